@@ -0,0 +1,274 @@
+#!/usr/bin/env python3
+"""
+Traitement en masse de PDF sans passer par le serveur HTTP
+
+Extraction du texte dans un pool de processus, appels au modèle sous une
+limite de concurrence commune, génération des fiches puis écriture d'un
+résumé CSV/JSONL. Une nouvelle exécution ignore les fichiers déjà traités
+avec succès (reconnus par leur contenu).
+
+Usage:
+    python -m app.cli catalogues/ --format both
+    python -m app.cli "archives/**/*.pdf" --output-dir bulk_outputs/archives --workers 8 --concurrency 4
+"""
+
+import argparse
+import asyncio
+import csv
+import glob
+import hashlib
+import json
+import logging
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Dict, Any, List, Tuple
+
+from app.config import settings
+from app.services.pdf_analyzer import PDFAnalyzer
+from app.services.html_generator import HTMLGenerator
+from app.services.pdf_generator import PDFGenerator
+from app.services.model_response_store import model_response_store
+from app.services.scheduler import llm_scheduler
+from app.services.lazy_render import save_product_data
+from app.services.ocr import page_ocr
+
+logger = logging.getLogger(__name__)
+
+# Hors OUTPUT_DIR : la rétention du serveur ne gère que ses propres sessions
+DEFAULT_OUTPUT_DIR = Path("bulk_outputs")
+RESULTS_FILENAME = "results.jsonl"
+SUMMARY_FILENAME = "summary.csv"
+SUMMARY_COLUMNS = [
+    "file", "sha256", "status", "product_name", "pages",
+    "extraction_seconds", "analysis_seconds", "render_seconds", "outputs", "error",
+]
+
+def find_pdfs(inputs: List[str]) -> List[Path]:
+    """Liste les PDF des dossiers, motifs glob et fichiers donnés (sans doublons)"""
+    found = {}
+    for item in inputs:
+        path = Path(item)
+        if path.is_dir():
+            candidates = path.rglob("*")
+        elif path.is_file():
+            candidates = [path]
+        else:
+            candidates = (Path(p) for p in glob.glob(item, recursive=True))
+        for candidate in candidates:
+            if candidate.is_file() and candidate.suffix.lower() == ".pdf":
+                found[candidate.resolve()] = candidate
+    return sorted(found.values())
+
+def hash_file(path: Path) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def extract_document(pdf_path: str) -> Tuple[str, int, float]:
+    """Extraction du texte, exécutée dans un processus du pool"""
+    # Déjà un processus par document : l'OCR des pages scannées se fait sur place
+    page_ocr.workers = 1
+    start = time.perf_counter()
+    analyzer = PDFAnalyzer()
+    text = analyzer.extract_text_from_pdf(Path(pdf_path))
+    return text, analyzer.page_count, time.perf_counter() - start
+
+def load_results(results_path: Path) -> Dict[str, Dict[str, Any]]:
+    """Dernier résultat connu par empreinte de fichier"""
+    results = {}
+    if not results_path.exists():
+        return results
+    with open(results_path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue  # Ligne tronquée par une interruption
+            results[record["sha256"]] = record
+    return results
+
+def write_summary(summary_path: Path, records: List[Dict[str, Any]]) -> None:
+    with open(summary_path, "w", encoding="utf-8", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=SUMMARY_COLUMNS, extrasaction="ignore")
+        writer.writeheader()
+        for record in records:
+            row = dict(record)
+            row["outputs"] = " ".join(record.get("outputs", {}).values())
+            writer.writerow(row)
+
+
+class Progress:
+    """Affichage de l'avancement et du débit sur stderr"""
+
+    def __init__(self, total: int, enabled: bool = True):
+        self.total = total
+        self.enabled = enabled
+        self.done = 0
+        self.failed = 0
+        self.pages = 0
+        self.start = time.monotonic()
+        self.interactive = sys.stderr.isatty()
+
+    def update(self, record: Dict[str, Any]) -> None:
+        self.done += 1
+        self.pages += record.get("pages") or 0
+        if record["status"] != "ok":
+            self.failed += 1
+        if not self.enabled:
+            return
+        elapsed = time.monotonic() - self.start
+        rate = self.done / elapsed if elapsed else 0.0
+        remaining = (self.total - self.done) / rate if rate else 0.0
+        line = (f"[{self.done}/{self.total}] {self.failed} échec(s) | {rate * 60:.1f} fichiers/min, "
+                f"{self.pages / elapsed if elapsed else 0:.1f} pages/s | reste ~{remaining:.0f}s | {Path(record['file']).name}")
+        if self.interactive:
+            sys.stderr.write("\r\033[K" + line)
+            sys.stderr.flush()
+        else:
+            print(line, file=sys.stderr)
+
+    def finish(self) -> None:
+        if self.enabled and self.interactive:
+            sys.stderr.write("\n")
+
+
+class BulkProcessor:
+    """Traitement d'une liste de PDF avec reprise sur une nouvelle exécution"""
+
+    def __init__(self, output_dir: Path, output_format: str = "html", workers: int = None,
+                 concurrency: int = None, force: bool = False, progress: bool = True):
+        self.output_dir = output_dir
+        self.output_format = output_format
+        self.workers = workers or os.cpu_count() or 1
+        self.concurrency = concurrency or settings.OLLAMA_CONCURRENCY
+        self.force = force
+        self.show_progress = progress
+        self.results_path = output_dir / RESULTS_FILENAME
+
+    async def process_file(self, pdf_path: Path, sha256: str, pool: ProcessPoolExecutor,
+                           semaphore: asyncio.Semaphore) -> Dict[str, Any]:
+        record = {
+            "file": str(pdf_path), "sha256": sha256, "status": "error", "product_name": "",
+            "pages": 0, "extraction_seconds": 0.0, "analysis_seconds": 0.0, "render_seconds": 0.0,
+            "outputs": {}, "error": "",
+        }
+        # Identifiant stable : le même fichier retombe dans le même dossier
+        session_id = f"{pdf_path.stem[:40]}_{sha256[:12]}"
+        output_path = self.output_dir / session_id
+        try:
+            loop = asyncio.get_running_loop()
+            text, pages, extraction_seconds = await loop.run_in_executor(pool, extract_document, str(pdf_path))
+            record["pages"] = pages
+            record["extraction_seconds"] = round(extraction_seconds, 3)
+
+            output_path.mkdir(parents=True, exist_ok=True)
+            analyzer = PDFAnalyzer()
+            analyzer.page_count = pages
+            start = time.perf_counter()
+            async with semaphore:
+                product_data = await analyzer.analyze_text(text, session_id, output_path, client_id="cli")
+            record["analysis_seconds"] = round(time.perf_counter() - start, 3)
+            record["product_name"] = product_data.get("product_name", "")
+
+            start = time.perf_counter()
+            outputs = {"json": str(await save_product_data(product_data, output_path, session_id))}
+            if self.output_format in ("html", "both"):
+                outputs["html"] = str(await HTMLGenerator().generate_product_sheet(product_data, output_path, session_id))
+            if self.output_format in ("pdf", "both"):
+                outputs["pdf"] = str(await PDFGenerator().generate_product_pdf(product_data, output_path, session_id))
+            record["render_seconds"] = round(time.perf_counter() - start, 3)
+            record["outputs"] = outputs
+            record["status"] = "ok"
+        except Exception as e:
+            record["error"] = str(e)
+            logger.error(f"Échec du traitement de {pdf_path}: {e}")
+        return record
+
+    async def run(self, pdf_paths: List[Path]) -> List[Dict[str, Any]]:
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        previous = load_results(self.results_path)
+
+        pending = []
+        for pdf_path in pdf_paths:
+            sha256 = await asyncio.to_thread(hash_file, pdf_path)
+            if not self.force and previous.get(sha256, {}).get("status") == "ok":
+                continue
+            pending.append((pdf_path, sha256))
+        skipped = len(pdf_paths) - len(pending)
+        print(f"📂 {len(pdf_paths)} PDF trouvé(s), {skipped} déjà traité(s), {len(pending)} à traiter", file=sys.stderr)
+
+        # Traitement hors ligne : pas de refus sur attente estimée, la limite est --concurrency
+        llm_scheduler.max_wait = 0
+        progress = Progress(len(pending), self.show_progress)
+        semaphore = asyncio.Semaphore(self.concurrency)
+        results = dict(previous)
+        queue = iter(pending)
+        with ProcessPoolExecutor(max_workers=self.workers) as pool, \
+                open(self.results_path, "a", encoding="utf-8") as results_file:
+
+            async def consume():
+                for path, sha256 in queue:
+                    record = await self.process_file(path, sha256, pool, semaphore)
+                    # Écrit au fil de l'eau : une interruption ne perd que les fichiers en cours
+                    results_file.write(json.dumps(record, ensure_ascii=False) + "\n")
+                    results_file.flush()
+                    results[record["sha256"]] = record
+                    progress.update(record)
+
+            # Fichiers en cours bornés : assez pour occuper le pool d'extraction pendant
+            # les analyses, sans accumuler les textes extraits devant le sémaphore
+            await asyncio.gather(*(consume() for _ in range(min(len(pending), self.workers + self.concurrency))))
+        progress.finish()
+
+        records = sorted(results.values(), key=lambda r: r["file"])
+        write_summary(self.output_dir / SUMMARY_FILENAME, records)
+        return records
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Traitement en masse de PDF constructeur")
+    parser.add_argument("inputs", nargs="+", help="Dossiers, fichiers PDF ou motifs glob (ex: 'docs/**/*.pdf')")
+    parser.add_argument("--output-dir", type=Path, default=DEFAULT_OUTPUT_DIR,
+                        help="Dossier des fiches, de results.jsonl et summary.csv")
+    parser.add_argument("--format", dest="output_format", default="html", choices=["html", "pdf", "both", "json"])
+    parser.add_argument("--workers", type=int, help="Processus d'extraction (défaut: nombre de cœurs)")
+    parser.add_argument("--concurrency", type=int, help=f"Documents analysés simultanément (défaut: {settings.OLLAMA_CONCURRENCY})")
+    parser.add_argument("--force", action="store_true", help="Retraiter aussi les fichiers déjà traités")
+    parser.add_argument("--no-progress", action="store_true", help="Ne pas afficher l'avancement")
+    parser.add_argument("--verbose", action="store_true", help="Journaux détaillés")
+    args = parser.parse_args()
+
+    logging.basicConfig(
+        level=logging.INFO if args.verbose else logging.WARNING,
+        format='%(asctime)s - %(levelname)s - %(message)s'
+    )
+
+    pdf_paths = find_pdfs(args.inputs)
+    if not pdf_paths:
+        print("❌ Aucun PDF trouvé", file=sys.stderr)
+        sys.exit(1)
+
+    processor = BulkProcessor(args.output_dir, args.output_format, args.workers, args.concurrency,
+                              args.force, not args.no_progress)
+    start = time.monotonic()
+    try:
+        records = asyncio.run(processor.run(pdf_paths))
+    finally:
+        model_response_store.close()
+    elapsed = time.monotonic() - start
+
+    failed = [r for r in records if r["status"] != "ok"]
+    print(f"✅ {len(records) - len(failed)} fiche(s), {len(failed)} échec(s) en {elapsed:.1f}s", file=sys.stderr)
+    print(f"📄 Résumé: {args.output_dir / SUMMARY_FILENAME}", file=sys.stderr)
+    sys.exit(1 if failed else 0)
+
+if __name__ == "__main__":
+    main()
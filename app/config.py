@@ -7,19 +7,94 @@ class Settings(BaseSettings):
     OLLAMA_URL: str = "http://localhost:11434"
     OLLAMA_MODEL: str = "llama3"  # Retour au modèle original
     OLLAMA_TIMEOUT: int = 180  # Timeout augmenté à 3 minutes
+    OLLAMA_SMALL_MODEL: str = ""  # Petit modèle essayé en premier (ex: llama3.2:3b), vide = désactivé
+    CASCADE_MIN_COVERAGE: float = 0.4  # Part minimale de champs renseignés pour accepter le petit modèle
+    OLLAMA_MAX_CTX: int = 8192  # num_ctx maximal (la taille est choisie par requête)
+    OLLAMA_MAX_PREDICT: int = 3000  # Budget maximal de tokens générés par requête
     
     # Configuration des dossiers
     UPLOAD_DIR: str = "uploads"
     OUTPUT_DIR: str = "outputs"
+    DATA_DIR: str = "data"  # Stockage local durable (bases SQLite)
     
     # Configuration du serveur
     HOST: str = "0.0.0.0"
     PORT: int = 8000
+    WORKERS: int = 1  # Processus uvicorn (0 = un par cœur), état partagé via DATA_DIR
     
     # Configuration des retries
     MAX_RETRIES: int = 3
     RETRY_DELAY: int = 2
-    
+
+    # Ordonnancement des appels au modèle
+    OLLAMA_CONCURRENCY: int = 2  # Appels simultanés envoyés à Ollama (limite initiale si adaptative)
+    ADAPTIVE_CONCURRENCY: bool = True  # Ajuste la limite selon la latence observée (AIMD)
+    OLLAMA_MIN_CONCURRENCY: int = 1
+    OLLAMA_MAX_CONCURRENCY: int = 16
+    SCHEDULER_MAX_WAIT: int = 600  # Attente estimée maximale avant refus (429), en secondes (0 = désactivé)
+    SCHEDULER_SEGMENT_SECONDS: float = 30  # Durée initiale estimée d'un segment, ajustée par les mesures
+
+    # Déduplication des uploads identiques
+    IDEMPOTENCY_TTL: int = 3600  # Durée de rejeu d'une réponse par Idempotency-Key (secondes, 0 = désactivé)
+    JOB_TTL_HOURS: int = 24  # Conservation de l'état des traitements (GET /status)
+    JOB_STALE_SECONDS: int = 60  # Traitement repris par un autre worker sans signe de vie de son propriétaire
+
+    # Webhooks de fin de traitement (callback_url de POST /upload)
+    WEBHOOK_SECRET: str = ""  # Clé HMAC de signature (X-Webhook-Signature), vide = callback_url refusé
+    WEBHOOK_WORKERS: int = 4  # Livraisons simultanées par worker
+    WEBHOOK_TIMEOUT: float = 10  # Secondes par tentative de livraison
+    WEBHOOK_MAX_ATTEMPTS: int = 10  # Tentatives avant abandon
+    WEBHOOK_BACKOFF_BASE: float = 5  # Attente après le premier échec, doublée à chaque tentative (secondes)
+    WEBHOOK_MAX_BACKOFF: float = 3600  # Attente maximale entre deux tentatives (secondes)
+    WEBHOOK_ALLOWED_HOSTS: str = ""  # Hôtes acceptés pour callback_url, séparés par des virgules (vide = hôtes publics uniquement)
+    WEBHOOK_TTL_HOURS: int = 168  # Conservation des livraisons terminées (0 = illimitée)
+
+    # Quasi-doublons (variantes de couleur, de référence d'une fiche déjà analysée)
+    NEAR_DUPLICATE_ENABLED: bool = True  # Reprise des données du document indexé le plus proche (MinHash/LSH)
+    NEAR_DUPLICATE_THRESHOLD: float = 0.8  # Similarité de Jaccard estimée minimale
+    NEAR_DUPLICATE_MAX_REFRESH: float = 0.3  # Part maximale de champs à redemander, au-delà analyse complète
+
+    # OCR des PDF scannés (pages sans couche texte)
+    OCR_ENABLED: bool = True  # Reconnaissance des pages image par tesseract (binaire tesseract-ocr requis)
+    OCR_LANGUAGES: str = "fra+eng"  # Langues tesseract (-l), paquets tesseract-ocr-fra etc.
+    OCR_COMMAND: str = "tesseract"
+    OCR_WORKERS: int = 0  # Processus du pool OCR par worker (0 = cœurs / WORKERS, au moins 1)
+    OCR_MIN_CHARS: int = 20  # En dessous, une page qui contient des images est considérée comme scannée
+    OCR_TIMEOUT: int = 120  # Secondes maximum par page
+    OCR_CACHE_TTL_HOURS: int = 720  # Conservation du texte reconnu par image de page (0 = illimité)
+
+    # Catalogues multi-produits (mode="catalogue")
+    CATALOGUE_CONCURRENCY: int = 4  # Produits d'un même catalogue analysés simultanément
+    CATALOGUE_MAX_PRODUCTS: int = 200  # Refus au-delà de ce nombre de produits détectés
+
+    # Configuration de la rétention (uploads, outputs, réponses du modèle)
+    RETENTION_MAX_AGE_HOURS: int = 168  # Suppression des sessions plus anciennes (0 = désactivé)
+    RETENTION_MAX_BYTES: int = 5 * 1024 * 1024 * 1024  # Quota disque, éviction LRU (0 = désactivé)
+    RETENTION_INTERVAL: int = 300  # Secondes entre deux passes
+    CHECKPOINT_TTL_HOURS: int = 24  # Conservation des résultats par segment pour la reprise d'une analyse
+
+    # Configuration des téléchargements
+    PRECOMPRESS_HTML: bool = True  # Variantes .gz/.br des fiches HTML écrites à la génération
+    DOWNLOAD_CACHE_MAX_AGE: int = 3600  # Cache-Control max-age (secondes)
+
+    # Traces par requête et profilage
+    TRACES_ENABLED: bool = True  # Spans de chaque upload écrits dans DATA_DIR/traces.jsonl (format Chrome Trace)
+    TRACE_MAX_BYTES: int = 50 * 1024 * 1024  # Rotation du fichier de traces (traces.jsonl.1)
+    ADMIN_TOKEN: str = ""  # Jeton X-Admin-Token des fonctions d'administration (?profile=1, /traces), vide = désactivées
+
+    # Journaux (écrits par un thread dédié, hors de la boucle asyncio)
+    LOG_LEVEL: str = "INFO"
+    LOG_FORMAT: str = "json"  # json (un objet par ligne, avec session_id) ou text (format historique)
+    LOG_QUEUE_SIZE: int = 10000  # Enregistrements en attente d'écriture, au-delà abandonnés et comptés (0 = illimité)
+    LOG_SAMPLING: str = "app.services.pdf_analyzer.pages=0.1,app.services.pdf_analyzer.validation=0.2"  # Taux conservé par logger bruyant (logger=taux, séparés par des virgules)
+
+    # Configuration du rendu PDF
+    PDF_TEMPLATE: str = "product_sheet_print.html"  # Template allégé pour WeasyPrint
+    ALLOW_REMOTE_ASSETS: bool = False  # Autoriser les téléchargements CDN lors du rendu
+    PRELOAD_MODULES: bool = False  # Charger WeasyPrint/PyPDF2 en arrière-plan après le démarrage (sinon au premier usage)
+    EXPORT_CHUNK_SIZE: int = 100  # Fiches mises en page par passe WeasyPrint lors d'un export groupé
+    EXPORT_MAX_PRODUCTS: int = 5000  # Fiches maximum par export groupé (POST /export/pdf)
+
     class Config:
         env_file = ".env"
 
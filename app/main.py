@@ -1,25 +1,48 @@
-from fastapi import FastAPI, UploadFile, HTTPException, Form
-from fastapi.responses import FileResponse, HTMLResponse
+from fastapi import FastAPI, UploadFile, HTTPException, Form, Header, Query
+from fastapi.responses import HTMLResponse, Response, StreamingResponse, JSONResponse
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
 from fastapi import Request
+from starlette.datastructures import MutableHeaders
+from pydantic import BaseModel
 import os
 import uuid
+import hmac
+import json
+import asyncio
 import aiofiles
+from datetime import datetime
 from pathlib import Path
-from typing import Optional
+from typing import List, Optional
 import logging
 
 from app.services.pdf_analyzer import PDFAnalyzer
 from app.services.html_generator import HTMLGenerator
 from app.services.pdf_generator import PDFGenerator
+from app.services import metrics
+from app.services.model_response_store import model_response_store
+from app.services.retention import retention_manager
+from app.services.output_files import output_file_index, choose_encoding, etag_matches, parse_range, iter_file
+from app.services.lazy_render import lazy_renderer, save_product_data, sheet_filename, session_product_files
+from app.services.single_flight import upload_flight, upload_fingerprint, JobFailedError
+from app.services.jobs import job_store, WORKER_ID, RUNNING, DONE
+from app.services.scheduler import llm_scheduler, QueueFullError
+from app.services.concurrency import ollama_limiter
+from app.services.token_budget import token_budget
+from app.services.tracing import start_trace, span, annotate, trace_writer
+from app.services.profiling import RequestProfiler
+from app.services.preload import preload_in_background
+from app.services.ocr import page_ocr
+from app.services.catalogue import catalogue_processor, MANIFEST_FILENAME
+from app.services.product_records import RecordFilter
+from app.services.record_export import iter_export, EXPORT_FORMATS
+from app.services.log_pipeline import log_pipeline, set_session_id
+from app.services.webhooks import (webhook_outbox, webhook_dispatcher, validate_callback_url,
+                                   UPLOAD_COMPLETED, UPLOAD_FAILED)
 from app.config import settings
 
-# Configuration des logs
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s'
-)
+# Configuration des logs : écrits par un thread dédié, jamais depuis la boucle asyncio
+log_pipeline.start()
 logger = logging.getLogger(__name__)
 
 app = FastAPI(
@@ -38,19 +61,114 @@ templates = Jinja2Templates(directory="app/templates")
 os.makedirs(settings.UPLOAD_DIR, exist_ok=True)
 os.makedirs(settings.OUTPUT_DIR, exist_ok=True)
 
-def cleanup_outputs():
-    """Nettoie le dossier outputs au démarrage"""
+@app.on_event("startup")
+async def start_retention():
+    """Charge l'index de rétention et lance le nettoyage en arrière-plan"""
+    await asyncio.to_thread(retention_manager.load)
+    retention_manager.start()
+
+@app.on_event("startup")
+async def start_metrics_aggregation():
+    """Avec plusieurs workers, /metrics agrège les instantanés de tous les processus"""
+    if settings.WORKERS != 1:
+        await asyncio.to_thread(metrics.enable_multiprocess, Path(settings.DATA_DIR) / metrics.MULTIPROCESS_DIRNAME, WORKER_ID)
+
+@app.on_event("startup")
+async def load_token_budget():
+    """Recale les tailles num_predict / num_ctx sur les réponses déjà enregistrées"""
     try:
-        import shutil
-        if os.path.exists(settings.OUTPUT_DIR):
-            shutil.rmtree(settings.OUTPUT_DIR)
-        os.makedirs(settings.OUTPUT_DIR, exist_ok=True)
-        logger.info("Dossier outputs nettoyé au démarrage")
+        await asyncio.to_thread(token_budget.load_history, model_response_store)
     except Exception as e:
-        logger.warning(f"Impossible de nettoyer le dossier outputs: {e}")
+        logger.warning(f"Impossible de recharger l'historique des tokens: {e}")
+
+@app.on_event("startup")
+async def schedule_preload():
+    """WeasyPrint et PyPDF2 sont importés au premier usage, ou en arrière-plan si PRELOAD_MODULES"""
+    if settings.PRELOAD_MODULES:
+        app.state.preload_task = asyncio.get_running_loop().create_task(preload_in_background())
+
+@app.on_event("startup")
+async def start_webhooks():
+    """Livraison des webhooks en attente dans l'outbox, y compris ceux d'avant un redémarrage
+
+    Les inscriptions de traitements interrompus par l'arrêt sont notifiées
+    (upload.failed) dès l'expiration de leur bail.
+    """
+    webhook_dispatcher.start()
+
+@app.on_event("shutdown")
+async def shutdown_services():
+    """Arrête la rétention, les webhooks, le pool OCR et écrit les métriques, les réponses du modèle et les journaux encore en file d'attente"""
+    await retention_manager.stop()
+    await webhook_dispatcher.stop()
+    page_ocr.shutdown()
+    metrics.disable_multiprocess()
+    model_response_store.close()
+    log_pipeline.stop()
+
+def is_admin(token: Optional[str]) -> bool:
+    """Vérifie le jeton X-Admin-Token (fonctions désactivées sans ADMIN_TOKEN)"""
+    return bool(settings.ADMIN_TOKEN) and token is not None and hmac.compare_digest(token, settings.ADMIN_TOKEN)
+
+class UploadTraceMiddleware:
+    """Trace des étapes de chaque upload, avec profil CPU et mémoire sur demande (?profile=1)
+
+    Middleware ASGI pur : les autres requêtes, dont les corps envoyés en flux
+    par /download et /export, lui passent au travers sans être enveloppées.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] != "POST" or scope["path"] != "/upload":
+            await self.app(scope, receive, send)
+            return
+        request = Request(scope)
+        profile = request.query_params.get("profile") == "1"
+        if not settings.TRACES_ENABLED and not profile:
+            await self.app(scope, receive, send)
+            return
+
+        profiler = None
+        if profile:
+            if not is_admin(request.headers.get("x-admin-token")):
+                response = JSONResponse(status_code=403, content={"detail": "Profilage réservé aux administrateurs"})
+                await response(scope, receive, send)
+                return
+            profiler = RequestProfiler()
+            if not profiler.start():
+                response = JSONResponse(status_code=409, content={"detail": "Un profilage est déjà en cours sur ce worker"})
+                await response(scope, receive, send)
+                return
+
+        last_body = None
+        with start_trace("upload", profile=profile) as trace:
+            async def send_traced(message):
+                nonlocal last_body
+                if message["type"] == "http.response.start":
+                    trace.args["status_code"] = message["status"]
+                    MutableHeaders(scope=message).append("X-Trace-Id", trace.trace_id)
+                elif message["type"] == "http.response.body" and not message.get("more_body", False):
+                    # Fin de réponse retenue : la trace est consultable dès que le client la reçoit
+                    last_body = message
+                    return
+                await send(message)
+
+            try:
+                await self.app(scope, receive, send_traced)
+            finally:
+                if profiler is not None:
+                    trace.extra["profile"] = await asyncio.to_thread(profiler.stop)
+
+        try:
+            await asyncio.to_thread(trace_writer.write, trace)
+        except Exception as e:
+            logger.warning(f"Impossible d'écrire la trace {trace.trace_id}: {e}")
+        if last_body is not None:
+            await send(last_body)
 
-# Nettoyage au démarrage
-cleanup_outputs()
+app.add_middleware(UploadTraceMiddleware)
 
 @app.get("/", response_class=HTMLResponse)
 async def home(request: Request):
@@ -59,23 +177,123 @@ async def home(request: Request):
 
 @app.post("/upload")
 async def upload_pdf(
+    request: Request,
     file: UploadFile,
     output_format: str = Form("html"),
-    output_dir: Optional[str] = Form(None)
+    output_dir: Optional[str] = Form(None),
+    mode: str = Form("single"),
+    callback_url: Optional[str] = Form(None),
+    idempotency_key: Optional[str] = Header(None),
+    x_client_id: Optional[str] = Header(None)
 ):
     """
     Endpoint pour l'upload et le traitement d'un fichier PDF
+
+    Avec callback_url, la réponse (202) est immédiate : le résultat est posté
+    à cette URL à la fin du traitement (webhook signé).
     """
     if not file.filename.lower().endswith('.pdf'):
         raise HTTPException(status_code=400, detail="Le fichier doit être un PDF")
+    if mode not in ("single", "catalogue"):
+        raise HTTPException(status_code=400, detail="mode doit valoir 'single' ou 'catalogue'")
+    if callback_url:
+        if not webhook_dispatcher.enabled:
+            raise HTTPException(status_code=400, detail="Webhooks désactivés sur ce serveur (WEBHOOK_SECRET)")
+        try:
+            # Résolution DNS de l'hôte (adresses privées refusées) hors de la boucle
+            callback_url = await asyncio.to_thread(validate_callback_url, callback_url)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+    
+    # Lecture du fichier
+    content = await file.read()
+    metrics.UPLOAD_SIZE.observe(len(content))
     
-    # Génération d'un ID unique pour cette session
+    # Les uploads identiques (même contenu, mêmes options) partagent un seul traitement
+    fingerprint = await asyncio.to_thread(upload_fingerprint, content, output_format, output_dir, mode)
+    key = f"{idempotency_key}:{fingerprint}" if idempotency_key else fingerprint
+    # Client utilisé pour le partage équitable des appels au modèle
+    client_id = x_client_id or (request.client.host if request.client else "anonymous")
+    # Génération d'un ID unique pour cette session (inutilisé si l'upload est regroupé)
     session_id = str(uuid.uuid4())
+    delivery_id = None
+    if callback_url:
+        # Inscrite avant la réponse 202 : un arrêt du serveur pendant le traitement est notifié
+        delivery_id = await asyncio.to_thread(webhook_outbox.register, session_id, callback_url,
+                                              webhook_dispatcher.registration_lease)
+    flight = upload_flight.run(
+        key,
+        session_id,
+        lambda: process_upload(content, file.filename, output_format, output_dir, client_id, session_id, mode),
+        remember=idempotency_key is not None
+    )
+    if callback_url:
+        task = asyncio.get_running_loop().create_task(notify_when_done(flight, session_id, callback_url, delivery_id))
+        background_uploads.add(task)
+        task.add_done_callback(background_uploads.discard)
+        annotate(session_id=session_id, filename=file.filename, bytes=len(content), callback=True)
+        return JSONResponse(status_code=202, content={
+            "success": True,
+            "session_id": session_id,
+            "status": "accepted",
+            "status_url": f"/status/{session_id}",
+            "callback_url": callback_url
+        })
+    try:
+        result, coalesced = await flight
+    except JobFailedError as e:
+        # Traitement identique mené (et échoué) dans un autre worker
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
+    annotate(session_id=result["session_id"], filename=file.filename, bytes=len(content), coalesced=coalesced)
+    set_session_id(result["session_id"])
+    if coalesced:
+        metrics.UPLOADS_COALESCED.inc(mode=coalesced)
+        logger.info(f"Upload identique regroupé ({coalesced}) avec la session {result['session_id']}")
+    return result
+
+# Traitements des uploads avec callback_url, poursuivis après la réponse 202
+background_uploads = set()
+
+async def notify_when_done(flight, session_id: str, callback_url: str, delivery_id: Optional[str] = None) -> None:
+    """Attend la fin d'un traitement puis complète son inscription dans l'outbox
+
+    session_id est celui de la réponse 202 ; si l'upload a été regroupé avec
+    un traitement identique, result.session_id désigne ce traitement.
+    """
+    set_session_id(session_id)
+    try:
+        result, coalesced = await flight
+        if coalesced:
+            metrics.UPLOADS_COALESCED.inc(mode=coalesced)
+        event, payload = UPLOAD_COMPLETED, {"session_id": session_id, "status": DONE, "result": result}
+    except (HTTPException, JobFailedError) as e:
+        event, payload = UPLOAD_FAILED, {"session_id": session_id, "status": "error",
+                                         "status_code": e.status_code, "error": e.detail}
+    except Exception as e:
+        logger.error(f"Erreur lors du traitement de la session {session_id}: {e}", exc_info=True)
+        event, payload = UPLOAD_FAILED, {"session_id": session_id, "status": "error", "status_code": 500,
+                                         "error": str(e)}
+    try:
+        await asyncio.to_thread(webhook_outbox.enqueue, session_id, callback_url, event, payload,
+                                delivery_id)
+        webhook_dispatcher.notify()
+    except Exception as e:
+        logger.error(f"Impossible d'inscrire le webhook de la session {session_id}: {e}", exc_info=True)
+
+async def process_upload(content: bytes, filename: str, output_format: str, output_dir: Optional[str],
+                         client_id: str = "anonymous", session_id: Optional[str] = None,
+                         mode: str = "single") -> dict:
+    """Traitement complet d'un PDF uploadé : analyse puis génération des fiches
+
+    En mode "catalogue", le PDF est découpé en produits et chacun reçoit sa fiche.
+    """
+    session_id = session_id or str(uuid.uuid4())
+    set_session_id(session_id)
     
+    metrics.UPLOADS_IN_PROGRESS.inc()
+    upload_path = None
+    output_path = None
     try:
-        # Lecture du fichier
-        content = await file.read()
-        
         # Création du dossier de sortie personnalisé si spécifié
         if output_dir:
             output_path = Path(output_dir)
@@ -85,65 +303,293 @@ async def upload_pdf(
             output_path.mkdir(parents=True, exist_ok=True)
         
         # Sauvegarde du fichier PDF original
-        pdf_path = Path(settings.UPLOAD_DIR) / f"{session_id}_{file.filename}"
-        async with aiofiles.open(pdf_path, 'wb') as f:
+        upload_path = Path(settings.UPLOAD_DIR) / f"{session_id}_{filename}"
+        async with span("save", bytes=len(content)), aiofiles.open(upload_path, 'wb') as f:
             await f.write(content)
         
-        logger.info(f"Fichier PDF sauvegardé: {pdf_path}")
+        logger.info(f"Fichier PDF sauvegardé: {upload_path}")
+        
+        if mode == "catalogue":
+            manifest = await catalogue_processor.process(
+                upload_path, output_path, session_id, output_format, client_id, source=filename
+            )
+            metrics.UPLOADS.inc(status="success")
+            return {
+                "success": True,
+                "session_id": session_id,
+                "mode": "catalogue",
+                "product_count": manifest["product_count"],
+                "failed": manifest["failed"],
+                "products": manifest["products"],
+                "outputs": {"manifest": str(output_path / MANIFEST_FILENAME)},
+                "downloads": {"manifest": f"/download/{session_id}/{MANIFEST_FILENAME}"},
+                "output_directory": str(output_path)
+            }
         
         # Analyse du PDF avec Ollama
         analyzer = PDFAnalyzer()
-        product_data = await analyzer.analyze_pdf(pdf_path, session_id, output_path)
+        product_data = await analyzer.analyze_pdf(upload_path, session_id, output_path, client_id)
         
         logger.info(f"Données produit extraites: {product_data.get('product_name', 'N/A')}")
         
+        # Données structurées persistées : HTML/PDF peuvent être rendus plus tard à la demande
+        data_path = await save_product_data(product_data, output_path, session_id)
+        
         # Génération des fichiers de sortie
         results = {}
         
+        if output_format == "json":
+            metrics.UPLOADS.inc(status="success")
+            return {
+                "success": True,
+                "session_id": session_id,
+                "product_name": product_data.get("product_name", "Produit"),
+                "product_data": product_data,
+                "near_duplicate": analyzer.near_duplicate,
+                "outputs": {"json": str(data_path)},
+                "downloads": {
+                    fmt: f"/download/{session_id}/{sheet_filename(session_id, fmt)}"
+                    for fmt in ("html", "pdf")
+                },
+                "output_directory": str(output_path)
+            }
+        
         if output_format in ["html", "both"]:
             html_generator = HTMLGenerator()
-            html_path = await html_generator.generate_product_sheet(
-                product_data, output_path, session_id
-            )
+            with span("render_html"), metrics.RENDER_SECONDS.time(format="html"):
+                html_path = await html_generator.generate_product_sheet(
+                    product_data, output_path, session_id
+                )
             results["html"] = str(html_path)
         
         if output_format in ["pdf", "both"]:
             pdf_generator = PDFGenerator()
-            pdf_path = await pdf_generator.generate_product_pdf(
-                product_data, output_path, session_id
-            )
+            with span("render_pdf"), metrics.RENDER_SECONDS.time(format="pdf"):
+                pdf_path = await pdf_generator.generate_product_pdf(
+                    product_data, output_path, session_id
+                )
             results["pdf"] = str(pdf_path)
         
+        metrics.UPLOADS.inc(status="success")
         return {
             "success": True,
             "session_id": session_id,
             "product_name": product_data.get("product_name", "Produit"),
+            "near_duplicate": analyzer.near_duplicate,
             "outputs": results,
             "output_directory": str(output_path)
         }
         
+    except QueueFullError as e:
+        metrics.UPLOADS.inc(status="rejected")
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": str(e.retry_after)})
     except Exception as e:
+        metrics.UPLOADS.inc(status="error")
         logger.error(f"Erreur lors du traitement: {str(e)}", exc_info=True)
         raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        metrics.UPLOADS_IN_PROGRESS.dec()
+        # Suivi de la session par la rétention, y compris en cas d'échec
+        if upload_path is not None:
+            try:
+                await asyncio.to_thread(retention_manager.register, session_id, upload_path, output_path)
+            except Exception as e:
+                logger.warning(f"Impossible d'indexer la session {session_id}: {e}")
 
-@app.get("/download/{session_id}/{filename}")
-async def download_file(session_id: str, filename: str):
-    """Téléchargement d'un fichier généré"""
-    file_path = Path(settings.OUTPUT_DIR) / session_id / filename
+class ExportRequest(BaseModel):
+    session_ids: List[str]
+    title: str = "Catalogue produits"
+
+@app.post("/export/pdf")
+async def export_pdf(export: ExportRequest):
+    """Export de plusieurs fiches (sessions ou catalogues) dans un seul PDF, avec sommaire et signets"""
+    files = []
+    for session_id in export.session_ids:
+        found = await asyncio.to_thread(session_product_files, session_id)
+        if not found:
+            raise HTTPException(status_code=404, detail=f"Aucune donnée produit pour la session {session_id}")
+        files.extend(found)
+    if not files:
+        raise HTTPException(status_code=400, detail="Aucune session à exporter")
+    if len(files) > settings.EXPORT_MAX_PRODUCTS:
+        raise HTTPException(
+            status_code=413,
+            detail=f"Export limité à {settings.EXPORT_MAX_PRODUCTS} fiches ({len(files)} demandées)"
+        )
     
-    if not file_path.exists():
-        raise HTTPException(status_code=404, detail="Fichier non trouvé")
+    export_id = str(uuid.uuid4())
+    output_path = Path(settings.OUTPUT_DIR) / export_id
+    output_path.mkdir(parents=True, exist_ok=True)
+    filename = f"export_{export_id}.pdf"
+    # Lecture au fil du rendu : seul le lot en cours de mise en page est en mémoire
+    products = (json.loads(path.read_text(encoding="utf-8")) for path in files)
+    try:
+        with metrics.RENDER_SECONDS.time(format="combined_pdf"):
+            result = await PDFGenerator().generate_combined_pdf(products, output_path, filename, export.title)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        await asyncio.to_thread(retention_manager.register, export_id, None, output_path)
     
-    return FileResponse(
-        path=file_path,
-        filename=filename,
-        media_type='application/octet-stream'
+    return {
+        "success": True,
+        "export_id": export_id,
+        "products": result["products"],
+        "pages": result["pages"],
+        "toc": result["toc"],
+        "download": f"/download/{export_id}/{filename}",
+        "output_directory": str(output_path)
+    }
+
+@app.get("/export")
+async def export_records(
+    output_format: str = Query("csv", alias="format"),
+    since: Optional[str] = None,
+    until: Optional[str] = None,
+    brand: Optional[str] = None,
+    category: Optional[str] = None
+):
+    """Export des données produit extraites (CSV, XLSX ou NDJSON), généré en flux
+
+    Filtres : date d'extraction (since/until, ISO 8601), marque et catégorie
+    (sans distinction de casse). Les spécifications techniques et dimensions
+    sont aplaties en colonnes (technical_specs.voltage, dimensions.height).
+    """
+    if output_format not in EXPORT_FORMATS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Format d'export invalide: {output_format} (attendu: {', '.join(EXPORT_FORMATS)})"
+        )
+    try:
+        selection = RecordFilter.from_query(since, until, brand, category)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    media_type, extension = EXPORT_FORMATS[output_format]
+    content = await asyncio.to_thread(iter_export, output_format, selection)
+    metrics.RECORD_EXPORTS.inc(format=output_format)
+    
+    def counted():
+        for chunk in content:
+            metrics.RECORD_EXPORT_BYTES.inc(len(chunk), format=output_format)
+            yield chunk
+    
+    filename = f"produits_{datetime.now().strftime('%Y%m%d_%H%M%S')}.{extension}"
+    return StreamingResponse(
+        counted(),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"', "Cache-Control": "no-store"}
     )
 
+@app.get("/download/{session_id}/{filename}")
+async def download_file(session_id: str, filename: str, request: Request):
+    """Téléchargement d'un fichier généré (ETag, Range et variantes précompressées)"""
+    entry = output_file_index.lookup_cached(session_id, filename)
+    if entry is None:
+        entry = await asyncio.to_thread(output_file_index.lookup, session_id, filename)
+    if entry is None:
+        # Fiche jamais générée (output_format="json") : rendu à la demande
+        try:
+            entry = await lazy_renderer.ensure(session_id, filename)
+        except Exception as e:
+            logger.error(f"Erreur lors du rendu à la demande: {str(e)}", exc_info=True)
+            raise HTTPException(status_code=500, detail=str(e))
+    if entry is None:
+        raise HTTPException(status_code=404, detail="Fichier non trouvé")
+    
+    await asyncio.to_thread(retention_manager.touch, session_id)
+    
+    headers = {
+        "Cache-Control": f"public, max-age={settings.DOWNLOAD_CACHE_MAX_AGE}",
+        "Content-Disposition": f'attachment; filename="{filename}"',
+        "Accept-Ranges": "bytes",
+    }
+    if entry.variants:
+        headers["Vary"] = "Accept-Encoding"
+    
+    # Les requêtes partielles portent sur la représentation non compressée
+    range_header = request.headers.get("range")
+    if_range = request.headers.get("if-range")
+    if if_range and if_range != entry.strong_etag:
+        range_header = None
+    try:
+        byte_range = parse_range(range_header, entry.size)
+        satisfiable = True
+    except ValueError:
+        byte_range, satisfiable = None, False
+    # Range ignoré (absent ou invalide) : la variante compressée reste possible
+    encoding = None if byte_range or not satisfiable else choose_encoding(request.headers.get("accept-encoding"), entry)
+    etag = entry.variant_etag(encoding) if encoding else entry.strong_etag
+    headers["ETag"] = etag
+    
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    
+    if not satisfiable:
+        headers["Content-Range"] = f"bytes */{entry.size}"
+        return Response(status_code=416, headers=headers)
+    
+    if byte_range is not None:
+        start, end = byte_range
+        headers["Content-Range"] = f"bytes {start}-{end}/{entry.size}"
+        headers["Content-Length"] = str(end - start + 1)
+        return StreamingResponse(
+            iter_file(entry.path, start, end - start + 1),
+            status_code=206, media_type=entry.media_type, headers=headers
+        )
+    
+    path, size = (entry.variants[encoding] if encoding else (entry.path, entry.size))
+    if encoding:
+        headers["Content-Encoding"] = encoding
+    headers["Content-Length"] = str(size)
+    return StreamingResponse(iter_file(path), media_type=entry.media_type, headers=headers)
+
+@app.get("/status/{session_id}")
+async def session_status(session_id: str):
+    """État du traitement d'une session, quel que soit le worker qui l'a mené"""
+    job = await asyncio.to_thread(job_store.get_session, session_id)
+    webhooks = await asyncio.to_thread(webhook_outbox.session_deliveries, session_id)
+    if job is None and not webhooks:
+        raise HTTPException(status_code=404, detail="Session inconnue")
+    status = {"session_id": session_id}
+    if job is not None:
+        status.update(status=job["status"], created_at=job["created_at"], updated_at=job["updated_at"])
+        if job["status"] == DONE:
+            status["result"] = json.loads(job["result"])
+        elif job["status"] != RUNNING:
+            status["error"] = job["error"]
+    if webhooks:
+        # Upload avec callback_url (regroupé avec un autre traitement si le statut manque)
+        status["webhooks"] = webhooks
+    return status
+
+@app.get("/traces/{trace_id}")
+async def get_trace(trace_id: str, x_admin_token: Optional[str] = Header(None)):
+    """Trace d'un upload (en-tête X-Trace-Id) au format Chrome Trace, pour Perfetto"""
+    if not is_admin(x_admin_token):
+        raise HTTPException(status_code=403, detail="Accès réservé aux administrateurs")
+    trace = await asyncio.to_thread(trace_writer.find, trace_id) if trace_id.isalnum() else None
+    if trace is None:
+        raise HTTPException(status_code=404, detail="Trace non trouvée")
+    return JSONResponse(content=trace, headers={"Content-Disposition": f'attachment; filename="trace_{trace_id}.json"'})
+
 @app.get("/health")
 async def health_check():
     """Vérification de l'état du service"""
-    return {"status": "healthy", "service": "PDF to Product Sheet Generator"}
+    return {
+        "status": "healthy",
+        "service": "PDF to Product Sheet Generator",
+        "worker": WORKER_ID,
+        "retention": await asyncio.to_thread(retention_manager.stats),
+        "scheduler": llm_scheduler.stats(),
+        "ollama_concurrency": ollama_limiter.stats()
+    }
+
+@app.get("/metrics")
+async def metrics_endpoint():
+    """Métriques du pipeline au format texte Prometheus"""
+    # Lecture des instantanés des autres workers (fichiers) hors de la boucle
+    return Response(content=await asyncio.to_thread(metrics.render_metrics), media_type=metrics.CONTENT_TYPE)
 
 if __name__ == "__main__":
     import uvicorn
@@ -0,0 +1,110 @@
+import logging
+import mimetypes
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, Any, Optional
+from urllib.parse import urlparse, unquote
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+STATIC_DIR = Path(__file__).parent.parent / "static"
+
+
+class LocalAssetFetcher:
+    """url_fetcher WeasyPrint servant les ressources depuis app/static avec cache mémoire
+
+    Les URL hors de /static (CDN du template complet) ne sont jamais
+    téléchargées sauf si ALLOW_REMOTE_ASSETS est activé. Le cache garde les
+    `max_entries` ressources les plus récemment utilisées, dans la limite de
+    `max_bytes`.
+    """
+
+    def __init__(self, static_dir: Path = STATIC_DIR, allow_remote: Optional[bool] = None,
+                 max_entries: int = 256, max_bytes: int = 32 * 1024 * 1024):
+        self.static_dir = static_dir.resolve()
+        self.allow_remote = settings.ALLOW_REMOTE_ASSETS if allow_remote is None else allow_remote
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._cache: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def resolve(self, url: str) -> Optional[Path]:
+        """Retourne le fichier local correspondant à une URL, ou None"""
+        parsed = urlparse(url)
+        if parsed.scheme == "file":
+            path = Path(unquote(parsed.path)).resolve()
+            return path if path.is_relative_to(self.static_dir) else None
+        if parsed.scheme in ("", "http", "https") and parsed.path.startswith("/static/"):
+            # Ressource de notre propre service (/static monté par FastAPI)
+            return self._safe_path(parsed.path[len("/static/"):])
+        return None
+
+    def _safe_path(self, relative: str) -> Optional[Path]:
+        path = (self.static_dir / unquote(relative.split("?", 1)[0])).resolve()
+        if not path.is_relative_to(self.static_dir):
+            return None
+        return path
+
+    def __call__(self, url: str, timeout: int = 10, ssl_context=None) -> Dict[str, Any]:
+        with self._lock:
+            cached = self._cache.get(url)
+            if cached is not None:
+                self._cache.move_to_end(url)
+        if cached is not None:
+            return dict(cached)
+
+        path = self.resolve(url)
+        if path is not None and path.is_file():
+            mime_type, encoding = mimetypes.guess_type(str(path))
+            result = {
+                "string": path.read_bytes(),
+                "mime_type": mime_type or "application/octet-stream",
+                "encoding": "utf-8" if (mime_type or "").startswith("text/") else encoding,
+                "redirected_url": path.as_uri(),
+            }
+        elif self.allow_remote and url.startswith(("http://", "https://")):
+            from weasyprint.urls import default_url_fetcher
+            result = default_url_fetcher(url, timeout=timeout, ssl_context=ssl_context)
+            if "file_obj" in result:
+                result["string"] = result.pop("file_obj").read()
+        else:
+            # Ressource indisponible hors ligne : on renvoie un contenu vide
+            # plutôt que de bloquer le rendu sur un accès réseau.
+            logger.warning(f"Ressource non disponible localement, ignorée: {url}")
+            mime_type = mimetypes.guess_type(urlparse(url).path)[0]
+            result = {
+                "string": b"",
+                "mime_type": mime_type or "text/css",
+                "encoding": "utf-8",
+                "redirected_url": url,
+            }
+
+        self._put(url, result)
+        return dict(result)
+
+    def _put(self, url: str, result: Dict[str, Any]) -> None:
+        size = len(result.get("string") or b"")
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            previous = self._cache.pop(url, None)
+            if previous is not None:
+                self._size -= len(previous.get("string") or b"")
+            self._cache[url] = result
+            self._size += size
+            while len(self._cache) > self.max_entries or self._size > self.max_bytes:
+                _, evicted = self._cache.popitem(last=False)
+                self._size -= len(evicted.get("string") or b"")
+
+    def clear(self) -> None:
+        """Vide le cache des ressources"""
+        with self._lock:
+            self._cache.clear()
+            self._size = 0
+
+
+asset_fetcher = LocalAssetFetcher()
@@ -0,0 +1,252 @@
+import asyncio
+import json
+import logging
+import re
+import time
+from collections import Counter
+from dataclasses import dataclass, field
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+import aiofiles
+
+from app.config import settings
+from app.services import metrics
+from app.services.pdf_analyzer import PDFAnalyzer
+from app.services.html_generator import HTMLGenerator
+from app.services.pdf_generator import PDFGenerator
+from app.services.lazy_render import save_product_data, sheet_filename, product_data_filename
+from app.services.output_files import output_file_index
+from app.services.scheduler import QueueFullError, llm_scheduler
+from app.services.tracing import span, traced
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_FILENAME = "manifest.json"
+
+# Référence introduite par un libellé : « Réf. : FX-4500 », « Modèle n° RS68N8220S9 »
+MODEL_LABEL = re.compile(
+    r"\b(?:r[ée]f(?:[ée]rence)?|mod[èe]le|model|article|art|sku)\b\.?\s*(?:n[°o]\.?\s*)?[:#]?\s*"
+    r"([A-Z0-9][A-Z0-9./-]*\d[A-Z0-9./-]*)",
+    re.IGNORECASE
+)
+# Référence dans un titre : lettres et chiffres mêlés, en majuscules (« Four FX-4500 »)
+MODEL_TOKEN = re.compile(r"\b(?=[A-Z0-9./-]*[A-Z])(?=[A-Z0-9./-]*\d)[A-Z0-9][A-Z0-9./-]{2,}[A-Z0-9]\b")
+# Valeurs et normes qui ressemblent à des références (230V, 50HZ, IP44, EN60335)
+NOT_A_MODEL = re.compile(
+    r"^(?:\d+(?:[.,]\d+)?(?:V|W|KW|HZ|MM|CM|M|KG|G|L|A|DB|MAH|GB|TB|GO|TO|MP|MHZ|GHZ)|(?:ISO|EN|IEC|IP|NF|DIN|CE)-?\d+.*)$"
+)
+PAGE_NUMBER = re.compile(r"^(?:page\s*)?\d+(?:\s*/\s*\d+)?$", re.IGNORECASE)
+
+
+@dataclass
+class ProductSection:
+    """Pages d'un produit du catalogue"""
+    index: int
+    pages: List[int] = field(default_factory=list)  # Numéros de page, à partir de 1
+    title: str = ""
+    model_numbers: List[str] = field(default_factory=list)
+
+
+class CatalogueSplitter:
+    """Découpe un catalogue en produits à partir du texte de chaque page
+
+    Une page ouvre un nouveau produit quand elle cite une référence (précédée
+    d'un libellé, ou dans son titre) inconnue jusque-là et aucune référence du
+    produit en cours. Les autres pages (suite des caractéristiques, tableaux)
+    prolongent le produit en cours ; celles qui précèdent le premier produit
+    (couverture, sommaire) sont écartées. Une page qui cite plus de
+    `max_models_per_page` références (sommaire, tableau comparatif) n'ouvre pas
+    de produit. Le découpage se fait à la page : deux produits décrits sur une
+    même page restent ensemble.
+    """
+
+    def __init__(self, max_models_per_page: int = 4):
+        self.max_models_per_page = max_models_per_page
+
+    def running_headers(self, pages: List[str]) -> Set[str]:
+        """Premières lignes répétées sur la plupart des pages (en-têtes courants)"""
+        first_lines = Counter(lines[0] for lines in (self._lines(page) for page in pages) if lines)
+        threshold = max(3, len(pages) // 2)
+        return {line for line, count in first_lines.items() if count >= threshold}
+
+    def heading(self, text: str, ignored: Set[str] = frozenset()) -> str:
+        """Titre de la page : première ligne courte qui n'est ni un numéro ni un en-tête courant"""
+        for line in self._lines(text):
+            if line in ignored or PAGE_NUMBER.match(line):
+                continue
+            return line if len(line) <= 100 else ""
+        return ""
+
+    def model_numbers(self, text: str, heading: str = "") -> List[str]:
+        """Références citées dans la page, dans leur ordre d'apparition"""
+        found = [m.upper() for m in MODEL_TOKEN.findall(heading)]
+        found += [m.group(1).upper().rstrip("./-") for m in MODEL_LABEL.finditer(text)]
+        return list(dict.fromkeys(m for m in found if len(m) >= 3 and not NOT_A_MODEL.match(m)))
+
+    @traced("split_catalogue")
+    def split(self, pages: List[str]) -> Tuple[List[ProductSection], List[int]]:
+        """Retourne les produits détectés et les pages écartées avant le premier produit"""
+        ignored = self.running_headers(pages)
+        sections: List[ProductSection] = []
+        seen: Set[str] = set()
+        preamble: List[int] = []
+
+        for number, text in enumerate(pages, 1):
+            if not text.strip():
+                continue
+            heading = self.heading(text, ignored)
+            models = self.model_numbers(text, heading)
+            current = sections[-1] if sections else None
+            new_models = [m for m in models if m not in seen]
+            starts_product = (
+                new_models
+                and len(models) <= self.max_models_per_page
+                and (current is None or not set(models) & set(current.model_numbers))
+            )
+            if starts_product:
+                current = ProductSection(index=len(sections) + 1, title=heading or new_models[0])
+                sections.append(current)
+            if current is None:
+                preamble.append(number)
+                continue
+            current.pages.append(number)
+            if len(models) <= self.max_models_per_page:
+                current.model_numbers.extend(m for m in new_models if m not in current.model_numbers)
+                seen.update(new_models)
+
+        if not sections:
+            # Aucune référence reconnue : le document est traité comme un seul produit
+            text_pages = [number for number, text in enumerate(pages, 1) if text.strip()]
+            title = self.heading(pages[text_pages[0] - 1], ignored) if text_pages else ""
+            return [ProductSection(index=1, pages=text_pages, title=title)], []
+        return sections, preamble
+
+    @staticmethod
+    def _lines(text: str) -> List[str]:
+        return [line.strip() for line in text.splitlines() if line.strip()]
+
+
+class CatalogueProcessor:
+    """Traitement d'un catalogue multi-produits : une fiche par produit
+
+    Chaque produit est analysé séparément (ses pages seulement, avec sa propre
+    reprise par segment) et jusqu'à `concurrency` produits le sont en même
+    temps ; les appels au modèle restent soumis à l'ordonnanceur et au
+    limiteur Ollama. Le rendu d'une fiche se fait hors de cette limite, pendant
+    l'analyse des produits suivants. L'échec d'un produit est consigné dans le
+    manifeste sans interrompre les autres.
+    """
+
+    def __init__(self, concurrency: Optional[int] = None, max_products: Optional[int] = None):
+        self.concurrency = concurrency or settings.CATALOGUE_CONCURRENCY
+        self.max_products = max_products or settings.CATALOGUE_MAX_PRODUCTS
+        self.splitter = CatalogueSplitter()
+
+    async def process(self, pdf_path: Path, output_path: Path, session_id: str, output_format: str = "html",
+                      client_id: str = "anonymous", source: Optional[str] = None) -> Dict[str, Any]:
+        """Découpe, analyse et génère les fiches ; retourne le manifeste (écrit dans manifest.json)"""
+        analyzer = PDFAnalyzer()
+        # Refus anticipé si la file du modèle est déjà saturée, avant l'extraction (OCR compris)
+        llm_scheduler.check(client_id)
+        pages = await asyncio.to_thread(analyzer.extract_pages_from_pdf, pdf_path)
+        sections, preamble = self.splitter.split(pages)
+        if len(sections) > self.max_products:
+            raise ValueError(f"Catalogue trop volumineux: {len(sections)} produits détectés (maximum {self.max_products})")
+        metrics.CATALOGUE_PRODUCTS.observe(len(sections))
+        logger.info(f"Catalogue {source or pdf_path.name}: {len(sections)} produit(s) détecté(s) sur {len(pages)} pages")
+
+        semaphore = asyncio.Semaphore(self.concurrency)
+        tasks = [
+            asyncio.ensure_future(self._process_product(section, pages, semaphore, output_path, session_id,
+                                                        output_format, client_id))
+            for section in sections
+        ]
+        try:
+            products = await asyncio.gather(*tasks)
+        except BaseException:
+            # Refus de l'ordonnanceur (429) ou annulation : les autres produits sont abandonnés
+            for task in tasks:
+                task.cancel()
+            raise
+
+        succeeded = sum(1 for product in products if product["status"] == "ok")
+        manifest = {
+            "session_id": session_id,
+            "source": source or pdf_path.name,
+            "created_at": datetime.now().isoformat(),
+            "page_count": len(pages),
+            "preamble_pages": preamble,
+            "product_count": len(products),
+            "succeeded": succeeded,
+            "failed": len(products) - succeeded,
+            "products": products,
+        }
+        manifest_path = output_path / MANIFEST_FILENAME
+        content = json.dumps(manifest, ensure_ascii=False, indent=2).encode("utf-8")
+        async with aiofiles.open(manifest_path, 'wb') as f:
+            await f.write(content)
+        output_file_index.register(session_id, manifest_path, content)
+
+        if not succeeded:
+            raise Exception(f"Aucun des {len(products)} produit(s) du catalogue n'a pu être analysé")
+        return manifest
+
+    async def _process_product(self, section: ProductSection, pages: List[str], semaphore: asyncio.Semaphore,
+                               output_path: Path, session_id: str, output_format: str,
+                               client_id: str) -> Dict[str, Any]:
+        entry = {
+            "index": section.index,
+            "title": section.title,
+            "model_numbers": section.model_numbers,
+            "pages": section.pages,
+            "status": "ok",
+            "product_name": "",
+            "near_duplicate": None,
+            "outputs": {},
+            "downloads": {},
+        }
+        start = time.perf_counter()
+        with span("catalogue_product", product=section.index, pages=len(section.pages)):
+            try:
+                async with semaphore:
+                    analyzer = PDFAnalyzer()
+                    analyzer.page_count = len(section.pages)
+                    text = analyzer.prepare_text([pages[number - 1] for number in section.pages])
+                    product_data = await analyzer.analyze_text(text, session_id, output_path, client_id)
+
+                entry["product_name"] = product_data.get("product_name") or section.title
+                entry["near_duplicate"] = analyzer.near_duplicate
+                data_path = await save_product_data(product_data, output_path, session_id, section.index)
+                entry["outputs"]["json"] = str(data_path)
+                entry["downloads"]["json"] = f"/download/{session_id}/{product_data_filename(section.index)}"
+
+                if output_format in ["html", "both"]:
+                    with metrics.RENDER_SECONDS.time(format="html"):
+                        html_path = await HTMLGenerator().generate_product_sheet(
+                            product_data, output_path, session_id, sheet_filename(session_id, "html", section.index)
+                        )
+                    entry["outputs"]["html"] = str(html_path)
+                if output_format in ["pdf", "both"]:
+                    with metrics.RENDER_SECONDS.time(format="pdf"):
+                        pdf_path = await PDFGenerator().generate_product_pdf(
+                            product_data, output_path, session_id, sheet_filename(session_id, "pdf", section.index)
+                        )
+                    entry["outputs"]["pdf"] = str(pdf_path)
+                # Les fiches non générées (output_format="json") sont rendues au premier téléchargement
+                for fmt in ("html", "pdf"):
+                    entry["downloads"][fmt] = f"/download/{session_id}/{sheet_filename(session_id, fmt, section.index)}"
+                metrics.CATALOGUE_PRODUCT_SHEETS.inc(status="success")
+            except QueueFullError:
+                raise
+            except Exception as e:
+                logger.error(f"Erreur sur le produit {section.index} ({section.title}): {e}", exc_info=True)
+                entry["status"] = "error"
+                entry["error"] = str(e)
+                metrics.CATALOGUE_PRODUCT_SHEETS.inc(status="error")
+        entry["seconds"] = round(time.perf_counter() - start, 3)
+        return entry
+
+
+catalogue_processor = CatalogueProcessor()
@@ -0,0 +1,98 @@
+import hashlib
+import json
+import logging
+import sqlite3
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Any, Optional
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS segment_checkpoints (
+    document_key TEXT NOT NULL,
+    segment_index INTEGER NOT NULL,
+    segment_count INTEGER NOT NULL,
+    session_id TEXT,
+    created_at TEXT NOT NULL,
+    result TEXT NOT NULL,
+    PRIMARY KEY (document_key, segment_index)
+);
+CREATE INDEX IF NOT EXISTS idx_segment_checkpoints_created ON segment_checkpoints(created_at);
+"""
+
+def document_key(text: str, segment_count: int, *models: str) -> str:
+    """Identifie une analyse : texte extrait, découpage et modèles utilisés"""
+    digest = hashlib.sha256(text.encode("utf-8"))
+    digest.update(f"\0{segment_count}\0{'/'.join(models)}".encode("utf-8"))
+    return digest.hexdigest()
+
+
+class CheckpointStore:
+    """Résultats par segment des analyses en cours, pour reprendre après un échec
+
+    Chaque segment analysé est écrit dès qu'il est terminé ; une nouvelle
+    soumission du même document ne relance que les segments manquants.
+    """
+
+    def __init__(self, db_path: Optional[Path] = None):
+        self.db_path = Path(db_path or Path(settings.DATA_DIR) / "checkpoints.db")
+        self._schema_ready = False
+
+    def connect(self) -> sqlite3.Connection:
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        if not self._schema_ready:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(SCHEMA)
+            self._schema_ready = True
+        return conn
+
+    def load(self, key: str, segment_count: int) -> Dict[int, Dict[str, Any]]:
+        """Résultats déjà obtenus pour un document, par index de segment"""
+        conn = self.connect()
+        try:
+            rows = conn.execute(
+                "SELECT segment_index, result FROM segment_checkpoints WHERE document_key = ? AND segment_count = ?",
+                (key, segment_count)
+            ).fetchall()
+        finally:
+            conn.close()
+        return {index: json.loads(result) for index, result in rows}
+
+    def save(self, key: str, segment_index: int, segment_count: int, result: Dict[str, Any],
+             session_id: Optional[str] = None) -> None:
+        conn = self.connect()
+        try:
+            with conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO segment_checkpoints VALUES (?, ?, ?, ?, ?, ?)",
+                    (key, segment_index, segment_count, session_id, datetime.now().isoformat(),
+                     json.dumps(result, ensure_ascii=False))
+                )
+        finally:
+            conn.close()
+
+    def delete(self, key: str) -> int:
+        conn = self.connect()
+        try:
+            with conn:
+                return conn.execute("DELETE FROM segment_checkpoints WHERE document_key = ?", (key,)).rowcount
+        finally:
+            conn.close()
+
+    def delete_older_than(self, cutoff: datetime) -> int:
+        """Supprime les points de reprise antérieurs à cutoff"""
+        conn = self.connect()
+        try:
+            with conn:
+                return conn.execute(
+                    "DELETE FROM segment_checkpoints WHERE created_at < ?", (cutoff.isoformat(),)
+                ).rowcount
+        finally:
+            conn.close()
+
+
+checkpoint_store = CheckpointStore()
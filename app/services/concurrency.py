@@ -0,0 +1,156 @@
+import asyncio
+import logging
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Callable, Deque, Dict, List
+
+from app.config import settings
+from app.services import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class AdaptiveLimiter:
+    """Limite de concurrence adaptative (AIMD) des appels au modèle
+
+    La latence est normalisée par le nombre de tokens générés, pour comparer
+    des réponses de tailles différentes, puis comparée à la latence minimale
+    observée (sans file d'attente). L'écart donne une estimation du nombre
+    d'appels en attente côté serveur : en dessous de `alpha`, la limite
+    augmente d'un appel par fenêtre pleine ; au-delà de `beta`, elle est
+    multipliée par `backoff` au plus une fois par fenêtre (`limit` appels
+    terminés depuis la dernière réduction). Un timeout la multiplie par
+    `backoff` à chaque fois, sans attendre de fenêtre : c'est le signal de
+    surcharge.
+    La référence minimale remonte lentement (`drift`) pour suivre un
+    changement de machine ; elle est tenue par modèle, les latences par token
+    de modèles de tailles différentes n'étant pas comparables.
+    """
+
+    def __init__(self, initial: int = 2, min_limit: int = 1, max_limit: int = 16, adaptive: bool = True,
+                 alpha: float = 1.0, beta: float = 3.0, backoff: float = 0.75, smoothing: float = 0.3,
+                 drift: float = 0.0002):
+        self.min_limit = min_limit
+        self.max_limit = max(max_limit, min_limit)
+        self.adaptive = adaptive
+        self.alpha = alpha
+        self.beta = beta
+        self.backoff = backoff
+        self.smoothing = smoothing
+        self.drift = drift
+        self._limit = float(min(max(initial, min_limit), self.max_limit))
+        self._in_flight = 0
+        self._waiters: Deque[asyncio.Future] = deque()
+        self._recent: Dict[str, float] = {}
+        self._baseline: Dict[str, float] = {}
+        self._since_decrease = 0
+        self._listeners: List[Callable[[], None]] = []
+        metrics.OLLAMA_CONCURRENCY_LIMIT.set(self.limit)
+
+    @property
+    def limit(self) -> int:
+        return int(self._limit)
+
+    @property
+    def in_flight(self) -> int:
+        return self._in_flight
+
+    def add_listener(self, callback: Callable[[], None]) -> None:
+        """Appelé à chaque hausse de la limite (ex: ordonnanceur qui répartit les créneaux)"""
+        self._listeners.append(callback)
+
+    def _wake(self) -> None:
+        while self._waiters and self._in_flight < self.limit:
+            future = self._waiters.popleft()
+            if future.done():
+                continue
+            self._in_flight += 1
+            future.set_result(None)
+
+    async def _acquire(self) -> None:
+        if self._in_flight < self.limit and not self._waiters:
+            self._in_flight += 1
+            return
+        future = asyncio.get_running_loop().create_future()
+        self._waiters.append(future)
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                self._release()
+            raise
+
+    def _release(self) -> None:
+        self._in_flight -= 1
+        self._wake()
+
+    def _set_limit(self, value: float, reason: str) -> None:
+        previous = self.limit
+        self._limit = min(max(value, self.min_limit), self.max_limit)
+        if self.limit != previous:
+            metrics.OLLAMA_CONCURRENCY_ADJUSTMENTS.inc(direction="up" if self.limit > previous else "down")
+            logger.info(f"Limite de concurrence Ollama: {previous} -> {self.limit} ({reason})")
+        metrics.OLLAMA_CONCURRENCY_LIMIT.set(self.limit)
+        self._wake()
+        if self.limit > previous:
+            for callback in self._listeners:
+                callback()
+
+    def on_success(self, latency: float, tokens: int, in_flight: int, model: str = "") -> None:
+        """Prend en compte un appel réussi"""
+        if not self.adaptive:
+            return
+        sample = latency / max(1, tokens)
+        if model not in self._recent:
+            self._recent[model] = self._baseline[model] = sample
+        else:
+            self._recent[model] += self.smoothing * (sample - self._recent[model])
+            self._baseline[model] = min(sample, self._baseline[model] * (1 + self.drift))
+        self._since_decrease += 1
+
+        queued = self._limit * (1 - self._baseline[model] / self._recent[model])
+        if queued > self.beta:
+            self._decrease("latence")
+        elif queued < self.alpha and in_flight >= self.limit:
+            # Augmentation seulement si la limite actuelle est réellement utilisée
+            self._set_limit(self._limit + 1 / self._limit, "latence stable")
+
+    def on_overload(self) -> None:
+        """Prend en compte un timeout ou une erreur de surcharge : réduction immédiate"""
+        if not self.adaptive:
+            return
+        self._since_decrease = 0
+        self._set_limit(self._limit * self.backoff, "timeout")
+
+    def _decrease(self, reason: str) -> None:
+        """Réduction due à la latence, au plus une fois par fenêtre d'appels terminés"""
+        if self._since_decrease < self.limit:
+            return
+        self._since_decrease = 0
+        self._set_limit(self._limit * self.backoff, reason)
+
+    @asynccontextmanager
+    async def acquire(self):
+        """Réserve une place pour un appel HTTP au modèle"""
+        await self._acquire()
+        in_flight = self._in_flight
+        try:
+            yield in_flight
+        finally:
+            self._release()
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            "limit": self.limit,
+            "in_flight": self._in_flight,
+            "waiting": len(self._waiters),
+            "adaptive": self.adaptive,
+        }
+
+
+ollama_limiter = AdaptiveLimiter(
+    initial=settings.OLLAMA_CONCURRENCY,
+    min_limit=settings.OLLAMA_MIN_CONCURRENCY,
+    max_limit=settings.OLLAMA_MAX_CONCURRENCY,
+    adaptive=settings.ADAPTIVE_CONCURRENCY,
+)
@@ -0,0 +1,53 @@
+import fcntl
+import os
+from pathlib import Path
+
+
+class FileLock:
+    """Verrou exclusif entre processus (flock) sur un fichier
+
+    Sert à coordonner les workers uvicorn d'une même machine : tâches de
+    démarrage exécutées une seule fois, rendu d'un fichier par un seul
+    worker. Le verrou est libéré par le système si le processus meurt.
+    """
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self._fd = None
+
+    def acquire(self, blocking: bool = True) -> bool:
+        """Prend le verrou ; sans attente, retourne False s'il est déjà pris"""
+        if self._fd is not None:
+            return True
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            os.close(fd)
+            return False
+        except BaseException:
+            os.close(fd)
+            raise
+        self._fd = fd
+        return True
+
+    def release(self) -> None:
+        if self._fd is None:
+            return
+        try:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+        finally:
+            os.close(self._fd)
+            self._fd = None
+
+    @property
+    def locked(self) -> bool:
+        return self._fd is not None
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
@@ -1,9 +1,13 @@
 import aiofiles
+import asyncio
 import logging
 from pathlib import Path
-from typing import Dict, Any
+from typing import Dict, Any, Optional
 from jinja2 import Environment, FileSystemLoader, select_autoescape
 
+from app.config import settings
+from app.services.output_files import output_file_index
+
 logger = logging.getLogger(__name__)
 
 class HTMLGenerator:
@@ -19,9 +23,10 @@ class HTMLGenerator:
         self, 
         product_data: Dict[str, Any], 
         output_path: Path, 
-        session_id: str
+        session_id: str,
+        filename: Optional[str] = None
     ) -> Path:
-        """Génère une fiche produit HTML"""
+        """Génère une fiche produit HTML (`filename` : nom du fichier, fiche_produit_<session>.html par défaut)"""
         try:
             logger.info(f"Génération de la fiche produit HTML pour {product_data.get('product_name', 'Produit')}")
             
@@ -33,12 +38,18 @@ class HTMLGenerator:
             )
             
             # Sauvegarde du fichier HTML
-            html_filename = f"fiche_produit_{session_id}.html"
+            html_filename = filename or f"fiche_produit_{session_id}.html"
             html_path = output_path / html_filename
             
             async with aiofiles.open(html_path, 'w', encoding='utf-8') as f:
                 await f.write(html_content)
             
+            # ETag et variantes gzip/brotli calculés une seule fois, pour /download
+            await asyncio.to_thread(
+                output_file_index.register,
+                session_id, html_path, html_content.encode('utf-8'), settings.PRECOMPRESS_HTML
+            )
+            
             logger.info(f"Fiche produit HTML générée: {html_path}")
             return html_path
             
@@ -0,0 +1,167 @@
+import json
+import logging
+import os
+import socket
+import sqlite3
+import time
+from pathlib import Path
+from typing import Dict, Any, Optional
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    key TEXT PRIMARY KEY,
+    session_id TEXT NOT NULL,
+    status TEXT NOT NULL,
+    owner TEXT NOT NULL,
+    remember INTEGER NOT NULL DEFAULT 0,
+    result TEXT,
+    error TEXT,
+    status_code INTEGER,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_jobs_session ON jobs(session_id);
+CREATE INDEX IF NOT EXISTS idx_jobs_updated ON jobs(updated_at);
+"""
+
+# Identifiant du processus propriétaire d'un traitement
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}"
+
+RUNNING = "running"
+DONE = "done"
+ERROR = "error"
+
+
+class JobStore:
+    """État des traitements d'upload partagé entre les workers
+
+    Une ligne par empreinte d'upload : le worker qui l'insère en premier
+    traite le document, les autres attendent son résultat. Le statut et le
+    résultat restent consultables par session_id depuis n'importe quel worker.
+    Un traitement dont le propriétaire ne donne plus signe de vie depuis
+    `stale_after` secondes peut être repris.
+    """
+
+    def __init__(self, db_path: Optional[Path] = None, stale_after: float = 60):
+        self.db_path = Path(db_path or Path(settings.DATA_DIR) / "jobs.db")
+        self.stale_after = stale_after
+        self._schema_ready = False
+
+    def connect(self) -> sqlite3.Connection:
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        if not self._schema_ready:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(SCHEMA)
+            self._schema_ready = True
+        return conn
+
+    def claim(self, key: str, session_id: str, replay_ttl: float = 0) -> Optional[Dict[str, Any]]:
+        """Tente de prendre en charge un traitement
+
+        Retourne None si l'appelant en devient propriétaire, sinon la ligne
+        existante : traitement en cours ailleurs, ou résultat à rejouer.
+        """
+        now = time.time()
+        conn = self.connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = conn.execute("SELECT * FROM jobs WHERE key = ?", (key,)).fetchone()
+                if row is not None:
+                    if row["status"] == RUNNING and now - row["updated_at"] <= self.stale_after:
+                        conn.execute("COMMIT")
+                        return dict(row)
+                    if (row["status"] == DONE and row["remember"] and replay_ttl
+                            and now - row["updated_at"] <= replay_ttl):
+                        conn.execute("COMMIT")
+                        return dict(row)
+                    if row["status"] == RUNNING:
+                        logger.warning(f"Traitement {row['session_id']} abandonné par {row['owner']}, repris")
+                conn.execute(
+                    "INSERT OR REPLACE INTO jobs (key, session_id, status, owner, created_at, updated_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    (key, session_id, RUNNING, WORKER_ID, now, now)
+                )
+                conn.execute("COMMIT")
+                return None
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+        finally:
+            conn.close()
+
+    def heartbeat(self, key: str) -> None:
+        """Signale que le traitement est toujours en cours"""
+        conn = self.connect()
+        try:
+            conn.execute(
+                "UPDATE jobs SET updated_at = ? WHERE key = ? AND owner = ? AND status = ?",
+                (time.time(), key, WORKER_ID, RUNNING)
+            )
+        finally:
+            conn.close()
+
+    def complete(self, key: str, result: Any, remember: bool = False) -> None:
+        conn = self.connect()
+        try:
+            conn.execute(
+                "UPDATE jobs SET status = ?, result = ?, remember = ?, updated_at = ? WHERE key = ? AND owner = ?",
+                (DONE, json.dumps(result, ensure_ascii=False), int(remember), time.time(), key, WORKER_ID)
+            )
+        finally:
+            conn.close()
+
+    def fail(self, key: str, error: str, status_code: int = 500) -> None:
+        conn = self.connect()
+        try:
+            conn.execute(
+                "UPDATE jobs SET status = ?, error = ?, status_code = ?, updated_at = ? WHERE key = ? AND owner = ?",
+                (ERROR, error, status_code, time.time(), key, WORKER_ID)
+            )
+        finally:
+            conn.close()
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        conn = self.connect()
+        try:
+            row = conn.execute("SELECT * FROM jobs WHERE key = ?", (key,)).fetchone()
+        finally:
+            conn.close()
+        return dict(row) if row else None
+
+    def get_session(self, session_id: str) -> Optional[Dict[str, Any]]:
+        """Dernier état connu du traitement d'une session"""
+        conn = self.connect()
+        try:
+            row = conn.execute(
+                "SELECT * FROM jobs WHERE session_id = ? ORDER BY updated_at DESC LIMIT 1", (session_id,)
+            ).fetchone()
+        finally:
+            conn.close()
+        return dict(row) if row else None
+
+    def delete_session(self, session_id: str) -> int:
+        conn = self.connect()
+        try:
+            return conn.execute("DELETE FROM jobs WHERE session_id = ?", (session_id,)).rowcount
+        finally:
+            conn.close()
+
+    def delete_older_than(self, cutoff: float) -> int:
+        """Supprime les traitements sans activité depuis cutoff (timestamp)"""
+        conn = self.connect()
+        try:
+            return conn.execute(
+                "DELETE FROM jobs WHERE updated_at < ?", (cutoff,)
+            ).rowcount
+        finally:
+            conn.close()
+
+
+job_store = JobStore(stale_after=settings.JOB_STALE_SECONDS)
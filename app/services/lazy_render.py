@@ -0,0 +1,149 @@
+import asyncio
+import json
+import logging
+import re
+from pathlib import Path
+from typing import Dict, Any, List, Optional, Tuple
+
+import aiofiles
+
+from app.config import settings
+from app.services import metrics
+from app.services.html_generator import HTMLGenerator
+from app.services.pdf_generator import PDFGenerator
+from app.services.output_files import output_file_index, safe_output_path, OutputFile
+from app.services.retention import retention_manager
+from app.services.product_records import product_record_store
+from app.services.file_lock import FileLock
+
+logger = logging.getLogger(__name__)
+
+PRODUCT_DATA_FILENAME = "product_data.json"
+
+
+def sheet_filename(session_id: str, output_format: str, product: Optional[int] = None) -> str:
+    """Nom du fichier de fiche produit généré pour un format (html ou pdf)
+
+    `product` numérote les fiches d'un catalogue (mode multi-produits).
+    """
+    suffix = f"_{product:02d}" if product is not None else ""
+    return f"fiche_produit_{session_id}{suffix}.{output_format}"
+
+def product_data_filename(product: Optional[int] = None) -> str:
+    return PRODUCT_DATA_FILENAME if product is None else f"product_data_{product:02d}.json"
+
+async def save_product_data(product_data: Dict[str, Any], output_path: Path, session_id: str,
+                            product: Optional[int] = None) -> Path:
+    """Persiste les données produit extraites pour un rendu ultérieur et l'export catalogue"""
+    data_path = output_path / product_data_filename(product)
+    content = json.dumps(product_data, ensure_ascii=False).encode("utf-8")
+    async with aiofiles.open(data_path, 'wb') as f:
+        await f.write(content)
+    output_file_index.register(session_id, data_path, content)
+    await asyncio.to_thread(product_record_store.save, session_id, product_data, product)
+    return data_path
+
+def session_product_files(session_id: str) -> List[Path]:
+    """Données produit persistées d'une session : une seule fiche, ou une par produit d'un catalogue"""
+    single = safe_output_path(session_id, PRODUCT_DATA_FILENAME)
+    if single is None:
+        return []
+    if single.exists():
+        return [single]
+    numbered = []
+    for path in single.parent.glob("product_data_*.json"):
+        number = path.stem[len("product_data_"):]
+        if number.isdigit():
+            numbered.append((int(number), path))
+    return [path for _, path in sorted(numbered)]
+
+async def load_product_data(session_id: str, product: Optional[int] = None) -> Optional[Dict[str, Any]]:
+    """Charge les données produit persistées d'une session"""
+    data_path = safe_output_path(session_id, product_data_filename(product))
+    if data_path is None:
+        return None
+    try:
+        async with aiofiles.open(data_path, 'r', encoding='utf-8') as f:
+            return json.loads(await f.read())
+    except FileNotFoundError:
+        return None
+
+
+class LazyRenderer:
+    """Rendu HTML/PDF à la demande, mis en cache sur disque
+
+    Les premières requêtes concurrentes pour un même fichier partagent un seul
+    rendu ; entre workers, un verrou de fichier par fiche évite les rendus en double.
+    """
+
+    def __init__(self):
+        self._in_flight: Dict[Tuple[str, str], asyncio.Task] = {}
+
+    def renderable_format(self, session_id: str, filename: str) -> Optional[Tuple[str, Optional[int]]]:
+        """(format, numéro de produit) de la fiche demandée, None si ce n'est pas une fiche"""
+        match = re.fullmatch(rf"fiche_produit_{re.escape(session_id)}(?:_(\d{{2,}}))?\.(html|pdf)", filename)
+        if match is None:
+            return None
+        product, output_format = match.groups()
+        return output_format, int(product) if product is not None else None
+
+    async def ensure(self, session_id: str, filename: str) -> Optional[OutputFile]:
+        """Retourne le fichier demandé, en le générant s'il manque et qu'il peut l'être"""
+        renderable = self.renderable_format(session_id, filename)
+        if renderable is None:
+            return None
+
+        key = (session_id, filename)
+        task = self._in_flight.get(key)
+        if task is None:
+            # Rendu dans une tâche indépendante : l'abandon de la première requête
+            # n'annule pas le rendu attendu par les autres
+            task = asyncio.get_running_loop().create_task(self._render(session_id, filename, *renderable))
+            self._in_flight[key] = task
+            task.add_done_callback(lambda t: self._finished(key, t))
+        return await asyncio.shield(task)
+
+    def _finished(self, key: Tuple[str, str], task: asyncio.Task) -> None:
+        self._in_flight.pop(key, None)
+        if not task.cancelled():
+            # Évite l'avertissement "exception never retrieved" si plus personne n'attend
+            task.exception()
+
+    async def _render(self, session_id: str, filename: str, output_format: str,
+                      product: Optional[int] = None) -> Optional[OutputFile]:
+        # Un rendu concurrent a pu se terminer entre la recherche et l'appel
+        entry = await asyncio.to_thread(output_file_index.lookup, session_id, filename)
+        if entry is not None:
+            return entry
+
+        product_data = await load_product_data(session_id, product)
+        if product_data is None:
+            return None
+
+        output_path = Path(settings.OUTPUT_DIR) / session_id
+        lock = FileLock(output_path / f".{filename}.lock")
+        # Attente sans thread bloqué : l'abandon de la requête ne laisse pas le verrou pris
+        while not lock.acquire(blocking=False):
+            await asyncio.sleep(0.1)
+        try:
+            # Fiche rendue par un autre worker pendant l'attente du verrou
+            entry = await asyncio.to_thread(output_file_index.lookup, session_id, filename)
+            if entry is not None:
+                return entry
+
+            logger.info(f"Rendu à la demande de {filename}")
+            with metrics.RENDER_SECONDS.time(format=output_format):
+                if output_format == "html":
+                    path = await HTMLGenerator().generate_product_sheet(product_data, output_path, session_id, filename)
+                else:
+                    path = await PDFGenerator().generate_product_pdf(product_data, output_path, session_id, filename)
+        finally:
+            lock.release()
+        metrics.LAZY_RENDERS.inc(format=output_format)
+        entry = await asyncio.to_thread(output_file_index.lookup, session_id, path.name)
+        if entry is not None:
+            await asyncio.to_thread(retention_manager.add_bytes, session_id, entry.size)
+        return entry
+
+
+lazy_renderer = LazyRenderer()
@@ -0,0 +1,238 @@
+import json
+import logging
+import queue
+import sys
+import threading
+from contextvars import ContextVar
+from datetime import datetime
+from itertools import count
+from logging.handlers import QueueHandler, QueueListener
+from typing import Dict, Optional
+
+from app.config import settings
+from app.services import metrics
+
+TEXT_FORMAT = '%(asctime)s - %(levelname)s - %(session)s%(message)s'
+
+# Session de l'upload en cours : héritée par les tâches et asyncio.to_thread
+_session_id: ContextVar[Optional[str]] = ContextVar("log_session_id", default=None)
+
+def set_session_id(session_id: Optional[str]) -> None:
+    """Rattache les journaux suivants de la requête (et des tâches qu'elle crée) à une session"""
+    _session_id.set(session_id)
+
+def parse_sampling(value: str) -> Dict[str, float]:
+    """Taux d'échantillonnage par logger : « app.services.pdf_analyzer.pages=0.1,... »
+
+    Lève ValueError pour une entrée mal formée ou un taux hors de ]0, 1].
+    """
+    rates = {}
+    for entry in value.split(","):
+        if not entry.strip():
+            continue
+        name, sep, rate = entry.partition("=")
+        if not sep or not name.strip():
+            raise ValueError(f"Échantillonnage invalide: {entry} (format attendu: logger=taux)")
+        rate = float(rate)
+        if not 0 < rate <= 1:
+            raise ValueError(f"Taux d'échantillonnage hors de ]0, 1] pour {name.strip()}: {rate}")
+        rates[name.strip()] = rate
+    return rates
+
+
+class SamplingFilter(logging.Filter):
+    """Ne garde qu'un enregistrement sur 1/taux des loggers bruyants (ex: une ligne par page)
+
+    Le premier enregistrement de chaque logger est toujours conservé, puis un
+    sur N ; les erreurs ne sont jamais échantillonnées. Le logger s'applique à
+    ses enfants (app.services.pdf_analyzer.pages couvre ...pages.ocr).
+    """
+
+    def __init__(self, rates: Dict[str, float]):
+        super().__init__()
+        self.intervals = {name: max(1, round(1 / rate)) for name, rate in rates.items()}
+        self._counters: Dict[str, count] = {name: count() for name in rates}
+
+    def _sampled_logger(self, name: str) -> Optional[str]:
+        while name:
+            if name in self.intervals:
+                return name
+            name = name.rpartition(".")[0]
+        return None
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if not self.intervals or record.levelno >= logging.ERROR:
+            return True
+        name = self._sampled_logger(record.name)
+        if name is None:
+            return True
+        interval = self.intervals[name]
+        if next(self._counters[name]) % interval:
+            metrics.LOG_RECORDS_DROPPED.inc(reason="sampled")
+            return False
+        if interval > 1:
+            record.sample_interval = interval
+        return True
+
+
+class ContextQueueHandler(QueueHandler):
+    """Dépose les enregistrements dans la file sans les formater
+
+    Le thread émetteur (boucle asyncio, to_thread) ne fait qu'ajouter la
+    session et mettre l'enregistrement en file : le message (%-args), la
+    trace d'exception et l'écriture sont faits par le thread d'écriture.
+    File pleine : l'enregistrement est abandonné plutôt que de bloquer.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record.session_id = _session_id.get()
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            metrics.LOG_RECORDS_DROPPED.inc(reason="queue_full")
+
+
+class DrainingListener(QueueListener):
+    def enqueue_sentinel(self) -> None:
+        # File pleine à l'arrêt : attendre que le thread d'écriture la vide
+        self.queue.put(self._sentinel)
+
+
+class BatchingStreamHandler(logging.StreamHandler):
+    """Sortie du listener : les lignes arrivées pendant une écriture partent ensemble
+
+    Une écriture par paquet plutôt que par ligne : une sortie lente (pilote
+    de logs saturé) ne fait que grossir le paquet suivant. Le paquet est
+    écrit dès que la file est vide ou qu'il atteint max_bytes.
+    """
+
+    def __init__(self, stream, pending: queue.Queue, max_bytes: int = 64 * 1024):
+        super().__init__(stream)
+        self.pending = pending
+        self.max_bytes = max_bytes
+        self._lines = []
+        self._size = 0
+
+    def emit(self, record: logging.LogRecord) -> None:
+        try:
+            line = self.format(record)
+        except Exception:
+            self.handleError(record)
+            return
+        self._lines.append(line)
+        self._size += len(line)
+        if self._size >= self.max_bytes or self.pending.empty():
+            self.flush()
+
+    def flush(self) -> None:
+        self.acquire()
+        try:
+            if self._lines:
+                lines, self._lines, self._size = self._lines, [], 0
+                self.stream.write(self.terminator.join(lines) + self.terminator)
+            super().flush()
+        finally:
+            self.release()
+
+
+class JSONFormatter(logging.Formatter):
+    """Un objet JSON par ligne : date, niveau, logger, message, session, processus"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": datetime.fromtimestamp(record.created).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        session_id = getattr(record, "session_id", None)
+        if session_id:
+            entry["session_id"] = session_id
+        entry["process"] = record.process
+        interval = getattr(record, "sample_interval", None)
+        if interval:
+            entry["sampled"] = f"1/{interval}"
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        if record.stack_info:
+            entry["stack"] = self.formatStack(record.stack_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    """Format historique, préfixé du début de l'identifiant de session"""
+
+    def __init__(self):
+        super().__init__(TEXT_FORMAT)
+
+    def format(self, record: logging.LogRecord) -> str:
+        session_id = getattr(record, "session_id", None)
+        record.session = f"[{session_id[:8]}] " if session_id else ""
+        return super().format(record)
+
+
+class LogPipeline:
+    """Journaux de l'application écrits par un thread dédié (QueueHandler / QueueListener)
+
+    logging.basicConfig écrit sur stderr depuis le thread qui journalise : sous
+    charge (ou quand le pilote de logs de Docker ralentit), chaque ligne
+    bloquait la boucle asyncio. Ici, le logger racine ne fait que filtrer
+    (niveau, échantillonnage) et mettre l'enregistrement en file ; le
+    formatage JSON et l'écriture se font dans le thread du listener.
+    """
+
+    def __init__(self):
+        self.queue: Optional[queue.Queue] = None
+        self.listener: Optional[DrainingListener] = None
+        self.handler: Optional[ContextQueueHandler] = None
+        self.output: Optional[logging.Handler] = None
+        self._lock = threading.Lock()
+
+    @property
+    def running(self) -> bool:
+        return self.listener is not None
+
+    def start(self, level: Optional[str] = None, log_format: Optional[str] = None,
+              sampling: Optional[str] = None, queue_size: Optional[int] = None, stream=None) -> None:
+        """Remplace les handlers du logger racine par la file (sans effet si déjà démarré)"""
+        with self._lock:
+            if self.running:
+                return
+            log_format = (log_format or settings.LOG_FORMAT).lower()
+            if log_format not in ("json", "text"):
+                raise ValueError(f"LOG_FORMAT invalide: {log_format} (json ou text)")
+            rates = parse_sampling(settings.LOG_SAMPLING if sampling is None else sampling)
+
+            self.queue = queue.Queue(maxsize=settings.LOG_QUEUE_SIZE if queue_size is None else queue_size)
+            self.output = BatchingStreamHandler(stream or sys.stderr, self.queue)
+            self.output.setFormatter(JSONFormatter() if log_format == "json" else TextFormatter())
+            self.handler = ContextQueueHandler(self.queue)
+            self.handler.addFilter(SamplingFilter(rates))
+
+            root = logging.getLogger()
+            for handler in root.handlers[:]:
+                root.removeHandler(handler)
+            root.addHandler(self.handler)
+            root.setLevel((level or settings.LOG_LEVEL).upper())
+            self.listener = DrainingListener(self.queue, self.output)
+            self.listener.start()
+
+    def stop(self) -> None:
+        """Écrit les enregistrements encore en file puis repasse en écriture directe"""
+        with self._lock:
+            if not self.running:
+                return
+            root = logging.getLogger()
+            root.removeHandler(self.handler)
+            self.listener.stop()
+            self.output.flush()
+            # Journaux de fin d'arrêt : plus de thread d'écriture, écriture synchrone
+            root.addHandler(self.output)
+            self.listener = None
+            self.handler = None
+
+
+log_pipeline = LogPipeline()
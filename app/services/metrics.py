@@ -0,0 +1,382 @@
+import json
+import math
+import os
+import re
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, List, Tuple, Iterator, Optional
+
+# Format d'exposition texte Prometheus (version 0.0.4)
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+SIZE_BUCKETS = (10_000, 100_000, 500_000, 1_000_000, 5_000_000, 10_000_000, 25_000_000, 50_000_000)
+COUNT_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500)
+SCORE_BUCKETS = (0.5, 0.6, 0.7, 0.8, 0.85, 0.9, 0.95, 0.98, 1.0)
+TOKEN_BUCKETS = (64, 128, 256, 512, 1024, 2048, 4096, 8192, 16384)
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+def _label_key(labels: Dict[str, str]) -> LabelKey:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+def _format_labels(key: LabelKey, extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = list(key) + ([extra] if extra else [])
+    if not pairs:
+        return ""
+    escaped = []
+    for name, value in pairs:
+        value = value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+        escaped.append(f'{name}="{value}"')
+    return "{" + ",".join(escaped) + "}"
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class _Metric:
+    metric_type = "untyped"
+
+    def __init__(self, name: str, documentation: str, registry: "Registry" = None):
+        self.name = name
+        self.documentation = documentation
+        self._lock = threading.Lock()
+        (registry or REGISTRY).register(self)
+
+    def snapshot(self) -> Dict[LabelKey, object]:
+        """Copie des valeurs courantes, par jeu de labels"""
+        with self._lock:
+            return {key: list(value) if isinstance(value, list) else value for key, value in self._values.items()}
+
+    def samples(self, values: Optional[Dict[LabelKey, object]] = None) -> Iterator[Tuple[str, LabelKey, Optional[Tuple[str, str]], float]]:
+        raise NotImplementedError
+
+    def expose(self, values: Optional[Dict[LabelKey, object]] = None) -> List[str]:
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.metric_type}",
+        ]
+        for suffix, key, extra, value in self.samples(values):
+            lines.append(f"{self.name}{suffix}{_format_labels(key, extra)} {_format_value(value)}")
+        return lines
+
+
+class Counter(_Metric):
+    """Compteur monotone"""
+    metric_type = "counter"
+
+    def __init__(self, name: str, documentation: str, registry: "Registry" = None):
+        super().__init__(f"{name}_total", documentation, registry)
+        self._values: Dict[LabelKey, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels) -> None:
+        key = _label_key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels) -> float:
+        with self._lock:
+            return self._values.get(_label_key(labels), 0.0)
+
+    def samples(self, values=None):
+        for key, value in (self.snapshot() if values is None else values).items():
+            yield "", key, None, value
+
+
+class Gauge(_Metric):
+    """Valeur instantanée (ex: requêtes en cours)"""
+    metric_type = "gauge"
+
+    def __init__(self, name: str, documentation: str, registry: "Registry" = None):
+        super().__init__(name, documentation, registry)
+        self._values: Dict[LabelKey, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels) -> None:
+        key = _label_key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def dec(self, amount: float = 1.0, **labels) -> None:
+        self.inc(-amount, **labels)
+
+    def set(self, value: float, **labels) -> None:
+        with self._lock:
+            self._values[_label_key(labels)] = value
+
+    def value(self, **labels) -> float:
+        with self._lock:
+            return self._values.get(_label_key(labels), 0.0)
+
+    @contextmanager
+    def track_inprogress(self, **labels):
+        self.inc(**labels)
+        try:
+            yield
+        finally:
+            self.dec(**labels)
+
+    def samples(self, values=None):
+        for key, value in (self.snapshot() if values is None else values).items():
+            yield "", key, None, value
+
+
+class Histogram(_Metric):
+    """Histogramme à seaux cumulés"""
+    metric_type = "histogram"
+
+    def __init__(self, name: str, documentation: str, buckets=DEFAULT_BUCKETS, registry: "Registry" = None):
+        super().__init__(name, documentation, registry)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+        self._values: Dict[LabelKey, List[float]] = {}  # [compte par seau..., somme, compte]
+
+    def observe(self, value: float, **labels) -> None:
+        key = _label_key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = [0.0] * (len(self.buckets) + 2)
+                self._values[key] = state
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[i] += 1
+                    break
+            state[-2] += value
+            state[-1] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def count(self, **labels) -> float:
+        with self._lock:
+            state = self._values.get(_label_key(labels))
+            return state[-1] if state else 0.0
+
+    def sum(self, **labels) -> float:
+        with self._lock:
+            state = self._values.get(_label_key(labels))
+            return state[-2] if state else 0.0
+
+    def samples(self, values=None):
+        for key, state in (self.snapshot() if values is None else values).items():
+            cumulative = 0.0
+            for i, bound in enumerate(self.buckets):
+                cumulative += state[i]
+                yield "_bucket", key, ("le", _format_value(bound)), cumulative
+            yield "_sum", key, None, state[-2]
+            yield "_count", key, None, state[-1]
+
+
+class Registry:
+    """Ensemble des métriques exposées sur /metrics"""
+
+    def __init__(self):
+        self._metrics: List[_Metric] = []
+        self._lock = threading.Lock()
+
+    def register(self, metric: _Metric) -> None:
+        with self._lock:
+            self._metrics.append(metric)
+
+    def metrics(self) -> List[_Metric]:
+        with self._lock:
+            return list(self._metrics)
+
+    def render(self) -> str:
+        lines = []
+        for metric in self.metrics():
+            lines.extend(metric.expose())
+        return "\n".join(lines) + "\n"
+
+
+class MultiprocessMetrics:
+    """Agrégation des métriques des workers uvicorn (WORKERS > 1)
+
+    Chaque processus a ses propres compteurs, et /metrics n'est servi que par
+    l'un d'eux. Chaque worker écrit donc toutes les `interval` secondes un
+    instantané de ses métriques dans `directory` (un fichier JSON par
+    processus). Au scrape, le worker qui répond écrit le sien puis fusionne
+    ceux de tous les workers : compteurs et histogrammes sont sommés, les
+    jauges gardent une valeur par processus (label `worker`). Les compteurs
+    d'un worker arrêté restent comptés, pour que les totaux ne reculent pas ;
+    ses jauges sont ignorées dès que son fichier n'est plus mis à jour. Le
+    dossier est vidé au lancement du service (run.py).
+    """
+
+    def __init__(self, directory: Path, worker_id: str, registry: Registry = None, interval: float = 5.0):
+        self.directory = Path(directory)
+        self.worker_id = worker_id
+        self.registry = registry or REGISTRY
+        self.interval = interval
+        self.path = self.directory / (re.sub(r"[^A-Za-z0-9_.-]", "_", worker_id) + ".json")
+        self._write_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def write(self) -> None:
+        """Écrit l'instantané de ce processus (remplacement atomique du fichier)"""
+        snapshot = {
+            "worker": self.worker_id,
+            "metrics": {
+                metric.name: [[list(key), value] for key, value in metric.snapshot().items()]
+                for metric in self.registry.metrics()
+            },
+        }
+        with self._write_lock:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            tmp_path = self.path.with_name(self.path.name + ".tmp")
+            tmp_path.write_text(json.dumps(snapshot), encoding="utf-8")
+            os.replace(tmp_path, self.path)
+
+    def _snapshots(self) -> Iterator[Tuple[Dict[str, object], bool]]:
+        """Instantanés de tous les workers, avec un indicateur « encore actif »"""
+        now = time.time()
+        for path in sorted(self.directory.glob("*.json")):
+            try:
+                alive = now - path.stat().st_mtime <= 3 * self.interval
+                yield json.loads(path.read_text(encoding="utf-8")), alive
+            except (OSError, ValueError):
+                continue  # Fichier supprimé ou en cours de remplacement
+
+    def render(self) -> str:
+        """Métriques de tous les workers au format texte Prometheus"""
+        self.write()
+        merged: Dict[str, Dict[LabelKey, object]] = {}
+        types = {metric.name: metric.metric_type for metric in self.registry.metrics()}
+        for snapshot, alive in self._snapshots():
+            for name, values in snapshot["metrics"].items():
+                metric_type = types.get(name)
+                if metric_type is None or (metric_type == "gauge" and not alive):
+                    continue
+                target = merged.setdefault(name, {})
+                for key, value in values:
+                    key = tuple(tuple(pair) for pair in key)
+                    if metric_type == "gauge":
+                        target[_label_key({**dict(key), "worker": snapshot["worker"]})] = value
+                    elif metric_type == "histogram":
+                        current = target.get(key)
+                        target[key] = value if current is None else [a + b for a, b in zip(current, value)]
+                    else:
+                        target[key] = target.get(key, 0.0) + value
+        lines = []
+        for metric in self.registry.metrics():
+            lines.extend(metric.expose(merged.get(metric.name, {})))
+        return "\n".join(lines) + "\n"
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            try:
+                self.write()
+            except OSError:
+                continue
+
+    def start(self) -> None:
+        self.write()
+        self._thread = threading.Thread(target=self._run, name="metrics-snapshot", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Dernier instantané (compteurs conservés après l'arrêt du worker)"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.write()
+
+
+REGISTRY = Registry()
+MULTIPROCESS_DIRNAME = "metrics"  # Sous-dossier de DATA_DIR des instantanés par worker
+_multiprocess: Optional[MultiprocessMetrics] = None
+
+def enable_multiprocess(directory: Path, worker_id: str, interval: float = 5.0) -> MultiprocessMetrics:
+    """Active l'agrégation des métriques entre workers et démarre l'écriture périodique"""
+    global _multiprocess
+    _multiprocess = MultiprocessMetrics(directory, worker_id, interval=interval)
+    _multiprocess.start()
+    return _multiprocess
+
+def disable_multiprocess() -> None:
+    global _multiprocess
+    if _multiprocess is not None:
+        _multiprocess.stop()
+        _multiprocess = None
+
+def render_metrics() -> str:
+    """Rend toutes les métriques au format texte Prometheus (tous workers confondus si activé)"""
+    if _multiprocess is not None:
+        return _multiprocess.render()
+    return REGISTRY.render()
+
+
+# --- Métriques du pipeline -------------------------------------------------
+
+UPLOADS = Counter("pdf_uploads", "Uploads traités, par statut")
+UPLOAD_SIZE = Histogram("pdf_upload_size_bytes", "Taille des PDF uploadés", SIZE_BUCKETS)
+UPLOADS_IN_PROGRESS = Gauge("pdf_uploads_in_progress", "Uploads en cours de traitement")
+UPLOADS_COALESCED = Counter("pdf_uploads_coalesced", "Uploads identiques servis par un traitement existant, par mode")
+
+EXTRACTION_SECONDS = Histogram("pdf_extraction_seconds", "Durée d'extraction du texte PDF")
+EXTRACTION_PAGES = Histogram("pdf_extraction_pages", "Nombre de pages par PDF", COUNT_BUCKETS)
+OCR_PAGES = Counter("ocr_pages", "Pages sans couche texte passées à l'OCR, par résultat (ocr, cached, empty, unsupported, error)")
+OCR_PAGE_SECONDS = Histogram("ocr_page_seconds", "Durée d'OCR d'une page (hors cache)")
+SEGMENTS_PER_DOCUMENT = Histogram("pdf_segments_per_document", "Segments de texte envoyés au modèle par document", COUNT_BUCKETS)
+NEAR_DUPLICATE_LOOKUPS = Counter("near_duplicate_lookups", "Recherches de quasi-doublon, par résultat (reused, refreshed, full, miss)")
+NEAR_DUPLICATE_SCORE = Histogram("near_duplicate_score", "Similarité du document indexé le plus proche", SCORE_BUCKETS)
+NEAR_DUPLICATE_REFRESHED_FIELDS = Histogram("near_duplicate_refreshed_fields", "Champs redemandés au modèle pour un quasi-doublon repris", COUNT_BUCKETS)
+CHECKPOINT_SEGMENTS_REUSED = Counter("checkpoint_segments_reused", "Segments repris d'une analyse précédente au lieu d'être relancés")
+
+OLLAMA_REQUEST_SECONDS = Histogram("ollama_request_seconds", "Latence des appels /api/generate, par prompt")
+OLLAMA_TIME_TO_FIRST_TOKEN = Histogram("ollama_time_to_first_token_seconds", "Temps avant le premier token (chargement + évaluation du prompt)")
+OLLAMA_EVAL_COUNT = Histogram("ollama_eval_count", "Tokens générés par appel (eval_count)", TOKEN_BUCKETS)
+OLLAMA_PROMPT_EVAL_COUNT = Histogram("ollama_prompt_eval_count", "Tokens du prompt par appel (prompt_eval_count)", TOKEN_BUCKETS)
+OLLAMA_NUM_PREDICT = Histogram("ollama_num_predict", "Budget de génération (num_predict) choisi par appel", TOKEN_BUCKETS)
+OLLAMA_NUM_CTX = Histogram("ollama_num_ctx", "Taille de contexte (num_ctx) choisie par appel", TOKEN_BUCKETS + (32768,))
+OLLAMA_TRUNCATED_GENERATIONS = Counter("ollama_truncated_generations", "Générations coupées par num_predict")
+OLLAMA_CONTEXT_OVERFLOW = Counter("ollama_context_overflow", "Prompts estimés plus longs que le contexte maximal")
+OLLAMA_REQUESTS_IN_PROGRESS = Gauge("ollama_requests_in_progress", "Appels Ollama en cours")
+OLLAMA_ERRORS = Counter("ollama_errors", "Erreurs des appels Ollama, par type")
+OLLAMA_RETRIES = Counter("ollama_retries", "Nouvelles tentatives d'analyse, par raison")
+OLLAMA_SIMPLE_PROMPT_FALLBACKS = Counter("ollama_simple_prompt_fallbacks", "Replis sur le prompt simplifié")
+OLLAMA_CONCURRENCY_LIMIT = Gauge("ollama_concurrency_limit", "Limite actuelle d'appels Ollama simultanés")
+OLLAMA_CONCURRENCY_ADJUSTMENTS = Counter("ollama_concurrency_adjustments", "Ajustements de la limite de concurrence, par sens")
+CASCADE_SEGMENTS = Counter("cascade_segments", "Segments analysés, par niveau de modèle ayant fourni le résultat")
+CASCADE_ESCALATIONS = Counter("cascade_escalations", "Escalades du petit modèle vers le modèle principal, par raison")
+CASCADE_TIER_SECONDS = Histogram("cascade_tier_seconds", "Durée d'analyse d'un segment, par niveau de modèle")
+
+SCHEDULER_QUEUED = Gauge("scheduler_queued_segments", "Segments en attente d'un créneau Ollama")
+SCHEDULER_QUEUE_WAIT = Histogram("scheduler_queue_wait_seconds", "Attente d'un créneau Ollama par segment")
+SCHEDULER_ESTIMATED_WAIT = Histogram("scheduler_estimated_wait_seconds", "Attente estimée à l'admission des documents")
+SCHEDULER_REJECTIONS = Counter("scheduler_rejections", "Documents refusés car l'attente estimée dépasse le seuil")
+
+JSON_EXTRACTION = Counter("json_extraction", "Extraction du JSON des réponses, par méthode")
+VALIDATION_DROPPED_VALUES = Counter("validation_dropped_values", "Valeurs supprimées par la validation, par raison")
+VALIDATION_ENGLISH_DETECTED = Counter("validation_english_detected", "Réponses contenant du texte anglais")
+
+RENDER_SECONDS = Histogram("render_seconds", "Durée de génération des fiches, par format")
+
+CATALOGUE_PRODUCTS = Histogram("catalogue_products", "Produits détectés par catalogue", COUNT_BUCKETS)
+CATALOGUE_PRODUCT_SHEETS = Counter("catalogue_product_sheets", "Produits de catalogue traités, par statut")
+RECORD_EXPORTS = Counter("record_exports", "Exports des données produit (GET /export), par format")
+RECORD_EXPORT_BYTES = Counter("record_export_bytes", "Octets envoyés par les exports des données produit, par format")
+
+RETENTION_EVICTIONS = Counter("retention_evictions", "Sessions supprimées par la rétention, par raison")
+RETENTION_FREED_BYTES = Counter("retention_freed_bytes", "Octets libérés par la rétention")
+RETENTION_BYTES = Gauge("retention_bytes", "Octets occupés par les sessions suivies")
+LAZY_RENDERS = Counter("lazy_renders", "Fiches générées à la demande lors d'un téléchargement, par format")
+
+WEBHOOK_DELIVERIES = Counter("webhook_deliveries", "Tentatives de livraison des webhooks, par résultat (delivered, retry, failed)")
+WEBHOOK_DELIVERY_SECONDS = Histogram("webhook_delivery_seconds", "Durée d'une tentative de livraison de webhook")
+WEBHOOK_DELIVERY_ATTEMPTS = Histogram("webhook_delivery_attempts", "Tentatives nécessaires aux webhooks livrés", COUNT_BUCKETS)
+
+LOG_RECORDS_DROPPED = Counter("log_records_dropped", "Enregistrements de journal non écrits, par raison (sampled, queue_full)")
+MODULE_LOAD_SECONDS = Gauge("module_load_seconds", "Durée de chargement des bibliothèques lourdes (import différé ou préchargement)")
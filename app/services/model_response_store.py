@@ -0,0 +1,319 @@
+import json
+import logging
+import queue
+import sqlite3
+import threading
+import zlib
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Any, List, Optional
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS model_responses (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    session_id TEXT NOT NULL,
+    timestamp TEXT NOT NULL,
+    model TEXT NOT NULL,
+    parse_status TEXT NOT NULL,
+    prompt_length INTEGER NOT NULL,
+    response_length INTEGER NOT NULL,
+    parsed_fields_count INTEGER NOT NULL,
+    payload BLOB NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_model_responses_session ON model_responses(session_id);
+CREATE INDEX IF NOT EXISTS idx_model_responses_timestamp ON model_responses(timestamp);
+CREATE INDEX IF NOT EXISTS idx_model_responses_model ON model_responses(model, timestamp);
+CREATE INDEX IF NOT EXISTS idx_model_responses_status ON model_responses(parse_status, timestamp);
+"""
+
+INSERT_SQL = (
+    "INSERT INTO model_responses (session_id, timestamp, model, parse_status, "
+    "prompt_length, response_length, parsed_fields_count, payload) "
+    "VALUES (?, ?, ?, ?, ?, ?, ?, ?)"
+)
+
+SUMMARY_COLUMNS = "id, session_id, timestamp, model, parse_status, prompt_length, response_length, parsed_fields_count"
+
+
+class ModelResponseStore:
+    """Stockage SQLite des réponses du modèle, alimenté par un thread d'écriture
+
+    Les lignes ne sont jamais modifiées ; seule la rétention les supprime.
+    Le prompt, la réponse brute et les données parsées sont stockés en JSON
+    compressé, les colonnes indexées servent au filtrage.
+    """
+
+    def __init__(self, db_path: Optional[Path] = None, batch_size: int = 100):
+        self.db_path = Path(db_path or Path(settings.DATA_DIR) / "model_responses.db")
+        self.batch_size = batch_size
+        self._queue: "queue.Queue[Optional[tuple]]" = queue.Queue()
+        self._writer: Optional[threading.Thread] = None
+        self._writer_lock = threading.Lock()
+        self._schema_ready = False
+
+    def connect(self) -> sqlite3.Connection:
+        """Ouvre une connexion (le schéma est créé à la première ouverture)"""
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        if not self._schema_ready:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(SCHEMA)
+            self._schema_ready = True
+        return conn
+
+    # --- Écriture -----------------------------------------------------------
+
+    def append(
+        self,
+        session_id: str,
+        model: str,
+        prompt: str,
+        raw_response: str,
+        parsed_data: Dict[str, Any],
+        parse_status: str,
+        timestamp: Optional[datetime] = None,
+        usage: Optional[Dict[str, Any]] = None
+    ) -> None:
+        """Ajoute une réponse sans bloquer l'appelant (écriture en arrière-plan)"""
+        row = self._make_row(session_id, model, prompt, raw_response, parsed_data, parse_status, timestamp, usage)
+        self._ensure_writer()
+        self._queue.put(row)
+
+    def _make_row(self, session_id, model, prompt, raw_response, parsed_data, parse_status, timestamp, usage=None) -> tuple:
+        content = {
+            "prompt": prompt,
+            "raw_response": raw_response,
+            "parsed_data": parsed_data,
+        }
+        if usage:
+            content["usage"] = usage  # Options de taille choisies et compteurs de tokens
+        payload = zlib.compress(json.dumps(content, ensure_ascii=False).encode("utf-8"))
+        return (
+            session_id,
+            (timestamp or datetime.now()).isoformat(),
+            model,
+            parse_status,
+            len(prompt),
+            len(raw_response),
+            len(parsed_data),
+            payload,
+        )
+
+    def _ensure_writer(self) -> None:
+        with self._writer_lock:
+            if self._writer is None or not self._writer.is_alive():
+                self._writer = threading.Thread(target=self._write_loop, name="model-response-writer", daemon=True)
+                self._writer.start()
+
+    def _write_loop(self) -> None:
+        conn = self.connect()
+        try:
+            while True:
+                item = self._queue.get()
+                batch, stop = [], item is None
+                if item is not None:
+                    batch.append(item)
+                # Regroupe les lignes déjà en attente dans une même transaction
+                while not stop and len(batch) < self.batch_size:
+                    try:
+                        item = self._queue.get_nowait()
+                    except queue.Empty:
+                        break
+                    if item is None:
+                        stop = True
+                    else:
+                        batch.append(item)
+                if batch:
+                    try:
+                        with conn:
+                            conn.executemany(INSERT_SQL, batch)
+                    except sqlite3.Error as e:
+                        logger.error(f"Erreur lors de l'écriture des réponses du modèle: {e}")
+                for _ in range(len(batch) + (1 if stop else 0)):
+                    self._queue.task_done()
+                if stop:
+                    return
+        finally:
+            conn.close()
+
+    def flush(self) -> None:
+        """Attend que toutes les réponses en attente soient écrites"""
+        if self._writer is not None and self._writer.is_alive():
+            self._queue.join()
+
+    def close(self) -> None:
+        """Vide la file d'attente et arrête le thread d'écriture"""
+        with self._writer_lock:
+            writer = self._writer
+            self._writer = None
+        if writer is not None and writer.is_alive():
+            self._queue.put(None)
+            writer.join(timeout=30)
+
+    # --- Lecture ------------------------------------------------------------
+
+    def list(
+        self,
+        session_id: Optional[str] = None,
+        model: Optional[str] = None,
+        parse_status: Optional[str] = None,
+        since: Optional[datetime] = None,
+        until: Optional[datetime] = None,
+        limit: Optional[int] = None,
+        newest_first: bool = True
+    ) -> List[Dict[str, Any]]:
+        """Liste les métadonnées des réponses (sans prompt ni réponse brute)"""
+        clauses, params = [], []
+        for column, value in (("session_id", session_id), ("model", model), ("parse_status", parse_status)):
+            if value is not None:
+                clauses.append(f"{column} = ?")
+                params.append(value)
+        if since is not None:
+            clauses.append("timestamp >= ?")
+            params.append(since.isoformat())
+        if until is not None:
+            clauses.append("timestamp < ?")
+            params.append(until.isoformat())
+        query = f"SELECT {SUMMARY_COLUMNS} FROM model_responses"
+        if clauses:
+            query += " WHERE " + " AND ".join(clauses)
+        query += " ORDER BY timestamp " + ("DESC" if newest_first else "ASC")
+        if limit is not None:
+            query += " LIMIT ?"
+            params.append(limit)
+        conn = self.connect()
+        try:
+            return [dict(row) for row in conn.execute(query, params)]
+        finally:
+            conn.close()
+
+    def get(self, response_id: int) -> Optional[Dict[str, Any]]:
+        """Retourne une réponse complète, au format des anciens fichiers de sauvegarde"""
+        conn = self.connect()
+        try:
+            row = conn.execute(
+                f"SELECT {SUMMARY_COLUMNS}, payload FROM model_responses WHERE id = ?", (response_id,)
+            ).fetchone()
+        finally:
+            conn.close()
+        return self.to_record(row) if row else None
+
+    def iter_records(self, **filters):
+        """Itère sur les réponses complètes correspondant aux filtres de list()"""
+        for summary in self.list(**filters):
+            record = self.get(summary["id"])
+            if record is not None:
+                yield record
+
+    @staticmethod
+    def to_record(row: sqlite3.Row) -> Dict[str, Any]:
+        payload = json.loads(zlib.decompress(row["payload"]).decode("utf-8"))
+        return {
+            "metadata": {
+                "id": row["id"],
+                "session_id": row["session_id"],
+                "timestamp": row["timestamp"],
+                "model": row["model"],
+                "parse_status": row["parse_status"],
+            },
+            "prompt": payload["prompt"],
+            "raw_response": payload["raw_response"],
+            "parsed_data": payload["parsed_data"],
+            "usage": payload.get("usage", {}),
+            "analysis_info": {
+                "prompt_length": row["prompt_length"],
+                "response_length": row["response_length"],
+                "parsed_fields_count": row["parsed_fields_count"],
+                "model_used": row["model"],
+            },
+        }
+
+    def delete_older_than(self, cutoff: datetime) -> int:
+        """Supprime les réponses antérieures à cutoff et retourne leur nombre"""
+        conn = self.connect()
+        try:
+            with conn:
+                cursor = conn.execute("DELETE FROM model_responses WHERE timestamp < ?", (cutoff.isoformat(),))
+            return cursor.rowcount
+        finally:
+            conn.close()
+
+    def delete_session(self, session_id: str) -> int:
+        """Supprime toutes les réponses d'une session"""
+        conn = self.connect()
+        try:
+            with conn:
+                cursor = conn.execute("DELETE FROM model_responses WHERE session_id = ?", (session_id,))
+            return cursor.rowcount
+        finally:
+            conn.close()
+
+    def session_usage(self, session_id: Optional[str] = None) -> Dict[str, Dict[str, Any]]:
+        """Taille stockée et date de première réponse, par session"""
+        query = "SELECT session_id, SUM(LENGTH(payload)) AS bytes, MIN(timestamp) AS first_timestamp FROM model_responses"
+        params = []
+        if session_id is not None:
+            query += " WHERE session_id = ?"
+            params.append(session_id)
+        query += " GROUP BY session_id"
+        conn = self.connect()
+        try:
+            return {
+                row["session_id"]: {"bytes": row["bytes"] or 0, "first_timestamp": row["first_timestamp"]}
+                for row in conn.execute(query, params)
+            }
+        finally:
+            conn.close()
+
+    def import_legacy_files(self, outputs_dir: Path) -> int:
+        """Importe les anciens fichiers outputs/<session>/model_responses/*.json
+
+        Un fichier déjà importé (même session, même modèle, même horodatage)
+        est ignoré : la commande peut être relancée sans créer de doublons.
+        Retourne le nombre de réponses ajoutées.
+        """
+        rows = []
+        for json_file in Path(outputs_dir).glob("*/model_responses/*.json"):
+            try:
+                with open(json_file, 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+                metadata = data.get("metadata", {})
+                parsed_data = data.get("parsed_data", {})
+                timestamp = metadata.get("timestamp")
+                rows.append(self._make_row(
+                    metadata.get("session_id", json_file.parent.parent.name),
+                    metadata.get("model", ""),
+                    data.get("prompt", ""),
+                    data.get("raw_response", ""),
+                    parsed_data,
+                    "error" if "error" in parsed_data else "ok",
+                    datetime.fromisoformat(timestamp) if timestamp else datetime.fromtimestamp(json_file.stat().st_mtime)
+                ))
+            except Exception as e:
+                logger.warning(f"Impossible d'importer {json_file}: {e}")
+        if not rows:
+            return 0
+        conn = self.connect()
+        try:
+            seen = set()
+            new_rows = []
+            for row in rows:
+                key = row[:3]  # session_id, timestamp, model
+                if key in seen or conn.execute(
+                    "SELECT 1 FROM model_responses WHERE session_id = ? AND timestamp = ? AND model = ? LIMIT 1", key
+                ).fetchone():
+                    continue
+                seen.add(key)
+                new_rows.append(row)
+            with conn:
+                conn.executemany(INSERT_SQL, new_rows)
+        finally:
+            conn.close()
+        return len(new_rows)
+
+model_response_store = ModelResponseStore()
@@ -0,0 +1,251 @@
+import hashlib
+import json
+import logging
+import random
+import re
+import sqlite3
+from array import array
+from collections import Counter
+from dataclasses import dataclass
+from difflib import SequenceMatcher
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Any, Iterable, List, Optional, Set
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS documents (
+    doc_id TEXT PRIMARY KEY,
+    session_id TEXT,
+    created_at TEXT NOT NULL,
+    signature BLOB NOT NULL,
+    text TEXT NOT NULL,
+    product_data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_documents_session ON documents(session_id);
+CREATE INDEX IF NOT EXISTS idx_documents_created ON documents(created_at);
+CREATE TABLE IF NOT EXISTS lsh_buckets (
+    band INTEGER NOT NULL,
+    bucket TEXT NOT NULL,
+    doc_id TEXT NOT NULL,
+    PRIMARY KEY (band, bucket, doc_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_lsh_buckets_doc ON lsh_buckets(doc_id);
+"""
+
+# Signature MinHash : 128 permutations, 32 bandes de 4 lignes. Deux documents
+# deviennent candidats dès qu'une bande coïncide (probable au-delà de ~0,42 de
+# similarité) ; la similarité est ensuite estimée sur toute la signature.
+# Changer ces valeurs impose de reconstruire l'index.
+NUM_PERM = 128
+BANDS = 32
+ROWS = NUM_PERM // BANDS
+SHINGLE_SIZE = 3
+MERSENNE_PRIME = (1 << 61) - 1
+_rng = random.Random(48)  # Permutations identiques dans tous les processus
+PERMUTATIONS = [(_rng.randrange(1, MERSENNE_PRIME), _rng.randrange(0, MERSENNE_PRIME)) for _ in range(NUM_PERM)]
+# Candidats comparés au plus par recherche
+MAX_CANDIDATES = 200
+
+TOKEN = re.compile(r"\w+")
+
+
+def tokens(text: str) -> List[str]:
+    return TOKEN.findall(text.lower())
+
+def shingles(words: List[str], size: int = SHINGLE_SIZE) -> Set[str]:
+    """Suites de `size` mots consécutifs (les mots seuls pour un texte très court)"""
+    if len(words) < size:
+        return set(words)
+    return {" ".join(words[i:i + size]) for i in range(len(words) - size + 1)}
+
+def minhash(text: str) -> List[int]:
+    """Signature MinHash du texte (NUM_PERM valeurs)"""
+    hashes = [
+        int.from_bytes(hashlib.blake2b(shingle.encode("utf-8"), digest_size=8).digest(), "big") % MERSENNE_PRIME
+        for shingle in shingles(tokens(text))
+    ]
+    if not hashes:
+        return [MERSENNE_PRIME] * NUM_PERM
+    return [min((a * h + b) % MERSENNE_PRIME for h in hashes) for a, b in PERMUTATIONS]
+
+def band_buckets(signature: List[int]) -> List[str]:
+    """Clé de seau de chaque bande de la signature"""
+    buckets = []
+    for band in range(BANDS):
+        values = array("Q", signature[band * ROWS:(band + 1) * ROWS]).tobytes()
+        buckets.append(hashlib.blake2b(values, digest_size=8).hexdigest())
+    return buckets
+
+def similarity(a: List[int], b: List[int]) -> float:
+    """Similarité de Jaccard estimée : part des positions égales des deux signatures"""
+    return sum(1 for x, y in zip(a, b) if x == y) / NUM_PERM
+
+
+@dataclass
+class NearDuplicate:
+    """Document indexé le plus proche d'un nouveau texte"""
+    doc_id: str
+    session_id: Optional[str]
+    score: float
+    text: str
+    product_data: Dict[str, Any]
+
+
+class NearDuplicateIndex:
+    """Index MinHash/LSH des documents déjà analysés (texte nettoyé et données produit)
+
+    Les variantes d'une même fiche (couleur, référence) ont presque le même
+    texte : retrouver la plus proche permet de reprendre ses données et de
+    ne redemander au modèle que les champs touchés par les différences.
+    """
+
+    def __init__(self, db_path: Optional[Path] = None):
+        self.db_path = Path(db_path or Path(settings.DATA_DIR) / "near_duplicates.db")
+        self._schema_ready = False
+
+    def connect(self) -> sqlite3.Connection:
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        if not self._schema_ready:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(SCHEMA)
+            self._schema_ready = True
+        return conn
+
+    def add(self, text: str, product_data: Dict[str, Any], session_id: Optional[str] = None,
+            signature: Optional[List[int]] = None) -> str:
+        """Indexe un document analysé ; retourne son identifiant (empreinte du texte)"""
+        doc_id = hashlib.sha256(text.encode("utf-8")).hexdigest()
+        signature = signature or minhash(text)
+        conn = self.connect()
+        try:
+            with conn:
+                conn.execute("DELETE FROM lsh_buckets WHERE doc_id = ?", (doc_id,))
+                conn.execute(
+                    "INSERT OR REPLACE INTO documents VALUES (?, ?, ?, ?, ?, ?)",
+                    (doc_id, session_id, datetime.now().isoformat(), array("Q", signature).tobytes(), text,
+                     json.dumps(product_data, ensure_ascii=False))
+                )
+                conn.executemany(
+                    "INSERT OR IGNORE INTO lsh_buckets VALUES (?, ?, ?)",
+                    [(band, bucket, doc_id) for band, bucket in enumerate(band_buckets(signature))]
+                )
+        finally:
+            conn.close()
+        return doc_id
+
+    def nearest(self, text: str, signature: Optional[List[int]] = None) -> Optional[NearDuplicate]:
+        """Document indexé le plus similaire parmi les candidats LSH (quel que soit le score)"""
+        signature = signature or minhash(text)
+        buckets = band_buckets(signature)
+        conn = self.connect()
+        try:
+            placeholders = ", ".join("(?, ?)" for _ in buckets)
+            params = [value for band, bucket in enumerate(buckets) for value in (band, bucket)]
+            candidates = conn.execute(
+                f"SELECT DISTINCT doc_id FROM lsh_buckets WHERE (band, bucket) IN (VALUES {placeholders}) LIMIT ?",
+                params + [MAX_CANDIDATES]
+            ).fetchall()
+            best_id, best_score = None, -1.0
+            for doc_id, in candidates:
+                row = conn.execute("SELECT signature FROM documents WHERE doc_id = ?", (doc_id,)).fetchone()
+                if row is None:
+                    continue
+                score = similarity(signature, array("Q", row[0]).tolist())
+                if score > best_score:
+                    best_id, best_score = doc_id, score
+            if best_id is None:
+                return None
+            session_id, stored_text, product_data = conn.execute(
+                "SELECT session_id, text, product_data FROM documents WHERE doc_id = ?", (best_id,)
+            ).fetchone()
+        finally:
+            conn.close()
+        return NearDuplicate(best_id, session_id, best_score, stored_text, json.loads(product_data))
+
+    def delete_session(self, session_id: str) -> int:
+        return self._delete("session_id = ?", (session_id,))
+
+    def delete_older_than(self, cutoff: datetime) -> int:
+        """Supprime les documents indexés avant cutoff"""
+        return self._delete("created_at < ?", (cutoff.isoformat(),))
+
+    def _delete(self, where: str, params: Iterable[Any]) -> int:
+        conn = self.connect()
+        try:
+            with conn:
+                conn.execute(f"DELETE FROM lsh_buckets WHERE doc_id IN (SELECT doc_id FROM documents WHERE {where})",
+                             tuple(params))
+                return conn.execute(f"DELETE FROM documents WHERE {where}", tuple(params)).rowcount
+        finally:
+            conn.close()
+
+
+def field_values(product_data: Dict[str, Any]) -> Dict[str, Any]:
+    """Champs de la fiche par chemin (« brand », « technical_specs.color », « features »)"""
+    fields = {}
+    for key, value in product_data.items():
+        if isinstance(value, dict):
+            for subkey, subvalue in value.items():
+                fields[f"{key}.{subkey}"] = subvalue
+        else:
+            fields[key] = value
+    return fields
+
+def fields_to_refresh(previous_text: str, text: str, product_data: Dict[str, Any]) -> Optional[List[str]]:
+    """Champs à redemander au modèle pour adapter les données d'un quasi-doublon
+
+    Les deux textes sont comparés passage par passage. Un champ dont une
+    valeur contient un mot retiré d'un passage modifié est périmé (« Inox »
+    devenu « Noir », ancienne référence), même si ce mot figure encore
+    ailleurs dans le texte. Un passage qui ajoute des mots sans toucher aucun
+    champ peut décrire une information absente des données du voisin (nouvelle
+    caractéristique technique) : None est alors retourné, pour une analyse
+    complète. Si un passage apporte plus de mots qu'il n'en retire, les champs
+    vides sont aussi redemandés.
+    """
+    fields: Dict[str, Set[str]] = {}
+    empty = []
+    for path, value in field_values(product_data).items():
+        parts = value if isinstance(value, list) else [value]
+        words = {word for part in parts if isinstance(part, str) for word in tokens(part)}
+        if words:
+            fields[path] = words
+        else:
+            empty.append(path)
+
+    old_words, new_words = tokens(previous_text), tokens(text)
+    stale: Set[str] = set()
+    grown = False
+    for tag, i1, i2, j1, j2 in SequenceMatcher(None, old_words, new_words).get_opcodes():
+        if tag == "equal":
+            continue
+        before, after = Counter(old_words[i1:i2]), Counter(new_words[j1:j2])
+        removed, added = before - after, after - before
+        touched = {path for path, words in fields.items() if not words.isdisjoint(removed)}
+        if added and not touched:
+            return None
+        stale |= touched
+        grown = grown or sum(added.values()) > sum(removed.values())
+    result = [path for path in fields if path in stale]
+    return result + empty if grown else result
+
+def apply_refresh(product_data: Dict[str, Any], refreshed: Dict[str, Any], fields: List[str]) -> Dict[str, Any]:
+    """Données du quasi-doublon avec les champs redemandés remplacés (vidés s'ils ne sont plus trouvés)"""
+    result = json.loads(json.dumps(product_data))
+    for path in fields:
+        if "." in path:
+            group, key = path.split(".", 1)
+            value = (refreshed.get(group) or {}).get(key, "") if isinstance(refreshed.get(group), dict) else ""
+            result.setdefault(group, {})[key] = value
+        else:
+            default = [] if isinstance(result.get(path), list) else ""
+            result[path] = refreshed.get(path, default)
+    return result
+
+
+near_duplicate_index = NearDuplicateIndex()
@@ -0,0 +1,344 @@
+import hashlib
+import io
+import logging
+import multiprocessing
+import os
+import shutil
+import sqlite3
+import subprocess
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Any, List, Optional, Tuple
+
+from app.config import settings
+from app.services import metrics
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS ocr_pages (
+    image_hash TEXT NOT NULL,
+    languages TEXT NOT NULL,
+    text TEXT NOT NULL,
+    seconds REAL NOT NULL,
+    last_used TEXT NOT NULL,
+    PRIMARY KEY (image_hash, languages)
+);
+CREATE INDEX IF NOT EXISTS idx_ocr_pages_last_used ON ocr_pages(last_used);
+"""
+
+
+class OCRCache:
+    """Texte reconnu par image de page, partagé entre processus (SQLite, WAL)
+
+    La clé est l'empreinte des images de la page et non du PDF : une même
+    fiche scannée, renvoyée seule ou dans un autre document, n'est reconnue
+    qu'une fois. Une page qui n'a rien donné est aussi conservée.
+    """
+
+    def __init__(self, db_path: Optional[Path] = None):
+        self.db_path = Path(db_path or Path(settings.DATA_DIR) / "ocr_cache.db")
+        self._schema_ready = False
+
+    def connect(self) -> sqlite3.Connection:
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        if not self._schema_ready:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(SCHEMA)
+            self._schema_ready = True
+        return conn
+
+    def get(self, image_hash: str, languages: str) -> Optional[str]:
+        conn = self.connect()
+        try:
+            with conn:
+                row = conn.execute(
+                    "SELECT text FROM ocr_pages WHERE image_hash = ? AND languages = ?", (image_hash, languages)
+                ).fetchone()
+                if row is not None:
+                    conn.execute(
+                        "UPDATE ocr_pages SET last_used = ? WHERE image_hash = ? AND languages = ?",
+                        (datetime.now().isoformat(), image_hash, languages)
+                    )
+        finally:
+            conn.close()
+        return row[0] if row is not None else None
+
+    def put(self, image_hash: str, languages: str, text: str, seconds: float) -> None:
+        conn = self.connect()
+        try:
+            with conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO ocr_pages VALUES (?, ?, ?, ?, ?)",
+                    (image_hash, languages, text, seconds, datetime.now().isoformat())
+                )
+        finally:
+            conn.close()
+
+    def delete_older_than(self, cutoff: datetime) -> int:
+        """Supprime les pages non réutilisées depuis cutoff"""
+        conn = self.connect()
+        try:
+            with conn:
+                return conn.execute("DELETE FROM ocr_pages WHERE last_used < ?", (cutoff.isoformat(),)).rowcount
+        finally:
+            conn.close()
+
+
+def has_images(page) -> bool:
+    """La page affiche-t-elle des images (sans les décoder) ?"""
+    try:
+        x_objects = page["/Resources"]["/XObject"].get_object()
+        return any(x_objects[name].get_object().get("/Subtype") == "/Image" for name in x_objects)
+    except (KeyError, AttributeError, TypeError):
+        return False
+
+class UnsupportedPage(Exception):
+    """Images de la page que ni PyPDF2 ni Pillow ne savent décoder (JBIG2, filtre inconnu)"""
+
+
+IDENTITY = (1.0, 0.0, 0.0, 1.0, 0.0, 0.0)
+
+def _multiply(m: Tuple[float, ...], ctm: Tuple[float, ...]) -> Tuple[float, ...]:
+    """Produit de matrices PDF [a b c d e f] (opérateur cm)"""
+    a, b, c, d, e, f = m
+    return (a * ctm[0] + b * ctm[2], a * ctm[1] + b * ctm[3],
+            c * ctm[0] + d * ctm[2], c * ctm[1] + d * ctm[3],
+            e * ctm[0] + f * ctm[2] + ctm[4], e * ctm[1] + f * ctm[3] + ctm[5])
+
+def image_placements(page) -> List[Tuple[str, Tuple[float, ...]]]:
+    """Images dessinées par la page, dans l'ordre, avec leur matrice de placement
+
+    Le flux de contenu est parcouru sans extraire le texte : seuls q/Q, cm
+    et Do comptent. Les images d'un formulaire (Form XObject) sont ignorées,
+    comme dans has_images.
+    """
+    from PyPDF2.generic import ContentStream
+    contents = page.get_contents()
+    if contents is None:
+        return []
+    x_objects = page["/Resources"]["/XObject"].get_object()
+    ctm, stack, placements = IDENTITY, [], []
+    for operands, operator in ContentStream(contents, page.pdf).operations:
+        if operator == b"q":
+            stack.append(ctm)
+        elif operator == b"Q":
+            ctm = stack.pop() if stack else IDENTITY
+        elif operator == b"cm":
+            ctm = _multiply(tuple(float(value) for value in operands), ctm)
+        elif operator == b"Do" and operands[0] in x_objects \
+                and x_objects[operands[0]].get_object().get("/Subtype") == "/Image":
+            placements.append((operands[0], ctm))
+    return placements
+
+def page_images(page) -> List[Tuple[bytes, Tuple[float, ...]]]:
+    """Images de la page, encodées (JPEG tel quel, PNG/TIFF via Pillow), avec leur placement
+
+    Lève UnsupportedPage si une image affichée n'a pas pu être extraite :
+    OCR des seules autres bandes, le texte de la page serait tronqué.
+    """
+    try:
+        placements = image_placements(page)
+        files = {os.path.splitext(image.name)[0]: image.data for image in page.images}
+    except KeyError:
+        return []
+    except NotImplementedError as e:
+        # Filtre sans décodeur dans PyPDF2 (JBIG2Decode…)
+        raise UnsupportedPage(str(e))
+    images = []
+    for name, ctm in placements:
+        data = files.get(name[1:])
+        if data is None:
+            filters = page["/Resources"]["/XObject"][name].get_object().get("/Filter")
+            raise UnsupportedPage(f"image {name[1:]} non décodable (filtre {filters})")
+        images.append((data, ctm))
+    return images
+
+def compose_page(images: List[Tuple[bytes, Tuple[float, ...]]]) -> bytes:
+    """Une seule image pour tesseract : bandes ou tuiles d'un scan replacées sur la page
+
+    Reconnues séparément, les bandes coupent les lignes de texte en deux.
+    La page est recomposée à la résolution de l'image la plus fine.
+    """
+    if len(images) == 1:
+        return images[0][0]
+    from PIL import Image
+    decoded = []
+    for data, (a, b, c, d, e, f) in images:
+        try:
+            image = Image.open(io.BytesIO(data))
+            image.load()
+        except Exception as exc:
+            raise UnsupportedPage(f"image non décodable par Pillow: {exc}")
+        # Rectangle occupé sur la page (en points), rotations et cisaillements ignorés
+        x0, x1 = sorted((e, e + a + c))
+        y0, y1 = sorted((f, f + b + d))
+        if a < 0:
+            image = image.transpose(Image.Transpose.FLIP_LEFT_RIGHT)
+        if d < 0:
+            image = image.transpose(Image.Transpose.FLIP_TOP_BOTTOM)
+        decoded.append((image, x0, y0, x1, y1))
+
+    scale = max(image.width / max(x1 - x0, 1e-6) for image, x0, y0, x1, y1 in decoded)
+    left = min(x0 for _, x0, _, _, _ in decoded)
+    top = max(y1 for _, _, _, _, y1 in decoded)
+    width = round((max(x1 for _, _, _, x1, _ in decoded) - left) * scale)
+    height = round((top - min(y0 for _, _, y0, _, _ in decoded)) * scale)
+    mode = "L" if all(image.mode in ("1", "L") for image, *_ in decoded) else "RGB"
+    canvas = Image.new(mode, (max(width, 1), max(height, 1)), "white")
+    for image, x0, y0, x1, y1 in decoded:
+        size = (max(round((x1 - x0) * scale), 1), max(round((y1 - y0) * scale), 1))
+        image = image.convert(mode)
+        if image.size != size:
+            image = image.resize(size)
+        canvas.paste(image, (round((x0 - left) * scale), round((top - y1) * scale)))
+    output = io.BytesIO()
+    canvas.save(output, format="PNG")
+    return output.getvalue()
+
+def image_hash(images: List[Tuple[bytes, Tuple[float, ...]]]) -> str:
+    digest = hashlib.sha256()
+    for data, ctm in images:
+        digest.update(len(data).to_bytes(8, "big"))
+        digest.update(data)
+        digest.update(repr(ctm).encode())
+    return digest.hexdigest()
+
+def run_tesseract(image: bytes, languages: str, command: str, timeout: float) -> str:
+    """Reconnaissance d'une image par le binaire tesseract (entrée et sortie standard)"""
+    # Un seul thread OpenMP par page : le parallélisme vient du pool de processus
+    env = dict(os.environ, OMP_THREAD_LIMIT="1")
+    result = subprocess.run(
+        [command, "stdin", "stdout", "-l", languages],
+        input=image, capture_output=True, timeout=timeout, env=env, check=False
+    )
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.decode("utf-8", "replace").strip() or f"tesseract: code {result.returncode}")
+    return result.stdout.decode("utf-8", "replace")
+
+# PDF ouvert par le processus du pool : les pages d'un même document ne le relisent pas
+_open_document: Tuple[Optional[Tuple[str, float]], Any] = (None, None)
+
+def _reader(pdf_path: str):
+    global _open_document
+    key = (pdf_path, os.stat(pdf_path).st_mtime)
+    if _open_document[0] != key:
+        import PyPDF2
+        _open_document = (key, PyPDF2.PdfReader(pdf_path))
+    return _open_document[1]
+
+def close_document() -> None:
+    global _open_document
+    _open_document = (None, None)
+
+def ocr_page(pdf_path: str, page_index: int, languages: str, command: str, timeout: float,
+             cache_path: str) -> Dict[str, Any]:
+    """Extraction des images d'une page puis OCR, exécutée dans un processus du pool
+
+    Retourne le texte, l'empreinte des images et le statut (ocr, cached, empty,
+    unsupported ou error) ; les métriques sont comptées par le processus appelant.
+    """
+    start = time.perf_counter()
+    result = {"page": page_index, "text": "", "hash": "", "status": "empty", "seconds": 0.0}
+    try:
+        images = page_images(_reader(pdf_path).pages[page_index])
+        if not images:
+            return result
+        result["hash"] = image_hash(images)
+        cache = OCRCache(Path(cache_path))
+        cached = cache.get(result["hash"], languages)
+        if cached is not None:
+            result.update(text=cached, status="cached")
+            return result
+        text = run_tesseract(compose_page(images), languages, command, timeout).strip()
+        result.update(text=text, status="ocr" if text else "empty")
+        cache.put(result["hash"], languages, text, time.perf_counter() - start)
+    except UnsupportedPage as e:
+        result.update(status="unsupported", error=str(e))
+    except Exception as e:
+        # Non mis en cache : une nouvelle soumission retentera la page
+        result.update(status="error", error=str(e))
+    finally:
+        result["seconds"] = time.perf_counter() - start
+    return result
+
+
+def default_ocr_workers() -> int:
+    """Processus OCR par worker uvicorn : les cœurs partagés entre les WORKERS (au moins un)"""
+    cores = os.cpu_count() or 1
+    # WORKERS=0 lance un worker uvicorn par cœur (run.py)
+    uvicorn_workers = settings.WORKERS or cores
+    return max(1, cores // uvicorn_workers)
+
+
+class PageOCR:
+    """OCR des pages sans couche texte, dans un pool de processus
+
+    Les images des pages sont extraites du PDF (un scan est une image par
+    page, ou des bandes recomposées, sans rastérisation à faire) puis
+    reconnues par tesseract ; chaque
+    page est une tâche du pool. Le pool est créé au premier document scanné
+    et partagé par les requêtes du worker. Par défaut, les cœurs sont
+    répartis entre les workers uvicorn (WORKERS) plutôt que d'en donner
+    autant à chacun. Avec workers=1, l'OCR se fait dans le processus
+    appelant (ex: processus du pool de la ligne de commande).
+    """
+
+    def __init__(self, workers: Optional[int] = None, languages: Optional[str] = None,
+                 command: Optional[str] = None, cache: Optional[OCRCache] = None):
+        self.workers = workers or settings.OCR_WORKERS or default_ocr_workers()
+        self.languages = languages or settings.OCR_LANGUAGES
+        self.command = command or settings.OCR_COMMAND
+        self.timeout = settings.OCR_TIMEOUT
+        self.cache = cache or OCRCache()
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._available: Optional[bool] = None
+
+    @property
+    def available(self) -> bool:
+        if self._available is None:
+            self._available = shutil.which(self.command) is not None
+            if not self._available:
+                logger.warning(f"OCR indisponible: commande {self.command} introuvable (paquet tesseract-ocr)")
+        return self._available
+
+    def pool(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            # spawn : pas de fork d'un processus serveur qui a déjà des threads
+            self._pool = ProcessPoolExecutor(max_workers=self.workers,
+                                             mp_context=multiprocessing.get_context("spawn"))
+        return self._pool
+
+    def recognize(self, pdf_path: Path, page_indices: List[int]) -> Dict[int, str]:
+        """Texte reconnu par index de page (bloquant ; à appeler hors de la boucle asyncio)"""
+        args = (self.languages, self.command, self.timeout, str(self.cache.db_path))
+        if self.workers == 1 or len(page_indices) == 1:
+            results = [ocr_page(str(pdf_path), index, *args) for index in page_indices]
+            close_document()
+        else:
+            futures = [self.pool().submit(ocr_page, str(pdf_path), index, *args) for index in page_indices]
+            results = [future.result() for future in as_completed(futures)]
+
+        texts = {}
+        for result in results:
+            metrics.OCR_PAGES.inc(status=result["status"])
+            if result["status"] == "ocr":
+                metrics.OCR_PAGE_SECONDS.observe(result["seconds"])
+            if result["status"] == "error":
+                logger.warning("OCR de la page %d impossible: %s", result["page"] + 1, result["error"])
+            elif result["status"] == "unsupported":
+                logger.warning("Page %d non prise en charge par l'OCR: %s", result["page"] + 1, result["error"])
+            texts[result["page"]] = result["text"]
+        return texts
+
+    def shutdown(self) -> None:
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+
+ocr_cache = OCRCache()
+page_ocr = PageOCR(cache=ocr_cache)
@@ -0,0 +1,249 @@
+import gzip
+import hashlib
+import logging
+import mimetypes
+import re
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import AsyncIterator, Dict, Optional, Tuple
+
+import aiofiles
+
+from app.config import settings
+
+try:
+    import brotli
+except ImportError:  # brotli est optionnel : seule la variante gzip est produite
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+SAFE_NAME = re.compile(r'^[A-Za-z0-9][A-Za-z0-9._-]*$')
+
+# Extensions des variantes précompressées, par ordre de préférence
+ENCODINGS = (("br", ".br"), ("gzip", ".gz"))
+RANGE_RE = re.compile(r"bytes=[ \t]*(\d*)-(\d*)[ \t]*", re.IGNORECASE)
+COMPRESSIBLE_SUFFIXES = {".html"}
+
+MEDIA_TYPES = {
+    ".html": "text/html",  # charset ajouté par Starlette
+    ".pdf": "application/pdf",
+    ".json": "application/json",
+}
+
+
+@dataclass
+class OutputFile:
+    """Métadonnées d'un fichier généré, mises en cache pour éviter les stat répétés"""
+    path: Path
+    size: int
+    etag: str
+    media_type: str
+    mtime_ns: int = 0
+    variants: Dict[str, Tuple[Path, int]] = field(default_factory=dict)  # encodage -> (chemin, taille)
+
+    def variant_etag(self, encoding: str) -> str:
+        return f'"{self.etag}-{encoding}"'
+
+    @property
+    def strong_etag(self) -> str:
+        return f'"{self.etag}"'
+
+
+def media_type_for(path: Path) -> str:
+    return MEDIA_TYPES.get(path.suffix.lower()) or mimetypes.guess_type(path.name)[0] or "application/octet-stream"
+
+def safe_output_path(session_id: str, filename: str) -> Optional[Path]:
+    """Construit le chemin d'un fichier de sortie sans accès disque, None si le nom est invalide"""
+    if not SAFE_NAME.match(session_id) or not SAFE_NAME.match(filename) or ".." in filename:
+        return None
+    return Path(settings.OUTPUT_DIR) / session_id / filename
+
+def hash_file(path: Path) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def write_compressed_variants(path: Path, content: bytes) -> Dict[str, Tuple[Path, int]]:
+    """Écrit les variantes gzip (et brotli si disponible) d'un fichier"""
+    variants = {}
+    compressed = gzip.compress(content, compresslevel=9, mtime=0)
+    gz_path = path.with_name(path.name + ".gz")
+    gz_path.write_bytes(compressed)
+    variants["gzip"] = (gz_path, len(compressed))
+    if brotli is not None:
+        compressed = brotli.compress(content, quality=11)
+        br_path = path.with_name(path.name + ".br")
+        br_path.write_bytes(compressed)
+        variants["br"] = (br_path, len(compressed))
+    return variants
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Vrai si l'en-tête If-None-Match correspond à l'ETag (comparaison faible)"""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    candidates = [tag.strip() for tag in if_none_match.split(",")]
+    return any(tag.removeprefix("W/") == etag for tag in candidates)
+
+def choose_encoding(accept_encoding: Optional[str], entry: OutputFile) -> Optional[str]:
+    """Choisit la variante précompressée acceptée par le client"""
+    if not accept_encoding or not entry.variants:
+        return None
+    accepted = {}
+    for part in accept_encoding.split(","):
+        name, _, params = part.strip().partition(";")
+        quality = 1.0
+        if params.strip().startswith("q="):
+            try:
+                quality = float(params.strip()[2:])
+            except ValueError:
+                quality = 0.0
+        accepted[name.strip().lower()] = quality
+    for encoding, _ in ENCODINGS:
+        if encoding in entry.variants and accepted.get(encoding, accepted.get("*", 0.0)) > 0:
+            return encoding
+    return None
+
+def parse_range(range_header: Optional[str], size: int) -> Optional[Tuple[int, int]]:
+    """Parse un en-tête Range à intervalle unique
+
+    Retourne (début, fin incluse), ou None pour servir le fichier entier :
+    un en-tête absent, à plusieurs intervalles ou syntaxiquement invalide est
+    ignoré (RFC 9110, section 14.2). Lève ValueError si l'intervalle, valide,
+    n'est pas satisfiable.
+    """
+    if not range_header:
+        return None
+    match = RANGE_RE.fullmatch(range_header.strip())
+    if match is None:
+        # Plusieurs intervalles, autre unité ou syntaxe invalide : fichier entier
+        return None
+    start_str, end_str = match.groups()
+    if not start_str:
+        if not end_str:
+            return None
+        suffix = int(end_str)
+        if suffix == 0 or size == 0:
+            raise ValueError(f"Range non satisfiable: {range_header}")
+        return max(0, size - suffix), size - 1
+    start = int(start_str)
+    if end_str and int(end_str) < start:
+        return None
+    if start >= size:
+        raise ValueError(f"Range non satisfiable: {range_header}")
+    end = min(int(end_str), size - 1) if end_str else size - 1
+    return start, end
+
+async def iter_file(path: Path, start: int = 0, length: Optional[int] = None, chunk_size: int = 64 * 1024) -> AsyncIterator[bytes]:
+    """Lit un fichier (ou une partie) par blocs"""
+    async with aiofiles.open(path, "rb") as f:
+        await f.seek(start)
+        remaining = length
+        while remaining is None or remaining > 0:
+            chunk = await f.read(chunk_size if remaining is None else min(chunk_size, remaining))
+            if not chunk:
+                break
+            if remaining is not None:
+                remaining -= len(chunk)
+            yield chunk
+
+
+class OutputFileIndex:
+    """Cache LRU des métadonnées (taille, ETag, variantes) des fichiers générés
+
+    Avec plusieurs workers, un fichier peut être régénéré ou supprimé (rétention)
+    par un autre processus : `validate` compare alors taille et date de
+    modification à chaque lecture du cache (un stat, sans relire le fichier).
+    """
+
+    def __init__(self, max_entries: int = 10000, validate: bool = False):
+        self.max_entries = max_entries
+        self.validate = validate
+        self._entries: "OrderedDict[Tuple[str, str], OutputFile]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _put(self, key: Tuple[str, str], entry: OutputFile) -> None:
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def register(self, session_id: str, path: Path, content: bytes, precompress: bool = False) -> OutputFile:
+        """Enregistre un fichier qui vient d'être écrit (le contenu est déjà en mémoire)"""
+        # Seuls les fichiers servis par /download (OUTPUT_DIR/<session_id>/) sont mis en cache
+        cacheable = safe_output_path(session_id, path.name) == path
+        variants = {}
+        if precompress and path.suffix.lower() in COMPRESSIBLE_SUFFIXES:
+            variants = write_compressed_variants(path, content)
+        entry = OutputFile(
+            path=path,
+            size=len(content),
+            etag=hashlib.sha256(content).hexdigest(),
+            media_type=media_type_for(path),
+            mtime_ns=path.stat().st_mtime_ns,
+            variants=variants,
+        )
+        if cacheable:
+            self._put((session_id, path.name), entry)
+        return entry
+
+    def lookup_cached(self, session_id: str, filename: str) -> Optional[OutputFile]:
+        """Retourne les métadonnées en cache sans lire le fichier"""
+        key = (session_id, filename)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+        if entry is not None and self.validate and not self._is_current(entry):
+            self.invalidate(session_id, filename)
+            return None
+        return entry
+
+    @staticmethod
+    def _is_current(entry: OutputFile) -> bool:
+        try:
+            stat = entry.path.stat()
+        except OSError:
+            return False
+        return stat.st_size == entry.size and stat.st_mtime_ns == entry.mtime_ns
+
+    def lookup(self, session_id: str, filename: str) -> Optional[OutputFile]:
+        """Retourne les métadonnées d'un fichier, en les calculant au premier accès (bloquant)"""
+        entry = self.lookup_cached(session_id, filename)
+        if entry is not None:
+            return entry
+
+        path = safe_output_path(session_id, filename)
+        if path is None:
+            return None
+        try:
+            stat = path.stat()
+        except OSError:
+            return None
+        variants = {}
+        for encoding, suffix in ENCODINGS:
+            variant = path.with_name(path.name + suffix)
+            if variant.exists():
+                variants[encoding] = (variant, variant.stat().st_size)
+        entry = OutputFile(path=path, size=stat.st_size, etag=hash_file(path), media_type=media_type_for(path),
+                           mtime_ns=stat.st_mtime_ns, variants=variants)
+        self._put((session_id, filename), entry)
+        return entry
+
+    def invalidate(self, session_id: str, filename: Optional[str] = None) -> None:
+        """Oublie les fichiers d'une session (ou un seul fichier)"""
+        with self._lock:
+            for key in list(self._entries):
+                if key[0] == session_id and (filename is None or key[1] == filename):
+                    del self._entries[key]
+
+
+output_file_index = OutputFileIndex(validate=settings.WORKERS != 1)
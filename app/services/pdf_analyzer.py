@@ -1,18 +1,28 @@
-import PyPDF2
 import io
 import httpx
 import json
 import asyncio
 import logging
 import re
-import aiofiles
+import time
 from typing import Dict, Any, List, Optional
 from pathlib import Path
-from datetime import datetime
 
 from app.config import settings
+from app.services import metrics
+from app.services.model_response_store import model_response_store
+from app.services.scheduler import llm_scheduler, QueueFullError
+from app.services.concurrency import ollama_limiter
+from app.services.token_budget import token_budget
+from app.services.checkpoints import checkpoint_store, document_key
+from app.services.tracing import span, traced
+from app.services.ocr import page_ocr, has_images
+from app.services.near_duplicates import near_duplicate_index, minhash, fields_to_refresh, field_values, apply_refresh
 
 logger = logging.getLogger(__name__)
+# Loggers des messages répétés (une ligne par page, par valeur écartée), échantillonnés par LOG_SAMPLING
+page_logger = logging.getLogger(f"{__name__}.pages")
+validation_logger = logging.getLogger(f"{__name__}.validation")
 
 class PDFAnalyzer:
     def __init__(self):
@@ -21,6 +31,16 @@ class PDFAnalyzer:
         self.timeout = settings.OLLAMA_TIMEOUT
         self.max_retries = settings.MAX_RETRIES
         self.retry_delay = settings.RETRY_DELAY
+        self.page_count = 0  # Renseigné par extract_pages_from_pdf
+        self.ocr_page_count = 0  # Pages sans couche texte reconnues par OCR
+        self.english_detected = False  # Renseigné par validate_extracted_data
+        self.last_usage: Optional[Dict[str, Any]] = None  # Tailles choisies et compteurs du dernier appel
+        self.near_duplicate: Optional[Dict[str, Any]] = None  # Document repris par analyze_text (score, champs redemandés)
+        self.segment_status = "ok"  # Issue du dernier segment analysé : ok, fallback ou fallback_error
+        
+        # Cascade : petit modèle rapide d'abord, modèle principal si le résultat est insuffisant
+        self.small_model = settings.OLLAMA_SMALL_MODEL
+        self.min_coverage = settings.CASCADE_MIN_COVERAGE
         
         # Configuration pour différents types de produits
         self.product_type_keywords = {
@@ -50,65 +70,112 @@ class PDFAnalyzer:
                 logger.info("Ollama est disponible")
                 return True
             retries += 1
-            logger.warning(f"Tentative {retries}/{self.max_retries} de connexion à Ollama...")
+            logger.warning("Tentative %d/%d de connexion à Ollama...", retries, self.max_retries)
             await asyncio.sleep(self.retry_delay)
         return False
 
-    def extract_text_from_pdf(self, pdf_path: Path) -> str:
-        """Extrait le texte d'un fichier PDF avec gestion d'erreurs améliorée"""
-        try:
-            logger.info(f"Début de l'extraction du texte du PDF: {pdf_path}")
-            
-            if not pdf_path.exists():
-                raise FileNotFoundError(f"Le fichier PDF n'existe pas: {pdf_path}")
-            
-            file_size = pdf_path.stat().st_size
-            logger.info(f"Taille du fichier PDF: {file_size} octets")
-            
-            if file_size == 0:
-                raise ValueError("Le fichier PDF est vide")
-            
-            # Limite de taille pour éviter les problèmes de mémoire
-            if file_size > 50 * 1024 * 1024:  # 50MB
-                raise ValueError("Le fichier PDF est trop volumineux (> 50MB)")
+    @traced()
+    def extract_pages_from_pdf(self, pdf_path: Path) -> List[str]:
+        """Extrait le texte brut de chaque page (chaîne vide pour une page sans texte)"""
+        logger.info(f"Début de l'extraction du texte du PDF: {pdf_path}")
+        
+        if not pdf_path.exists():
+            raise FileNotFoundError(f"Le fichier PDF n'existe pas: {pdf_path}")
+        
+        file_size = pdf_path.stat().st_size
+        logger.info(f"Taille du fichier PDF: {file_size} octets")
+        
+        if file_size == 0:
+            raise ValueError("Le fichier PDF est vide")
+        
+        # Limite de taille pour éviter les problèmes de mémoire
+        if file_size > 50 * 1024 * 1024:  # 50MB
+            raise ValueError("Le fichier PDF est trop volumineux (> 50MB)")
+        
+        pages = []
+        image_pages = []  # Pages sans couche texte mais avec des images (scans)
+        extraction_start = time.perf_counter()
+        
+        # Import au premier PDF : les workers qui ne font que servir des fichiers ne le chargent pas
+        import PyPDF2
+        
+        with open(pdf_path, 'rb') as file:
+            pdf_reader = PyPDF2.PdfReader(file)
+            total_pages = len(pdf_reader.pages)
+            self.page_count = total_pages
+            logger.info(f"Nombre de pages dans le PDF: {total_pages}")
+            metrics.EXTRACTION_PAGES.observe(total_pages)
             
-            text_parts = []
+            if total_pages == 0:
+                raise ValueError("Le PDF ne contient aucune page")
             
-            with open(pdf_path, 'rb') as file:
-                pdf_reader = PyPDF2.PdfReader(file)
-                total_pages = len(pdf_reader.pages)
-                logger.info(f"Nombre de pages dans le PDF: {total_pages}")
-                
-                if total_pages == 0:
-                    raise ValueError("Le PDF ne contient aucune page")
-                
-                for i, page in enumerate(pdf_reader.pages):
+            for i, page in enumerate(pdf_reader.pages):
+                with span("extract_page", page=i + 1) as page_span:
                     try:
-                        page_text = page.extract_text()
-                        if page_text.strip():  # Seulement si la page contient du texte
-                            text_parts.append(page_text)
-                            logger.info(f"Page {i+1} extraite, longueur: {len(page_text)} caractères")
+                        page_text = page.extract_text() or ""
+                        page_span["chars"] = len(page_text)
+                        if page_text.strip():
+                            page_logger.info("Page %d extraite, longueur: %d caractères", i + 1, len(page_text))
                     except Exception as e:
-                        logger.warning(f"Erreur lors de l'extraction de la page {i+1}: {e}")
-                        continue
-                
-                full_text = "\n".join(text_parts)
-                
-                if not full_text.strip():
-                    raise ValueError("Aucun texte extractible trouvé dans le PDF")
-                
-                # Nettoyage du texte
-                full_text = self.clean_extracted_text(full_text)
-                
-                # Limiter la taille du texte pour éviter le troncage du prompt
-                max_text_length = 8000  # Augmenté pour plus de contexte
-                if len(full_text) > max_text_length:
-                    logger.warning(f"Texte tronqué de {len(full_text)} à {max_text_length} caractères")
-                    full_text = full_text[:max_text_length] + "..."
-                
-                logger.info(f"Extraction terminée, texte total: {len(full_text)} caractères")
-                return full_text
-                
+                        page_logger.warning("Erreur lors de l'extraction de la page %d: %s", i + 1, e)
+                        page_text = ""
+                    pages.append(page_text)
+                    if len(page_text.strip()) < settings.OCR_MIN_CHARS and has_images(page):
+                        image_pages.append(i)
+        
+        if image_pages:
+            self.ocr_missing_pages(pdf_path, pages, image_pages)
+        metrics.EXTRACTION_SECONDS.observe(time.perf_counter() - extraction_start)
+        return pages
+
+    def ocr_missing_pages(self, pdf_path: Path, pages: List[str], image_pages: List[int]) -> None:
+        """Complète `pages` avec le texte reconnu sur les pages scannées
+
+        Sans OCR disponible, un PDF entièrement scanné est refusé dès
+        l'extraction, avant toute attente d'Ollama.
+        """
+        logger.info(f"{len(image_pages)} page(s) sans couche texte sur {len(pages)}")
+        if not settings.OCR_ENABLED or not page_ocr.available:
+            if not any(len(text.strip()) >= settings.OCR_MIN_CHARS for text in pages):
+                reason = "OCR désactivé" if not settings.OCR_ENABLED else f"{page_ocr.command} introuvable"
+                raise ValueError(f"PDF scanné sans couche texte ({len(image_pages)} page(s) image) et OCR indisponible: {reason}")
+            return
+        
+        with span("ocr", pages=len(image_pages)) as ocr_span:
+            texts = page_ocr.recognize(pdf_path, image_pages)
+            recognized = 0
+            for index, text in texts.items():
+                if len(text.strip()) > len(pages[index].strip()):
+                    pages[index] = text
+                    recognized += 1
+            ocr_span["recognized"] = recognized
+        self.ocr_page_count = recognized
+        logger.info(f"OCR: {recognized}/{len(image_pages)} page(s) reconnue(s)")
+
+    def prepare_text(self, pages: List[str]) -> str:
+        """Assemble, nettoie et limite le texte des pages pour le prompt"""
+        full_text = "\n".join(page for page in pages if page.strip())
+        
+        if not full_text.strip():
+            raise ValueError("Aucun texte extractible trouvé dans le PDF")
+        
+        # Nettoyage du texte
+        full_text = self.clean_extracted_text(full_text)
+        
+        # Limiter la taille du texte pour éviter le troncage du prompt
+        max_text_length = 8000  # Augmenté pour plus de contexte
+        if len(full_text) > max_text_length:
+            logger.warning(f"Texte tronqué de {len(full_text)} à {max_text_length} caractères")
+            full_text = full_text[:max_text_length] + "..."
+        
+        logger.info(f"Extraction terminée, texte total: {len(full_text)} caractères")
+        return full_text
+
+    @traced()
+    def extract_text_from_pdf(self, pdf_path: Path) -> str:
+        """Extrait le texte d'un fichier PDF avec gestion d'erreurs améliorée"""
+        try:
+            return self.prepare_text(self.extract_pages_from_pdf(pdf_path))
         except Exception as e:
             logger.error(f"Erreur lors de l'extraction du PDF: {str(e)}", exc_info=True)
             raise Exception(f"Erreur lors de l'extraction du PDF: {str(e)}")
@@ -139,42 +206,19 @@ class PDFAnalyzer:
         logger.info("Type de produit non détecté, utilisation du template générique")
         return "generic"
 
-    async def save_model_response(self, session_id: str, prompt: str, raw_response: str, parsed_data: Dict[str, Any], output_path: Path) -> None:
-        """Sauvegarde la réponse complète du modèle pour analyse"""
+    async def save_model_response(self, session_id: str, prompt: str, raw_response: str, parsed_data: Dict[str, Any], output_path: Path, parse_status: str = "ok", model: Optional[str] = None) -> None:
+        """Sauvegarde la réponse complète du modèle pour analyse (écriture en arrière-plan)"""
         try:
-            # Créer le dossier de sauvegarde
-            backup_dir = output_path / "model_responses"
-            backup_dir.mkdir(exist_ok=True)
-            
-            # Nom du fichier avec timestamp
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            filename = f"{session_id}_{timestamp}_model_response.json"
-            file_path = backup_dir / filename
-            
-            # Données à sauvegarder
-            backup_data = {
-                "metadata": {
-                    "session_id": session_id,
-                    "timestamp": datetime.now().isoformat(),
-                    "model": self.model,
-                    "filename": filename
-                },
-                "prompt": prompt,
-                "raw_response": raw_response,
-                "parsed_data": parsed_data,
-                "analysis_info": {
-                    "prompt_length": len(prompt),
-                    "response_length": len(raw_response),
-                    "parsed_fields_count": len(parsed_data),
-                    "model_used": self.model
-                }
-            }
-            
-            # Sauvegarder en JSON
-            async with aiofiles.open(file_path, 'w', encoding='utf-8') as f:
-                await f.write(json.dumps(backup_data, indent=2, ensure_ascii=False))
-            
-            logger.info(f"Réponse du modèle sauvegardée: {file_path}")
+            model_response_store.append(
+                session_id=session_id,
+                model=model or self.model,
+                prompt=prompt,
+                raw_response=raw_response,
+                parsed_data=parsed_data,
+                parse_status=parse_status,
+                usage=self.last_usage
+            )
+            logger.info(f"Réponse du modèle mise en file pour sauvegarde (session {session_id})")
             
         except Exception as e:
             logger.error(f"Erreur lors de la sauvegarde de la réponse du modèle: {str(e)}")
@@ -263,6 +307,33 @@ RÈGLES DE RECHERCHE PRÉCISES :
 RÉPONDS UNIQUEMENT AVEC LE JSON, SANS COMMENTAIRES NI EXPLICATIONS."""
         return prompt
 
+    def create_fields_prompt(self, text: str, fields: List[str]) -> str:
+        """Prompt limité à quelques champs (« brand », « technical_specs.color »), pour un quasi-doublon"""
+        structure = self.create_fallback_structure()
+        skeleton: Dict[str, Any] = {}
+        for path in fields:
+            if "." in path:
+                group, key = path.split(".", 1)
+                skeleton.setdefault(group, {})[key] = ""
+            else:
+                skeleton[path] = [] if isinstance(structure.get(path), list) else ""
+        return f"""Tu es un expert en analyse de fiches techniques produits. Tu dois analyser EXCLUSIVEMENT le texte fourni ci-dessous et extraire UNIQUEMENT les champs demandés, s'ils y sont explicitement mentionnés.
+
+⚠️ RÈGLES ABSOLUES :
+1. Ne JAMAIS inventer ou deviner d'informations
+2. Si une information n'est pas dans le texte, mettre ""
+3. RÉPONDRE OBLIGATOIREMENT EN FRANÇAIS
+4. Être précis sur les unités (mm, cm, kg, W, V, etc.)
+
+TEXTE À ANALYSER (analyse uniquement ce contenu) :
+{text}
+
+FORMAT DE RÉPONSE OBLIGATOIRE (JSON valide, uniquement ces champs) :
+{json.dumps(skeleton, ensure_ascii=False, indent=4)}
+
+RÉPONDS UNIQUEMENT AVEC LE JSON, SANS COMMENTAIRES NI EXPLICATIONS."""
+
+    @traced()
     def extract_json_from_text(self, text: str) -> str:
         """Extrait le JSON de la réponse d'Ollama avec plusieurs méthodes améliorées"""
         # Suppression des balises markdown
@@ -282,6 +353,7 @@ RÉPONDS UNIQUEMENT AVEC LE JSON, SANS COMMENTAIRES NI EXPLICATIONS."""
             json_candidate = cleaned[start:end]
             try:
                 json.loads(json_candidate)
+                metrics.JSON_EXTRACTION.inc(method="direct")
                 return json_candidate
             except json.JSONDecodeError:
                 pass
@@ -298,6 +370,7 @@ RÉPONDS UNIQUEMENT AVEC LE JSON, SANS COMMENTAIRES NI EXPLICATIONS."""
             for match in matches:
                 try:
                     json.loads(match)
+                    metrics.JSON_EXTRACTION.inc(method="regex")
                     return match
                 except json.JSONDecodeError:
                     continue
@@ -320,13 +393,16 @@ RÉPONDS UNIQUEMENT AVEC LE JSON, SANS COMMENTAIRES NI EXPLICATIONS."""
             
             # Essayer de parser
             json.loads(repaired)
+            metrics.JSON_EXTRACTION.inc(method="repaired")
             logger.info("JSON réparé avec succès")
             return repaired
             
         except json.JSONDecodeError:
+            metrics.JSON_EXTRACTION.inc(method="failed")
             logger.warning("Impossible de réparer le JSON, retour d'un JSON vide")
             return "{}"
 
+    @traced()
     def validate_extracted_data(self, data: Dict[str, Any], original_text: str) -> Dict[str, Any]:
         """Valide les données extraites contre le texte original pour éviter les hallucinations"""
         logger.info("Validation des données extraites")
@@ -376,17 +452,27 @@ RÉPONDS UNIQUEMENT AVEC LE JSON, SANS COMMENTAIRES NI EXPLICATIONS."""
             else:
                 return normalized_value in normalized_text
         
+        def drop_reason(value: str) -> Optional[str]:
+            """Raison de suppression d'une valeur, ou None si elle est conservée"""
+            if is_suspicious(value):
+                return "suspicious"
+            if not validate_in_text(value, original_text):
+                return "not_in_text"
+            return None
+        
         validated_data = {}
         english_detected = False
         
         for key, value in data.items():
             if isinstance(value, str):
-                if is_suspicious(value) or not validate_in_text(value, original_text):
+                reason = drop_reason(value)
+                if reason:
                     validated_data[key] = ""
-                    logger.warning(f"Valeur suspecte supprimée pour {key}: {value}")
+                    metrics.VALIDATION_DROPPED_VALUES.inc(reason=reason)
+                    validation_logger.warning("Valeur suspecte supprimée pour %s: %s", key, value)
                 elif contains_english(value):
                     validated_data[key] = value  # Garder la valeur mais logger l'alerte
-                    logger.warning(f"TEXTE ANGLAIS DÉTECTÉ pour {key}: {value}")
+                    validation_logger.warning("TEXTE ANGLAIS DÉTECTÉ pour %s: %s", key, value)
                     english_detected = True
                 else:
                     validated_data[key] = value
@@ -394,23 +480,30 @@ RÉPONDS UNIQUEMENT AVEC LE JSON, SANS COMMENTAIRES NI EXPLICATIONS."""
             elif isinstance(value, list):
                 validated_list = []
                 for item in value:
-                    if isinstance(item, str) and not is_suspicious(item) and validate_in_text(item, original_text):
-                        if contains_english(item):
-                            logger.warning(f"TEXTE ANGLAIS DÉTECTÉ pour {key}: {item}")
-                            english_detected = True
-                        validated_list.append(item)
+                    if not isinstance(item, str):
+                        continue
+                    reason = drop_reason(item)
+                    if reason:
+                        metrics.VALIDATION_DROPPED_VALUES.inc(reason=reason)
+                        continue
+                    if contains_english(item):
+                        validation_logger.warning("TEXTE ANGLAIS DÉTECTÉ pour %s: %s", key, item)
+                        english_detected = True
+                    validated_list.append(item)
                 validated_data[key] = validated_list
                 
             elif isinstance(value, dict):
                 validated_dict = {}
                 for subkey, subvalue in value.items():
                     if isinstance(subvalue, str):
-                        if not is_suspicious(subvalue) and validate_in_text(subvalue, original_text):
+                        reason = drop_reason(subvalue)
+                        if not reason:
                             if contains_english(subvalue):
-                                logger.warning(f"TEXTE ANGLAIS DÉTECTÉ pour {key}.{subkey}: {subvalue}")
+                                validation_logger.warning("TEXTE ANGLAIS DÉTECTÉ pour %s.%s: %s", key, subkey, subvalue)
                                 english_detected = True
                             validated_dict[subkey] = subvalue
                         else:
+                            metrics.VALIDATION_DROPPED_VALUES.inc(reason=reason)
                             validated_dict[subkey] = ""
                     else:
                         validated_dict[subkey] = subvalue
@@ -419,10 +512,150 @@ RÉPONDS UNIQUEMENT AVEC LE JSON, SANS COMMENTAIRES NI EXPLICATIONS."""
                 validated_data[key] = value
         
         if english_detected:
+            metrics.VALIDATION_ENGLISH_DETECTED.inc()
             logger.error("⚠️  RÉPONSE EN ANGLAIS DÉTECTÉE - Le prompt doit être renforcé")
         
+        self.english_detected = english_detected
         return validated_data
 
+    def field_coverage(self, data: Dict[str, Any]) -> float:
+        """Part des champs de la fiche renseignés après validation"""
+        fields = self.create_fallback_structure()
+        filled = 0
+        for key in fields:
+            value = data.get(key)
+            if isinstance(value, dict):
+                value = any(value.values())
+            if value:
+                filled += 1
+        return filled / len(fields)
+
+    async def generate(self, client: httpx.AsyncClient, request_data: Dict[str, Any], prompt_kind: str = "structured") -> Dict[str, Any]:
+        """Appelle /api/generate et enregistre les métriques de l'appel"""
+        self.last_usage = None
+        options = request_data.get("options", {})
+        async with ollama_limiter.acquire() as in_flight:
+            start = time.perf_counter()
+            try:
+                # Span après l'acquisition : l'attente du limiteur reste visible à part
+                with span("ollama_generate", prompt=prompt_kind, model=request_data.get("model", ""),
+                          in_flight=in_flight) as call_span, metrics.OLLAMA_REQUESTS_IN_PROGRESS.track_inprogress():
+                    response = await client.post(
+                        f"{self.ollama_url}/api/generate",
+                        json=request_data
+                    )
+                    response.raise_for_status()
+                    result = response.json()
+                    call_span["eval_count"] = result.get("eval_count")
+            except httpx.TimeoutException:
+                metrics.OLLAMA_ERRORS.inc(type="timeout")
+                ollama_limiter.on_overload()
+                raise
+            except httpx.ConnectError:
+                metrics.OLLAMA_ERRORS.inc(type="connect")
+                raise
+            except httpx.HTTPError as e:
+                metrics.OLLAMA_ERRORS.inc(type="http")
+                if isinstance(e, httpx.HTTPStatusError) and e.response.status_code >= 500:
+                    ollama_limiter.on_overload()
+                raise
+            finally:
+                latency = time.perf_counter() - start
+                metrics.OLLAMA_REQUEST_SECONDS.observe(latency, prompt=prompt_kind)
+            ollama_limiter.on_success(latency, result.get("eval_count", 0), in_flight, request_data.get("model", ""))
+        
+        token_budget.record(request_data.get("model", ""), prompt_kind, request_data.get("prompt", ""), result)
+        self.last_usage = {
+            "prompt_kind": prompt_kind,
+            "num_predict": options.get("num_predict"),
+            "num_ctx": options.get("num_ctx"),
+            "prompt_eval_count": result.get("prompt_eval_count"),
+            "eval_count": result.get("eval_count"),
+            "done_reason": result.get("done_reason"),
+        }
+        if "num_predict" in options:
+            metrics.OLLAMA_NUM_PREDICT.observe(options["num_predict"], prompt=prompt_kind)
+        if "num_ctx" in options:
+            metrics.OLLAMA_NUM_CTX.observe(options["num_ctx"], prompt=prompt_kind)
+        
+        # Durées Ollama en nanosecondes ; sans streaming, le premier token arrive
+        # après le chargement du modèle et l'évaluation du prompt
+        if "prompt_eval_duration" in result:
+            ttft_ns = result.get("load_duration", 0) + result.get("prompt_eval_duration", 0)
+            metrics.OLLAMA_TIME_TO_FIRST_TOKEN.observe(ttft_ns / 1e9, prompt=prompt_kind)
+        if "eval_count" in result:
+            metrics.OLLAMA_EVAL_COUNT.observe(result["eval_count"], prompt=prompt_kind)
+        if "prompt_eval_count" in result:
+            metrics.OLLAMA_PROMPT_EVAL_COUNT.observe(result["prompt_eval_count"], prompt=prompt_kind)
+        return result
+
+    def structured_request(self, prompt: str, model: str, attempt: int = 0,
+                           prompt_kind: str = "structured") -> Dict[str, Any]:
+        """Requête /api/generate pour le prompt structuré (ou limité à quelques champs)"""
+        return {
+            "model": model,
+            "prompt": prompt,
+            "stream": False,
+            "options": {
+                "temperature": 0.05,  # Très faible pour éviter les hallucinations
+                "top_p": 0.9,
+                # num_predict / num_ctx dimensionnés selon le prompt et les sorties observées
+                **token_budget.options(model, prompt, prompt_kind, attempt),
+                "stop": ["```", "---", "RÉPONDS", "FORMAT"]  # Arrêter à ces tokens
+            }
+        }
+
+    async def try_small_model(self, text: str, session_id: str = None, output_path: Path = None) -> tuple:
+        """Tentative unique avec le petit modèle
+
+        Retourne (données, None) si le résultat est accepté, sinon (None, raison de l'escalade).
+        """
+        prompt = self.create_structured_prompt(text)
+        json_str = ""
+        try:
+            async with span("small_model", model=self.small_model), httpx.AsyncClient(timeout=self.timeout) as client:
+                result = await self.generate(client, self.structured_request(prompt, self.small_model), "structured")
+            json_str = result["response"]
+            data = json.loads(self.extract_json_from_text(json_str))
+        except httpx.HTTPError as e:
+            logger.warning(f"Petit modèle indisponible ({self.small_model}): {e}")
+            return None, "error"
+        except Exception as e:
+            logger.info(f"Réponse du petit modèle non exploitable: {e}")
+            if session_id and output_path:
+                await self.save_model_response(session_id, prompt, json_str, {"error": str(e)}, output_path, "escalated", self.small_model)
+            return None, "parse"
+        
+        validated_data = self.validate_extracted_data(data, text)
+        coverage = self.field_coverage(validated_data)
+        reason = None
+        if self.english_detected:
+            reason = "english"
+        elif coverage < self.min_coverage:
+            reason = "coverage"
+        
+        if session_id and output_path:
+            await self.save_model_response(session_id, prompt, json_str, validated_data, output_path,
+                                           "escalated" if reason else "ok", self.small_model)
+        logger.info(f"Petit modèle: couverture {coverage:.0%}" + (f", escalade ({reason})" if reason else ", résultat accepté"))
+        return (None, reason) if reason else (validated_data, None)
+
+    async def analyze_with_cascade(self, text: str, session_id: str = None, output_path: Path = None) -> Dict[str, Any]:
+        """Analyse d'un segment : petit modèle d'abord (si configuré), modèle principal en escalade"""
+        self.segment_status = "ok"
+        if self.small_model:
+            with metrics.CASCADE_TIER_SECONDS.time(tier="small"):
+                data, reason = await self.try_small_model(text, session_id, output_path)
+            if data is not None:
+                metrics.CASCADE_SEGMENTS.inc(tier="small")
+                return data
+            metrics.CASCADE_ESCALATIONS.inc(reason=reason)
+        
+        with metrics.CASCADE_TIER_SECONDS.time(tier="large"):
+            data = await self.analyze_with_ollama(text, session_id, output_path)
+        metrics.CASCADE_SEGMENTS.inc(tier="large")
+        return data
+
     async def analyze_with_ollama(self, text: str, session_id: str = None, output_path: Path = None) -> Dict[str, Any]:
         """Analyse le texte avec Ollama pour extraire les informations produit"""
         logger.info(f"Début de l'analyse avec Ollama, texte à analyser: {len(text)} caractères")
@@ -433,33 +666,19 @@ RÉPONDS UNIQUEMENT AVEC LE JSON, SANS COMMENTAIRES NI EXPLICATIONS."""
         retries = 0
         while retries < self.max_retries:
             try:
-                logger.info(f"Tentative {retries + 1}/{self.max_retries} d'analyse avec Ollama")
+                logger.info("Tentative %d/%d d'analyse avec Ollama", retries + 1, self.max_retries)
                 
-                async with httpx.AsyncClient(timeout=self.timeout) as client:
-                    request_data = {
-                        "model": self.model,
-                        "prompt": prompt,
-                        "stream": False,
-                        "options": {
-                            "temperature": 0.05,  # Très faible pour éviter les hallucinations
-                            "top_p": 0.9,
-                            "num_predict": 3000,
-                            "stop": ["```", "---", "RÉPONDS", "FORMAT"]  # Arrêter à ces tokens
-                        }
-                    }
+                async with span("analyze_with_ollama", attempt=retries + 1, model=self.model), \
+                        httpx.AsyncClient(timeout=self.timeout) as client:
+                    request_data = self.structured_request(prompt, self.model, retries)
                     
-                    response = await client.post(
-                        f"{self.ollama_url}/api/generate",
-                        json=request_data
-                    )
-                    response.raise_for_status()
-                    result = response.json()
+                    result = await self.generate(client, request_data, "structured")
                     
                     logger.info("Réponse reçue d'Ollama")
                     
                     try:
                         json_str = result["response"]
-                        logger.info(f"Réponse brute d'Ollama: {json_str[:200]}...")
+                        logger.info("Réponse brute d'Ollama: %.200s...", json_str)
                         
                         # Extraction et parsing du JSON
                         clean_json = self.extract_json_from_text(json_str)
@@ -472,21 +691,23 @@ RÉPONDS UNIQUEMENT AVEC LE JSON, SANS COMMENTAIRES NI EXPLICATIONS."""
                         if session_id and output_path:
                             await self.save_model_response(session_id, prompt, json_str, validated_data, output_path)
                         
-                        logger.info(f"Données extraites et validées: {len(validated_data)} champs")
+                        logger.info("Données extraites et validées: %d champs", len(validated_data))
                         return validated_data
                         
                     except Exception as e:
-                        logger.error(f"Erreur lors du parsing: {str(e)}")
+                        logger.error("Erreur lors du parsing: %s", e)
                         
                         # Sauvegarder même en cas d'erreur si session_id et output_path sont fournis
                         if session_id and output_path:
-                            await self.save_model_response(session_id, prompt, json_str, {"error": str(e)}, output_path)
+                            await self.save_model_response(session_id, prompt, json_str, {"error": str(e)}, output_path, "error")
                         
                         # Si c'est la dernière tentative, essayer avec un prompt simplifié
                         if retries == self.max_retries - 1:
                             logger.info("Tentative avec un prompt simplifié...")
+                            metrics.OLLAMA_SIMPLE_PROMPT_FALLBACKS.inc()
                             return await self.analyze_with_simple_prompt(text, session_id, output_path)
                         
+                        metrics.OLLAMA_RETRIES.inc(reason="parse")
                         retries += 1
                         continue
                         
@@ -497,7 +718,8 @@ RÉPONDS UNIQUEMENT AVEC LE JSON, SANS COMMENTAIRES NI EXPLICATIONS."""
                     raise Exception(
                         "Service Ollama indisponible. Veuillez vérifier qu'Ollama est en cours d'exécution."
                     )
-                logger.warning(f"Échec de la connexion à Ollama, nouvelle tentative dans {self.retry_delay} secondes...")
+                metrics.OLLAMA_RETRIES.inc(reason="connect")
+                logger.warning("Échec de la connexion à Ollama, nouvelle tentative dans %s secondes...", self.retry_delay)
                 await asyncio.sleep(self.retry_delay)
             except httpx.TimeoutException:
                 logger.error("Timeout lors de l'appel à Ollama")
@@ -524,37 +746,34 @@ JSON en français:"""
 
         try:
             async with httpx.AsyncClient(timeout=self.timeout) as client:
-                response = await client.post(
-                    f"{self.ollama_url}/api/generate",
-                    json={
-                        "model": self.model,
-                        "prompt": simple_prompt,
-                        "stream": False,
-                        "options": {"temperature": 0.1}
-                    }
-                )
-                response.raise_for_status()
-                result = response.json()
+                result = await self.generate(client, {
+                    "model": self.model,
+                    "prompt": simple_prompt,
+                    "stream": False,
+                    "options": {"temperature": 0.1, **token_budget.options(self.model, simple_prompt, "simple")}
+                }, "simple")
                 
                 json_str = self.extract_json_from_text(result["response"])
                 parsed_json = json.loads(json_str)
                 
                 # Créer une structure complète avec les données disponibles
                 validated_data = self.create_fallback_structure(parsed_json)
+                self.segment_status = "fallback"
                 
                 # Sauvegarder la réponse du modèle si session_id et output_path sont fournis
                 if session_id and output_path:
-                    await self.save_model_response(session_id, simple_prompt, json_str, validated_data, output_path)
+                    await self.save_model_response(session_id, simple_prompt, json_str, validated_data, output_path, "fallback")
                 
                 return validated_data
                 
         except Exception as e:
             logger.error(f"Erreur avec le prompt simplifié: {str(e)}")
             fallback_data = self.create_fallback_structure({})
+            self.segment_status = "fallback_error"
             
             # Sauvegarder même en cas d'erreur si session_id et output_path sont fournis
             if session_id and output_path:
-                await self.save_model_response(session_id, simple_prompt, "Erreur lors de l'analyse", fallback_data, output_path)
+                await self.save_model_response(session_id, simple_prompt, "Erreur lors de l'analyse", fallback_data, output_path, "fallback_error")
             
             return fallback_data
 
@@ -586,6 +805,7 @@ JSON en français:"""
             "additional_info": partial_data.get("additional_info", "")
         }
 
+    @traced()
     def split_text(self, text: str, max_length: int = 4000) -> list:
         """Découpe le texte en segments avec chevauchement"""
         if len(text) <= max_length:
@@ -616,6 +836,7 @@ JSON en français:"""
         
         return segments
 
+    @traced()
     def merge_results(self, results: list) -> dict:
         """Fusionne les résultats JSON extraits de chaque segment"""
         if not results:
@@ -641,8 +862,8 @@ JSON en français:"""
                 
                 # Si les deux valeurs sont des listes
                 elif isinstance(value, list) and isinstance(current_value, list):
-                    # Fusionner les listes en évitant les doublons
-                    merged[key] = list(set(current_value + value))
+                    # Fusionner les listes en évitant les doublons (ordre d'apparition conservé)
+                    merged[key] = list(dict.fromkeys(current_value + value))
                 
                 # Si les deux valeurs sont des chaînes
                 elif isinstance(value, str) and isinstance(current_value, str):
@@ -652,42 +873,179 @@ JSON en français:"""
         
         return merged
 
-    async def analyze_pdf(self, pdf_path: Path, session_id: str = None, output_path: Path = None) -> Dict[str, Any]:
-        """Analyse complète d'un fichier PDF"""
-        logger.info(f"=== DÉBUT ANALYSE PDF: {pdf_path} ===")
+    async def load_checkpoints(self, key: str, segment_count: int) -> Dict[int, Dict[str, Any]]:
+        """Résultats des segments déjà analysés pour ce document"""
+        try:
+            results = await asyncio.to_thread(checkpoint_store.load, key, segment_count)
+        except Exception as e:
+            logger.warning(f"Impossible de lire les points de reprise: {e}")
+            return {}
+        if results:
+            metrics.CHECKPOINT_SEGMENTS_REUSED.inc(len(results))
+            logger.info(f"Reprise de l'analyse: {len(results)}/{segment_count} segment(s) déjà analysé(s)")
+        return results
+
+    async def save_checkpoint(self, key: str, index: int, segment_count: int, result: Dict[str, Any], session_id: str = None) -> None:
+        """Enregistre le résultat d'un segment dès qu'il est obtenu"""
+        try:
+            await asyncio.to_thread(checkpoint_store.save, key, index, segment_count, result, session_id)
+        except Exception as e:
+            logger.warning(f"Impossible d'enregistrer le point de reprise du segment {index+1}: {e}")
+
+    async def clear_checkpoints(self, key: str) -> None:
+        """Supprime les points de reprise d'un document dont l'analyse est terminée"""
+        try:
+            await asyncio.to_thread(checkpoint_store.delete, key)
+        except Exception as e:
+            logger.warning(f"Impossible de supprimer les points de reprise: {e}")
+
+    async def reuse_near_duplicate(self, text: str, session_id: str = None, output_path: Path = None,
+                                   client_id: str = "anonymous") -> Optional[Dict[str, Any]]:
+        """Données du document déjà analysé le plus proche, champs touchés par les différences redemandés
+
+        Retourne None (analyse complète) sans document assez similaire, si les
+        différences ajoutent du contenu qu'aucun champ ne couvre, ou si elles
+        touchent plus de NEAR_DUPLICATE_MAX_REFRESH des champs.
+        """
+        try:
+            signature = await asyncio.to_thread(minhash, text)
+            match = await asyncio.to_thread(near_duplicate_index.nearest, text, signature)
+        except Exception as e:
+            logger.warning(f"Recherche de quasi-doublon impossible: {e}")
+            return None
+        if match is not None:
+            metrics.NEAR_DUPLICATE_SCORE.observe(match.score)
+        if match is None or match.score < settings.NEAR_DUPLICATE_THRESHOLD:
+            metrics.NEAR_DUPLICATE_LOOKUPS.inc(result="miss")
+            return None
+        
+        fields = await asyncio.to_thread(fields_to_refresh, match.text, text, match.product_data)
+        if fields is None:
+            logger.info(f"Quasi-doublon de la session {match.session_id} (similarité {match.score:.2f}) "
+                        f"avec du contenu ajouté hors des champs connus, analyse complète")
+            metrics.NEAR_DUPLICATE_LOOKUPS.inc(result="full")
+            return None
+        total = len(field_values(match.product_data))
+        logger.info(f"Quasi-doublon de la session {match.session_id} (similarité {match.score:.2f}), "
+                    f"{len(fields)}/{total} champ(s) à redemander")
+        if len(fields) > total * settings.NEAR_DUPLICATE_MAX_REFRESH:
+            metrics.NEAR_DUPLICATE_LOOKUPS.inc(result="full")
+            return None
         
+        data = match.product_data
+        if fields:
+            try:
+                refreshed = await self.refresh_fields(text, fields, session_id, output_path, client_id)
+            except QueueFullError:
+                raise
+            except Exception as e:
+                logger.warning(f"Mise à jour du quasi-doublon impossible, analyse complète: {e}")
+                metrics.NEAR_DUPLICATE_LOOKUPS.inc(result="full")
+                return None
+            data = apply_refresh(data, refreshed, fields)
+        
+        metrics.NEAR_DUPLICATE_LOOKUPS.inc(result="refreshed" if fields else "reused")
+        metrics.NEAR_DUPLICATE_REFRESHED_FIELDS.observe(len(fields))
+        self.near_duplicate = {"session_id": match.session_id, "score": round(match.score, 3), "refreshed_fields": fields}
+        await self.index_document(text, data, session_id, signature)
+        return data
+
+    async def refresh_fields(self, text: str, fields: List[str], session_id: str = None, output_path: Path = None,
+                             client_id: str = "anonymous") -> Dict[str, Any]:
+        """Un seul appel au modèle principal, limité aux champs donnés"""
+        prompt = self.create_fields_prompt(text, fields)
+        job = llm_scheduler.admit(client_id, self.page_count, 1)
         try:
-            # Vérification de la disponibilité d'Ollama
             if not await self.wait_for_ollama():
                 raise Exception("Ollama n'est pas disponible")
-            
-            # Extraction du texte
-            text = self.extract_text_from_pdf(pdf_path)
-            
-            # Détection du type de produit
-            product_type = self.detect_product_type(text)
-            
-            # Si le texte est court, analyser directement
-            if len(text) <= 4000:
-                result = await self.analyze_with_ollama(text, session_id, output_path)
-            else:
-                # Découpage en segments
-                segments = self.split_text(text, 4000)
-                logger.info(f"Texte découpé en {len(segments)} segments")
-                
-                # Analyse de chaque segment
-                results = []
-                for idx, segment in enumerate(segments):
-                    logger.info(f"Analyse du segment {idx+1}/{len(segments)}")
-                    res = await self.analyze_with_ollama(segment, session_id, output_path)
-                    results.append(res)
-                
-                # Fusion des résultats
-                result = self.merge_results(results)
+            async with llm_scheduler.slot(job), span("refresh_fields", fields=len(fields)), \
+                    httpx.AsyncClient(timeout=self.timeout) as client:
+                result = await self.generate(client, self.structured_request(prompt, self.model, prompt_kind="fields"), "fields")
+        finally:
+            llm_scheduler.finish(job)
+        json_str = result["response"]
+        validated_data = self.validate_extracted_data(json.loads(self.extract_json_from_text(json_str)), text)
+        if session_id and output_path:
+            await self.save_model_response(session_id, prompt, json_str, validated_data, output_path, "partial")
+        return validated_data
+
+    async def index_document(self, text: str, product_data: Dict[str, Any], session_id: str = None,
+                             signature: Optional[List[int]] = None) -> None:
+        """Ajoute un document analysé à l'index des quasi-doublons (résultats trop incomplets exclus)"""
+        if self.field_coverage(product_data) < self.min_coverage:
+            return
+        try:
+            await asyncio.to_thread(near_duplicate_index.add, text, product_data, session_id, signature)
+        except Exception as e:
+            logger.warning(f"Impossible d'indexer le document pour les quasi-doublons: {e}")
+
+    async def analyze_pdf(self, pdf_path: Path, session_id: str = None, output_path: Path = None,
+                          client_id: str = "anonymous") -> Dict[str, Any]:
+        """Analyse complète d'un fichier PDF"""
+        logger.info(f"=== DÉBUT ANALYSE PDF: {pdf_path} ===")
+        
+        try:
+            # Refus anticipé si même un document d'un segment attendrait trop : ni extraction ni OCR
+            llm_scheduler.check(client_id)
+            # Extraction du texte (OCR éventuel dans le pool) hors de la boucle asyncio
+            text = await asyncio.to_thread(self.extract_text_from_pdf, pdf_path)
+            result = await self.analyze_text(text, session_id, output_path, client_id)
             
             logger.info("=== FIN ANALYSE PDF ===")
             return result
             
         except Exception as e:
             logger.error(f"Erreur lors de l'analyse: {e}")
-            raise
\ No newline at end of file
+            raise
+
+    async def analyze_text(self, text: str, session_id: str = None, output_path: Path = None,
+                           client_id: str = "anonymous") -> Dict[str, Any]:
+        """Analyse du texte déjà extrait d'un PDF (quasi-doublons, segments, reprise, fusion)"""
+        self.near_duplicate = None
+        if settings.NEAR_DUPLICATE_ENABLED:
+            reused = await self.reuse_near_duplicate(text, session_id, output_path, client_id)
+            if reused is not None:
+                return reused
+        
+        # Détection du type de produit
+        product_type = self.detect_product_type(text)
+        
+        # Découpage en segments (un seul si le texte est court)
+        segments = self.split_text(text, 4000)
+        if len(segments) > 1:
+            logger.info(f"Texte découpé en {len(segments)} segments")
+        metrics.SEGMENTS_PER_DOCUMENT.observe(len(segments))
+        
+        # Reprise : segments déjà analysés lors d'une soumission précédente du même document
+        key = document_key(text, len(segments), self.model, self.small_model)
+        results = await self.load_checkpoints(key, len(segments))
+        missing = [idx for idx in range(len(segments)) if idx not in results]
+        
+        if missing:
+            # Admission : refus immédiat si l'attente estimée est trop longue, avant d'attendre Ollama
+            job = llm_scheduler.admit(client_id, self.page_count, len(missing))
+            try:
+                if not await self.wait_for_ollama():
+                    raise Exception("Ollama n'est pas disponible")
+                # Analyse de chaque segment, un créneau Ollama à la fois
+                for idx in missing:
+                    if len(segments) > 1:
+                        logger.info("Analyse du segment %d/%d", idx + 1, len(segments))
+                    async with llm_scheduler.slot(job):
+                        res = await self.analyze_with_cascade(segments[idx], session_id, output_path)
+                    results[idx] = res
+                    # Résultat de secours (prompt simplifié) : une nouvelle soumission redemande le modèle
+                    if self.segment_status == "ok":
+                        await self.save_checkpoint(key, idx, len(segments), res, session_id)
+                    else:
+                        logger.info("Segment %d non enregistré pour la reprise (%s)", idx + 1, self.segment_status)
+            finally:
+                llm_scheduler.finish(job)
+        
+        # Fusion des résultats
+        merged = self.merge_results([results[idx] for idx in range(len(segments))])
+        # Analyse terminée : une nouvelle soumission du document est analysée à nouveau
+        await self.clear_checkpoints(key)
+        if settings.NEAR_DUPLICATE_ENABLED:
+            await self.index_document(text, merged, session_id)
+        return merged
@@ -1,100 +1,256 @@
 import aiofiles
+import asyncio
 import logging
+import tempfile
+import threading
+import time
+from itertools import islice
 from pathlib import Path
-from typing import Dict, Any
-from weasyprint import HTML, CSS
+from typing import Dict, Any, Iterable, Iterator, List, Optional, TYPE_CHECKING
 from jinja2 import Environment, FileSystemLoader, select_autoescape
 
+from app.config import settings
+from app.services.asset_fetcher import asset_fetcher, STATIC_DIR
+from app.services.tracing import span
+
+if TYPE_CHECKING:
+    from weasyprint import CSS, Document
+
 logger = logging.getLogger(__name__)
 
+PRINT_CSS_PATH = STATIC_DIR / "css" / "product_sheet_print.css"
+PRINT_TEMPLATE = "product_sheet_print.html"
+COMBINED_TEMPLATE = "product_sheets_combined_print.html"
+
+# CSS pour l'impression du template complet (product_sheet.html)
+LEGACY_PRINT_CSS = """
+@page {
+    size: A4;
+    margin: 2cm;
+}
+body {
+    font-family: Arial, sans-serif;
+    line-height: 1.6;
+    color: #333;
+}
+.header {
+    text-align: center;
+    margin-bottom: 2em;
+    border-bottom: 2px solid #007bff;
+    padding-bottom: 1em;
+}
+.product-info {
+    display: grid;
+    grid-template-columns: 1fr 1fr;
+    gap: 2em;
+    margin-bottom: 2em;
+}
+.specs-grid {
+    display: grid;
+    grid-template-columns: 1fr 1fr;
+    gap: 1em;
+    margin: 1em 0;
+}
+.feature-list {
+    list-style: none;
+    padding: 0;
+}
+.feature-list li {
+    padding: 0.5em 0;
+    border-bottom: 1px solid #eee;
+}
+.certification-badge {
+    display: inline-block;
+    background: #28a745;
+    color: white;
+    padding: 0.3em 0.8em;
+    border-radius: 15px;
+    margin: 0.2em;
+    font-size: 0.9em;
+}
+"""
+
+def batched(items: Iterable[Any], size: int) -> Iterator[List[Any]]:
+    iterator = iter(items)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+
 class PDFGenerator:
-    def __init__(self):
+    # Feuilles de style analysées une seule fois par processus
+    _stylesheets: Dict[str, "CSS"] = {}
+    _stylesheets_lock = threading.Lock()
+
+    def __init__(self, template_name: Optional[str] = None):
         # Configuration de Jinja2
         template_dir = Path(__file__).parent.parent / "templates"
         self.env = Environment(
             loader=FileSystemLoader(str(template_dir)),
             autoescape=select_autoescape(['html', 'xml'])
         )
-        
+        self.template_name = template_name or settings.PDF_TEMPLATE
+
+    def get_stylesheet(self, template_name: Optional[str] = None) -> "CSS":
+        """Retourne la feuille de style d'impression du template (mise en cache)"""
+        # WeasyPrint (pango, cairo, fontconfig) n'est chargé qu'au premier rendu PDF
+        from weasyprint import CSS
+        template_name = template_name or self.template_name
+        with self._stylesheets_lock:
+            css_doc = self._stylesheets.get(template_name)
+            if css_doc is None:
+                if template_name == "product_sheet.html":
+                    css_doc = CSS(string=LEGACY_PRINT_CSS, url_fetcher=asset_fetcher)
+                else:
+                    css_doc = CSS(filename=str(PRINT_CSS_PATH), url_fetcher=asset_fetcher)
+                self._stylesheets[template_name] = css_doc
+            return css_doc
+
+    def _layout(self, html_content: str) -> "Document":
+        """Mise en page d'un document avec la feuille de style d'impression"""
+        from weasyprint import HTML
+        html_doc = HTML(string=html_content, base_url=STATIC_DIR.as_uri() + "/", url_fetcher=asset_fetcher)
+        return html_doc.render(stylesheets=[self.get_stylesheet(PRINT_TEMPLATE)])
+
     async def generate_product_pdf(
-        self, 
-        product_data: Dict[str, Any], 
-        output_path: Path, 
-        session_id: str
+        self,
+        product_data: Dict[str, Any],
+        output_path: Path,
+        session_id: str,
+        filename: Optional[str] = None
     ) -> Path:
-        """Génère une fiche produit PDF"""
+        """Génère une fiche produit PDF (`filename` : nom du fichier, fiche_produit_<session>.pdf par défaut)"""
         try:
             logger.info(f"Génération de la fiche produit PDF pour {product_data.get('product_name', 'Produit')}")
-            
+
             # Rendu du template HTML
-            template = self.env.get_template("product_sheet.html")
+            template = self.env.get_template(self.template_name)
             html_content = template.render(
                 product=product_data,
                 session_id=session_id
             )
-            
-            # Génération du PDF avec WeasyPrint
-            html_doc = HTML(string=html_content)
-            
-            # CSS pour l'impression
-            css_content = """
-            @page {
-                size: A4;
-                margin: 2cm;
-            }
-            body {
-                font-family: Arial, sans-serif;
-                line-height: 1.6;
-                color: #333;
-            }
-            .header {
-                text-align: center;
-                margin-bottom: 2em;
-                border-bottom: 2px solid #007bff;
-                padding-bottom: 1em;
-            }
-            .product-info {
-                display: grid;
-                grid-template-columns: 1fr 1fr;
-                gap: 2em;
-                margin-bottom: 2em;
-            }
-            .specs-grid {
-                display: grid;
-                grid-template-columns: 1fr 1fr;
-                gap: 1em;
-                margin: 1em 0;
-            }
-            .feature-list {
-                list-style: none;
-                padding: 0;
-            }
-            .feature-list li {
-                padding: 0.5em 0;
-                border-bottom: 1px solid #eee;
-            }
-            .certification-badge {
-                display: inline-block;
-                background: #28a745;
-                color: white;
-                padding: 0.3em 0.8em;
-                border-radius: 15px;
-                margin: 0.2em;
-                font-size: 0.9em;
-            }
-            """
-            
-            css_doc = CSS(string=css_content)
-            
+
+            # Génération du PDF avec WeasyPrint, ressources servies localement
+            from weasyprint import HTML
+            html_doc = HTML(
+                string=html_content,
+                base_url=STATIC_DIR.as_uri() + "/",
+                url_fetcher=asset_fetcher
+            )
+
             # Génération du PDF
-            pdf_filename = f"fiche_produit_{session_id}.pdf"
+            pdf_filename = filename or f"fiche_produit_{session_id}.pdf"
             pdf_path = output_path / pdf_filename
-            
-            html_doc.write_pdf(pdf_path, stylesheets=[css_doc])
-            
+
+            # Mise en page dans un thread : la boucle reste disponible pour les autres fiches et requêtes
+            await asyncio.to_thread(html_doc.write_pdf, pdf_path, stylesheets=[self.get_stylesheet()])
+
             logger.info(f"Fiche produit PDF générée: {pdf_path}")
             return pdf_path
-            
+
         except Exception as e:
             logger.error(f"Erreur lors de la génération PDF: {str(e)}", exc_info=True)
-            raise Exception(f"Erreur lors de la génération PDF: {str(e)}") 
\ No newline at end of file
+            raise Exception(f"Erreur lors de la génération PDF: {str(e)}")
+
+    def render_combined_pdf(
+        self,
+        products: Iterable[Dict[str, Any]],
+        pdf_path: Path,
+        title: str = "Catalogue produits",
+        chunk_size: Optional[int] = None
+    ) -> Dict[str, Any]:
+        """Rend plusieurs fiches dans un seul PDF avec sommaire et signets (bloquant)
+
+        Les fiches sont mises en page par lots de `chunk_size` : une passe
+        WeasyPrint par lot, avec feuille de style et polices partagées. Chaque
+        lot est écrit dans un fichier temporaire puis libéré, si bien que la
+        mémoire de mise en page ne dépend pas du nombre de produits. Le
+        sommaire est rendu une fois les numéros de page connus, puis les lots
+        sont recopiés un par un derrière lui dans le fichier final
+        (PdfConcatenator) : la concaténation ne garde en mémoire qu'un lot et
+        la position de chaque objet écrit.
+        """
+        from app.services.pdf_merge import PdfConcatenator
+
+        start_time = time.perf_counter()
+        chunk_size = chunk_size or settings.EXPORT_CHUNK_SIZE
+        template = self.env.get_template(COMBINED_TEMPLATE)
+        entries: List[Dict[str, Any]] = []
+        parts: List[Path] = []
+        sheet_pages = 0
+
+        with tempfile.TemporaryDirectory(dir=pdf_path.parent, prefix=".combined_") as tmp_dir:
+            for chunk_number, chunk in enumerate(batched(products, chunk_size)):
+                start = len(entries) + 1
+                with span("render_chunk", chunk=chunk_number + 1, products=len(chunk)):
+                    document = self._layout(template.render(products=chunk, start=start, toc=None, title=title))
+                    # Première page de chaque fiche, repérée par son ancre product-N
+                    first_pages: Dict[int, int] = {}
+                    for page_number, page in enumerate(document.pages):
+                        for anchor in page.anchors:
+                            if anchor.startswith("product-"):
+                                first_pages.setdefault(int(anchor[len("product-"):]), page_number)
+                    for offset, product in enumerate(chunk):
+                        index = start + offset
+                        entries.append({
+                            "index": index,
+                            "name": product.get("product_name") or f"Produit {index}",
+                            "brand": product.get("brand") or "",
+                            "model_number": product.get("model_number") or "",
+                            "sheet_page": sheet_pages + first_pages.get(index, 0),
+                        })
+                    part = Path(tmp_dir) / f"part_{chunk_number:05d}.pdf"
+                    document.write_pdf(part)
+                    parts.append(part)
+                    sheet_pages += len(document.pages)
+                    del document
+
+            if not entries:
+                raise ValueError("Aucune fiche à exporter")
+
+            # Le sommaire précède les fiches : ses numéros dépendent de sa propre longueur
+            with span("render_toc", products=len(entries)):
+                toc_pages = 0
+                for _ in range(3):
+                    for entry in entries:
+                        entry["page"] = toc_pages + entry["sheet_page"] + 1
+                    toc = self._layout(template.render(toc=entries, products=None, title=title))
+                    if len(toc.pages) == toc_pages:
+                        break
+                    toc_pages = len(toc.pages)
+                toc_path = Path(tmp_dir) / "toc.pdf"
+                toc.write_pdf(toc_path)
+                del toc
+
+            with span("merge_pdf", parts=len(parts) + 1):
+                with open(pdf_path, "wb") as f:
+                    merger = PdfConcatenator(f)
+                    for part in [toc_path] + parts:
+                        merger.append(part)
+                        part.unlink()
+                    merger.finish([("Sommaire", 0)] + [(entry["name"], entry["page"] - 1) for entry in entries],
+                                  title)
+
+        logger.info(f"Export PDF groupé: {len(entries)} fiche(s), {toc_pages + sheet_pages} pages, "
+                    f"{len(parts)} lot(s) en {time.perf_counter() - start_time:.1f}s")
+        return {
+            "path": pdf_path,
+            "products": len(entries),
+            "pages": toc_pages + sheet_pages,
+            "toc_pages": toc_pages,
+            "chunks": len(parts),
+            "toc": [{key: entry[key] for key in ("index", "name", "brand", "model_number", "page")} for entry in entries],
+        }
+
+    async def generate_combined_pdf(
+        self,
+        products: Iterable[Dict[str, Any]],
+        output_path: Path,
+        filename: str,
+        title: str = "Catalogue produits"
+    ) -> Dict[str, Any]:
+        """Export groupé de plusieurs fiches (voir render_combined_pdf), hors de la boucle"""
+        try:
+            return await asyncio.to_thread(self.render_combined_pdf, products, output_path / filename, title)
+        except Exception as e:
+            logger.error(f"Erreur lors de l'export PDF groupé: {str(e)}", exc_info=True)
+            raise Exception(f"Erreur lors de l'export PDF groupé: {str(e)}")
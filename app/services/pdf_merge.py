@@ -0,0 +1,151 @@
+import gc
+from array import array
+from pathlib import Path
+from typing import BinaryIO, Dict, List, Sequence, Tuple
+
+from PyPDF2 import PdfReader
+from PyPDF2.generic import (ArrayObject, DecodedStreamObject, DictionaryObject, EncodedStreamObject,
+                            IndirectObject, NameObject, NumberObject, StreamObject, create_string_object)
+
+PDF_HEADER = b"%PDF-1.7\n%\xe2\xe3\xcf\xd3\n"
+CATALOG = 1
+PAGES = 2
+CHUNK = 1024  # Entrées de /Kids et de la table xref écrites par appel
+
+
+class PdfConcatenator:
+    """Concaténation de PDF écrite au fil de l'eau, avec signets
+
+    PdfWriter garde toutes les pages et les PdfReader de chaque partie
+    jusqu'à write() : la mémoire croît avec la taille de l'export. Ici,
+    chaque partie est lue puis recopiée objet par objet dans le fichier de
+    sortie (numéros d'objets renumérotés) et libérée avant la suivante. Ne
+    restent en mémoire que la position de chaque objet écrit et la liste
+    des pages (huit octets chacune), écrites en fin de fichier avec l'arbre des pages, les
+    signets et la table xref.
+    """
+
+    def __init__(self, stream: BinaryIO):
+        self.stream = stream
+        # Huit octets par objet écrit et par page : seule mémoire qui croît avec l'export
+        self._offsets = array("q", [0, 0])  # Catalogue et arbre des pages, écrits par finish()
+        self._kids = array("q")
+        stream.write(PDF_HEADER)
+
+    @property
+    def pages(self) -> int:
+        return len(self._kids)
+
+    def _reserve(self) -> int:
+        self._offsets.append(0)
+        return len(self._offsets)
+
+    def _write(self, number: int, obj) -> None:
+        self._offsets[number - 1] = self.stream.tell()
+        self.stream.write(b"%d 0 obj\n" % number)
+        obj.write_to_stream(self.stream, None)
+        self.stream.write(b"\nendobj\n")
+
+    def append(self, path: Path) -> int:
+        """Ajoute les pages d'un PDF ; retourne le nombre de pages ajoutées"""
+        reader = PdfReader(str(path))
+        if reader.is_encrypted:
+            raise ValueError(f"PDF chiffré non concaténable: {path.name}")
+        root = reader.trailer.raw_get("/Root")
+        # Les références au catalogue et à l'arbre des pages de la partie désignent ceux de la sortie
+        mapping: Dict[Tuple[int, int], int] = {(root.idnum, root.generation): CATALOG}
+        pages_ref = root.get_object().raw_get("/Pages")
+        mapping[(pages_ref.idnum, pages_ref.generation)] = PAGES
+        pages = reader.pages  # Attributs hérités (ressources, MediaBox) recopiés dans chaque page
+        page_numbers = []
+        for page in pages:
+            ref = page.indirect_reference
+            mapping[(ref.idnum, ref.generation)] = number = self._reserve()
+            page_numbers.append(number)
+
+        pending: List[IndirectObject] = []
+
+        def remap(obj):
+            if isinstance(obj, IndirectObject):
+                key = (obj.idnum, obj.generation)
+                if key not in mapping:
+                    mapping[key] = self._reserve()
+                    pending.append(obj)
+                return IndirectObject(mapping[key], 0, None)
+            if isinstance(obj, StreamObject):
+                copy = DecodedStreamObject() if isinstance(obj, DecodedStreamObject) else EncodedStreamObject()
+                for key, value in obj.items():
+                    if key != "/Length":  # Recalculée à l'écriture
+                        copy[key] = remap(value)
+                copy._data = obj._data
+                return copy
+            if isinstance(obj, DictionaryObject):
+                copy = DictionaryObject()
+                for key, value in obj.items():
+                    copy[key] = remap(value)
+                return copy
+            if isinstance(obj, ArrayObject):
+                return ArrayObject(remap(value) for value in obj)
+            return obj
+
+        for page, number in zip(pages, page_numbers):
+            copy = DictionaryObject()
+            for key, value in page.items():
+                if key != "/Parent":
+                    copy[key] = remap(value)
+            copy[NameObject("/Parent")] = IndirectObject(PAGES, 0, None)
+            self._write(number, copy)
+            while pending:
+                ref = pending.pop()
+                self._write(mapping[(ref.idnum, ref.generation)], remap(ref.get_object()))
+        self._kids.extend(page_numbers)
+        # Le lecteur et ses objets forment des cycles (IndirectObject.pdf) : libérés avant la partie suivante
+        del reader, pages, page
+        gc.collect()
+        return len(page_numbers)
+
+    def finish(self, outline: Sequence[Tuple[str, int]] = (), title: str = "") -> None:
+        """Écrit l'arbre des pages, les signets (titre, index de page), les métadonnées et la table xref"""
+        if not self._kids:
+            raise ValueError("Aucune page à écrire")
+        self._offsets[PAGES - 1] = self.stream.tell()
+        self.stream.write(b"%d 0 obj\n<< /Type /Pages /Count %d /Kids [" % (PAGES, len(self._kids)))
+        for start in range(0, len(self._kids), CHUNK):
+            self.stream.write(b"".join(b"%d 0 R " % kid for kid in self._kids[start:start + CHUNK]))
+        self.stream.write(b"] >>\nendobj\n")
+        catalog = DictionaryObject({
+            NameObject("/Type"): NameObject("/Catalog"),
+            NameObject("/Pages"): IndirectObject(PAGES, 0, None),
+        })
+        if outline:
+            outline_root = self._reserve()
+            items = [self._reserve() for _ in outline]
+            for position, ((label, page_index), number) in enumerate(zip(outline, items)):
+                item = DictionaryObject({
+                    NameObject("/Title"): create_string_object(label),
+                    NameObject("/Parent"): IndirectObject(outline_root, 0, None),
+                    NameObject("/Dest"): ArrayObject([IndirectObject(self._kids[page_index], 0, None),
+                                                      NameObject("/Fit")]),
+                })
+                if position:
+                    item[NameObject("/Prev")] = IndirectObject(items[position - 1], 0, None)
+                if position + 1 < len(items):
+                    item[NameObject("/Next")] = IndirectObject(items[position + 1], 0, None)
+                self._write(number, item)
+            self._write(outline_root, DictionaryObject({
+                NameObject("/Type"): NameObject("/Outlines"),
+                NameObject("/First"): IndirectObject(items[0], 0, None),
+                NameObject("/Last"): IndirectObject(items[-1], 0, None),
+                NameObject("/Count"): NumberObject(len(items)),
+            }))
+            catalog[NameObject("/Outlines")] = IndirectObject(outline_root, 0, None)
+        self._write(CATALOG, catalog)
+        info = self._reserve()
+        self._write(info, DictionaryObject({NameObject("/Title"): create_string_object(title)}))
+
+        xref_offset = self.stream.tell()
+        self.stream.write(b"xref\n0 %d\n0000000000 65535 f \n" % (len(self._offsets) + 1))
+        for start in range(0, len(self._offsets), CHUNK):
+            self.stream.write(b"".join(b"%010d 00000 n \n" % offset for offset in self._offsets[start:start + CHUNK]))
+        self.stream.write(b"trailer\n<< /Size %d /Root %d 0 R /Info %d 0 R >>\nstartxref\n%d\n%%%%EOF\n"
+                          % (len(self._offsets) + 1, CATALOG, info, xref_offset))
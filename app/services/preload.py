@@ -0,0 +1,47 @@
+import asyncio
+import importlib
+import logging
+import time
+from typing import Dict
+
+from app.services import metrics
+
+logger = logging.getLogger(__name__)
+
+# Bibliothèques importées au premier usage (extraction, rendu PDF)
+HEAVY_MODULES = ("PyPDF2", "weasyprint")
+
+# Délai après le démarrage, le temps que le serveur accepte les connexions
+PRELOAD_DELAY = 1.0
+
+
+def preload_modules() -> Dict[str, float]:
+    """Importe les bibliothèques lourdes et prépare la feuille de style PDF (bloquant)"""
+    timings = {}
+    for name in HEAVY_MODULES:
+        start = time.perf_counter()
+        try:
+            importlib.import_module(name)
+        except Exception as e:  # ex: pango/cairo absents, le rendu PDF échouera au premier usage
+            logger.warning(f"Préchargement de {name} impossible: {e}")
+            continue
+        timings[name] = time.perf_counter() - start
+        metrics.MODULE_LOAD_SECONDS.set(timings[name], module=name)
+
+    if "weasyprint" in timings:
+        # Analyse du CSS d'impression et découverte des polices
+        from app.services.pdf_generator import PDFGenerator
+        start = time.perf_counter()
+        try:
+            PDFGenerator().get_stylesheet()
+            timings["stylesheet"] = time.perf_counter() - start
+        except Exception as e:
+            logger.warning(f"Préchargement de la feuille de style PDF impossible: {e}")
+
+    logger.info("Préchargement terminé: " + ", ".join(f"{name} {seconds:.2f}s" for name, seconds in timings.items()))
+    return timings
+
+async def preload_in_background(delay: float = PRELOAD_DELAY) -> None:
+    """Préchargement dans un thread, une fois le serveur démarré"""
+    await asyncio.sleep(delay)
+    await asyncio.to_thread(preload_modules)
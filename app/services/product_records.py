@@ -0,0 +1,208 @@
+import json
+import logging
+import sqlite3
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Dict, Any, Iterable, Iterator, List, Optional, Tuple
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS product_records (
+    session_id TEXT NOT NULL,
+    product_index INTEGER NOT NULL,
+    created_at TEXT NOT NULL,
+    product_name TEXT NOT NULL DEFAULT '',
+    brand TEXT NOT NULL DEFAULT '',
+    model_number TEXT NOT NULL DEFAULT '',
+    category TEXT NOT NULL DEFAULT '',
+    brand_key TEXT NOT NULL DEFAULT '',
+    category_key TEXT NOT NULL DEFAULT '',
+    data TEXT NOT NULL,
+    PRIMARY KEY (session_id, product_index)
+);
+CREATE INDEX IF NOT EXISTS idx_product_records_created ON product_records(created_at);
+CREATE INDEX IF NOT EXISTS idx_product_records_brand ON product_records(brand_key, created_at);
+CREATE INDEX IF NOT EXISTS idx_product_records_category ON product_records(category_key, created_at);
+"""
+
+# Lignes lues par aller-retour lors d'un export
+FETCH_SIZE = 500
+
+def filter_key(value: str) -> str:
+    """Forme comparée des filtres marque/catégorie : sans distinction de casse, accents compris (É = é)"""
+    return " ".join(value.split()).casefold()
+
+
+@dataclass
+class RecordFilter:
+    """Critères de sélection d'un export (bornes de date incluse / exclue)"""
+    since: Optional[datetime] = None
+    until: Optional[datetime] = None
+    brand: Optional[str] = None
+    category: Optional[str] = None
+
+    @classmethod
+    def from_query(cls, since: Optional[str] = None, until: Optional[str] = None,
+                   brand: Optional[str] = None, category: Optional[str] = None) -> "RecordFilter":
+        """Critères d'une requête : dates ISO 8601, `until` inclus lorsqu'il s'agit d'un jour (2024-05-31)
+
+        Lève ValueError pour une date invalide.
+        """
+        def parse(value: Optional[str], name: str) -> Optional[datetime]:
+            if not value:
+                return None
+            try:
+                parsed = datetime.fromisoformat(value)
+            except ValueError:
+                raise ValueError(f"Date invalide pour {name}: {value} (format attendu: AAAA-MM-JJ[THH:MM:SS])")
+            # created_at est en heure locale sans fuseau : une date avec décalage y est convertie
+            return parsed.astimezone().replace(tzinfo=None) if parsed.tzinfo is not None else parsed
+
+        end = parse(until, "until")
+        if end is not None and len(until) == 10:
+            end += timedelta(days=1)
+        return cls(since=parse(since, "since"), until=end, brand=brand, category=category)
+
+    def where(self) -> Tuple[str, List[Any]]:
+        clauses, params = [], []
+        if self.since is not None:
+            clauses.append("created_at >= ?")
+            params.append(self.since.isoformat())
+        if self.until is not None:
+            clauses.append("created_at < ?")
+            params.append(self.until.isoformat())
+        if self.brand:
+            clauses.append("brand_key = ?")
+            params.append(filter_key(self.brand))
+        if self.category:
+            clauses.append("category_key = ?")
+            params.append(filter_key(self.category))
+        return (" WHERE " + " AND ".join(clauses)) if clauses else "", params
+
+
+class ProductRecordStore:
+    """Données produit extraites, une ligne par produit, pour l'export catalogue
+
+    Chaque fiche persistée (upload simple ou produit d'un catalogue) y est
+    copiée ; marque, catégorie et date sont indexées pour filtrer les exports.
+    Les lectures parcourent un curseur par paquets de FETCH_SIZE lignes : un
+    export ne garde jamais toute la sélection en mémoire.
+    """
+
+    def __init__(self, db_path: Optional[Path] = None):
+        self.db_path = Path(db_path or Path(settings.DATA_DIR) / "products.db")
+        self._schema_ready = False
+
+    def connect(self, check_same_thread: bool = True) -> sqlite3.Connection:
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(self.db_path, timeout=30, check_same_thread=check_same_thread)
+        if not self._schema_ready:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(SCHEMA)
+            self._schema_ready = True
+        return conn
+
+    def save(self, session_id: str, product_data: Dict[str, Any], product: Optional[int] = None) -> None:
+        """Enregistre (ou remplace) le produit `product` d'une session, 0 pour un upload simple"""
+        self.save_many([(session_id, product_data, product)])
+
+    def save_many(self, items: Iterable[Tuple[str, Dict[str, Any], Optional[int]]]) -> None:
+        """Enregistre des (session_id, données produit, numéro de produit) dans une seule transaction"""
+        now = datetime.now().isoformat()
+        conn = self.connect()
+        try:
+            with conn:
+                conn.executemany(
+                    "INSERT OR REPLACE INTO product_records VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (self._row(session_id, product_data, product, now) for session_id, product_data, product in items)
+                )
+        finally:
+            conn.close()
+
+    def count(self, selection: RecordFilter) -> int:
+        where, params = selection.where()
+        conn = self.connect()
+        try:
+            return conn.execute(f"SELECT COUNT(*) FROM product_records{where}", params).fetchone()[0]
+        finally:
+            conn.close()
+
+    def nested_keys(self, field: str, selection: RecordFilter) -> List[str]:
+        """Clés rencontrées dans l'objet `field` (technical_specs, dimensions) des produits sélectionnés"""
+        where, params = selection.where()
+        conn = self.connect()
+        try:
+            rows = conn.execute(
+                f"SELECT DISTINCT j.key FROM (SELECT data FROM product_records{where}) AS r, "
+                f"json_each(r.data, ?) AS j WHERE json_type(r.data, ?) = 'object'",
+                params + [f"$.{field}", f"$.{field}"]
+            ).fetchall()
+        finally:
+            conn.close()
+        return [key for key, in rows]
+
+    def iter_records(self, selection: RecordFilter) -> Iterator[Dict[str, Any]]:
+        """Produits sélectionnés par date de création, lus au fil de l'eau
+
+        Le générateur peut être repris depuis un autre thread (StreamingResponse) :
+        la connexion n'est pas liée au thread qui l'a ouverte.
+        """
+        where, params = selection.where()
+        conn = self.connect(check_same_thread=False)
+        try:
+            cursor = conn.execute(
+                f"SELECT session_id, product_index, created_at, data FROM product_records{where} "
+                f"ORDER BY created_at, session_id, product_index",
+                params
+            )
+            while True:
+                rows = cursor.fetchmany(FETCH_SIZE)
+                if not rows:
+                    break
+                for session_id, product_index, created_at, data in rows:
+                    yield {
+                        "session_id": session_id,
+                        "product_index": product_index,
+                        "created_at": created_at,
+                        "data": json.loads(data),
+                    }
+        finally:
+            conn.close()
+
+    def delete_session(self, session_id: str) -> int:
+        conn = self.connect()
+        try:
+            with conn:
+                return conn.execute("DELETE FROM product_records WHERE session_id = ?", (session_id,)).rowcount
+        finally:
+            conn.close()
+
+    def delete_older_than(self, cutoff: datetime) -> int:
+        """Supprime les produits enregistrés avant cutoff"""
+        conn = self.connect()
+        try:
+            with conn:
+                return conn.execute(
+                    "DELETE FROM product_records WHERE created_at < ?", (cutoff.isoformat(),)
+                ).rowcount
+        finally:
+            conn.close()
+
+    @classmethod
+    def _row(cls, session_id: str, product_data: Dict[str, Any], product: Optional[int], created_at: str) -> tuple:
+        brand = cls._text(product_data.get("brand"))
+        category = cls._text(product_data.get("category"))
+        return (session_id, product or 0, created_at, cls._text(product_data.get("product_name")), brand,
+                cls._text(product_data.get("model_number")), category, filter_key(brand), filter_key(category),
+                json.dumps(product_data, ensure_ascii=False))
+
+    @staticmethod
+    def _text(value: Any) -> str:
+        return value.strip() if isinstance(value, str) else ""
+
+
+product_record_store = ProductRecordStore()
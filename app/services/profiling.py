@@ -0,0 +1,190 @@
+import logging
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from typing import Any, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Frames où un thread attend sans consommer de CPU (boucle asyncio, pool de threads, files)
+IDLE_FRAMES = {
+    ("selectors.py", "select"),
+    ("threading.py", "wait"),
+    ("queue.py", "get"),
+    ("thread.py", "_worker"),
+}
+
+Frame = Tuple[str, int, str]
+
+
+def _frame_label(frame: Frame) -> str:
+    filename, lineno, name = frame
+    return f"{name} ({os.path.basename(filename)}:{lineno})"
+
+
+class SamplingProfiler:
+    """Profileur CPU par échantillonnage, sans dépendance
+
+    Un thread relève toutes les `interval` secondes la pile des autres
+    threads (sys._current_frames). Les piles en attente (select, wait) sont
+    comptées à part. Les autres requêtes traitées en même temps par le worker
+    apparaissent aussi dans les échantillons.
+    """
+
+    def __init__(self, interval: float = 0.005, max_depth: int = 64):
+        self.interval = interval
+        self.max_depth = max_depth
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self.idle_samples = 0
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._started = 0.0
+        self._elapsed = 0.0
+
+    def _stack(self, frame) -> Tuple[Frame, ...]:
+        stack = []
+        while frame is not None and len(stack) < self.max_depth:
+            code = frame.f_code
+            stack.append((code.co_filename, frame.f_lineno, code.co_name))
+            frame = frame.f_back
+        stack.reverse()
+        return tuple(stack)
+
+    def _run(self) -> None:
+        own_id = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                stack = self._stack(frame)
+                if not stack:
+                    continue
+                filename, _, name = stack[-1]
+                if (os.path.basename(filename), name) in IDLE_FRAMES:
+                    self.idle_samples += 1
+                    continue
+                self.stacks[stack] += 1
+                self.samples += 1
+
+    def start(self) -> None:
+        self._started = time.perf_counter()
+        self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        self._elapsed = time.perf_counter() - self._started
+
+    def summary(self, top: int = 20) -> Dict[str, Any]:
+        """Fonctions les plus échantillonnées (propres et cumulées) et piles repliées"""
+        own: Counter = Counter()
+        cumulative: Counter = Counter()
+        for stack, count in self.stacks.items():
+            own[stack[-1]] += count
+            for frame in set(stack):
+                cumulative[frame] += count
+
+        def ranking(counter: Counter) -> List[Dict[str, Any]]:
+            return [
+                {"function": _frame_label(frame), "samples": count,
+                 "percent": round(100 * count / self.samples, 1) if self.samples else 0.0}
+                for frame, count in counter.most_common(top)
+            ]
+
+        return {
+            "interval_ms": self.interval * 1000,
+            "duration_s": round(self._elapsed, 3),
+            "samples": self.samples,
+            "idle_samples": self.idle_samples,
+            "top_self": ranking(own),
+            "top_cumulative": ranking(cumulative),
+            # Format « folded » (flamegraph.pl, speedscope)
+            "folded": [
+                f"{';'.join(f'{name} ({os.path.basename(filename)})' for filename, _, name in stack)} {count}"
+                for stack, count in self.stacks.most_common(top)
+            ],
+        }
+
+
+class AllocationTracker:
+    """Allocations mémoire d'une requête (tracemalloc), par ligne de code"""
+
+    def __init__(self, frames: int = 1):
+        self.frames = frames
+        self._started_tracing = False
+        self._before: Optional[tracemalloc.Snapshot] = None
+        self._after: Optional[tracemalloc.Snapshot] = None
+        self._peak = 0
+
+    def start(self) -> None:
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(self.frames)
+            self._started_tracing = True
+        tracemalloc.reset_peak()
+        self._before = tracemalloc.take_snapshot()
+
+    def stop(self) -> None:
+        self._after = tracemalloc.take_snapshot()
+        self._peak = tracemalloc.get_traced_memory()[1]
+        if self._started_tracing:
+            tracemalloc.stop()
+
+    def summary(self, top: int = 20) -> Dict[str, Any]:
+        filters = [
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+        ]
+        after = self._after.filter_traces(filters)
+        before = self._before.filter_traces(filters)
+        diff = after.compare_to(before, "lineno")
+        return {
+            "peak_bytes": self._peak,
+            "top_allocations": [
+                {
+                    "location": f"{os.path.basename(stat.traceback[0].filename)}:{stat.traceback[0].lineno}",
+                    "size_diff_bytes": stat.size_diff,
+                    "count_diff": stat.count_diff,
+                    "size_bytes": stat.size,
+                }
+                for stat in diff[:top]
+            ],
+        }
+
+
+class RequestProfiler:
+    """Profil CPU et allocations d'une requête (une seule à la fois par worker)"""
+
+    _lock = threading.Lock()
+
+    def __init__(self, top: int = 20, interval: float = 0.005):
+        self.top = top
+        self.cpu = SamplingProfiler(interval)
+        self.memory = AllocationTracker()
+        self._acquired = False
+
+    def start(self) -> bool:
+        """Démarre le profil ; False si une autre requête est déjà profilée"""
+        if not self._lock.acquire(blocking=False):
+            return False
+        self._acquired = True
+        self.memory.start()
+        self.cpu.start()
+        return True
+
+    def stop(self) -> Dict[str, Any]:
+        if not self._acquired:
+            return {}
+        try:
+            self.cpu.stop()
+            self.memory.stop()
+            return {"cpu": self.cpu.summary(self.top), "memory": self.memory.summary(self.top)}
+        finally:
+            self._acquired = False
+            self._lock.release()
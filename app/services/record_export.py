@@ -0,0 +1,243 @@
+import csv
+import io
+import json
+import zipfile
+from typing import Any, Dict, Iterable, Iterator, List
+from xml.sax.saxutils import escape
+
+from app.services.product_records import product_record_store, RecordFilter, ProductRecordStore
+
+# Colonnes de premier niveau, dans l'ordre du schéma demandé au modèle (pdf_analyzer)
+BASE_COLUMNS = [
+    "product_name", "brand", "model_number", "category", "description", "price_range", "weight",
+    "features", "certifications", "warranty", "installation_requirements", "maintenance",
+    "safety_features", "accessories_included", "compatibility", "environmental_conditions",
+    "standards_compliance", "additional_info",
+]
+# Objets aplatis en une colonne par clé (« technical_specs.voltage »)
+NESTED_COLUMNS = {
+    "technical_specs": [
+        "power_consumption", "voltage", "frequency", "capacity", "efficiency_class", "noise_level",
+        "speed", "pressure", "temperature_range", "material", "color", "connectivity", "display",
+        "memory", "processor", "battery", "operating_system",
+    ],
+    "dimensions": ["length", "width", "height", "depth", "diameter", "overall"],
+}
+RECORD_COLUMNS = ["session_id", "product_index", "created_at"]
+# Séparateur des listes (features, certifications) dans une cellule
+LIST_SEPARATOR = " | "
+
+EXPORT_FORMATS = {
+    "csv": ("text/csv", "csv"),
+    "ndjson": ("application/x-ndjson", "ndjson"),
+    "xlsx": ("application/vnd.openxmlformats-officedocument.spreadsheetml.sheet", "xlsx"),
+}
+
+# Lignes sérialisées avant de rendre un morceau de réponse
+ROWS_PER_CHUNK = 200
+
+
+def export_columns(selection: RecordFilter, store: ProductRecordStore = product_record_store) -> List[str]:
+    """En-tête des exports tabulaires : colonnes fixes puis clés imbriquées
+
+    Les clés du schéma viennent en premier, dans leur ordre ; celles qu'un
+    modèle aurait ajoutées suivent, par ordre alphabétique.
+    """
+    columns = RECORD_COLUMNS + BASE_COLUMNS
+    for field, known in NESTED_COLUMNS.items():
+        extra = sorted(set(store.nested_keys(field, selection)) - set(known))
+        columns += [f"{field}.{key}" for key in known + extra]
+    return columns
+
+def flatten_record(record: Dict[str, Any]) -> Dict[str, str]:
+    """Produit enregistré → cellules (texte) indexées par nom de colonne"""
+    data = record["data"]
+    row = {column: str(record[column]) for column in RECORD_COLUMNS}
+    for column in BASE_COLUMNS:
+        row[column] = _cell(data.get(column))
+    for field in NESTED_COLUMNS:
+        nested = data.get(field)
+        if isinstance(nested, dict):
+            for key, value in nested.items():
+                row[f"{field}.{key}"] = _cell(value)
+    return row
+
+def _cell(value: Any) -> str:
+    if value is None:
+        return ""
+    if isinstance(value, list):
+        return LIST_SEPARATOR.join(_cell(item) for item in value if item not in (None, ""))
+    if isinstance(value, dict):
+        return json.dumps(value, ensure_ascii=False)
+    return str(value)
+
+
+def iter_csv(records: Iterable[Dict[str, Any]], columns: List[str]) -> Iterator[bytes]:
+    """CSV UTF-8 avec BOM (ouverture directe dans Excel), par morceaux de ROWS_PER_CHUNK lignes"""
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=columns, extrasaction="ignore")
+    buffer.write("\ufeff")
+    writer.writeheader()
+    for count, record in enumerate(records, 1):
+        writer.writerow(flatten_record(record))
+        if count % ROWS_PER_CHUNK == 0:
+            yield _drain_text(buffer)
+    yield _drain_text(buffer)
+
+def iter_ndjson(records: Iterable[Dict[str, Any]]) -> Iterator[bytes]:
+    """Un objet JSON par ligne : métadonnées de l'enregistrement et données produit non aplaties"""
+    lines = []
+    for record in records:
+        lines.append(json.dumps(record, ensure_ascii=False))
+        if len(lines) >= ROWS_PER_CHUNK:
+            yield ("\n".join(lines) + "\n").encode("utf-8")
+            lines = []
+    if lines:
+        yield ("\n".join(lines) + "\n").encode("utf-8")
+
+def _drain_text(buffer: io.StringIO) -> bytes:
+    data = buffer.getvalue().encode("utf-8")
+    buffer.seek(0)
+    buffer.truncate()
+    return data
+
+
+class _ZipStream(io.RawIOBase):
+    """Sortie non positionnable de zipfile : les octets écrits sont récupérés au fur et à mesure"""
+
+    def __init__(self):
+        super().__init__()
+        self._chunks: List[bytes] = []
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+XLSX_CONTENT_TYPES = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+    '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+    '<Default Extension="xml" ContentType="application/xml"/>'
+    '<Override PartName="/xl/workbook.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+    '<Override PartName="/xl/worksheets/sheet1.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+    '<Override PartName="/xl/styles.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.styles+xml"/>'
+    '</Types>'
+)
+XLSX_ROOT_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" '
+    'Target="xl/workbook.xml"/>'
+    '</Relationships>'
+)
+XLSX_WORKBOOK = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+    'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+    '<sheets><sheet name="Produits" sheetId="1" r:id="rId1"/></sheets>'
+    '</workbook>'
+)
+XLSX_WORKBOOK_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" '
+    'Target="worksheets/sheet1.xml"/>'
+    '<Relationship Id="rId2" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/styles" '
+    'Target="styles.xml"/>'
+    '</Relationships>'
+)
+# Style 1 : en-tête en gras
+XLSX_STYLES = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<styleSheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+    '<fonts count="2"><font><sz val="11"/><name val="Calibri"/></font>'
+    '<font><b/><sz val="11"/><name val="Calibri"/></font></fonts>'
+    '<fills count="2"><fill><patternFill patternType="none"/></fill><fill><patternFill patternType="gray125"/></fill></fills>'
+    '<borders count="1"><border><left/><right/><top/><bottom/><diagonal/></border></borders>'
+    '<cellStyleXfs count="1"><xf numFmtId="0" fontId="0" fillId="0" borderId="0"/></cellStyleXfs>'
+    '<cellXfs count="2"><xf numFmtId="0" fontId="0" fillId="0" borderId="0" xfId="0"/>'
+    '<xf numFmtId="0" fontId="1" fillId="0" borderId="0" xfId="0" applyFont="1"/></cellXfs>'
+    '</styleSheet>'
+)
+XLSX_SHEET_START = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+    '<sheetViews><sheetView workbookViewId="0"><pane ySplit="1" topLeftCell="A2" activePane="bottomLeft" state="frozen"/>'
+    '</sheetView></sheetViews><sheetData>'
+)
+XLSX_SHEET_END = '</sheetData></worksheet>'
+# Caractères interdits en XML 1.0 (hors tabulation et retours à la ligne)
+XML_INVALID = dict.fromkeys(c for c in range(32) if c not in (9, 10, 13))
+# Limite d'Excel par cellule
+XLSX_MAX_CELL = 32767
+
+
+def iter_xlsx(records: Iterable[Dict[str, Any]], columns: List[str]) -> Iterator[bytes]:
+    """Classeur XLSX écrit en flux : une feuille en chaînes en ligne, sans table de chaînes partagées
+
+    Le zip est produit avec des descripteurs de données (sortie non
+    positionnable) ; la feuille est compressée au fil des lignes, la mémoire
+    ne dépend pas du nombre de produits.
+    """
+    stream = _ZipStream()
+    with zipfile.ZipFile(stream, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+        archive.writestr("[Content_Types].xml", XLSX_CONTENT_TYPES)
+        archive.writestr("_rels/.rels", XLSX_ROOT_RELS)
+        archive.writestr("xl/workbook.xml", XLSX_WORKBOOK)
+        archive.writestr("xl/_rels/workbook.xml.rels", XLSX_WORKBOOK_RELS)
+        archive.writestr("xl/styles.xml", XLSX_STYLES)
+        yield stream.drain()
+
+        with archive.open("xl/worksheets/sheet1.xml", "w", force_zip64=True) as sheet:
+            parts = [XLSX_SHEET_START, _xlsx_row(1, columns, style=1)]
+            for number, record in enumerate(records, 2):
+                row = flatten_record(record)
+                parts.append(_xlsx_row(number, [row.get(column, "") for column in columns]))
+                if len(parts) >= ROWS_PER_CHUNK:
+                    sheet.write("".join(parts).encode("utf-8"))
+                    parts = []
+                    yield stream.drain()
+            parts.append(XLSX_SHEET_END)
+            sheet.write("".join(parts).encode("utf-8"))
+    yield stream.drain()
+
+def _xlsx_row(number: int, values: List[str], style: int = 0) -> str:
+    style_attr = f' s="{style}"' if style else ""
+    cells = "".join(
+        f'<c r="{_column_letter(index)}{number}"{style_attr} t="inlineStr"><is><t xml:space="preserve">'
+        f'{escape(value.translate(XML_INVALID)[:XLSX_MAX_CELL])}</t></is></c>'
+        for index, value in enumerate(values) if value
+    )
+    return f'<row r="{number}">{cells}</row>'
+
+def _column_letter(index: int) -> str:
+    letters = ""
+    index += 1
+    while index:
+        index, remainder = divmod(index - 1, 26)
+        letters = chr(65 + remainder) + letters
+    return letters
+
+
+def iter_export(output_format: str, selection: RecordFilter,
+                store: ProductRecordStore = product_record_store) -> Iterator[bytes]:
+    """Contenu de l'export dans le format demandé (csv, xlsx ou ndjson), généré au fil de la lecture"""
+    records = store.iter_records(selection)
+    if output_format == "ndjson":
+        return iter_ndjson(records)
+    columns = export_columns(selection, store)
+    if output_format == "xlsx":
+        return iter_xlsx(records, columns)
+    return iter_csv(records, columns)
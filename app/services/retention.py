@@ -0,0 +1,376 @@
+import asyncio
+import logging
+import os
+import shutil
+import sqlite3
+import threading
+import time
+import uuid
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Any, List, Optional, Tuple
+
+from app.config import settings
+from app.services import metrics
+from app.services.model_response_store import model_response_store
+from app.services.output_files import output_file_index
+from app.services.checkpoints import checkpoint_store
+from app.services.jobs import job_store
+from app.services.product_records import product_record_store
+from app.services.ocr import ocr_cache
+from app.services.near_duplicates import near_duplicate_index
+from app.services.webhooks import webhook_outbox
+from app.services.file_lock import FileLock
+
+logger = logging.getLogger(__name__)
+
+SESSION_ID_LENGTH = 36  # uuid4 en texte
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions (
+    session_id TEXT PRIMARY KEY,
+    upload_path TEXT,
+    output_path TEXT,
+    bytes INTEGER NOT NULL,
+    created_at REAL NOT NULL,
+    last_access REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_sessions_last_access ON sessions(last_access);
+"""
+
+UPSERT_SQL = """
+INSERT INTO sessions VALUES (:session_id, :upload_path, :output_path, :bytes, :created_at, :last_access)
+ON CONFLICT(session_id) DO UPDATE SET
+    upload_path = excluded.upload_path,
+    output_path = excluded.output_path,
+    bytes = excluded.bytes,
+    last_access = excluded.last_access
+"""
+
+def _path_size(path: Path) -> int:
+    """Taille d'un fichier ou d'un dossier (récursif)"""
+    if path.is_file():
+        return path.stat().st_size
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                continue
+    return total
+
+def _is_session_id(name: str) -> bool:
+    """Identifiant de session attribué par le serveur (uuid4)"""
+    try:
+        return len(name) == SESSION_ID_LENGTH and str(uuid.UUID(name)) == name
+    except ValueError:
+        return False
+
+
+class RetentionManager:
+    """Rétention par âge et quota disque (LRU) des sessions
+
+    Une session regroupe le PDF uploadé, le dossier de sortie et les réponses
+    du modèle. L'index est tenu à jour à chaque upload et téléchargement dans
+    une base SQLite (WAL) de DATA_DIR partagée par tous les workers : les
+    dossiers ne sont parcourus qu'une fois, à la création de l'index, et un
+    seul worker à la fois applique les règles.
+    """
+
+    def __init__(self, db_path: Optional[Path] = None):
+        self.db_path = Path(db_path or Path(settings.DATA_DIR) / "retention.db")
+        self.upload_dir = Path(settings.UPLOAD_DIR)
+        self.output_dir = Path(settings.OUTPUT_DIR)
+        self.max_age = settings.RETENTION_MAX_AGE_HOURS * 3600
+        self.max_bytes = settings.RETENTION_MAX_BYTES
+        self.interval = settings.RETENTION_INTERVAL
+        self._lock = threading.Lock()
+        self._schema_ready = False
+        self._loaded = False
+        # Tenu par le worker qui applique la rétention, repris si celui-ci s'arrête
+        self._leader_lock = FileLock(self.db_path.with_name(self.db_path.name + ".leader"))
+        self._task: Optional[asyncio.Task] = None
+        self._stats = {"expired": 0, "evicted": 0, "freed_bytes": 0, "last_run": None}
+
+    def _connect(self) -> sqlite3.Connection:
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        if not self._schema_ready:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(SCHEMA)
+            self._schema_ready = True
+        return conn
+
+    def _usage(self, conn: sqlite3.Connection) -> Tuple[int, int]:
+        """Nombre de sessions et taille totale indexées"""
+        count, total = conn.execute("SELECT COUNT(*), COALESCE(SUM(bytes), 0) FROM sessions").fetchone()
+        return count, total
+
+    # --- Index ----------------------------------------------------------------
+
+    def load(self) -> None:
+        """Ouvre l'index persisté, ou le construit par un parcours initial
+
+        Le verrou garantit qu'un seul worker fait le parcours au démarrage.
+        """
+        with FileLock(self.db_path.with_name(self.db_path.name + ".lock")):
+            conn = self._connect()
+            try:
+                bootstrapped = conn.execute("SELECT value FROM meta WHERE key = 'bootstrapped'").fetchone()
+                if not bootstrapped:
+                    self._bootstrap(conn)
+                count, total = self._usage(conn)
+            finally:
+                conn.close()
+        self._loaded = True
+        metrics.RETENTION_BYTES.set(total)
+        logger.info(f"Index de rétention chargé: {count} session(s), {total} octets")
+
+    def _bootstrap(self, conn: sqlite3.Connection) -> None:
+        """Parcours unique des dossiers existants pour construire l'index"""
+        logger.info("Construction initiale de l'index de rétention")
+        sessions: Dict[str, Dict[str, Any]] = {}
+
+        def entry(session_id: str, mtime: float) -> Dict[str, Any]:
+            current = sessions.setdefault(session_id, {
+                "session_id": session_id, "upload_path": None, "output_path": None,
+                "bytes": 0, "created_at": mtime, "last_access": mtime,
+            })
+            current["created_at"] = min(current["created_at"], mtime)
+            current["last_access"] = max(current["last_access"], mtime)
+            return current
+
+        if self.upload_dir.exists():
+            for path in self.upload_dir.iterdir():
+                if path.is_file() and _is_session_id(path.name[:SESSION_ID_LENGTH]):
+                    current = entry(path.name[:SESSION_ID_LENGTH], path.stat().st_mtime)
+                    current["upload_path"] = str(path)
+                    current["bytes"] += path.stat().st_size
+        if self.output_dir.exists():
+            for path in self.output_dir.iterdir():
+                # Autres dossiers (ex: sorties de la ligne de commande) : hors rétention
+                if path.is_dir() and _is_session_id(path.name):
+                    current = entry(path.name, path.stat().st_mtime)
+                    current["output_path"] = str(path)
+                    current["bytes"] += _path_size(path)
+        for session_id, usage in model_response_store.session_usage().items():
+            timestamp = datetime.fromisoformat(usage["first_timestamp"]).timestamp()
+            entry(session_id, timestamp)["bytes"] += usage["bytes"]
+
+        with conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO sessions VALUES (:session_id, :upload_path, :output_path, :bytes, :created_at, :last_access)",
+                list(sessions.values())
+            )
+            conn.execute("INSERT OR REPLACE INTO meta VALUES ('bootstrapped', ?)", (datetime.now().isoformat(),))
+
+    def _ensure_loaded(self) -> None:
+        if not self._loaded:
+            self.load()
+
+    def register(self, session_id: str, upload_path: Optional[Path] = None, output_path: Optional[Path] = None) -> None:
+        """Ajoute (ou met à jour) une session dans l'index après traitement"""
+        self._ensure_loaded()
+        # Les dossiers de sortie personnalisés (hors OUTPUT_DIR) ne sont pas gérés
+        if output_path is not None and self.output_dir.resolve() not in Path(output_path).resolve().parents:
+            output_path = None
+        size = 0
+        for path in (upload_path, output_path):
+            if path is not None and Path(path).exists():
+                size += _path_size(Path(path))
+        # Réponses encore dans la file du thread d'écriture : comptées avec la session
+        model_response_store.flush()
+        size += model_response_store.session_usage(session_id).get(session_id, {}).get("bytes", 0)
+
+        now = time.time()
+        row = {
+            "session_id": session_id,
+            "upload_path": str(upload_path) if upload_path else None,
+            "output_path": str(output_path) if output_path else None,
+            "bytes": size,
+            "created_at": now,
+            "last_access": now,
+        }
+        conn = self._connect()
+        try:
+            with conn:
+                conn.execute(UPSERT_SQL, row)
+            _, total = self._usage(conn)
+        finally:
+            conn.close()
+        metrics.RETENTION_BYTES.set(total)
+
+    def add_bytes(self, session_id: str, size: int) -> None:
+        """Ajoute la taille d'un fichier généré après coup (rendu à la demande)"""
+        conn = self._connect()
+        try:
+            with conn:
+                conn.execute("UPDATE sessions SET bytes = bytes + ? WHERE session_id = ?", (size, session_id))
+            _, total = self._usage(conn)
+        finally:
+            conn.close()
+        metrics.RETENTION_BYTES.set(total)
+
+    def touch(self, session_id: str) -> None:
+        """Marque une session comme récemment utilisée (téléchargement)"""
+        conn = self._connect()
+        try:
+            with conn:
+                conn.execute("UPDATE sessions SET last_access = ? WHERE session_id = ?", (time.time(), session_id))
+        finally:
+            conn.close()
+
+    # --- Application des règles -------------------------------------------------
+
+    def _delete_session(self, entry: Dict[str, Any]) -> None:
+        if entry["upload_path"]:
+            try:
+                os.remove(entry["upload_path"])
+            except FileNotFoundError:
+                pass
+        if entry["output_path"]:
+            shutil.rmtree(entry["output_path"], ignore_errors=True)
+        model_response_store.delete_session(entry["session_id"])
+        job_store.delete_session(entry["session_id"])
+        product_record_store.delete_session(entry["session_id"])
+        near_duplicate_index.delete_session(entry["session_id"])
+        webhook_outbox.delete_session(entry["session_id"])
+        output_file_index.invalidate(entry["session_id"])
+
+    def _select_victims(self, conn: sqlite3.Connection, now: float) -> List[Tuple[Dict[str, Any], str]]:
+        """Sessions expirées puis les moins récemment utilisées au-delà du quota"""
+        victims = []
+        if self.max_age:
+            for row in conn.execute("SELECT * FROM sessions WHERE last_access < ?", (now - self.max_age,)):
+                victims.append((dict(row), "age"))
+        if self.max_bytes:
+            _, total = self._usage(conn)
+            total -= sum(entry["bytes"] for entry, _ in victims)
+            if total > self.max_bytes:
+                expired = {entry["session_id"] for entry, _ in victims}
+                for row in conn.execute("SELECT * FROM sessions ORDER BY last_access"):
+                    if total <= self.max_bytes:
+                        break
+                    if row["session_id"] in expired:
+                        continue
+                    victims.append((dict(row), "quota"))
+                    total -= row["bytes"]
+        return victims
+
+    def enforce(self, now: Optional[float] = None) -> Dict[str, int]:
+        """Supprime les sessions expirées puis les moins récemment utilisées au-delà du quota"""
+        self._ensure_loaded()
+        now = now or time.time()
+        conn = self._connect()
+        try:
+            # Sélection et retrait de l'index dans une même transaction : un autre
+            # worker ne peut pas ré-enregistrer une session entre les deux
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                victims = self._select_victims(conn, now)
+                conn.executemany("DELETE FROM sessions WHERE session_id = ?", [(e["session_id"],) for e, _ in victims])
+                conn.commit()
+            except BaseException:
+                conn.rollback()
+                raise
+            _, total = self._usage(conn)
+        finally:
+            conn.close()
+
+        result = {"expired": 0, "evicted": 0, "freed_bytes": 0}
+        for entry, reason in victims:
+            try:
+                self._delete_session(entry)
+            except Exception as e:
+                logger.warning(f"Impossible de supprimer la session {entry['session_id']}: {e}")
+            result["expired" if reason == "age" else "evicted"] += 1
+            result["freed_bytes"] += entry["bytes"]
+            metrics.RETENTION_EVICTIONS.inc(reason=reason)
+            metrics.RETENTION_FREED_BYTES.inc(entry["bytes"])
+        if victims:
+            logger.info(
+                f"Rétention: {result['expired']} session(s) expirée(s), {result['evicted']} évincée(s), "
+                f"{result['freed_bytes']} octets libérés"
+            )
+
+        # Réponses du modèle sans session indexée (ex: traitement hors ligne)
+        if self.max_age:
+            model_response_store.delete_older_than(datetime.fromtimestamp(now - self.max_age))
+            product_record_store.delete_older_than(datetime.fromtimestamp(now - self.max_age))
+            near_duplicate_index.delete_older_than(datetime.fromtimestamp(now - self.max_age))
+        # Points de reprise des analyses (durée propre, indépendante des sessions)
+        if settings.CHECKPOINT_TTL_HOURS:
+            checkpoint_store.delete_older_than(datetime.fromtimestamp(now - settings.CHECKPOINT_TTL_HOURS * 3600))
+        # Texte reconnu des pages scannées, conservé tant qu'il est réutilisé
+        if settings.OCR_CACHE_TTL_HOURS:
+            ocr_cache.delete_older_than(datetime.fromtimestamp(now - settings.OCR_CACHE_TTL_HOURS * 3600))
+        # États des traitements (statut, rejeu Idempotency-Key)
+        if settings.JOB_TTL_HOURS:
+            job_store.delete_older_than(now - settings.JOB_TTL_HOURS * 3600)
+        # Livraisons de webhooks terminées (celles en attente sont conservées)
+        if settings.WEBHOOK_TTL_HOURS:
+            webhook_outbox.delete_older_than(now - settings.WEBHOOK_TTL_HOURS * 3600)
+
+        metrics.RETENTION_BYTES.set(total)
+        with self._lock:
+            for key in ("expired", "evicted", "freed_bytes"):
+                self._stats[key] += result[key]
+            self._stats["last_run"] = datetime.fromtimestamp(now).isoformat()
+        return result
+
+    def stats(self) -> Dict[str, Any]:
+        """Statistiques exposées sur /health (compteurs du worker qui répond)"""
+        conn = self._connect()
+        try:
+            count, total = self._usage(conn)
+        finally:
+            conn.close()
+        with self._lock:
+            return {
+                "sessions": count,
+                "total_bytes": total,
+                "quota_bytes": self.max_bytes,
+                "max_age_hours": self.max_age // 3600,
+                "leader": self._leader_lock.locked,
+                "expired_total": self._stats["expired"],
+                "evicted_total": self._stats["evicted"],
+                "freed_bytes_total": self._stats["freed_bytes"],
+                "last_run": self._stats["last_run"],
+            }
+
+    # --- Tâche de fond ----------------------------------------------------------
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                # Un seul worker applique les règles ; les autres retentent à
+                # chaque intervalle et prennent le relais s'il s'arrête
+                if self._leader_lock.acquire(blocking=False):
+                    await asyncio.to_thread(self.enforce)
+            except Exception as e:
+                logger.error(f"Erreur lors de l'application de la rétention: {e}", exc_info=True)
+            await asyncio.sleep(self.interval)
+
+    def start(self) -> None:
+        """Démarre la tâche de rétention en arrière-plan"""
+        if self._task is None and (self.max_age or self.max_bytes):
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        self._leader_lock.release()
+
+
+retention_manager = RetentionManager()
@@ -0,0 +1,183 @@
+import asyncio
+import itertools
+import logging
+import math
+import time
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from typing import Dict, List, Tuple
+
+from app.config import settings
+from app.services import metrics
+from app.services.concurrency import AdaptiveLimiter, ollama_limiter
+
+logger = logging.getLogger(__name__)
+
+
+class QueueFullError(Exception):
+    """Attente estimée trop longue : la requête est refusée avant d'être mise en file"""
+
+    def __init__(self, estimated_wait: float, retry_after: int):
+        super().__init__(f"File d'attente du modèle saturée (attente estimée: {estimated_wait:.0f}s)")
+        self.estimated_wait = estimated_wait
+        self.retry_after = retry_after
+
+
+@dataclass
+class Job:
+    """Document admis et suivi de ses segments analysés"""
+    client_id: str
+    pages: int
+    segments: int
+    seq: int
+    completed: int = 0
+    running: int = 0
+
+
+class LLMScheduler:
+    """Admission et ordonnancement des appels au modèle
+
+    Chaque document admis est un job dont le coût est estimé à partir de son
+    nombre de segments (durée moyenne observée d'un segment) ; le nombre de
+    pages départage les jobs de même coût. Les créneaux libres vont au job au
+    coût restant le plus faible (shortest job first), pondéré par le nombre de
+    jobs actifs du même client (partage équitable) et diminué avec l'attente
+    pour éviter la famine des gros documents. Le nombre de créneaux suit la
+    limite du limiteur adaptatif des appels HTTP.
+    """
+
+    def __init__(self, limiter: AdaptiveLimiter, max_wait: float = 600, segment_seconds: float = 30,
+                 aging: float = 1.0, smoothing: float = 0.2):
+        self.limiter = limiter
+        self.max_wait = max_wait
+        self.segment_seconds = segment_seconds
+        self.aging = aging
+        self.smoothing = smoothing
+        self._jobs: Dict[int, Job] = {}
+        self._waiters: List[Tuple[Job, float, asyncio.Future]] = []
+        self._running = 0
+        self._seq = itertools.count()
+        # Créneaux supplémentaires attribués dès la hausse, sans attendre une libération
+        limiter.add_listener(self._dispatch)
+
+    @property
+    def concurrency(self) -> int:
+        return self.limiter.limit
+
+    # --- Admission --------------------------------------------------------------
+
+    def estimate(self, segments: int) -> float:
+        """Coût estimé d'un document en secondes de travail LLM"""
+        return max(1, segments) * self.segment_seconds
+
+    def remaining(self, job: Job) -> float:
+        """Coût estimé du travail restant d'un job"""
+        return max(0, job.segments - job.completed) * self.segment_seconds
+
+    def estimated_wait(self, cost: float) -> float:
+        """Attente estimée d'un nouveau job de coût donné
+
+        Les jobs plus courts passent avant lui (travail restant, segments en
+        cours compris), les plus longs ne le retardent que de leurs segments
+        en cours.
+        """
+        ahead = 0.0
+        for job in self._jobs.values():
+            remaining = self.remaining(job)
+            ahead += remaining if remaining <= cost else job.running * self.segment_seconds
+        return ahead / self.concurrency
+
+    def check(self, client_id: str, segments: int = 1) -> float:
+        """Attente estimée d'un document ; lève QueueFullError si elle dépasse max_wait
+
+        Avec segments=1 (coût minimal), permet de refuser une requête avant
+        l'extraction du texte, quand même le plus petit document attendrait
+        trop longtemps.
+        """
+        wait = self.estimated_wait(self.estimate(segments))
+        if self.max_wait and wait > self.max_wait:
+            metrics.SCHEDULER_REJECTIONS.inc()
+            retry_after = max(1, math.ceil(wait - self.max_wait))
+            logger.warning(f"Requête refusée pour {client_id}: attente estimée {wait:.0f}s > {self.max_wait}s")
+            raise QueueFullError(wait, retry_after)
+        return wait
+
+    def admit(self, client_id: str, pages: int, segments: int) -> Job:
+        """Enregistre un document, ou lève QueueFullError si l'attente serait trop longue"""
+        wait = self.check(client_id, segments)
+        job = Job(client_id=client_id, pages=pages, segments=segments, seq=next(self._seq))
+        self._jobs[job.seq] = job
+        metrics.SCHEDULER_ESTIMATED_WAIT.observe(wait)
+        logger.info(f"Job {job.seq} admis ({client_id}): {segments} segment(s), {pages} page(s), attente estimée {wait:.0f}s")
+        return job
+
+    def finish(self, job: Job) -> None:
+        """Retire un job terminé (ou abandonné)"""
+        self._jobs.pop(job.seq, None)
+
+    # --- Ordonnancement ---------------------------------------------------------
+
+    def _client_jobs(self, client_id: str) -> int:
+        return sum(1 for job in self._jobs.values() if job.client_id == client_id)
+
+    def _priority(self, job: Job, enqueued_at: float, now: float) -> Tuple[float, int, int]:
+        share = self._client_jobs(job.client_id)
+        score = self.remaining(job) * share - self.aging * (now - enqueued_at)
+        return score, job.pages, job.seq
+
+    def _dispatch(self) -> None:
+        now = time.monotonic()
+        while self._waiters and self._running < self.concurrency:
+            index = min(range(len(self._waiters)), key=lambda i: self._priority(self._waiters[i][0], self._waiters[i][1], now))
+            job, enqueued_at, future = self._waiters.pop(index)
+            if future.done():  # appelant annulé
+                continue
+            self._running += 1
+            job.running += 1
+            future.set_result(None)
+        metrics.SCHEDULER_QUEUED.set(len(self._waiters))
+
+    @asynccontextmanager
+    async def slot(self, job: Job):
+        """Réserve un créneau pour un appel au modèle (un segment du job)"""
+        enqueued_at = time.monotonic()
+        future = asyncio.get_running_loop().create_future()
+        self._waiters.append((job, enqueued_at, future))
+        self._dispatch()
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # Créneau attribué pendant l'annulation : on le rend
+                self._running -= 1
+                job.running -= 1
+                self._dispatch()
+            raise
+        metrics.SCHEDULER_QUEUE_WAIT.observe(time.monotonic() - enqueued_at)
+
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            elapsed = time.monotonic() - start
+            self.segment_seconds += self.smoothing * (elapsed - self.segment_seconds)
+            job.completed += 1
+            job.running -= 1
+            self._running -= 1
+            self._dispatch()
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            "jobs": len(self._jobs),
+            "queued": len(self._waiters),
+            "running": self._running,
+            "concurrency": self.concurrency,
+            "segment_seconds": round(self.segment_seconds, 2),
+        }
+
+
+llm_scheduler = LLMScheduler(
+    ollama_limiter,
+    max_wait=settings.SCHEDULER_MAX_WAIT,
+    segment_seconds=settings.SCHEDULER_SEGMENT_SECONDS,
+)
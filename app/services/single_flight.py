@@ -0,0 +1,121 @@
+import asyncio
+import hashlib
+import json
+import logging
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from app.config import settings
+from app.services.jobs import JobStore, job_store, DONE, ERROR, RUNNING
+
+logger = logging.getLogger(__name__)
+
+
+def upload_fingerprint(content: bytes, output_format: str, output_dir: Optional[str], mode: str = "single") -> str:
+    """Empreinte d'un upload : contenu du PDF et options de traitement"""
+    digest = hashlib.sha256(content)
+    digest.update(f"\0{output_format}\0{output_dir or ''}".encode("utf-8"))
+    if mode != "single":
+        digest.update(f"\0{mode}".encode("utf-8"))
+    return digest.hexdigest()
+
+
+class JobFailedError(Exception):
+    """Échec d'un traitement partagé, mené par un autre worker"""
+
+    def __init__(self, detail: str, status_code: int = 500):
+        super().__init__(detail)
+        self.detail = detail
+        self.status_code = status_code
+
+
+class SingleFlight:
+    """Regroupe les appels concurrents identiques sur un seul calcul
+
+    Le premier appel d'une clé lance le calcul dans une tâche indépendante ;
+    les suivants attendent son résultat (ou son exception). Entre workers,
+    la coordination passe par le JobStore : un worker qui trouve la clé en
+    cours ailleurs interroge la base jusqu'au résultat. Les résultats des
+    clés mémorisées (Idempotency-Key) sont rejoués pendant `ttl` secondes.
+    """
+
+    def __init__(self, store: JobStore, ttl: float = 3600, poll_interval: float = 0.5):
+        self.store = store
+        self.ttl = ttl
+        self.poll_interval = poll_interval
+        self._in_flight: Dict[str, asyncio.Task] = {}
+
+    async def _lead(self, key: str, factory: Callable[[], Awaitable[Any]], remember: bool) -> Any:
+        """Exécute le calcul en signalant régulièrement qu'il est toujours en cours"""
+
+        async def heartbeat():
+            while True:
+                await asyncio.sleep(self.store.stale_after / 3)
+                await asyncio.to_thread(self.store.heartbeat, key)
+
+        beat = asyncio.get_running_loop().create_task(heartbeat())
+        try:
+            result = await factory()
+        except BaseException as e:
+            detail = getattr(e, "detail", None) or str(e) or "Traitement interrompu"
+            await asyncio.shield(asyncio.to_thread(self.store.fail, key, str(detail), getattr(e, "status_code", 500)))
+            raise
+        finally:
+            beat.cancel()
+        await asyncio.to_thread(self.store.complete, key, result, remember and bool(self.ttl))
+        return result
+
+    async def _wait(self, key: str) -> Optional[Any]:
+        """Attend le résultat d'un calcul mené par un autre worker
+
+        Retourne None si ce worker a disparu sans terminer.
+        """
+        while True:
+            await asyncio.sleep(self.poll_interval)
+            row = await asyncio.to_thread(self.store.get, key)
+            if row is None:
+                return None
+            if row["status"] == DONE:
+                return json.loads(row["result"])
+            if row["status"] == ERROR:
+                raise JobFailedError(row["error"], row["status_code"] or 500)
+            if row["status"] == RUNNING and time.time() - row["updated_at"] > self.store.stale_after:
+                return None
+
+    async def _execute(self, key: str, session_id: str, factory: Callable[[], Awaitable[Any]],
+                       remember: bool) -> Tuple[Any, Optional[str]]:
+        while True:
+            row = await asyncio.to_thread(self.store.claim, key, session_id, self.ttl)
+            if row is None:
+                return await self._lead(key, factory, remember), None
+            if row["status"] == DONE:
+                return json.loads(row["result"]), "replay"
+            result = await self._wait(key)
+            if result is not None:
+                return result, "in_flight"
+            # Propriétaire disparu : nouvelle tentative de prise en charge
+
+    async def run(self, key: str, session_id: str, factory: Callable[[], Awaitable[Any]],
+                  remember: bool = False) -> Tuple[Any, Optional[str]]:
+        """Exécute `factory` une seule fois par clé, tous workers confondus
+
+        Retourne (résultat, mode) avec mode None pour le calcul d'origine,
+        "in_flight" pour un appel regroupé et "replay" pour un résultat rejoué.
+        `session_id` identifie le traitement si cet appel le mène.
+        """
+        task = self._in_flight.get(key)
+        if task is not None:
+            # shield : l'abandon d'un client n'annule pas le calcul partagé
+            result, _ = await asyncio.shield(task)
+            return result, "in_flight"
+
+        task = asyncio.get_running_loop().create_task(self._execute(key, session_id, factory, remember))
+        self._in_flight[key] = task
+        task.add_done_callback(lambda t: self._in_flight.pop(key, None))
+        return await asyncio.shield(task)
+
+    def in_flight(self) -> int:
+        return len(self._in_flight)
+
+
+upload_flight = SingleFlight(job_store, ttl=settings.IDEMPOTENCY_TTL)
@@ -0,0 +1,110 @@
+import logging
+import math
+import threading
+from collections import deque
+from typing import Any, Deque, Dict, Optional, Tuple
+
+from app.config import settings
+from app.services import metrics
+
+logger = logging.getLogger(__name__)
+
+# Tailles de contexte proposées : Ollama recharge le modèle quand num_ctx change,
+# on se limite donc à quelques paliers
+CONTEXT_SIZES = (2048, 4096, 8192, 16384, 32768)
+
+# Taille de sortie attendue avant d'avoir assez de mesures, par type de prompt
+DEFAULT_OUTPUT_TOKENS = {"structured": 1200, "simple": 300, "fields": 400}
+
+
+class TokenBudget:
+    """Dimensionnement de num_ctx et num_predict à partir des mesures Ollama
+
+    Le nombre de tokens du prompt est estimé par un ratio caractères/token
+    recalé sur prompt_eval_count ; la taille de sortie attendue est le
+    95e centile des eval_count observés (avec une marge), par modèle et par
+    type de prompt. num_predict borne aussi les générations qui s'emballent.
+    """
+
+    def __init__(self, max_ctx: int = 8192, max_predict: int = 3000, min_predict: int = 256,
+                 margin: float = 1.25, chars_per_token: float = 3.0, history: int = 200, min_samples: int = 20):
+        self.max_ctx = max_ctx
+        self.max_predict = max_predict
+        self.min_predict = min_predict
+        self.margin = margin
+        self.default_chars_per_token = chars_per_token
+        self.history = history
+        self.min_samples = min_samples
+        self._chars_per_token: Dict[str, float] = {}
+        self._eval_counts: Dict[Tuple[str, str], Deque[int]] = {}
+        self._lock = threading.Lock()
+
+    def estimate_prompt_tokens(self, model: str, prompt: str) -> int:
+        with self._lock:
+            ratio = self._chars_per_token.get(model, self.default_chars_per_token)
+        return math.ceil(len(prompt) / ratio)
+
+    def expected_output_tokens(self, model: str, kind: str) -> int:
+        with self._lock:
+            counts = sorted(self._eval_counts.get((model, kind), ()))
+        if len(counts) < self.min_samples:
+            return DEFAULT_OUTPUT_TOKENS.get(kind, self.max_predict)
+        p95 = counts[min(len(counts) - 1, int(len(counts) * 0.95))]
+        return math.ceil(p95 * self.margin)
+
+    def options(self, model: str, prompt: str, kind: str = "structured", attempt: int = 0) -> Dict[str, int]:
+        """Options num_predict / num_ctx d'une requête
+
+        Chaque nouvelle tentative double le budget de génération, au cas où la
+        précédente a été coupée.
+        """
+        prompt_tokens = self.estimate_prompt_tokens(model, prompt)
+        num_predict = self.expected_output_tokens(model, kind) * (2 ** attempt)
+        num_predict = min(max(num_predict, self.min_predict), self.max_predict)
+
+        needed = math.ceil(prompt_tokens * 1.1) + num_predict
+        num_ctx = next((size for size in CONTEXT_SIZES if size >= needed and size <= self.max_ctx), None)
+        if num_ctx is None:
+            num_ctx = min(CONTEXT_SIZES[-1], self.max_ctx)
+            metrics.OLLAMA_CONTEXT_OVERFLOW.inc(prompt=kind)
+            logger.warning(f"Contexte insuffisant: ~{prompt_tokens} tokens de prompt + {num_predict} générés > num_ctx {num_ctx}")
+        return {"num_predict": num_predict, "num_ctx": num_ctx}
+
+    def _observe(self, model: str, kind: str, prompt: str, prompt_tokens: int, eval_count: Optional[int]) -> None:
+        with self._lock:
+            # prompt_eval_count est réduit quand Ollama réutilise un préfixe en cache :
+            # ces mesures sont ignorées pour le ratio caractères/token
+            current = self._chars_per_token.get(model, self.default_chars_per_token)
+            if prompt_tokens > 0 and prompt_tokens >= 0.5 * len(prompt) / current:
+                ratio = min(max(len(prompt) / prompt_tokens, 2.0), 5.0)
+                self._chars_per_token[model] = current + 0.1 * (ratio - current)
+            if eval_count is not None:
+                counts = self._eval_counts.setdefault((model, kind), deque(maxlen=self.history))
+                counts.append(eval_count)
+
+    def record(self, model: str, kind: str, prompt: str, result: Dict[str, Any]) -> None:
+        """Met à jour les estimations avec les compteurs d'une réponse"""
+        eval_count = result.get("eval_count")
+        self._observe(model, kind, prompt, result.get("prompt_eval_count") or 0, eval_count)
+        if result.get("done_reason") == "length":
+            metrics.OLLAMA_TRUNCATED_GENERATIONS.inc(prompt=kind)
+            logger.warning(f"Génération coupée par num_predict ({eval_count} tokens)")
+
+    def load_history(self, store, limit: int = 500) -> int:
+        """Recharge les mesures enregistrées avec les réponses du modèle"""
+        loaded = 0
+        # Les plus récentes, rejouées dans l'ordre chronologique
+        records = list(store.iter_records(limit=limit))
+        for record in reversed(records):
+            usage = record.get("usage") or {}
+            if "eval_count" not in usage:
+                continue
+            self._observe(record["metadata"]["model"], usage.get("prompt_kind", "structured"), record["prompt"],
+                          usage.get("prompt_eval_count") or 0, usage["eval_count"])
+            loaded += 1
+        if loaded:
+            logger.info(f"Budget de tokens recalé sur {loaded} réponse(s) enregistrée(s)")
+        return loaded
+
+
+token_budget = TokenBudget(max_ctx=settings.OLLAMA_MAX_CTX, max_predict=settings.OLLAMA_MAX_PREDICT)
@@ -0,0 +1,201 @@
+import asyncio
+import functools
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional
+
+from app.config import settings
+from app.services.file_lock import FileLock
+
+logger = logging.getLogger(__name__)
+
+_current_trace: ContextVar[Optional["Trace"]] = ContextVar("current_trace", default=None)
+
+
+class Trace:
+    """Spans d'une requête, exportés au format Chrome Trace Event
+
+    Chaque tâche asyncio (ou thread) a sa propre ligne dans le visualiseur :
+    les spans d'une même ligne s'imbriquent par inclusion temporelle.
+    """
+
+    def __init__(self, name: str, **args):
+        self.trace_id = uuid.uuid4().hex
+        self.name = name
+        self.args = args
+        self.started_at = datetime.now()
+        self.start = time.perf_counter()
+        self.end: Optional[float] = None
+        self.events: List[Dict[str, Any]] = []
+        self.extra: Dict[str, Any] = {}
+        self._lanes: Dict[int, int] = {}
+
+    def _lane(self) -> int:
+        try:
+            key = id(asyncio.current_task())
+        except RuntimeError:  # Thread sans boucle (asyncio.to_thread)
+            key = threading.get_ident()
+        lane = self._lanes.get(key)
+        if lane is None:
+            lane = self._lanes.setdefault(key, len(self._lanes) + 1)
+        return lane
+
+    def add(self, name: str, start: float, end: float, args: Dict[str, Any], lane: int) -> None:
+        self.events.append({
+            "name": name,
+            "cat": "pdf",
+            "ph": "X",
+            "ts": round((start - self.start) * 1e6, 1),
+            "dur": round((end - start) * 1e6, 1),
+            "pid": os.getpid(),
+            "tid": lane,
+            "args": args,
+        })
+
+    def to_chrome(self) -> Dict[str, Any]:
+        """Document JSON ouvrable dans Perfetto ou chrome://tracing"""
+        end = self.end or time.perf_counter()
+        pid = os.getpid()
+        events = [{"name": "process_name", "ph": "M", "pid": pid, "args": {"name": f"worker {pid}"}}]
+        for lane in sorted(set(self._lanes.values())):
+            events.append({"name": "thread_name", "ph": "M", "pid": pid, "tid": lane,
+                           "args": {"name": "requête" if lane == 1 else f"tâche {lane}"}})
+        events.append({"name": self.name, "cat": "pdf", "ph": "X", "ts": 0,
+                       "dur": round((end - self.start) * 1e6, 1), "pid": pid, "tid": 1, "args": self.args})
+        events.extend(self.events)
+        return {
+            "traceEvents": events,
+            "displayTimeUnit": "ms",
+            "otherData": {
+                "trace_id": self.trace_id,
+                "name": self.name,
+                "started_at": self.started_at.isoformat(),
+                "duration_ms": round((end - self.start) * 1000, 1),
+                **self.args,
+                **self.extra,
+            },
+        }
+
+
+class Span:
+    """Mesure d'une étape, utilisable avec `with` comme avec `async with`
+
+    Sans trace en cours (hors requête, ligne de commande), ne fait rien.
+    """
+
+    __slots__ = ("name", "args", "trace", "start", "lane")
+
+    def __init__(self, name: str, args: Dict[str, Any]):
+        self.name = name
+        self.args = args
+        self.trace = None
+
+    def __enter__(self) -> Dict[str, Any]:
+        self.trace = _current_trace.get()
+        if self.trace is not None:
+            self.lane = self.trace._lane()
+            self.start = time.perf_counter()
+        return self.args
+
+    def __exit__(self, exc_type, exc, tb) -> bool:
+        if self.trace is not None:
+            if exc_type is not None:
+                self.args["error"] = exc_type.__name__
+            self.trace.add(self.name, self.start, time.perf_counter(), self.args, self.lane)
+        return False
+
+    async def __aenter__(self) -> Dict[str, Any]:
+        return self.__enter__()
+
+    async def __aexit__(self, exc_type, exc, tb) -> bool:
+        return self.__exit__(exc_type, exc, tb)
+
+
+def span(name: str, **args) -> Span:
+    """Span nommé ; le dict retourné par `with ... as` complète ses arguments"""
+    return Span(name, args)
+
+def traced(name: Optional[str] = None):
+    """Décorateur : un span par appel de la fonction (synchrone ou coroutine)"""
+    def decorator(func):
+        span_name = name or func.__name__
+        if asyncio.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                with Span(span_name, {}):
+                    return await func(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with Span(span_name, {}):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+def current_trace() -> Optional[Trace]:
+    return _current_trace.get()
+
+def annotate(**args) -> None:
+    """Ajoute des informations (ex: session_id) à la trace en cours"""
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.args.update(args)
+
+@contextmanager
+def start_trace(name: str, **args) -> Iterator[Trace]:
+    """Trace de la requête en cours ; les tâches créées pendant héritent du contexte"""
+    trace = Trace(name, **args)
+    token = _current_trace.set(trace)
+    try:
+        yield trace
+    finally:
+        trace.end = time.perf_counter()
+        _current_trace.reset(token)
+
+
+class TraceWriter:
+    """Écriture des traces dans un fichier JSONL (une trace Chrome par ligne)
+
+    Le fichier est partagé entre workers : ajout et rotation sous verrou.
+    """
+
+    def __init__(self, path: Optional[Path] = None, max_bytes: int = 50 * 1024 * 1024):
+        self.path = Path(path or Path(settings.DATA_DIR) / "traces.jsonl")
+        self.max_bytes = max_bytes
+        self.rotated_path = self.path.with_name(self.path.name + ".1")
+
+    def write(self, trace: Trace) -> None:
+        line = json.dumps(trace.to_chrome(), ensure_ascii=False, default=str) + "\n"
+        with FileLock(self.path.with_name(self.path.name + ".lock")):
+            try:
+                size = self.path.stat().st_size
+            except FileNotFoundError:
+                size = 0
+            if self.max_bytes and size and size + len(line) > self.max_bytes:
+                os.replace(self.path, self.rotated_path)
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(line)
+
+    def find(self, trace_id: str) -> Optional[Dict[str, Any]]:
+        """Recherche une trace par identifiant (fichier courant puis précédent)"""
+        needle = f'"trace_id": "{trace_id}"'
+        for path in (self.path, self.rotated_path):
+            if not path.exists():
+                continue
+            with open(path, "r", encoding="utf-8") as f:
+                for line in f:
+                    if needle in line:
+                        return json.loads(line)
+        return None
+
+
+trace_writer = TraceWriter(max_bytes=settings.TRACE_MAX_BYTES)
@@ -0,0 +1,502 @@
+import asyncio
+import hashlib
+import hmac
+import ipaddress
+import json
+import logging
+import random
+import socket
+import sqlite3
+import time
+import uuid
+from pathlib import Path
+from typing import Dict, Any, List, Optional
+from urllib.parse import urlsplit
+
+import httpx
+
+from app.config import settings
+from app.services import metrics
+from app.services.jobs import WORKER_ID
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS webhook_deliveries (
+    id TEXT PRIMARY KEY,
+    session_id TEXT NOT NULL,
+    url TEXT NOT NULL,
+    event TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    status TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_attempt_at REAL NOT NULL,
+    lease_owner TEXT,
+    lease_until REAL,
+    last_error TEXT,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL,
+    delivered_at REAL
+);
+CREATE INDEX IF NOT EXISTS idx_webhook_deliveries_due ON webhook_deliveries(status, next_attempt_at);
+CREATE INDEX IF NOT EXISTS idx_webhook_deliveries_session ON webhook_deliveries(session_id);
+"""
+
+# Inscription faite à la réponse 202, complétée (pending) à la fin du traitement
+AWAITING = "awaiting"
+PENDING = "pending"
+DELIVERED = "delivered"
+FAILED = "failed"
+
+UPLOAD_COMPLETED = "upload.completed"
+UPLOAD_FAILED = "upload.failed"
+
+# Réponses du destinataire qui justifient une nouvelle tentative (en plus des 5xx et des erreurs réseau)
+RETRYABLE_STATUS = {408, 425, 429}
+MAX_URL_LENGTH = 2048
+USER_AGENT = "fiches-produit-webhooks/1.0"
+
+def allowed_hosts(value: Optional[str] = None) -> set:
+    value = settings.WEBHOOK_ALLOWED_HOSTS if value is None else value
+    return {host.strip().lower() for host in value.split(",") if host.strip()}
+
+def check_public_host(host: str) -> None:
+    """Vérifie que toutes les adresses de l'hôte sont publiques
+
+    Lève ValueError pour une adresse de boucle locale, privée, lien-local
+    (métadonnées cloud 169.254.169.254), réservée ou multicast, et
+    socket.gaierror si le nom ne se résout pas.
+    """
+    for *_, sockaddr in socket.getaddrinfo(host, None, proto=socket.IPPROTO_TCP):
+        address = ipaddress.ip_address(sockaddr[0].split("%", 1)[0])
+        if address.version == 6 and address.ipv4_mapped:
+            address = address.ipv4_mapped
+        if not address.is_global or address.is_multicast:
+            raise ValueError(f"Hôte non autorisé pour callback_url: {host} (adresse locale ou privée)")
+
+def validate_callback_url(url: str, hosts: Optional[set] = None) -> str:
+    """URL de rappel acceptée : http/https, hôte public ou autorisé par WEBHOOK_ALLOWED_HOSTS
+
+    Sans WEBHOOK_ALLOWED_HOSTS, tout hôte dont les adresses sont publiques
+    est accepté ; les hôtes internes (ollama, 127.0.0.1, réseau privé)
+    doivent y être listés. Résolution DNS : à appeler hors de la boucle
+    asyncio. Lève ValueError sinon.
+    """
+    url = url.strip()
+    parts = urlsplit(url)
+    if parts.scheme not in ("http", "https") or not parts.hostname or len(url) > MAX_URL_LENGTH:
+        raise ValueError(f"callback_url invalide: {url[:200]} (URL http(s) absolue attendue)")
+    hosts = allowed_hosts() if hosts is None else hosts
+    host = parts.hostname.lower()
+    if host in hosts:
+        return url
+    if hosts:
+        raise ValueError(f"Hôte non autorisé pour callback_url: {parts.hostname}")
+    try:
+        check_public_host(host)
+    except (socket.gaierror, UnicodeError):
+        raise ValueError(f"Hôte introuvable pour callback_url: {parts.hostname}")
+    return url
+
+def sign_payload(secret: str, timestamp: int, body: bytes) -> str:
+    """Signature X-Webhook-Signature : HMAC-SHA256 de « <timestamp>.<corps> »"""
+    digest = hmac.new(secret.encode("utf-8"), f"{timestamp}.".encode("ascii") + body, hashlib.sha256)
+    return f"sha256={digest.hexdigest()}"
+
+def verify_signature(secret: str, timestamp: str, body: bytes, signature: str, tolerance: float = 300) -> bool:
+    """Vérification côté destinataire : signature valide et horodatage récent (rejeu refusé)"""
+    try:
+        sent_at = int(timestamp)
+    except (TypeError, ValueError):
+        return False
+    if abs(time.time() - sent_at) > tolerance:
+        return False
+    return hmac.compare_digest(sign_payload(secret, sent_at, body), signature or "")
+
+def backoff_delay(attempt: int, base: float, maximum: float) -> float:
+    """Attente avant la tentative suivante : base * 2^(n-1), plafonnée, réduite d'un aléa de 0 à 50 %"""
+    delay = min(maximum, base * 2 ** (attempt - 1))
+    return delay * random.uniform(0.5, 1.0)
+
+
+class WebhookOutbox:
+    """Livraisons de webhooks à effectuer, persistées avant tout envoi (SQLite, WAL)
+
+    L'URL de rappel est inscrite (awaiting) avant la réponse 202, sous bail
+    du worker qui traite l'upload, puis l'événement est complété à la fin du
+    traitement : un redémarrage ou un destinataire indisponible ne le
+    perdent pas. Une inscription dont le worker ne renouvelle plus le bail
+    devient un événement upload.failed. Chaque
+    livraison est prise par un worker pour une durée limitée (bail) ; celle
+    d'un worker arrêté en cours d'envoi est reprise à l'expiration du bail.
+    La livraison est donc « au moins une fois » : le destinataire
+    dédoublonne sur X-Webhook-Id.
+    """
+
+    def __init__(self, db_path: Optional[Path] = None):
+        self.db_path = Path(db_path or Path(settings.DATA_DIR) / "webhooks.db")
+        self._schema_ready = False
+
+    def connect(self) -> sqlite3.Connection:
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        if not self._schema_ready:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(SCHEMA)
+            self._schema_ready = True
+        return conn
+
+    def register(self, session_id: str, url: str, lease_seconds: float) -> str:
+        """Inscrit l'URL de rappel d'un upload accepté (202), avant la fin de son traitement"""
+        delivery_id = str(uuid.uuid4())
+        now = time.time()
+        conn = self.connect()
+        try:
+            conn.execute(
+                "INSERT INTO webhook_deliveries (id, session_id, url, event, payload, status, next_attempt_at, "
+                "lease_owner, lease_until, created_at, updated_at) VALUES (?, ?, ?, '', '', ?, ?, ?, ?, ?, ?)",
+                (delivery_id, session_id, url, AWAITING, now, WORKER_ID, now + lease_seconds, now, now)
+            )
+        finally:
+            conn.close()
+        return delivery_id
+
+    def enqueue(self, session_id: str, url: str, event: str, payload: Dict[str, Any],
+                delivery_id: Optional[str] = None) -> str:
+        """Inscrit une livraison, ou complète l'inscription delivery_id ; le corps est figé ici
+
+        Si l'inscription a déjà été déclarée orpheline (bail expiré),
+        l'événement est inscrit à part : le destinataire reçoit aussi le
+        résultat réel.
+        """
+        now = time.time()
+        conn = self.connect()
+        try:
+            if delivery_id is not None:
+                body = json.dumps({"id": delivery_id, "event": event, **payload}, ensure_ascii=False)
+                updated = conn.execute(
+                    "UPDATE webhook_deliveries SET event = ?, payload = ?, status = ?, next_attempt_at = ?, "
+                    "lease_owner = NULL, lease_until = NULL, updated_at = ? WHERE id = ? AND status = ?",
+                    (event, body, PENDING, now, now, delivery_id, AWAITING)
+                ).rowcount
+                if updated:
+                    return delivery_id
+            delivery_id = str(uuid.uuid4())
+            body = json.dumps({"id": delivery_id, "event": event, **payload}, ensure_ascii=False)
+            conn.execute(
+                "INSERT INTO webhook_deliveries (id, session_id, url, event, payload, status, next_attempt_at, "
+                "created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (delivery_id, session_id, url, event, body, PENDING, now, now, now)
+            )
+        finally:
+            conn.close()
+        return delivery_id
+
+    def renew_registrations(self, lease_seconds: float) -> int:
+        """Prolonge le bail des inscriptions de ce worker (traitements toujours en cours)"""
+        now = time.time()
+        conn = self.connect()
+        try:
+            return conn.execute(
+                "UPDATE webhook_deliveries SET lease_until = ? WHERE status = ? AND lease_owner = ?",
+                (now + lease_seconds, AWAITING, WORKER_ID)
+            ).rowcount
+        finally:
+            conn.close()
+
+    def expire_registrations(self) -> int:
+        """Transforme les inscriptions orphelines (bail expiré : worker arrêté) en événements upload.failed"""
+        now = time.time()
+        conn = self.connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                rows = conn.execute(
+                    "SELECT id, session_id FROM webhook_deliveries WHERE status = ? AND lease_until < ?",
+                    (AWAITING, now)
+                ).fetchall()
+                conn.executemany(
+                    "UPDATE webhook_deliveries SET event = ?, payload = ?, status = ?, next_attempt_at = ?, "
+                    "lease_owner = NULL, lease_until = NULL, updated_at = ? WHERE id = ?",
+                    [(UPLOAD_FAILED, json.dumps({
+                        "id": row["id"], "event": UPLOAD_FAILED, "session_id": row["session_id"],
+                        "status": "error", "status_code": 503,
+                        "error": "Traitement interrompu par l'arrêt du serveur, renvoyer le fichier"
+                    }, ensure_ascii=False), PENDING, now, now, row["id"]) for row in rows]
+                )
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+        finally:
+            conn.close()
+        return len(rows)
+
+    def claim(self, limit: int = 1, lease_seconds: float = 60) -> List[Dict[str, Any]]:
+        """Prend les livraisons échues et non réservées par un autre worker"""
+        now = time.time()
+        conn = self.connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                rows = conn.execute(
+                    "SELECT * FROM webhook_deliveries WHERE status = ? AND next_attempt_at <= ? "
+                    "AND (lease_until IS NULL OR lease_until < ?) ORDER BY next_attempt_at LIMIT ?",
+                    (PENDING, now, now, limit)
+                ).fetchall()
+                conn.executemany(
+                    "UPDATE webhook_deliveries SET lease_owner = ?, lease_until = ? WHERE id = ?",
+                    [(WORKER_ID, now + lease_seconds, row["id"]) for row in rows]
+                )
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+        finally:
+            conn.close()
+        return [dict(row) for row in rows]
+
+    def record_attempt(self, delivery_id: str, status: str, attempts: int, error: Optional[str] = None,
+                       next_attempt_at: Optional[float] = None) -> None:
+        """Résultat d'une tentative : livrée, à retenter à next_attempt_at, ou abandonnée"""
+        now = time.time()
+        conn = self.connect()
+        try:
+            conn.execute(
+                "UPDATE webhook_deliveries SET status = ?, attempts = ?, last_error = ?, next_attempt_at = ?, "
+                "lease_owner = NULL, lease_until = NULL, updated_at = ?, delivered_at = ? WHERE id = ?",
+                (status, attempts, error, next_attempt_at or now, now, now if status == DELIVERED else None,
+                 delivery_id)
+            )
+        finally:
+            conn.close()
+
+    def next_due(self) -> Optional[float]:
+        """Échéance de la prochaine livraison en attente (None si aucune)"""
+        conn = self.connect()
+        try:
+            row = conn.execute(
+                "SELECT MIN(MAX(next_attempt_at, COALESCE(lease_until, 0))) FROM webhook_deliveries WHERE status = ?",
+                (PENDING,)
+            ).fetchone()
+        finally:
+            conn.close()
+        return row[0]
+
+    def session_deliveries(self, session_id: str) -> List[Dict[str, Any]]:
+        """État des livraisons d'une session (GET /status)"""
+        conn = self.connect()
+        try:
+            rows = conn.execute(
+                "SELECT id, url, event, status, attempts, last_error, created_at, delivered_at "
+                "FROM webhook_deliveries WHERE session_id = ? ORDER BY created_at", (session_id,)
+            ).fetchall()
+        finally:
+            conn.close()
+        return [dict(row) for row in rows]
+
+    def get(self, delivery_id: str) -> Optional[Dict[str, Any]]:
+        conn = self.connect()
+        try:
+            row = conn.execute("SELECT * FROM webhook_deliveries WHERE id = ?", (delivery_id,)).fetchone()
+        finally:
+            conn.close()
+        return dict(row) if row else None
+
+    def delete_session(self, session_id: str) -> int:
+        """Supprime les livraisons terminées d'une session ; celles en attente partent quand même"""
+        conn = self.connect()
+        try:
+            return conn.execute(
+                "DELETE FROM webhook_deliveries WHERE session_id = ? AND status NOT IN (?, ?)",
+                (session_id, PENDING, AWAITING)
+            ).rowcount
+        finally:
+            conn.close()
+
+    def delete_older_than(self, cutoff: float) -> int:
+        """Supprime les livraisons terminées (livrées ou abandonnées) avant cutoff (timestamp)"""
+        conn = self.connect()
+        try:
+            return conn.execute(
+                "DELETE FROM webhook_deliveries WHERE status NOT IN (?, ?) AND updated_at < ?",
+                (PENDING, AWAITING, cutoff)
+            ).rowcount
+        finally:
+            conn.close()
+
+
+class WebhookDispatcher:
+    """Envoi des webhooks de l'outbox par un nombre borné de tâches de livraison
+
+    Chaque tâche prend une livraison échue, la poste signée (HMAC-SHA256) et
+    enregistre le résultat : 2xx livrée ; erreur réseau, 408/425/429 ou 5xx
+    retentée avec un délai exponentiel (Retry-After respecté) jusqu'à
+    max_attempts ; autre réponse abandonnée. L'hôte est revérifié avant
+    chaque envoi (son DNS a pu changer depuis l'upload). Sans livraison
+    échue, les tâches attendent notify() (événement inscrit par ce worker) ou la
+    prochaine échéance, au plus poll_interval (inscriptions d'autres workers).
+    Une tâche de plus renouvelle, toutes les poll_interval secondes, le bail
+    des inscriptions de ce worker et convertit celles des workers arrêtés.
+    """
+
+    def __init__(self, outbox: WebhookOutbox, workers: Optional[int] = None, secret: Optional[str] = None,
+                 timeout: Optional[float] = None, max_attempts: Optional[int] = None,
+                 backoff_base: Optional[float] = None, max_backoff: Optional[float] = None,
+                 poll_interval: float = 5.0, registration_lease: Optional[float] = None,
+                 hosts: Optional[str] = None):
+        self.outbox = outbox
+        self.workers = workers or settings.WEBHOOK_WORKERS
+        self.secret = settings.WEBHOOK_SECRET if secret is None else secret
+        self.timeout = timeout or settings.WEBHOOK_TIMEOUT
+        self.max_attempts = max_attempts or settings.WEBHOOK_MAX_ATTEMPTS
+        self.backoff_base = backoff_base or settings.WEBHOOK_BACKOFF_BASE
+        self.max_backoff = max_backoff or settings.WEBHOOK_MAX_BACKOFF
+        self.poll_interval = poll_interval
+        self.hosts = allowed_hosts(hosts)
+        # Bail d'une livraison : durée maximale d'un envoi, avec une marge
+        self.lease_seconds = self.timeout * 2 + 30
+        # Bail d'une inscription awaiting, renouvelé tant que le worker tourne
+        self.registration_lease = max(registration_lease or settings.JOB_STALE_SECONDS, poll_interval * 3)
+        self._tasks: List[asyncio.Task] = []
+        self._client: Optional[httpx.AsyncClient] = None
+        self._wake: Optional[asyncio.Event] = None
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.secret)
+
+    def start(self) -> None:
+        """Lance les tâches de livraison (sans effet si WEBHOOK_SECRET est vide)"""
+        if self._tasks or not self.enabled:
+            return
+        self._wake = asyncio.Event()
+        self._client = httpx.AsyncClient(
+            timeout=self.timeout, follow_redirects=False,
+            limits=httpx.Limits(max_connections=self.workers, max_keepalive_connections=self.workers)
+        )
+        loop = asyncio.get_running_loop()
+        self._tasks = [loop.create_task(self._run()) for _ in range(self.workers)]
+        self._tasks.append(loop.create_task(self._watch_registrations()))
+
+    async def stop(self) -> None:
+        """Arrête les tâches ; une livraison interrompue sera reprise à l'expiration de son bail"""
+        for task in self._tasks:
+            task.cancel()
+        for task in self._tasks:
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        self._tasks = []
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    def notify(self) -> None:
+        """Réveille les tâches après l'inscription d'une livraison"""
+        if self._wake is not None:
+            self._wake.set()
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                # Remis à zéro avant la recherche : une inscription pendant celle-ci n'est pas manquée
+                self._wake.clear()
+                deliveries = await asyncio.to_thread(self.outbox.claim, 1, self.lease_seconds)
+                if deliveries:
+                    await self.deliver(deliveries[0])
+                    continue
+                await self._idle()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Erreur de la tâche de livraison des webhooks: {e}", exc_info=True)
+                await asyncio.sleep(self.poll_interval)
+
+    async def _watch_registrations(self) -> None:
+        while True:
+            try:
+                await asyncio.to_thread(self.outbox.renew_registrations, self.registration_lease)
+                expired = await asyncio.to_thread(self.outbox.expire_registrations)
+                if expired:
+                    logger.warning("%d inscription(s) de webhook orpheline(s) notifiée(s) en échec", expired)
+                    self.notify()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Erreur du suivi des inscriptions de webhooks: {e}", exc_info=True)
+            await asyncio.sleep(self.poll_interval)
+
+    async def _idle(self) -> None:
+        due = await asyncio.to_thread(self.outbox.next_due)
+        wait = self.poll_interval if due is None else min(self.poll_interval, max(0.0, due - time.time()))
+        try:
+            await asyncio.wait_for(self._wake.wait(), timeout=wait)
+        except asyncio.TimeoutError:
+            pass
+
+    async def deliver(self, delivery: Dict[str, Any]) -> str:
+        """Une tentative de livraison ; retourne le nouvel état (delivered, pending ou failed)"""
+        attempts = delivery["attempts"] + 1
+        body = delivery["payload"].encode("utf-8")
+        timestamp = int(time.time())
+        headers = {
+            "Content-Type": "application/json",
+            "User-Agent": USER_AGENT,
+            "X-Webhook-Id": delivery["id"],
+            "X-Webhook-Event": delivery["event"],
+            "X-Webhook-Attempt": str(attempts),
+            "X-Webhook-Timestamp": str(timestamp),
+            "X-Webhook-Signature": sign_payload(self.secret, timestamp, body),
+        }
+        retry_after = None
+        start = time.perf_counter()
+        try:
+            host = urlsplit(delivery["url"]).hostname.lower()
+            if host not in self.hosts:
+                await asyncio.to_thread(check_public_host, host)
+            response = await self._client.post(delivery["url"], content=body, headers=headers)
+            metrics.WEBHOOK_DELIVERY_SECONDS.observe(time.perf_counter() - start)
+            if 200 <= response.status_code < 300:
+                await asyncio.to_thread(self.outbox.record_attempt, delivery["id"], DELIVERED, attempts)
+                metrics.WEBHOOK_DELIVERIES.inc(result="delivered")
+                metrics.WEBHOOK_DELIVERY_ATTEMPTS.observe(attempts)
+                logger.info("Webhook %s livré à %s (tentative %d)", delivery["event"], delivery["url"], attempts)
+                return DELIVERED
+            error = f"HTTP {response.status_code}"
+            retryable = response.status_code >= 500 or response.status_code in RETRYABLE_STATUS
+            retry_after = self._retry_after(response)
+        except ValueError as e:
+            error, retryable = str(e), False
+        except (httpx.HTTPError, OSError) as e:
+            metrics.WEBHOOK_DELIVERY_SECONDS.observe(time.perf_counter() - start)
+            error = f"{type(e).__name__}: {e}" if str(e) else type(e).__name__
+            retryable = True
+
+        if not retryable or attempts >= self.max_attempts:
+            await asyncio.to_thread(self.outbox.record_attempt, delivery["id"], FAILED, attempts, error)
+            metrics.WEBHOOK_DELIVERIES.inc(result="failed")
+            logger.warning("Webhook %s abandonné pour %s après %d tentative(s): %s",
+                           delivery["event"], delivery["url"], attempts, error)
+            return FAILED
+
+        delay = max(backoff_delay(attempts, self.backoff_base, self.max_backoff), retry_after or 0)
+        await asyncio.to_thread(self.outbox.record_attempt, delivery["id"], PENDING, attempts, error,
+                                time.time() + delay)
+        metrics.WEBHOOK_DELIVERIES.inc(result="retry")
+        logger.info("Webhook %s vers %s: %s, nouvelle tentative dans %.1f s",
+                    delivery["event"], delivery["url"], error, delay)
+        return PENDING
+
+    def _retry_after(self, response: httpx.Response) -> Optional[float]:
+        """Délai Retry-After en secondes (plafonné à max_backoff), forme date ignorée"""
+        try:
+            return min(float(response.headers["retry-after"]), self.max_backoff)
+        except (KeyError, ValueError):
+            return None
+
+
+webhook_outbox = WebhookOutbox()
+webhook_dispatcher = WebhookDispatcher(webhook_outbox)
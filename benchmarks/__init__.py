@@ -0,0 +1 @@
+# Package benchmarks 
\ No newline at end of file
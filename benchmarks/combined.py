@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+Benchmark de l'export PDF groupé : un PDF par produit vs un seul PDF (sommaire, signets)
+
+Pour chaque nombre de produits, rend les mêmes fiches une par une
+(generate_product_pdf) puis en un seul document par lots (render_combined_pdf)
+et compare le coût par fiche. Avec --memory, le pic d'allocations Python
+(tracemalloc) de chaque chemin est aussi mesuré : pour l'export groupé, il
+doit dépendre de la taille des lots et non du nombre de produits.
+
+Usage:
+    python -m benchmarks.combined
+    python -m benchmarks.combined --products 10 100 1000 --chunk-size 100 --memory
+    python -m benchmarks.combined --products 50 --skip-single --json combined.json
+"""
+
+import argparse
+import asyncio
+import json
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Tuple
+
+from app.services.pdf_generator import PDFGenerator, PRINT_TEMPLATE
+
+EXAMPLE_RESPONSE = Path(__file__).parent.parent / "example-model-response.json"
+
+def make_products(count: int) -> List[Dict[str, Any]]:
+    """Variantes numérotées des données produit de l'exemple"""
+    with open(EXAMPLE_RESPONSE, 'r', encoding='utf-8') as f:
+        base = json.load(f)["parsed_data"]
+    products = []
+    for i in range(count):
+        product = dict(base)
+        product["product_name"] = f"{base.get('product_name') or 'Produit'} #{i + 1}"
+        product["model_number"] = f"{base.get('model_number') or 'REF'}-{i + 1:04d}"
+        products.append(product)
+    return products
+
+def measure(func: Callable[[], Any], memory: bool) -> Tuple[Any, float, int]:
+    """Exécute func ; retourne (résultat, durée en s, pic tracemalloc en octets ou 0)"""
+    if memory:
+        tracemalloc.start()
+    start = time.perf_counter()
+    try:
+        result = func()
+        return result, time.perf_counter() - start, tracemalloc.get_traced_memory()[1] if memory else 0
+    finally:
+        if memory:
+            tracemalloc.stop()
+
+def render_single(generator: PDFGenerator, products: List[Dict[str, Any]], output_dir: Path) -> int:
+    async def run():
+        for i, product in enumerate(products):
+            await generator.generate_product_pdf(product, output_dir, f"bench_{i}")
+    asyncio.run(run())
+    return len(products)
+
+def main():
+    parser = argparse.ArgumentParser(description="Export PDF groupé vs un PDF par produit")
+    parser.add_argument("--products", type=int, nargs="+", default=[10, 50, 200], help="Nombres de produits testés")
+    parser.add_argument("--chunk-size", type=int, default=None, help="Fiches par passe de mise en page (défaut: EXPORT_CHUNK_SIZE)")
+    parser.add_argument("--memory", action="store_true", help="Mesure le pic d'allocations (tracemalloc, plus lent)")
+    parser.add_argument("--skip-single", action="store_true", help="Ne mesure que l'export groupé (grands volumes)")
+    parser.add_argument("--json", type=Path, help="Écrit les résultats dans ce fichier")
+    args = parser.parse_args()
+
+    generator = PDFGenerator(PRINT_TEMPLATE)
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp_dir = Path(tmp)
+        # Préchauffage : imports (WeasyPrint, PyPDF2), feuille de style et polices chargées une fois
+        render_single(generator, make_products(1), tmp_dir)
+        generator.render_combined_pdf(make_products(1), tmp_dir / "warmup.pdf")
+
+        print(f"📊 Export PDF groupé vs un PDF par produit (lots de {args.chunk_size or 'EXPORT_CHUNK_SIZE'})")
+        print(f"{'produits':>8}  {'chemin':<10} {'total (s)':>10} {'ms/fiche':>10} {'pages':>7} {'pic (Mo)':>9}")
+        for count in args.products:
+            products = make_products(count)
+            row: Dict[str, Any] = {"products": count}
+
+            if not args.skip_single:
+                _, seconds, peak = measure(lambda: render_single(generator, products, tmp_dir), args.memory)
+                row["single"] = {"seconds": seconds, "ms_per_sheet": seconds * 1000 / count, "peak_bytes": peak}
+                print(f"{count:8d}  {'unitaire':<10} {seconds:10.2f} {seconds * 1000 / count:10.1f} {'-':>7} "
+                      f"{(f'{peak / 1e6:.1f}' if args.memory else '-'):>9}")
+
+            combined, seconds, peak = measure(
+                lambda: generator.render_combined_pdf(products, tmp_dir / f"combined_{count}.pdf",
+                                                      chunk_size=args.chunk_size),
+                args.memory
+            )
+            row["combined"] = {"seconds": seconds, "ms_per_sheet": seconds * 1000 / count, "peak_bytes": peak,
+                               "pages": combined["pages"], "chunks": combined["chunks"]}
+            print(f"{count:8d}  {'groupé':<10} {seconds:10.2f} {seconds * 1000 / count:10.1f} {combined['pages']:7d} "
+                  f"{(f'{peak / 1e6:.1f}' if args.memory else '-'):>9}")
+            if "single" in row:
+                print(f"{'':8s}  gain par fiche: x{row['single']['seconds'] / seconds:.2f}")
+            results.append(row)
+
+    if args.json:
+        args.json.write_text(json.dumps(results, indent=2), encoding="utf-8")
+        print(f"✅ Résultats écrits dans {args.json}")
+
+if __name__ == "__main__":
+    main()
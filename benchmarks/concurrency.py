@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""
+Benchmark de la limite de concurrence adaptative face à un Ollama saturé
+
+Lance l'Ollama simulé avec une capacité donnée (au-delà, la latence croît),
+puis des clients qui appellent PDFAnalyzer.generate en continu. Affiche
+l'évolution de la limite, le débit et les latences : la limite doit se
+stabiliser autour de la capacité simulée.
+
+Usage:
+    python -m benchmarks.concurrency --capacity 4 --clients 16 --duration 30
+"""
+
+import argparse
+import asyncio
+import statistics
+import time
+
+import httpx
+
+from app.services.concurrency import AdaptiveLimiter
+from app.services import metrics, pdf_analyzer
+from app.services.pdf_analyzer import PDFAnalyzer
+from benchmarks.mock_ollama import MockOllama, BackgroundServer, load_recorded_responses
+from benchmarks.upload import free_port, percentile
+
+async def run(url: str, limiter: AdaptiveLimiter, clients: int, duration: float, interval: float):
+    analyzer = PDFAnalyzer()
+    analyzer.ollama_url = url
+    latencies, errors, timeline = [], 0, []
+    deadline = time.monotonic() + duration
+
+    async def client_loop(client_id: int):
+        nonlocal errors
+        count = 0
+        async with httpx.AsyncClient(timeout=analyzer.timeout) as client:
+            while time.monotonic() < deadline:
+                start = time.perf_counter()
+                try:
+                    await analyzer.generate(client, {
+                        "model": analyzer.model,
+                        "prompt": f"client {client_id} requête {count}",
+                        "stream": False,
+                    })
+                    latencies.append(time.perf_counter() - start)
+                except httpx.HTTPError:
+                    errors += 1
+                count += 1
+
+    async def sample():
+        started = time.monotonic()
+        while time.monotonic() < deadline:
+            timeline.append((time.monotonic() - started, limiter.limit, limiter.in_flight))
+            await asyncio.sleep(interval)
+
+    started = time.perf_counter()
+    await asyncio.gather(sample(), *(client_loop(i) for i in range(clients)))
+    return latencies, errors, timeline, time.perf_counter() - started
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de la limite de concurrence adaptative")
+    parser.add_argument("--capacity", type=int, default=4, help="Appels simultanés avant saturation du modèle simulé")
+    parser.add_argument("--clients", type=int, default=16, help="Clients simultanés")
+    parser.add_argument("--duration", type=float, default=30, help="Durée en secondes")
+    parser.add_argument("--latency", type=float, default=0.2)
+    parser.add_argument("--jitter", type=float, default=0.02)
+    parser.add_argument("--initial", type=int, default=1, help="Limite initiale")
+    parser.add_argument("--max-limit", type=int, default=32)
+    parser.add_argument("--fixed", action="store_true", help="Limite fixe (sans adaptation) pour comparaison")
+    parser.add_argument("--interval", type=float, default=1.0, help="Intervalle d'échantillonnage de la limite")
+    args = parser.parse_args()
+
+    limiter = AdaptiveLimiter(initial=args.initial, max_limit=args.max_limit, adaptive=not args.fixed)
+    # Le benchmark remplace le limiteur global utilisé par PDFAnalyzer.generate
+    pdf_analyzer.ollama_limiter = limiter
+
+    mock = MockOllama(load_recorded_responses(), args.latency, args.jitter, capacity=args.capacity)
+    with BackgroundServer(mock.app, port=free_port()) as ollama:
+        latencies, errors, timeline, elapsed = asyncio.run(
+            run(ollama.url, limiter, args.clients, args.duration, args.interval)
+        )
+
+    print(f"📊 Capacité simulée {args.capacity}, {args.clients} clients, {args.duration:.0f}s")
+    print(f"{'t (s)':>6} {'limite':>7} {'en vol':>7}")
+    for t, limit, in_flight in timeline:
+        print(f"{t:6.1f} {limit:7d} {in_flight:7d}")
+    if latencies:
+        print(f"Appels: {len(latencies)}  erreurs: {errors}  débit: {len(latencies) / elapsed:.2f}/s")
+        print(f"Latence p50: {percentile(latencies, 50):.3f}s  p95: {percentile(latencies, 95):.3f}s  "
+              f"moyenne: {statistics.mean(latencies):.3f}s")
+        # Temps passé dans l'appel HTTP (soumis à OLLAMA_TIMEOUT), hors attente du limiteur
+        calls = metrics.OLLAMA_REQUEST_SECONDS.count(prompt="structured")
+        if calls:
+            server_mean = metrics.OLLAMA_REQUEST_SECONDS.sum(prompt="structured") / calls
+            print(f"Latence moyenne côté Ollama: {server_mean:.3f}s")
+    print(f"Limite finale: {limiter.limit} (idéal: ~{args.capacity})")
+
+if __name__ == "__main__":
+    main()
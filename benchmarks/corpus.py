@@ -0,0 +1,122 @@
+"""
+Génération d'un corpus de PDF texte déterministe pour les benchmarks
+"""
+
+import io
+import random
+import textwrap
+from pathlib import Path
+from typing import List
+
+PAGE_TEMPLATE = [
+    "Réfrigérateur Side by Side Samsung RS68N8220S9",
+    "Catégorie: Électroménager - Froid",
+    "Tension: 220-240V   Fréquence: 50Hz   Classe énergétique: A+++",
+    "Couleur: Inox   Affichage: Écran tactile LED",
+    "Distributeur d'eau et de glace, système Twin Cooling Plus.",
+    "Certifications: CE, RoHS   Garantie: 2 ans",
+]
+
+FILLER_WORDS = (
+    "capacité volume litres compartiment congélateur clayette bac fraîcheur "
+    "porte éclairage alarme consommation annuelle niveau sonore installation "
+    "entretien filtre dégivrage compresseur inverter dimensions hauteur largeur"
+).split()
+
+def _escape(text: str) -> str:
+    return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+def make_pdf(pages: List[str]) -> bytes:
+    """Construit un PDF minimal (Helvetica, WinAnsi) avec une page par texte"""
+    objects = []
+
+    def add(body: bytes) -> int:
+        objects.append(body)
+        return len(objects)
+
+    catalog_id = add(b"")  # complété plus bas
+    pages_id = add(b"")
+    font_id = add(b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>")
+
+    page_ids = []
+    for text in pages:
+        lines = []
+        for paragraph in text.split("\n"):
+            lines.extend(textwrap.wrap(paragraph, 90) or [""])
+        stream = ["BT", "/F1 10 Tf", "12 TL", "50 800 Td"]
+        for line in lines[:60]:
+            stream.append(f"({_escape(line)}) Tj T*")
+        stream.append("ET")
+        content = "\n".join(stream).encode("cp1252", errors="replace")
+        content_id = add(b"<< /Length %d >>\nstream\n" % len(content) + content + b"\nendstream")
+        page_ids.append(add(
+            b"<< /Type /Page /Parent %d 0 R /MediaBox [0 0 595 842] "
+            b"/Resources << /Font << /F1 %d 0 R >> >> /Contents %d 0 R >>" % (pages_id, font_id, content_id)
+        ))
+
+    kids = b" ".join(b"%d 0 R" % page_id for page_id in page_ids)
+    objects[catalog_id - 1] = b"<< /Type /Catalog /Pages %d 0 R >>" % pages_id
+    objects[pages_id - 1] = b"<< /Type /Pages /Kids [%s] /Count %d >>" % (kids, len(page_ids))
+
+    output = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for index, body in enumerate(objects, 1):
+        offsets.append(len(output))
+        output += b"%d 0 obj\n" % index + body + b"\nendobj\n"
+    xref_offset = len(output)
+    output += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    for offset in offsets:
+        output += b"%010d 00000 n \n" % offset
+    output += b"trailer\n<< /Size %d /Root %d 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (
+        len(objects) + 1, catalog_id, xref_offset
+    )
+    return bytes(output)
+
+def make_scanned_pdf(pages: List[str], dpi: int = 150) -> bytes:
+    """PDF « scanné » : chaque page est une image JPEG en niveaux de gris, sans couche texte (Pillow)"""
+    from PIL import Image, ImageDraw, ImageFont
+
+    width, height = int(8.27 * dpi), int(11.69 * dpi)  # A4
+    font_size = dpi // 6
+    try:
+        font = ImageFont.load_default(size=font_size)
+    except TypeError:  # Pillow < 10.1 : police bitmap de taille fixe
+        font = ImageFont.load_default()
+    images = []
+    for text in pages:
+        image = Image.new("L", (width, height), 255)
+        draw = ImageDraw.Draw(image)
+        margin = dpi // 2
+        lines = []
+        for paragraph in text.splitlines():
+            lines.extend(textwrap.wrap(paragraph, width=70) or [""])
+        y = margin
+        for line in lines:
+            if y > height - margin:
+                break
+            draw.text((margin, y), line, fill=0, font=font)
+            y += int(font_size * 1.5)
+        images.append(image)
+    output = io.BytesIO()
+    images[0].save(output, "PDF", save_all=True, append_images=images[1:], resolution=dpi)
+    return output.getvalue()
+
+def make_document_pages(page_count: int, seed: int) -> List[str]:
+    """Texte déterministe d'une fiche technique de page_count pages"""
+    rng = random.Random(seed)
+    pages = []
+    for page in range(page_count):
+        filler = " ".join(rng.choice(FILLER_WORDS) for _ in range(rng.randint(150, 300)))
+        pages.append("\n".join(PAGE_TEMPLATE) + f"\nPage {page + 1}\n" + filler)
+    return pages
+
+def generate_corpus(output_dir: Path, page_counts: List[int] = (1, 3, 10), copies: int = 2) -> List[Path]:
+    """Écrit le corpus de PDF et retourne leurs chemins"""
+    output_dir.mkdir(parents=True, exist_ok=True)
+    paths = []
+    for page_count in page_counts:
+        for copy in range(copies):
+            path = output_dir / f"fiche_{page_count:03d}p_{copy}.pdf"
+            path.write_bytes(make_pdf(make_document_pages(page_count, seed=page_count * 1000 + copy)))
+            paths.append(path)
+    return paths
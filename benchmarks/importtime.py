@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""
+Benchmark du temps d'import au démarrage (python -X importtime)
+
+Importe le module dans un interpréteur neuf plusieurs fois, retient la
+médiane et échoue (code de sortie 1) si elle dépasse le budget ou si une
+bibliothèque lourde chargée en différé (WeasyPrint, PyPDF2) est importée
+au démarrage. Utilisable en CI pour détecter les régressions.
+
+Usage:
+    python -m benchmarks.importtime
+    python -m benchmarks.importtime --budget-ms 800 --runs 7 --top 20
+    python -m benchmarks.importtime --module app.cli --json importtime.json
+"""
+
+import argparse
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+from app.services.preload import HEAVY_MODULES
+
+ROOT = Path(__file__).parent.parent
+LINE = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \| ( *)(\S+)$")
+
+def run_importtime(code: str) -> List[Tuple[str, int, int, int]]:
+    """Lance un interpréteur avec -X importtime ; retourne (module, self µs, cumulé µs, profondeur)"""
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [str(ROOT), os.environ.get("PYTHONPATH")])))
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        cwd=ROOT, env=env, capture_output=True, text=True
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"Import impossible:\n{result.stderr[-2000:]}")
+    entries = []
+    for line in result.stderr.splitlines():
+        match = LINE.match(line)
+        if match:
+            self_us, cumulative_us, indent, name = match.groups()
+            entries.append((name, int(self_us), int(cumulative_us), len(indent) // 2))
+    return entries
+
+def measure(module: str, startup: set) -> Dict[str, object]:
+    """Temps total d'import du module (hors modules du démarrage de l'interpréteur)"""
+    entries = run_importtime(f"import {module}")
+    total_us = sum(cumulative for name, _, cumulative, depth in entries if depth == 0 and name not in startup)
+    return {
+        "total_ms": total_us / 1000,
+        "modules": {name: self_us for name, self_us, _, _ in entries if name not in startup},
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Temps d'import au démarrage")
+    parser.add_argument("--module", default="app.main", help="Module importé (défaut: app.main)")
+    parser.add_argument("--runs", type=int, default=5, help="Mesures (la médiane est retenue)")
+    parser.add_argument("--budget-ms", type=float, default=float(os.environ.get("IMPORT_BUDGET_MS", 1500)),
+                        help="Budget du temps d'import en ms (défaut: IMPORT_BUDGET_MS ou 1500)")
+    parser.add_argument("--forbid", nargs="*", default=list(HEAVY_MODULES),
+                        help="Modules qui ne doivent pas être importés au démarrage")
+    parser.add_argument("--top", type=int, default=15, help="Modules les plus coûteux affichés")
+    parser.add_argument("--json", type=Path, help="Écrit les résultats dans ce fichier")
+    args = parser.parse_args()
+
+    startup = {name for name, _, _, _ in run_importtime("pass")}
+    measure(args.module, startup)  # Préchauffage : compilation des .pyc, cache disque
+    runs = [measure(args.module, startup) for _ in range(args.runs)]
+
+    total_ms = statistics.median(run["total_ms"] for run in runs)
+    self_ms = {
+        name: statistics.median(run["modules"].get(name, 0) for run in runs) / 1000
+        for name in runs[0]["modules"]
+    }
+    imported = set().union(*(run["modules"] for run in runs))
+    forbidden = sorted(root for root in args.forbid
+                       if any(name == root or name.startswith(root + ".") for name in imported))
+
+    print(f"📦 import {args.module}: médiane {total_ms:.0f} ms sur {args.runs} mesure(s) "
+          f"(min {min(r['total_ms'] for r in runs):.0f}, max {max(r['total_ms'] for r in runs):.0f}), "
+          f"{len(imported)} modules")
+    print(f"{'self (ms)':>10}  module")
+    for name, ms in sorted(self_ms.items(), key=lambda item: item[1], reverse=True)[:args.top]:
+        print(f"{ms:10.1f}  {name}")
+
+    if args.json:
+        args.json.write_text(json.dumps({
+            "module": args.module,
+            "total_ms": total_ms,
+            "runs_ms": [run["total_ms"] for run in runs],
+            "budget_ms": args.budget_ms,
+            "forbidden_imported": forbidden,
+            "self_ms": self_ms,
+        }, indent=2, ensure_ascii=False), encoding="utf-8")
+
+    failed = False
+    if forbidden:
+        print(f"❌ Modules importés au démarrage alors qu'ils doivent l'être au premier usage: {', '.join(forbidden)}")
+        failed = True
+    if total_ms > args.budget_ms:
+        print(f"❌ Temps d'import {total_ms:.0f} ms > budget {args.budget_ms:.0f} ms")
+        failed = True
+    if not failed:
+        print(f"✅ Dans le budget ({args.budget_ms:.0f} ms), aucun module lourd importé au démarrage")
+    sys.exit(1 if failed else 0)
+
+if __name__ == "__main__":
+    main()
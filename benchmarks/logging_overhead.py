@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+"""
+Benchmark du coût des journaux par upload : écriture directe ou par file
+
+Rejoue les étapes les plus bavardes d'un upload (extraction page par page
+d'un PDF généré, validation des données de example-model-response.json
+contre un texte qui n'en contient qu'une partie, une ligne par valeur
+écartée) avec quatre configurations :
+  - off      : journaux désactivés (référence)
+  - sync     : StreamHandler au format historique, comme logging.basicConfig
+  - queue    : LogPipeline (JSON, écriture par le thread du listener)
+  - sampling : LogPipeline avec l'échantillonnage LOG_SAMPLING
+Le surcoût est le temps passé en plus dans le thread appelant, c'est-à-dire
+le temps pendant lequel la boucle asyncio serait bloquée. --sink-latency
+simule une sortie lente (pilote de logs Docker saturé) : chaque écriture
+attend ce nombre de millisecondes.
+
+Usage:
+    python -m benchmarks.logging_overhead
+    python -m benchmarks.logging_overhead --pages 50 --uploads 20 --sink-latency 0.5
+    python -m benchmarks.logging_overhead --modes sync queue --json logging.json
+"""
+
+import argparse
+import io
+import json
+import logging
+import statistics
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Dict, List
+
+from app.config import settings
+from app.services.log_pipeline import LogPipeline, TextFormatter, set_session_id
+from app.services.pdf_analyzer import PDFAnalyzer
+from benchmarks.corpus import make_document_pages, make_pdf
+
+EXAMPLE_RESPONSE = Path(__file__).parent.parent / "example-model-response.json"
+MODES = ["off", "sync", "queue", "sampling"]
+
+class Sink(io.TextIOBase):
+    """Sortie des journaux : compte les lignes, attend `latency` secondes par écriture"""
+
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self.lines = 0
+        self.bytes = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, text: str) -> int:
+        if self.latency:
+            time.sleep(self.latency)
+        self.lines += text.count("\n")
+        self.bytes += len(text)
+        return len(text)
+
+def reset_root() -> None:
+    root = logging.getLogger()
+    for handler in root.handlers[:]:
+        root.removeHandler(handler)
+
+def upload(analyzer: PDFAnalyzer, pdf_path: Path, data: Dict[str, Any], segments: int) -> None:
+    """Étapes d'un upload qui journalisent le plus, sans appel au modèle"""
+    pages = analyzer.extract_pages_from_pdf(pdf_path)
+    text = analyzer.prepare_text(pages)
+    for _ in range(segments):
+        analyzer.validate_extracted_data(data, text)
+
+def run_mode(mode: str, pdf_path: Path, data: Dict[str, Any], args) -> Dict[str, Any]:
+    sink = Sink(args.sink_latency / 1000)
+    pipeline = LogPipeline()
+    reset_root()
+    logging.disable(logging.NOTSET)
+    if mode == "off":
+        logging.disable(logging.CRITICAL)
+    elif mode == "sync":
+        handler = logging.StreamHandler(sink)
+        handler.setFormatter(TextFormatter())
+        logging.getLogger().addHandler(handler)
+        logging.getLogger().setLevel(logging.INFO)
+    else:
+        pipeline.start(level="INFO", log_format="json", stream=sink,
+                       sampling=settings.LOG_SAMPLING if mode == "sampling" else "")
+
+    analyzer = PDFAnalyzer()
+    timings = []
+    try:
+        upload(analyzer, pdf_path, data, args.segments)  # Échauffement (import de PyPDF2, cache disque)
+        for index in range(args.uploads):
+            set_session_id(f"bench-{index:04d}")
+            start = time.perf_counter()
+            upload(analyzer, pdf_path, data, args.segments)
+            timings.append(time.perf_counter() - start)
+        start = time.perf_counter()
+        pipeline.stop()
+        drain = time.perf_counter() - start
+    finally:
+        set_session_id(None)
+        logging.disable(logging.NOTSET)
+        reset_root()
+    uploads = args.uploads + 1
+    return {"mode": mode, "median_ms": statistics.median(timings) * 1000, "min_ms": min(timings) * 1000,
+            "lines_per_upload": sink.lines / uploads, "bytes_per_upload": sink.bytes / uploads,
+            "drain_ms": drain * 1000}
+
+def main():
+    parser = argparse.ArgumentParser(description="Coût des journaux par upload, écriture directe ou par file")
+    parser.add_argument("--pages", type=int, default=30, help="Pages du PDF extrait à chaque upload")
+    parser.add_argument("--segments", type=int, default=3, help="Validations par upload (une par segment)")
+    parser.add_argument("--uploads", type=int, default=10, help="Uploads mesurés par configuration")
+    parser.add_argument("--sink-latency", type=float, default=0.0, help="Attente par écriture (ms)")
+    parser.add_argument("--modes", nargs="+", choices=MODES, default=MODES, help="Configurations mesurées")
+    parser.add_argument("--json", type=Path, help="Écrit les résultats dans ce fichier")
+    args = parser.parse_args()
+
+    with open(EXAMPLE_RESPONSE, 'r', encoding='utf-8') as f:
+        data = json.load(f)["parsed_data"]
+
+    results: List[Dict[str, Any]] = []
+    with tempfile.TemporaryDirectory() as tmp:
+        pdf_path = Path(tmp) / "fiche.pdf"
+        pdf_path.write_bytes(make_pdf(make_document_pages(args.pages, seed=49)))
+        print(f"📊 Journaux par upload ({args.pages} pages, {args.segments} segment(s), "
+              f"sortie à {args.sink_latency:g} ms par écriture)")
+        print(f"{'mode':<9} {'médiane (ms)':>13} {'surcoût (ms)':>13} {'lignes':>7} {'octets':>8} {'vidage (ms)':>12}")
+        for mode in args.modes:
+            results.append(run_mode(mode, pdf_path, data, args))
+
+    baseline = next((r["median_ms"] for r in results if r["mode"] == "off"), None)
+    for result in results:
+        result["overhead_ms"] = result["median_ms"] - baseline if baseline is not None else None
+        overhead = f"{result['overhead_ms']:+13.2f}" if baseline is not None else f"{'-':>13}"
+        print(f"{result['mode']:<9} {result['median_ms']:13.2f} {overhead} {result['lines_per_upload']:7.0f} "
+              f"{result['bytes_per_upload']:8.0f} {result['drain_ms']:12.1f}")
+
+    by_mode = {r["mode"]: r for r in results}
+    if baseline is not None and "sync" in by_mode and "queue" in by_mode:
+        sync, queued = by_mode["sync"]["overhead_ms"], by_mode["queue"]["overhead_ms"]
+        status = "✅" if queued <= sync else "⚠️"
+        print(f"{status} Surcoût dans le thread appelant: {queued:.2f} ms par file contre {sync:.2f} ms en direct")
+
+    if args.json:
+        args.json.write_text(json.dumps(results, indent=2), encoding="utf-8")
+        print(f"✅ Résultats écrits dans {args.json}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+"""
+Serveur Ollama simulé et déterministe pour les benchmarks
+
+Rejoue des réponses enregistrées (data/model_responses.db, anciens fichiers
+model_responses/*.json ou example-model-response.json) sur /api/generate
+avec une latence configurable. Avec --capacity, la latence croît au-delà de
+ce nombre d'appels simultanés, comme un GPU saturé.
+
+Usage:
+    python -m benchmarks.mock_ollama --port 11435 --latency 0.5 --jitter 0.1 [reponses.json ...]
+    python -m benchmarks.mock_ollama --latency 0.5 --capacity 4
+"""
+
+import argparse
+import asyncio
+import hashlib
+import json
+import random
+import threading
+import time
+from pathlib import Path
+from typing import List, Optional
+
+import uvicorn
+from fastapi import FastAPI, Request
+
+from app.services.model_response_store import ModelResponseStore
+
+EXAMPLE_RESPONSE = Path(__file__).parent.parent / "example-model-response.json"
+
+def load_recorded_responses(paths: Optional[List[Path]] = None) -> List[str]:
+    """Charge les réponses brutes du modèle depuis des fichiers de sauvegarde"""
+    responses = []
+    for path in paths or [EXAMPLE_RESPONSE]:
+        if path.suffix == ".db":
+            store = ModelResponseStore(path)
+            responses.extend(record["raw_response"] for record in store.iter_records(parse_status="ok"))
+            continue
+        files = sorted(path.rglob("*.json")) if path.is_dir() else [path]
+        for json_file in files:
+            with open(json_file, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            if data.get("raw_response"):
+                responses.append(data["raw_response"])
+    if not responses:
+        raise ValueError("Aucune réponse enregistrée trouvée")
+    return responses
+
+
+class MockOllama:
+    """Application /api/generate + /api/tags rejouant des réponses enregistrées"""
+
+    def __init__(self, responses: List[str], latency: float = 0.5, jitter: float = 0.0,
+                 seed: int = 0, model: str = "llama3", capacity: Optional[int] = None):
+        self.responses = responses
+        self.latency = latency
+        self.jitter = jitter
+        self.capacity = capacity
+        self.seed = seed
+        self.model = model
+        self.requests = 0
+        self.in_flight = 0
+        self.app = self._create_app()
+
+    def _pick(self, prompt: str):
+        """Choix déterministe de la réponse et de la latence à partir du prompt"""
+        digest = int(hashlib.sha256(prompt.encode("utf-8")).hexdigest()[:16], 16)
+        rng = random.Random(self.seed ^ digest)
+        response = self.responses[digest % len(self.responses)]
+        delay = max(0.0, self.latency + rng.uniform(-self.jitter, self.jitter))
+        return response, delay
+
+    def compute_delay(self, base_delay: float) -> float:
+        """Latence effective d'un appel (point d'extension pour simuler la charge)
+
+        Au-delà de `capacity` appels simultanés, le temps de calcul est partagé.
+        """
+        if self.capacity:
+            return base_delay * max(1.0, self.in_flight / self.capacity)
+        return base_delay
+
+    def _create_app(self) -> FastAPI:
+        app = FastAPI(title="Mock Ollama")
+
+        @app.get("/api/tags")
+        async def tags():
+            return {"models": [{"name": f"{self.model}:latest", "model": f"{self.model}:latest"}]}
+
+        @app.post("/api/generate")
+        async def generate(request: Request):
+            body = await request.json()
+            prompt = body.get("prompt", "")
+            response, base_delay = self._pick(prompt)
+            self.requests += 1
+            self.in_flight += 1
+            try:
+                delay = self.compute_delay(base_delay)
+                await asyncio.sleep(delay)
+            finally:
+                self.in_flight -= 1
+            prompt_tokens = len(prompt) // 4
+            eval_tokens = len(response) // 4
+            # Répartition arbitraire mais stable de la latence entre les phases
+            total_ns = int(delay * 1e9)
+            return {
+                "model": body.get("model", self.model),
+                "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+                "response": response,
+                "done": True,
+                "total_duration": total_ns,
+                "load_duration": 0,
+                "prompt_eval_count": prompt_tokens,
+                "prompt_eval_duration": total_ns // 5,
+                "eval_count": eval_tokens,
+                "eval_duration": total_ns - total_ns // 5,
+            }
+
+        return app
+
+
+class BackgroundServer:
+    """Lance une application ASGI avec uvicorn dans un thread"""
+
+    def __init__(self, app, host: str = "127.0.0.1", port: int = 11435):
+        self.config = uvicorn.Config(app, host=host, port=port, log_level="warning")
+        self.server = uvicorn.Server(self.config)
+        self.thread = threading.Thread(target=self.server.run, daemon=True)
+        self.url = f"http://{host}:{port}"
+
+    def __enter__(self):
+        self.thread.start()
+        deadline = time.monotonic() + 10
+        while not self.server.started:
+            if time.monotonic() > deadline:
+                raise RuntimeError("Le serveur simulé n'a pas démarré")
+            time.sleep(0.05)
+        return self
+
+    def __exit__(self, *exc):
+        self.server.should_exit = True
+        self.thread.join(timeout=10)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serveur Ollama simulé")
+    parser.add_argument("responses", nargs="*", type=Path, help="Fichiers ou dossiers de réponses enregistrées")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=11435)
+    parser.add_argument("--latency", type=float, default=0.5, help="Latence moyenne en secondes")
+    parser.add_argument("--jitter", type=float, default=0.1, help="Variation maximale de la latence")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--capacity", type=int, help="Appels simultanés avant saturation")
+    args = parser.parse_args()
+
+    mock = MockOllama(load_recorded_responses(args.responses), args.latency, args.jitter, args.seed,
+                      capacity=args.capacity)
+    print(f"🤖 Ollama simulé sur http://{args.host}:{args.port} ({len(mock.responses)} réponse(s))")
+    uvicorn.run(mock.app, host=args.host, port=args.port, log_level="warning")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+Benchmark de l'OCR des PDF scannés : pages par seconde selon le nombre de processus
+
+Génère un PDF sans couche texte (une image JPEG par page, Pillow), puis
+reconnaît toutes ses pages avec PageOCR pour chaque taille de pool : une
+première passe à cache vide, une seconde servie par le cache des pages. Le
+démarrage du pool est mesuré à part. Nécessite le binaire tesseract.
+
+Usage:
+    python -m benchmarks.ocr
+    python -m benchmarks.ocr --pages 40 --workers 1 2 4 8
+    python -m benchmarks.ocr --dpi 300 --languages fra --json ocr.json
+"""
+
+import argparse
+import json
+import shutil
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from app.config import settings
+from app.services.ocr import OCRCache, PageOCR
+from benchmarks.corpus import make_document_pages, make_scanned_pdf
+
+# Mot présent sur chaque page du corpus : contrôle grossier de la reconnaissance
+EXPECTED_WORD = "Samsung"
+
+def main():
+    parser = argparse.ArgumentParser(description="Débit de l'OCR des pages scannées")
+    parser.add_argument("--pages", type=int, default=16, help="Pages du PDF scanné")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4], help="Tailles de pool testées")
+    parser.add_argument("--dpi", type=int, default=150, help="Résolution des pages scannées")
+    parser.add_argument("--languages", default=settings.OCR_LANGUAGES, help="Langues tesseract")
+    parser.add_argument("--json", type=Path, help="Écrit les résultats dans ce fichier")
+    args = parser.parse_args()
+
+    if shutil.which(settings.OCR_COMMAND) is None:
+        print(f"❌ {settings.OCR_COMMAND} introuvable (paquets tesseract-ocr et tesseract-ocr-fra)")
+        sys.exit(1)
+
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp_dir = Path(tmp)
+        pdf_path = tmp_dir / "scan.pdf"
+        pdf_path.write_bytes(make_scanned_pdf(make_document_pages(args.pages, seed=47), dpi=args.dpi))
+        pages = list(range(args.pages))
+        print(f"📊 OCR de {args.pages} pages scannées ({args.dpi} dpi, {pdf_path.stat().st_size / 1e6:.1f} Mo, "
+              f"langues {args.languages})")
+        print(f"{'processus':>9}  {'démarrage (s)':>13} {'pages/s':>8} {'s/page':>7} {'cache pages/s':>14} {'reconnues':>10}")
+
+        for workers in args.workers:
+            # Cache vide pour chaque taille de pool : la première passe fait tout l'OCR
+            ocr = PageOCR(workers=workers, languages=args.languages, cache=OCRCache(tmp_dir / f"ocr_{workers}.db"))
+            start = time.perf_counter()
+            if workers > 1:
+                list(ocr.pool().map(time.sleep, [0.1] * workers))
+            startup = time.perf_counter() - start
+            try:
+                start = time.perf_counter()
+                texts = ocr.recognize(pdf_path, pages)
+                cold = time.perf_counter() - start
+                start = time.perf_counter()
+                ocr.recognize(pdf_path, pages)
+                warm = time.perf_counter() - start
+            finally:
+                ocr.shutdown()
+
+            recognized = sum(1 for text in texts.values() if EXPECTED_WORD.lower() in text.lower())
+            row = {
+                "workers": workers, "pages": args.pages, "startup_seconds": startup,
+                "seconds": cold, "pages_per_second": args.pages / cold,
+                "cached_seconds": warm, "cached_pages_per_second": args.pages / warm,
+                "recognized_pages": recognized,
+            }
+            results.append(row)
+            print(f"{workers:9d}  {startup:13.2f} {row['pages_per_second']:8.2f} {cold / args.pages:7.2f} "
+                  f"{row['cached_pages_per_second']:14.0f} {recognized:>6}/{args.pages}")
+
+    base = results[0]["pages_per_second"]
+    for row in results[1:]:
+        print(f"   {row['workers']} processus: x{row['pages_per_second'] / base:.2f} par rapport à {results[0]['workers']}")
+    if any(row["recognized_pages"] < args.pages for row in results):
+        print(f"⚠️ « {EXPECTED_WORD} » non reconnu sur certaines pages (résolution, langues ?)")
+
+    if args.json:
+        args.json.write_text(json.dumps(results, indent=2), encoding="utf-8")
+        print(f"✅ Résultats écrits dans {args.json}")
+
+if __name__ == "__main__":
+    main()
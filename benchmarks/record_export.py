@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+Benchmark de l'export des données produit (GET /export) : débit et mémoire par format
+
+Remplit une base temporaire de N produits (variantes de l'exemple), puis
+génère l'export complet en CSV, XLSX et NDJSON en consommant le flux comme
+le ferait StreamingResponse. Le pic d'allocations Python (tracemalloc) doit
+rester le même quel que soit le nombre de produits : seuls un paquet de
+lignes lues et un morceau de réponse sont en mémoire.
+
+Usage:
+    python -m benchmarks.record_export
+    python -m benchmarks.record_export --products 1000 10000 100000
+    python -m benchmarks.record_export --formats csv xlsx --no-memory --json export.json
+"""
+
+import argparse
+import json
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Any, Dict, List
+
+from app.services.product_records import ProductRecordStore, RecordFilter
+from app.services.record_export import EXPORT_FORMATS, iter_export
+
+EXAMPLE_RESPONSE = Path(__file__).parent.parent / "example-model-response.json"
+BRANDS = ["Samsung", "Bosch", "Miele", "Whirlpool", "LG"]
+
+def populate(store: ProductRecordStore, count: int, batch: int = 5000) -> None:
+    """count produits répartis en catalogues de 10, marques alternées"""
+    with open(EXAMPLE_RESPONSE, 'r', encoding='utf-8') as f:
+        base = json.load(f)["parsed_data"]
+    for offset in range(0, count, batch):
+        items = []
+        for i in range(offset, min(offset + batch, count)):
+            product = dict(base)
+            product["product_name"] = f"{base.get('product_name') or 'Produit'} #{i + 1}"
+            product["model_number"] = f"{base.get('model_number') or 'REF'}-{i + 1:06d}"
+            product["brand"] = BRANDS[i % len(BRANDS)]
+            items.append((f"bench-{i // 10:06d}", product, i % 10 + 1))
+        store.save_many(items)
+
+def run_export(store: ProductRecordStore, output_format: str, memory: bool) -> Dict[str, Any]:
+    if memory:
+        tracemalloc.start()
+    start = time.perf_counter()
+    first_chunk = None
+    size = chunks = 0
+    try:
+        for chunk in iter_export(output_format, RecordFilter(), store):
+            if first_chunk is None:
+                first_chunk = time.perf_counter() - start
+            size += len(chunk)
+            chunks += 1
+        seconds = time.perf_counter() - start
+        peak = tracemalloc.get_traced_memory()[1] if memory else 0
+    finally:
+        if memory:
+            tracemalloc.stop()
+    return {"seconds": seconds, "first_chunk_ms": (first_chunk or 0) * 1000, "bytes": size,
+            "chunks": chunks, "peak_bytes": peak}
+
+def main():
+    parser = argparse.ArgumentParser(description="Débit et mémoire de l'export des données produit")
+    parser.add_argument("--products", type=int, nargs="+", default=[1000, 10000], help="Nombres de produits testés")
+    parser.add_argument("--formats", nargs="+", choices=list(EXPORT_FORMATS), default=list(EXPORT_FORMATS),
+                        help="Formats d'export mesurés")
+    parser.add_argument("--no-memory", action="store_true", help="Sans mesure tracemalloc (débit non ralenti)")
+    parser.add_argument("--json", type=Path, help="Écrit les résultats dans ce fichier")
+    args = parser.parse_args()
+
+    results: List[Dict[str, Any]] = []
+    print("📊 Export des données produit en flux")
+    print(f"{'produits':>9}  {'format':<7} {'total (s)':>10} {'produits/s':>11} {'1er octet (ms)':>15} "
+          f"{'taille (Mo)':>12} {'pic (Mo)':>9}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for count in args.products:
+            store = ProductRecordStore(Path(tmp) / f"products_{count}.db")
+            populate(store, count)
+            for output_format in args.formats:
+                result = run_export(store, output_format, not args.no_memory)
+                result.update(products=count, format=output_format)
+                results.append(result)
+                peak = f"{result['peak_bytes'] / 1e6:.1f}" if not args.no_memory else "-"
+                print(f"{count:9d}  {output_format:<7} {result['seconds']:10.2f} {count / result['seconds']:11.0f} "
+                      f"{result['first_chunk_ms']:15.1f} {result['bytes'] / 1e6:12.1f} {peak:>9}")
+
+    if not args.no_memory and len(args.products) > 1:
+        for output_format in args.formats:
+            peaks = [r["peak_bytes"] for r in results if r["format"] == output_format]
+            ratio = max(peaks) / max(min(peaks), 1)
+            status = "✅" if ratio < 2 else "⚠️"
+            print(f"{status} {output_format}: pic mémoire x{ratio:.2f} entre {min(args.products)} "
+                  f"et {max(args.products)} produits")
+
+    if args.json:
+        args.json.write_text(json.dumps(results, indent=2), encoding="utf-8")
+        print(f"✅ Résultats écrits dans {args.json}")
+
+if __name__ == "__main__":
+    main()
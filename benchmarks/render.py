@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+"""
+Benchmark du rendu PDF : template complet vs template d'impression allégé
+
+Hors ligne (ALLOW_REMOTE_ASSETS=false), les ressources CDN du template
+complet (Bootstrap, Font Awesome) sont ignorées : la comparaison porte sur
+le balisage et les CSS propres aux templates, pas sur le coût de Bootstrap.
+Lancer avec ALLOW_REMOTE_ASSETS=true pour mesurer la fiche complète.
+
+Usage:
+    python -m benchmarks.render [iterations]
+"""
+
+import asyncio
+import json
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from app.config import settings
+from app.services.pdf_generator import PDFGenerator
+
+EXAMPLE_RESPONSE = Path(__file__).parent.parent / "example-model-response.json"
+
+def load_product_data() -> dict:
+    """Charge les données produit de l'exemple de réponse du modèle"""
+    with open(EXAMPLE_RESPONSE, 'r', encoding='utf-8') as f:
+        return json.load(f)["parsed_data"]
+
+async def bench_template(template_name: str, product_data: dict, iterations: int) -> list:
+    """Mesure les temps de rendu d'un template"""
+    generator = PDFGenerator(template_name)
+    timings = []
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for i in range(iterations):
+            start = time.perf_counter()
+            await generator.generate_product_pdf(product_data, Path(tmp_dir), f"bench_{i}")
+            timings.append(time.perf_counter() - start)
+    return timings
+
+def main():
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+    product_data = load_product_data()
+
+    print(f"📊 Benchmark rendu PDF ({iterations} itérations)")
+    print("-" * 60)
+    results = {}
+    for template_name in ["product_sheet.html", "product_sheet_print.html"]:
+        timings = asyncio.run(bench_template(template_name, product_data, iterations))
+        results[template_name] = timings
+        # La première itération inclut l'analyse des CSS et le chargement des polices
+        warm = timings[1:] or timings
+        print(f"{template_name:28s} premier: {timings[0] * 1000:8.1f} ms  "
+              f"médiane: {statistics.median(warm) * 1000:8.1f} ms  "
+              f"min: {min(warm) * 1000:8.1f} ms")
+
+    full = statistics.median(results["product_sheet.html"][1:] or results["product_sheet.html"])
+    lean = statistics.median(results["product_sheet_print.html"][1:] or results["product_sheet_print.html"])
+    print("-" * 60)
+    print(f"Gain du template d'impression: x{full / lean:.2f}")
+    if not settings.ALLOW_REMOTE_ASSETS:
+        print("⚠️ Ressources CDN du template complet ignorées (ALLOW_REMOTE_ASSETS=false)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,326 @@
+#!/usr/bin/env python3
+"""
+Rejeu hors ligne du pipeline en aval du modèle (sans Ollama)
+
+Rejoue les réponses brutes enregistrées (data/model_responses.db, anciens
+fichiers model_responses/*.json ou example-model-response.json) dans
+extract_json_from_text, repair_json, validate_extracted_data, merge_results
+puis les générateurs HTML et PDF. Les réponses d'une même session forment un
+cas (un document). Rapporte la durée de chaque étape et compare les sorties
+(données validées, fusion, HTML, texte du PDF) à une référence enregistrée :
+code de sortie 1 en cas de différence.
+
+Usage:
+    python -m benchmarks.replay --baseline replay_baseline --update-baseline
+    python -m benchmarks.replay --baseline replay_baseline
+    python -m benchmarks.replay data/model_responses.db outputs/ --repeat 5 --formats html
+    python -m benchmarks.replay --baseline replay_baseline --max-regression 0.3 --json timings.json
+"""
+
+import argparse
+import asyncio
+import difflib
+import hashlib
+import json
+import logging
+import re
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from pathlib import Path
+from typing import Any, Dict, List
+
+from app.services import metrics
+from app.services.model_response_store import ModelResponseStore
+from app.services.pdf_analyzer import PDFAnalyzer
+from app.services.html_generator import HTMLGenerator
+from app.services.pdf_generator import PDFGenerator
+
+EXAMPLE_RESPONSE = Path(__file__).parent.parent / "example-model-response.json"
+
+STAGES = ["extract_json", "repair_json", "parse", "validate", "merge", "render_html", "render_pdf"]
+EXTRACTION_METHODS = ("direct", "regex", "repaired", "failed")
+TIMINGS_FILENAME = "timings.json"
+
+# Texte analysé, retrouvé dans le prompt structuré ou le prompt simplifié
+STRUCTURED_TEXT = re.compile(r"TEXTE À ANALYSER \(analyse uniquement ce contenu\) :\n(.*?)\n\nFORMAT DE RÉPONSE OBLIGATOIRE", re.DOTALL)
+SIMPLE_TEXT = re.compile(r"\nTexte: (.*?)\n\nJSON en français:", re.DOTALL)
+MIN_SOURCE_CHARS = 100
+
+def safe_name(value: str) -> str:
+    return re.sub(r"[^A-Za-z0-9._-]", "_", value) or "session"
+
+def load_records(paths: List[Path]) -> List[Dict[str, Any]]:
+    """Réponses enregistrées, au format des anciens fichiers de sauvegarde"""
+    records = []
+    for path in paths:
+        if path.suffix == ".db":
+            records.extend(ModelResponseStore(path).iter_records())
+            continue
+        files = sorted(path.rglob("*.json")) if path.is_dir() else [path]
+        for json_file in files:
+            with open(json_file, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            if isinstance(data, dict) and data.get("raw_response") and data.get("prompt"):
+                data.setdefault("metadata", {}).setdefault("session_id", json_file.parent.parent.name)
+                records.append(data)
+    return records
+
+def build_cases(records: List[Dict[str, Any]]) -> Dict[str, List[Dict[str, Any]]]:
+    """Regroupe les réponses par session (ordre chronologique) ; une réponse a un identifiant stable"""
+    cases = defaultdict(list)
+    for record in records:
+        metadata = record.get("metadata", {})
+        parsed = record.get("parsed_data") or {}
+        status = metadata.get("parse_status") or ("error" if "error" in parsed else "ok")
+        if status in ("fallback_error", "partial"):
+            # Aucune réponse exploitable du modèle, ou champs d'un quasi-doublon (fiche de départ non enregistrée)
+            continue
+        digest = hashlib.sha256((record["prompt"] + "\0" + record["raw_response"]).encode("utf-8")).hexdigest()
+        cases[safe_name(metadata.get("session_id", ""))].append({
+            "id": digest[:12],
+            "timestamp": metadata.get("timestamp", ""),
+            "status": status,
+            "prompt": record["prompt"],
+            "raw_response": record["raw_response"],
+        })
+    for case in cases.values():
+        case.sort(key=lambda r: (r["timestamp"], r["id"]))
+    return dict(sorted(cases.items()))
+
+def source_text(record: Dict[str, Any]) -> str:
+    """Texte du PDF envoyé au modèle, utilisé par la validation"""
+    for pattern in (STRUCTURED_TEXT, SIMPLE_TEXT):
+        match = pattern.search(record["prompt"])
+        if match and len(match.group(1)) >= MIN_SOURCE_CHARS:
+            return match.group(1)
+    # Texte absent ou abrégé (« [Contenu du PDF...] » de l'exemple) : la présence des
+    # valeurs dans le texte n'est pas vérifiable, seuls les autres contrôles s'appliquent
+    return record["raw_response"]
+
+def extraction_counts() -> Dict[str, float]:
+    return {method: metrics.JSON_EXTRACTION.value(method=method) for method in EXTRACTION_METHODS}
+
+class Replayer:
+    """Rejoue les cas et mesure chaque étape"""
+
+    def __init__(self, formats: List[str], work_dir: Path):
+        self.formats = formats
+        self.work_dir = work_dir
+        self.analyzer = PDFAnalyzer()
+        self.html_generator = HTMLGenerator()
+        self.pdf_generator = PDFGenerator()
+        self.timings: Dict[str, List[float]] = defaultdict(list)
+
+    def timed(self, stage: str, func, *args):
+        start = time.perf_counter()
+        try:
+            return func(*args)
+        finally:
+            self.timings[stage].append(time.perf_counter() - start)
+
+    async def timed_async(self, stage: str, coro):
+        start = time.perf_counter()
+        try:
+            return await coro
+        finally:
+            self.timings[stage].append(time.perf_counter() - start)
+
+    def replay_record(self, record: Dict[str, Any]) -> Dict[str, Any]:
+        """Extraction, réparation, parsing et validation d'une réponse brute"""
+        raw = record["raw_response"]
+        before = extraction_counts()
+        extracted = self.timed("extract_json", self.analyzer.extract_json_from_text, raw)
+        after = extraction_counts()
+        method = next((m for m in EXTRACTION_METHODS if after[m] > before[m]), "unknown")
+        # Mesurée à part sur chaque réponse : extract_json_from_text ne l'appelle qu'en dernier recours
+        self.timed("repair_json", self.analyzer.repair_json, raw.strip())
+        try:
+            data = self.timed("parse", json.loads, extracted)
+        except json.JSONDecodeError as e:
+            return {"status": record["status"], "method": method, "error": str(e)}
+        if record["status"] == "fallback":
+            validated = self.timed("validate", self.analyzer.create_fallback_structure, data)
+        else:
+            validated = self.timed("validate", self.analyzer.validate_extracted_data, data, source_text(record))
+        return {"status": record["status"], "method": method, "data": validated}
+
+    async def replay_case(self, case_id: str, records: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """Rejoue toutes les réponses d'un document puis fusionne et génère les fiches"""
+        replayed = {record["id"]: self.replay_record(record) for record in records}
+        # Seules les réponses retenues à l'origine (ok, repli) alimentent la fiche
+        results = [r["data"] for r in replayed.values() if "data" in r and r["status"] in ("ok", "fallback")]
+        merged = self.timed("merge", self.analyzer.merge_results, results)
+        outputs: Dict[str, Any] = {"records": replayed, "merged": merged}
+
+        case_dir = self.work_dir / case_id
+        case_dir.mkdir(parents=True, exist_ok=True)
+        if "html" in self.formats:
+            html_path = await self.timed_async(
+                "render_html", self.html_generator.generate_product_sheet(merged, case_dir, case_id)
+            )
+            outputs["html"] = html_path.read_text(encoding="utf-8")
+        if "pdf" in self.formats:
+            pdf_path = await self.timed_async(
+                "render_pdf", self.pdf_generator.generate_product_pdf(merged, case_dir, case_id)
+            )
+            outputs["pdf_text"] = pdf_text(pdf_path)
+        return outputs
+
+def pdf_text(pdf_path: Path) -> str:
+    """Texte du PDF page par page : comparable d'une exécution à l'autre, contrairement aux octets"""
+    import PyPDF2
+    reader = PyPDF2.PdfReader(str(pdf_path))
+    return "\n".join(f"--- page {i + 1} ---\n{page.extract_text() or ''}" for i, page in enumerate(reader.pages))
+
+# --- Instantanés et comparaison ----------------------------------------------
+
+def snapshot_files(outputs: Dict[str, Any]) -> Dict[str, str]:
+    """Fichiers texte d'un cas, écrits dans la référence et comparés ligne à ligne"""
+    files = {
+        "records.json": json.dumps(outputs["records"], ensure_ascii=False, indent=2, sort_keys=True) + "\n",
+        "merged.json": json.dumps(outputs["merged"], ensure_ascii=False, indent=2, sort_keys=True) + "\n",
+    }
+    if "html" in outputs:
+        files["sheet.html"] = outputs["html"]
+    if "pdf_text" in outputs:
+        files["sheet_pdf.txt"] = outputs["pdf_text"] + "\n"
+    return files
+
+def write_baseline(baseline_dir: Path, snapshots: Dict[str, Dict[str, str]], timings: Dict[str, Dict[str, float]]) -> None:
+    if baseline_dir.exists():
+        shutil.rmtree(baseline_dir)
+    for case_id, files in snapshots.items():
+        case_dir = baseline_dir / case_id
+        case_dir.mkdir(parents=True, exist_ok=True)
+        for name, content in files.items():
+            (case_dir / name).write_text(content, encoding="utf-8")
+    (baseline_dir / TIMINGS_FILENAME).write_text(json.dumps(timings, indent=2) + "\n", encoding="utf-8")
+
+def compare_baseline(baseline_dir: Path, snapshots: Dict[str, Dict[str, str]], diff_lines: int) -> List[str]:
+    """Différences avec la référence (cas ajoutés, disparus, fichiers modifiés)"""
+    differences = []
+    expected_cases = {p.name for p in baseline_dir.iterdir() if p.is_dir()}
+    for case_id in sorted(expected_cases - snapshots.keys()):
+        differences.append(f"Cas absent du rejeu: {case_id}")
+    for case_id, files in snapshots.items():
+        if case_id not in expected_cases:
+            differences.append(f"Nouveau cas (absent de la référence): {case_id}")
+            continue
+        for name, content in files.items():
+            expected_path = baseline_dir / case_id / name
+            if not expected_path.exists():
+                differences.append(f"{case_id}/{name}: absent de la référence")
+                continue
+            expected = expected_path.read_text(encoding="utf-8")
+            if expected == content:
+                continue
+            diff = list(difflib.unified_diff(
+                expected.splitlines(), content.splitlines(),
+                fromfile=f"référence/{case_id}/{name}", tofile=f"rejeu/{case_id}/{name}", lineterm=""
+            ))
+            shown = diff[:diff_lines] + ([f"... {len(diff) - diff_lines} ligne(s) de plus"] if len(diff) > diff_lines else [])
+            differences.append("\n".join(shown))
+    return differences
+
+def check_timings(baseline_dir: Path, timings: Dict[str, Dict[str, float]], max_regression: float) -> List[str]:
+    """Étapes dont la médiane dépasse la référence de plus de max_regression"""
+    path = baseline_dir / TIMINGS_FILENAME
+    if not path.exists():
+        return []
+    with open(path, 'r', encoding='utf-8') as f:
+        reference = json.load(f)
+    failures = []
+    for stage, stats in timings.items():
+        ref = reference.get(stage)
+        if ref and ref["median_ms"] and stats["median_ms"] > ref["median_ms"] * (1 + max_regression):
+            failures.append(f"{stage}: médiane {stats['median_ms']:.3f} ms > {ref['median_ms']:.3f} ms "
+                            f"+{max_regression:.0%}")
+    return failures
+
+def summarize(samples: Dict[str, List[float]]) -> Dict[str, Dict[str, float]]:
+    summary = {}
+    for stage in STAGES:
+        values = samples.get(stage)
+        if not values:
+            continue
+        ordered = sorted(values)
+        summary[stage] = {
+            "calls": len(values),
+            "median_ms": statistics.median(values) * 1000,
+            "p95_ms": ordered[max(0, int(round(0.95 * len(ordered))) - 1)] * 1000,
+            "total_ms": sum(values) * 1000,
+        }
+    return summary
+
+async def run(cases: Dict[str, List[Dict[str, Any]]], formats: List[str], repeat: int):
+    """Rejoue tous les cas `repeat` fois ; sorties de la première exécution, durées de toutes"""
+    with tempfile.TemporaryDirectory() as tmp:
+        replayer = Replayer(formats, Path(tmp))
+        snapshots = {}
+        for iteration in range(repeat):
+            for case_id, records in cases.items():
+                outputs = await replayer.replay_case(case_id, records)
+                if iteration == 0:
+                    snapshots[case_id] = snapshot_files(outputs)
+                elif snapshot_files(outputs) != snapshots[case_id]:
+                    print(f"⚠️  Sorties non déterministes pour {case_id}")
+        return snapshots, replayer.timings
+
+def main():
+    parser = argparse.ArgumentParser(description="Rejeu hors ligne des réponses du modèle")
+    parser.add_argument("sources", nargs="*", type=Path,
+                        help="Base model_responses.db, dossiers ou fichiers JSON (défaut: example-model-response.json)")
+    parser.add_argument("--baseline", type=Path, help="Dossier de référence (sorties par cas et durées)")
+    parser.add_argument("--update-baseline", action="store_true", help="Réécrit la référence au lieu de comparer")
+    parser.add_argument("--formats", nargs="+", choices=["html", "pdf"], default=["html", "pdf"],
+                        help="Fiches générées (défaut: html pdf)")
+    parser.add_argument("--repeat", type=int, default=3, help="Exécutions pour les durées (défaut: 3)")
+    parser.add_argument("--max-regression", type=float, help="Hausse tolérée de la médiane d'une étape (0.3 = 30%%)")
+    parser.add_argument("--diff-lines", type=int, default=40, help="Lignes de diff affichées par fichier")
+    parser.add_argument("--json", type=Path, help="Écrit les durées par étape dans ce fichier")
+    parser.add_argument("--verbose", action="store_true", help="Affiche les logs du pipeline")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO if args.verbose else logging.CRITICAL, format="%(levelname)s - %(message)s")
+
+    cases = build_cases(load_records(args.sources or [EXAMPLE_RESPONSE]))
+    if not cases:
+        print("❌ Aucune réponse enregistrée trouvée")
+        sys.exit(1)
+    records = sum(len(r) for r in cases.values())
+    print(f"📊 Rejeu de {records} réponse(s) sur {len(cases)} cas, {args.repeat} exécution(s), formats: {' '.join(args.formats)}")
+
+    snapshots, samples = asyncio.run(run(cases, args.formats, args.repeat))
+    timings = summarize(samples)
+    print(f"{'étape':<14} {'appels':>7} {'médiane (ms)':>13} {'p95 (ms)':>10} {'total (ms)':>11}")
+    for stage, stats in timings.items():
+        print(f"{stage:<14} {stats['calls']:7d} {stats['median_ms']:13.3f} {stats['p95_ms']:10.3f} {stats['total_ms']:11.1f}")
+
+    if args.json:
+        args.json.write_text(json.dumps(timings, indent=2), encoding="utf-8")
+
+    if not args.baseline:
+        return
+    if args.update_baseline:
+        write_baseline(args.baseline, snapshots, timings)
+        print(f"✅ Référence écrite dans {args.baseline} ({len(snapshots)} cas)")
+        return
+    if not args.baseline.is_dir():
+        print(f"❌ Référence introuvable: {args.baseline} (créer avec --update-baseline)")
+        sys.exit(1)
+
+    differences = compare_baseline(args.baseline, snapshots, args.diff_lines)
+    if args.max_regression is not None:
+        differences += check_timings(args.baseline, timings, args.max_regression)
+    if differences:
+        for difference in differences:
+            print(f"❌ {difference}")
+        sys.exit(1)
+    print(f"✅ Sorties identiques à la référence ({len(snapshots)} cas)")
+
+if __name__ == "__main__":
+    main()
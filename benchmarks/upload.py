@@ -0,0 +1,253 @@
+#!/usr/bin/env python3
+"""
+Benchmark de bout en bout de /upload avec un Ollama simulé
+
+Démarre le serveur Ollama simulé et l'application (uvicorn, dossiers temporaires),
+puis envoie le corpus de PDF générés avec plusieurs niveaux de concurrence.
+Rapporte débit, latences p50/p95/p99, durée moyenne par étape (depuis /metrics)
+et pic de mémoire résidente de l'application.
+
+Usage:
+    python -m benchmarks.upload --concurrency 1 2 4 8 --latency 0.5 --jitter 0.1
+    python -m benchmarks.upload --json resultats.json --baseline reference.json
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import re
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, List
+
+import httpx
+
+from benchmarks.corpus import generate_corpus
+from benchmarks.mock_ollama import MockOllama, BackgroundServer, load_recorded_responses
+
+ROOT_DIR = Path(__file__).parent.parent
+
+# Étapes du pipeline suivies via les histogrammes de /metrics
+STAGES = {
+    "extraction": ("pdf_extraction_seconds", {}),
+    "ollama": ("ollama_request_seconds", {}),
+    "render_html": ("render_seconds", {"format": "html"}),
+    "render_pdf": ("render_seconds", {"format": "pdf"}),
+}
+
+METRIC_LINE = re.compile(r'^([a-zA-Z_:][a-zA-Z0-9_:]*)(?:\{(.*)\})? (\S+)$')
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def percentile(values: List[float], pct: float) -> float:
+    """Percentile au rang le plus proche"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, int(round(pct / 100 * len(ordered) + 0.5)) - 1))
+    return ordered[index]
+
+def parse_metrics(text: str) -> Dict[tuple, float]:
+    """Parse le format texte Prometheus en {(nom, labels): valeur}"""
+    samples = {}
+    for line in text.splitlines():
+        match = METRIC_LINE.match(line)
+        if not match:
+            continue
+        name, labels, value = match.groups()
+        label_pairs = tuple(sorted(re.findall(r'(\w+)="([^"]*)"', labels or "")))
+        samples[(name, label_pairs)] = float(value)
+    return samples
+
+def stage_totals(samples: Dict[tuple, float], metric: str, labels: Dict[str, str]) -> tuple:
+    """Somme et nombre d'observations d'un histogramme, toutes séries confondues"""
+    wanted = set(labels.items())
+    total, count = 0.0, 0.0
+    for (name, label_pairs), value in samples.items():
+        if not wanted.issubset(set(label_pairs)):
+            continue
+        if name == f"{metric}_sum":
+            total += value
+        elif name == f"{metric}_count":
+            count += value
+    return total, count
+
+def read_rss_kb(pid: int) -> int:
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return 0
+
+async def sample_peak_rss(pid: int, stop: asyncio.Event, peak: list) -> None:
+    while not stop.is_set():
+        peak[0] = max(peak[0], read_rss_kb(pid))
+        await asyncio.sleep(0.05)
+
+async def run_level(client: httpx.AsyncClient, app_url: str, corpus: List[Path], concurrency: int,
+                    rounds: int, output_format: str, pid: int) -> Dict:
+    """Exécute un niveau de concurrence et retourne ses statistiques"""
+    before = parse_metrics((await client.get(f"{app_url}/metrics")).text)
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies, errors = [], 0
+
+    async def one(pdf_path: Path):
+        nonlocal errors
+        async with semaphore:
+            start = time.perf_counter()
+            with open(pdf_path, "rb") as f:
+                response = await client.post(
+                    f"{app_url}/upload",
+                    files={"file": (pdf_path.name, f.read(), "application/pdf")},
+                    data={"output_format": output_format},
+                )
+            if response.status_code == 200:
+                latencies.append(time.perf_counter() - start)
+            else:
+                errors += 1
+
+    stop, peak = asyncio.Event(), [0]
+    sampler = asyncio.create_task(sample_peak_rss(pid, stop, peak))
+    start = time.perf_counter()
+    await asyncio.gather(*(one(path) for _ in range(rounds) for path in corpus))
+    elapsed = time.perf_counter() - start
+    stop.set()
+    await sampler
+
+    after = parse_metrics((await client.get(f"{app_url}/metrics")).text)
+    stages = {}
+    for stage, (metric, labels) in STAGES.items():
+        total_before, count_before = stage_totals(before, metric, labels)
+        total_after, count_after = stage_totals(after, metric, labels)
+        count = count_after - count_before
+        if count:
+            stages[stage] = (total_after - total_before) / count
+
+    return {
+        "concurrency": concurrency,
+        "requests": len(latencies) + errors,
+        "errors": errors,
+        "elapsed_s": elapsed,
+        "throughput_rps": len(latencies) / elapsed if elapsed else 0.0,
+        "p50_s": percentile(latencies, 50),
+        "p95_s": percentile(latencies, 95),
+        "p99_s": percentile(latencies, 99),
+        "peak_rss_mb": peak[0] / 1024,
+        "stage_mean_s": stages,
+    }
+
+def wait_for_app(url: str, process: subprocess.Popen, timeout: float = 60) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError("L'application s'est arrêtée au démarrage")
+        try:
+            if httpx.get(f"{url}/health", timeout=1).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError("L'application n'a pas démarré à temps")
+
+def print_report(results: List[Dict]) -> None:
+    print(f"{'conc':>4} {'req':>5} {'err':>4} {'débit/s':>8} {'p50':>7} {'p95':>7} {'p99':>7} {'RSS Mo':>7}  étapes (moyenne)")
+    for r in results:
+        stages = " ".join(f"{name}={value * 1000:.0f}ms" for name, value in r["stage_mean_s"].items())
+        print(f"{r['concurrency']:>4} {r['requests']:>5} {r['errors']:>4} {r['throughput_rps']:>8.2f} "
+              f"{r['p50_s']:>7.2f} {r['p95_s']:>7.2f} {r['p99_s']:>7.2f} {r['peak_rss_mb']:>7.1f}  {stages}")
+
+def check_regressions(results: List[Dict], baseline_path: Path, max_regression: float) -> List[str]:
+    """Compare le débit à une exécution de référence"""
+    with open(baseline_path, 'r', encoding='utf-8') as f:
+        baseline = {r["concurrency"]: r for r in json.load(f)["results"]}
+    failures = []
+    for r in results:
+        ref = baseline.get(r["concurrency"])
+        if ref and ref["throughput_rps"] and r["throughput_rps"] < ref["throughput_rps"] * (1 - max_regression):
+            failures.append(
+                f"concurrence {r['concurrency']}: {r['throughput_rps']:.2f} req/s "
+                f"< référence {ref['throughput_rps']:.2f} req/s"
+            )
+    return failures
+
+async def run_sweep(args, app_url: str, corpus: List[Path], pid: int) -> List[Dict]:
+    results = []
+    async with httpx.AsyncClient(timeout=args.request_timeout) as client:
+        for concurrency in args.concurrency:
+            results.append(await run_level(client, app_url, corpus, concurrency, args.rounds, args.output_format, pid))
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de bout en bout de /upload")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--pages", type=int, nargs="+", default=[1, 3, 10], help="Nombre de pages des PDF générés")
+    parser.add_argument("--copies", type=int, default=2, help="Nombre de PDF par taille")
+    parser.add_argument("--rounds", type=int, default=1, help="Passes sur le corpus par niveau")
+    parser.add_argument("--output-format", default="html", choices=["html", "pdf", "both"])
+    parser.add_argument("--responses", type=Path, nargs="*", help="Réponses enregistrées à rejouer")
+    parser.add_argument("--latency", type=float, default=0.5)
+    parser.add_argument("--jitter", type=float, default=0.1)
+    parser.add_argument("--capacity", type=int, help="Appels simultanés avant saturation du modèle simulé")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--request-timeout", type=float, default=600)
+    parser.add_argument("--json", type=Path, help="Fichier de sortie des résultats")
+    parser.add_argument("--baseline", type=Path, help="Résultats de référence pour détecter les régressions")
+    parser.add_argument("--max-regression", type=float, default=0.2, help="Baisse de débit tolérée (0.2 = 20%%)")
+    args = parser.parse_args()
+
+    mock = MockOllama(load_recorded_responses(args.responses), args.latency, args.jitter, args.seed,
+                      capacity=args.capacity)
+
+    with tempfile.TemporaryDirectory() as tmp, BackgroundServer(mock.app, port=free_port()) as ollama:
+        tmp_dir = Path(tmp)
+        corpus = generate_corpus(tmp_dir / "corpus", args.pages, args.copies)
+        app_port = free_port()
+        env = dict(
+            os.environ,
+            OLLAMA_URL=ollama.url,
+            UPLOAD_DIR=str(tmp_dir / "uploads"),
+            OUTPUT_DIR=str(tmp_dir / "outputs"),
+            RETRY_DELAY="0",
+        )
+        process = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "app.main:app", "--host", "127.0.0.1",
+             "--port", str(app_port), "--log-level", "warning"],
+            cwd=ROOT_DIR, env=env,
+        )
+        try:
+            app_url = f"http://127.0.0.1:{app_port}"
+            wait_for_app(app_url, process)
+            print(f"📊 Benchmark /upload: {len(corpus)} PDF, latence simulée {args.latency}s ±{args.jitter}s")
+            results = asyncio.run(run_sweep(args, app_url, corpus, process.pid))
+        finally:
+            process.terminate()
+            process.wait(timeout=10)
+
+    print_report(results)
+    print(f"Appels Ollama simulés: {mock.requests}")
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump({"args": {k: str(v) for k, v in vars(args).items()}, "results": results}, f, indent=2)
+
+    if args.baseline:
+        failures = check_regressions(results, args.baseline, args.max_regression)
+        for failure in failures:
+            print(f"❌ Régression de débit: {failure}")
+        if failures:
+            sys.exit(1)
+        print("✅ Aucune régression de débit")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+Destinataire de webhooks local pour tester les livraisons (callback_url)
+
+Vérifie la signature HMAC (X-Webhook-Signature, même secret que
+WEBHOOK_SECRET), compte les livraisons par X-Webhook-Id (doublons compris)
+et peut simuler un destinataire lent ou en panne : échec des N premières
+tentatives de chaque événement, taux d'échec aléatoire, latence.
+GET /received retourne le décompte.
+
+Usage:
+    python -m benchmarks.webhook_receiver --port 8765 --secret $WEBHOOK_SECRET
+    python -m benchmarks.webhook_receiver --secret test --fail-first 2 --fail-rate 0.1 --latency 0.05
+    # Serveur lancé avec WEBHOOK_ALLOWED_HOSTS=127.0.0.1 (adresses locales refusées sinon)
+    curl -F "file=@fiche.pdf" -F "callback_url=http://127.0.0.1:8765/webhook" http://localhost:8000/upload
+"""
+
+import argparse
+import asyncio
+import random
+from collections import Counter
+from typing import Any, Dict, List
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+from app.config import settings
+from app.services.webhooks import verify_signature
+
+
+class WebhookReceiver:
+    """Application POST /webhook + GET /received"""
+
+    def __init__(self, secret: str, fail_first: int = 0, fail_rate: float = 0.0, latency: float = 0.0,
+                 seed: int = 0, verbose: bool = False):
+        self.secret = secret
+        self.fail_first = fail_first
+        self.fail_rate = fail_rate
+        self.latency = latency
+        self.verbose = verbose
+        self.rng = random.Random(seed)
+        self.attempts: Counter = Counter()
+        self.delivered: Counter = Counter()
+        self.rejected = 0
+        self.events: List[Dict[str, Any]] = []
+        self.app = self._create_app()
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            "events": len(self.delivered),
+            "deliveries": sum(self.delivered.values()),
+            "duplicates": sum(count - 1 for count in self.delivered.values()),
+            "attempts": sum(self.attempts.values()),
+            "rejected_signatures": self.rejected,
+        }
+
+    def _create_app(self) -> FastAPI:
+        app = FastAPI(title="Webhook receiver")
+
+        @app.post("/webhook")
+        async def webhook(request: Request):
+            body = await request.body()
+            headers = request.headers
+            if not verify_signature(self.secret, headers.get("x-webhook-timestamp"), body,
+                                    headers.get("x-webhook-signature")):
+                self.rejected += 1
+                return JSONResponse(status_code=401, content={"detail": "Signature invalide"})
+            delivery_id = headers.get("x-webhook-id", "")
+            self.attempts[delivery_id] += 1
+            if self.latency:
+                await asyncio.sleep(self.latency)
+            if self.attempts[delivery_id] <= self.fail_first or self.rng.random() < self.fail_rate:
+                return JSONResponse(status_code=503, content={"detail": "Indisponible (simulé)"})
+            self.delivered[delivery_id] += 1
+            if self.delivered[delivery_id] == 1:
+                event = await request.json()
+                self.events.append(event)
+                if self.verbose:
+                    print(f"📨 {event.get('event')} session {event.get('session_id')} "
+                          f"(tentative {headers.get('x-webhook-attempt')})")
+            return {"received": delivery_id}
+
+        @app.get("/received")
+        async def received():
+            return self.summary()
+
+        return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Destinataire de webhooks local")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--secret", default=settings.WEBHOOK_SECRET, help="Secret HMAC (défaut: WEBHOOK_SECRET)")
+    parser.add_argument("--fail-first", type=int, default=0, help="Tentatives refusées (503) par événement")
+    parser.add_argument("--fail-rate", type=float, default=0.0, help="Part des tentatives refusées au hasard")
+    parser.add_argument("--latency", type=float, default=0.0, help="Temps de réponse en secondes")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    if not args.secret:
+        parser.error("--secret ou WEBHOOK_SECRET requis")
+    receiver = WebhookReceiver(args.secret, args.fail_first, args.fail_rate, args.latency, args.seed, verbose=True)
+    print(f"📬 Webhooks attendus sur http://{args.host}:{args.port}/webhook")
+    uvicorn.run(receiver.app, host=args.host, port=args.port, log_level="warning")
+
+if __name__ == "__main__":
+    main()
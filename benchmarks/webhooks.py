@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+"""
+Benchmark de la livraison des webhooks : débit et délai selon le nombre de tâches
+
+Inscrit N événements (résultat d'upload de example-model-response.json)
+dans un outbox temporaire puis les livre avec WebhookDispatcher à un
+destinataire local (benchmarks.webhook_receiver) qui vérifie les signatures
+et peut refuser des tentatives pour exercer les reprises. Rapporte la durée
+totale, le délai inscription → livraison (p50/p95), les tentatives et les
+doublons reçus ; code de sortie 1 si un événement n'est pas livré.
+
+Usage:
+    python -m benchmarks.webhooks
+    python -m benchmarks.webhooks --events 500 --workers 1 4 16 --latency 0.05
+    python -m benchmarks.webhooks --fail-first 2 --fail-rate 0.2 --backoff 0.05 --json webhooks.json
+"""
+
+import argparse
+import asyncio
+import json
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Dict, List
+
+from app.services.webhooks import WebhookOutbox, WebhookDispatcher, PENDING, DELIVERED, UPLOAD_COMPLETED
+from benchmarks.mock_ollama import BackgroundServer
+from benchmarks.webhook_receiver import WebhookReceiver
+
+EXAMPLE_RESPONSE = Path(__file__).parent.parent / "example-model-response.json"
+SECRET = "benchmark-secret"
+
+async def deliver_all(dispatcher: WebhookDispatcher, outbox: WebhookOutbox, timeout: float) -> float:
+    """Démarre les tâches de livraison et attend qu'aucun événement ne reste en attente"""
+    start = time.perf_counter()
+    dispatcher.start()
+    try:
+        while time.perf_counter() - start < timeout:
+            conn = outbox.connect()
+            try:
+                pending = conn.execute("SELECT COUNT(*) FROM webhook_deliveries WHERE status = ?",
+                                       (PENDING,)).fetchone()[0]
+            finally:
+                conn.close()
+            if not pending:
+                break
+            await asyncio.sleep(0.05)
+        return time.perf_counter() - start
+    finally:
+        await dispatcher.stop()
+
+def run(workers: int, args, payload: Dict[str, Any], url: str, receiver: WebhookReceiver, tmp: Path) -> Dict[str, Any]:
+    outbox = WebhookOutbox(tmp / f"webhooks_{workers}.db")
+    for i in range(args.events):
+        outbox.enqueue(f"bench-{i:05d}", url, UPLOAD_COMPLETED, dict(payload, session_id=f"bench-{i:05d}"))
+    dispatcher = WebhookDispatcher(outbox, workers=workers, secret=SECRET, timeout=5, max_attempts=args.max_attempts,
+                                   backoff_base=args.backoff, max_backoff=args.backoff * 8, poll_interval=0.1,
+                                   hosts="127.0.0.1")
+    before = receiver.summary()
+    seconds = asyncio.run(deliver_all(dispatcher, outbox, args.timeout))
+    after = receiver.summary()
+
+    conn = outbox.connect()
+    try:
+        rows = conn.execute("SELECT status, attempts, created_at, delivered_at FROM webhook_deliveries").fetchall()
+    finally:
+        conn.close()
+    delays = sorted(row["delivered_at"] - row["created_at"] for row in rows if row["status"] == DELIVERED)
+    delivered = len(delays)
+    return {
+        "workers": workers, "events": args.events, "seconds": seconds,
+        "events_per_second": delivered / seconds if seconds else 0.0,
+        "delay_p50_ms": statistics.median(delays) * 1000 if delays else None,
+        "delay_p95_ms": delays[int(0.95 * (len(delays) - 1))] * 1000 if delays else None,
+        "delivered": delivered,
+        "failed": sum(1 for row in rows if row["status"] not in (DELIVERED, PENDING)),
+        "pending": sum(1 for row in rows if row["status"] == PENDING),
+        "attempts_per_event": sum(row["attempts"] for row in rows) / max(len(rows), 1),
+        "duplicates": after["duplicates"] - before["duplicates"],
+        "rejected_signatures": after["rejected_signatures"] - before["rejected_signatures"],
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Débit et délai de livraison des webhooks")
+    parser.add_argument("--events", type=int, default=200, help="Événements inscrits par mesure")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 4, 16], help="Tâches de livraison testées")
+    parser.add_argument("--latency", type=float, default=0.02, help="Temps de réponse du destinataire (s)")
+    parser.add_argument("--fail-first", type=int, default=0, help="Tentatives refusées (503) par événement")
+    parser.add_argument("--fail-rate", type=float, default=0.0, help="Part des tentatives refusées au hasard")
+    parser.add_argument("--backoff", type=float, default=0.05, help="Attente après le premier échec (s)")
+    parser.add_argument("--max-attempts", type=int, default=10)
+    parser.add_argument("--timeout", type=float, default=120, help="Durée maximale par mesure (s)")
+    parser.add_argument("--port", type=int, default=8766)
+    parser.add_argument("--json", type=Path, help="Écrit les résultats dans ce fichier")
+    args = parser.parse_args()
+
+    with open(EXAMPLE_RESPONSE, 'r', encoding='utf-8') as f:
+        product_data = json.load(f)["parsed_data"]
+    payload = {"status": "done", "result": {"success": True, "product_name": product_data.get("product_name"),
+                                            "product_data": product_data}}
+
+    receiver = WebhookReceiver(SECRET, args.fail_first, args.fail_rate, args.latency)
+    results: List[Dict[str, Any]] = []
+    with BackgroundServer(receiver.app, port=args.port) as server, tempfile.TemporaryDirectory() as tmp:
+        url = f"{server.url}/webhook"
+        print(f"📊 Livraison de {args.events} webhooks (destinataire {args.latency * 1000:.0f} ms, "
+              f"{args.fail_first} échec(s) imposé(s), {args.fail_rate:.0%} d'échecs aléatoires)")
+        print(f"{'tâches':>6}  {'total (s)':>9} {'évts/s':>8} {'p50 (ms)':>9} {'p95 (ms)':>9} "
+              f"{'tentatives':>10} {'livrés':>7} {'doublons':>8}")
+        for workers in args.workers:
+            row = run(workers, args, payload, url, receiver, Path(tmp))
+            results.append(row)
+            print(f"{workers:6d}  {row['seconds']:9.2f} {row['events_per_second']:8.1f} "
+                  f"{row['delay_p50_ms'] or 0:9.0f} {row['delay_p95_ms'] or 0:9.0f} "
+                  f"{row['attempts_per_event']:10.2f} {row['delivered']:>4}/{args.events} {row['duplicates']:8d}")
+
+    ok = all(row["delivered"] == args.events and not row["rejected_signatures"] for row in results)
+    if ok:
+        print("✅ Tous les événements livrés, signatures valides")
+    else:
+        print("❌ Événements non livrés ou signatures refusées")
+
+    if args.json:
+        args.json.write_text(json.dumps(results, indent=2), encoding="utf-8")
+        print(f"✅ Résultats écrits dans {args.json}")
+    sys.exit(0 if ok else 1)
+
+if __name__ == "__main__":
+    main()
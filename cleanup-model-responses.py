@@ -3,100 +3,62 @@
 Script pour nettoyer les anciennes réponses du modèle
 """
 
-import json
-import os
 import sys
 from pathlib import Path
 from datetime import datetime, timedelta
-from typing import Dict, Any, List
+from typing import Optional
 
-def cleanup_old_responses(outputs_dir: str = "outputs", days_to_keep: int = 7) -> None:
+from app.services.model_response_store import ModelResponseStore, model_response_store
+
+def cleanup_old_responses(store: ModelResponseStore = model_response_store, days_to_keep: int = 7) -> None:
     """Nettoie les anciennes réponses du modèle"""
-    outputs_path = Path(outputs_dir)
-    
-    if not outputs_path.exists():
-        print(f"❌ Le dossier {outputs_dir} n'existe pas")
+    if not store.db_path.exists():
+        print(f"❌ Le stockage {store.db_path} n'existe pas")
         return
     
     cutoff_date = datetime.now() - timedelta(days=days_to_keep)
-    deleted_count = 0
     
     print(f"🧹 Nettoyage des réponses plus anciennes que {days_to_keep} jours...")
     print(f"📅 Date limite: {cutoff_date.strftime('%Y-%m-%d %H:%M:%S')}")
     print()
     
-    # Parcourir tous les sous-dossiers
-    for session_dir in outputs_path.iterdir():
-        if session_dir.is_dir():
-            model_responses_dir = session_dir / "model_responses"
-            if model_responses_dir.exists():
-                for json_file in model_responses_dir.glob("*.json"):
-                    try:
-                        # Vérifier la date de modification du fichier
-                        file_mtime = datetime.fromtimestamp(json_file.stat().st_mtime)
-                        
-                        if file_mtime < cutoff_date:
-                            print(f"🗑️  Suppression: {json_file}")
-                            json_file.unlink()
-                            deleted_count += 1
-                            
-                            # Si le dossier est vide, le supprimer aussi
-                            if not any(model_responses_dir.iterdir()):
-                                model_responses_dir.rmdir()
-                                print(f"🗑️  Suppression du dossier vide: {model_responses_dir}")
-                                
-                    except Exception as e:
-                        print(f"⚠️  Erreur lors de la suppression de {json_file}: {e}")
+    # Suppression en une requête grâce à l'index sur le timestamp
+    deleted_count = store.delete_older_than(cutoff_date)
     
-    print(f"\n✅ Nettoyage terminé: {deleted_count} fichier(s) supprimé(s)")
+    print(f"\n✅ Nettoyage terminé: {deleted_count} réponse(s) supprimée(s)")
 
-def list_responses_by_age(outputs_dir: str = "outputs") -> None:
+def list_responses_by_age(store: ModelResponseStore = model_response_store, limit: Optional[int] = None) -> None:
     """Liste les réponses par âge"""
-    outputs_path = Path(outputs_dir)
-    
-    if not outputs_path.exists():
-        print(f"❌ Le dossier {outputs_dir} n'existe pas")
+    if not store.db_path.exists():
+        print(f"❌ Le stockage {store.db_path} n'existe pas")
         return
     
-    responses = []
-    
-    # Parcourir tous les sous-dossiers
-    for session_dir in outputs_path.iterdir():
-        if session_dir.is_dir():
-            model_responses_dir = session_dir / "model_responses"
-            if model_responses_dir.exists():
-                for json_file in model_responses_dir.glob("*.json"):
-                    try:
-                        file_mtime = datetime.fromtimestamp(json_file.stat().st_mtime)
-                        age_days = (datetime.now() - file_mtime).days
-                        
-                        responses.append({
-                            'file': json_file,
-                            'age_days': age_days,
-                            'mtime': file_mtime
-                        })
-                    except Exception as e:
-                        print(f"⚠️  Erreur lors de l'analyse de {json_file}: {e}")
+    # Les plus anciennes en premier
+    responses = store.list(newest_first=False, limit=limit)
     
     if not responses:
         print("❌ Aucune réponse trouvée")
         return
     
-    # Trier par âge
-    responses.sort(key=lambda x: x['age_days'], reverse=True)
-    
     print(f"📋 {len(responses)} réponse(s) trouvée(s):")
     print("-" * 80)
     
+    now = datetime.now()
     for i, response in enumerate(responses, 1):
-        age = response['age_days']
+        timestamp = datetime.fromisoformat(response['timestamp'])
+        age = (now - timestamp).days
         age_str = f"{age} jour(s)" if age > 0 else "Aujourd'hui"
         
-        print(f"{i:2d}. {response['file'].name}")
+        print(f"{i:2d}. Session {response['session_id']} ({response['model']}, {response['parse_status']})")
         print(f"    Âge: {age_str}")
-        print(f"    Date: {response['mtime'].strftime('%Y-%m-%d %H:%M:%S')}")
+        print(f"    Date: {timestamp.strftime('%Y-%m-%d %H:%M:%S')}")
         print()
 
+def import_legacy_responses(store: ModelResponseStore = model_response_store, outputs_dir: str = "outputs") -> None:
+    """Importe les anciens fichiers JSON outputs/<session>/model_responses/*.json"""
+    imported = store.import_legacy_files(Path(outputs_dir))
+    print(f"✅ {imported} réponse(s) importée(s) depuis {outputs_dir}")
+
 def main():
     """Fonction principale"""
     print("🧹 NETTOYEUR DES RÉPONSES DU MODÈLE")
@@ -119,11 +81,16 @@ def main():
         elif command == "list":
             list_responses_by_age()
             
+        elif command == "import":
+            outputs_dir = sys.argv[2] if len(sys.argv) > 2 else "outputs"
+            import_legacy_responses(outputs_dir=outputs_dir)
+            
         else:
             print("❌ Commande invalide")
             print("Usage:")
             print("  python cleanup-model-responses.py clean [jours]  # Nettoyer les anciennes réponses")
             print("  python cleanup-model-responses.py list            # Lister les réponses par âge")
+            print("  python cleanup-model-responses.py import [dossier] # Importer les anciens fichiers JSON")
     else:
         # Mode interactif
         print("Choisissez une action:")
@@ -3,14 +3,25 @@
 Script de démarrage pour l'application PDF to Product Sheet Generator
 """
 
+import os
+import shutil
+from pathlib import Path
+
 import uvicorn
-from app.main import app
+from app.config import settings
+from app.services.metrics import MULTIPROCESS_DIRNAME
 
 if __name__ == "__main__":
+    # WORKERS=0 : un processus par cœur (état partagé dans DATA_DIR)
+    workers = settings.WORKERS or os.cpu_count() or 1
+    # Instantanés /metrics des workers d'une exécution précédente : compteurs repartant de zéro
+    shutil.rmtree(Path(settings.DATA_DIR) / MULTIPROCESS_DIRNAME, ignore_errors=True)
     uvicorn.run(
         "app.main:app",
-        host="0.0.0.0",
-        port=8000,
-        reload=True,
+        host=settings.HOST,
+        port=settings.PORT,
+        # Le rechargement automatique n'est possible qu'avec un seul processus
+        reload=workers == 1,
+        workers=workers,
         log_level="info"
-    ) 
\ No newline at end of file
+    )
@@ -100,45 +100,51 @@ if [ -d "$output_dir" ]; then
     else
         echo "❌ Fichier HTML manquant"
     fi
-    
-    # Vérifier les réponses du modèle
-    model_responses_dir="$output_dir/model_responses"
-    if [ -d "$model_responses_dir" ]; then
-        echo "✅ Dossier des réponses du modèle créé"
-        
-        # Compter les fichiers de réponse
-        response_count=$(find "$model_responses_dir" -name "*.json" | wc -l)
-        echo "📊 Nombre de réponses sauvegardées: $response_count"
-        
-        # Afficher le contenu d'une réponse
-        if [ $response_count -gt 0 ]; then
-            echo ""
-            echo "📋 Exemple de réponse sauvegardée:"
-            first_response=$(find "$model_responses_dir" -name "*.json" | head -1)
-            echo "Fichier: $first_response"
-            
-            # Afficher les métadonnées
-            echo ""
-            echo "📊 Métadonnées:"
-            jq '.metadata' "$first_response" 2>/dev/null || echo "   Impossible de parser le JSON"
-            
-            # Afficher les statistiques
-            echo ""
-            echo "📈 Statistiques:"
-            jq '.analysis_info' "$first_response" 2>/dev/null || echo "   Impossible de parser le JSON"
-            
-            # Afficher les données extraites principales
-            echo ""
-            echo "✅ Données extraites principales:"
-            jq '.parsed_data | {product_name, brand, model_number, category}' "$first_response" 2>/dev/null || echo "   Impossible de parser le JSON"
-        fi
-    else
-        echo "❌ Dossier des réponses du modèle manquant"
-    fi
 else
     echo "❌ Dossier de sortie manquant"
 fi
 
+# Vérifier les réponses du modèle dans le stockage indexé (data/model_responses.db)
+echo ""
+echo "🔍 Vérification des réponses du modèle sauvegardées..."
+db_path="${DATA_DIR:-data}/model_responses.db"
+if [ -f "$db_path" ]; then
+    # Python standard uniquement (sqlite3, zlib) : pas besoin des dépendances de l'application
+    python3 - "$db_path" "$session_id" << 'PYEOF'
+import json, sqlite3, sys, zlib
+
+db_path, session_id = sys.argv[1], sys.argv[2]
+conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+rows = conn.execute(
+    "SELECT timestamp, model, parse_status, prompt_length, response_length, parsed_fields_count, payload "
+    "FROM model_responses WHERE session_id = ? ORDER BY timestamp", (session_id,)
+).fetchall()
+if not rows:
+    print("❌ Aucune réponse du modèle enregistrée pour cette session")
+    sys.exit(0)
+print(f"✅ Réponses du modèle enregistrées dans {db_path}")
+print(f"📊 Nombre de réponses sauvegardées: {len(rows)}")
+timestamp, model, status, prompt_length, response_length, fields, payload = rows[0]
+print("")
+print("📊 Métadonnées:")
+print(json.dumps({"session_id": session_id, "timestamp": timestamp, "model": model, "parse_status": status},
+                 ensure_ascii=False, indent=2))
+print("")
+print("📈 Statistiques:")
+print(json.dumps({"prompt_length": prompt_length, "response_length": response_length,
+                  "parsed_fields_count": fields}, indent=2))
+parsed = json.loads(zlib.decompress(payload)).get("parsed_data", {})
+print("")
+print("✅ Données extraites principales:")
+print(json.dumps({key: parsed.get(key) for key in ("product_name", "brand", "model_number", "category")},
+                 ensure_ascii=False, indent=2))
+PYEOF
+    echo ""
+    echo "   Détail: python view-model-responses.py --session $session_id"
+else
+    echo "❌ Stockage des réponses du modèle manquant: $db_path"
+fi
+
 echo ""
 
 # Nettoyer les fichiers de test
@@ -0,0 +1,31 @@
+from app.services.asset_fetcher import LocalAssetFetcher
+
+
+def make_fetcher(tmp_path, **kwargs):
+    for name in ("a.css", "b.css", "c.css"):
+        (tmp_path / name).write_text("x" * 100)
+    return LocalAssetFetcher(static_dir=tmp_path, allow_remote=False, **kwargs)
+
+
+def test_cache_evicts_least_recently_used(tmp_path):
+    fetcher = make_fetcher(tmp_path, max_entries=2)
+    fetcher("/static/a.css")
+    fetcher("/static/b.css")
+    fetcher("/static/a.css")
+    fetcher("/static/c.css")
+    assert list(fetcher._cache) == ["/static/a.css", "/static/c.css"]
+
+
+def test_cache_bounded_in_bytes(tmp_path):
+    fetcher = make_fetcher(tmp_path, max_bytes=250)
+    for name in ("a.css", "b.css", "c.css"):
+        assert fetcher(f"/static/{name}")["string"] == b"x" * 100
+    assert fetcher._size == 200
+    assert len(fetcher._cache) == 2
+
+
+def test_cdn_urls_ignored_offline(tmp_path):
+    fetcher = make_fetcher(tmp_path)
+    result = fetcher("https://cdn.jsdelivr.net/npm/bootstrap@5.1.3/dist/css/bootstrap.min.css")
+    assert result["string"] == b""
+    assert fetcher.resolve("https://cdn.jsdelivr.net/npm/bootstrap@5.1.3/dist/css/bootstrap.min.css") is None
@@ -0,0 +1,86 @@
+from app.services.catalogue import CatalogueSplitter
+
+HEADER = "Catalogue Cuisson 2024"
+
+
+def page(*lines):
+    """Page avec l'en-tête courant du catalogue"""
+    return "\n".join((HEADER,) + lines)
+
+
+CATALOGUE = [
+    page("Nos fours encastrables", "Édition printemps"),
+    page("Sommaire", "Réf. FX-4500 .... 3", "Réf. FX-5500 .... 5", "Réf. FX-6500 .... 7",
+         "Réf. HX-100 .... 8", "Réf. HX-200 .... 9"),
+    page("3", "Four multifonction FX-4500", "Réf. : FX-4500", "Puissance 3500 W, 230V, 50HZ"),
+    page("4", "Caractéristiques techniques", "Classe énergétique A+", "Norme EN60335"),
+    page("5", "Four vapeur FX-5500", "Modèle n° FX-5500"),
+    page("6", "Accessoires du four", "Compatibles avec la réf. FX-5500"),
+    "",
+    page("7", "Tableau comparatif", "Réf. FX-4500", "Réf. FX-5500", "Réf. FX-6500", "Réf. HX-100", "Réf. HX-200"),
+    page("8", "Plaque induction HX-100", "Réf. HX-100"),
+]
+
+
+def test_running_headers_detected():
+    assert CatalogueSplitter().running_headers(CATALOGUE) == {HEADER}
+
+
+def test_heading_skips_running_header_and_page_number():
+    splitter = CatalogueSplitter()
+    assert splitter.heading(CATALOGUE[2], {HEADER}) == "Four multifonction FX-4500"
+    assert splitter.heading(CATALOGUE[2]) == HEADER
+    assert splitter.heading("x" * 150) == ""
+
+
+def test_model_numbers_ignore_values_and_standards():
+    splitter = CatalogueSplitter()
+    text = "Four FX-4500\nRéf. : FX-4500\n230V 50HZ IP44 EN60335\nArticle n° ab-12."
+    assert splitter.model_numbers(text, "Four FX-4500") == ["FX-4500", "AB-12"]
+
+
+def test_split_catalogue():
+    sections, preamble = CatalogueSplitter().split(CATALOGUE)
+
+    # Couverture et sommaire (plus de max_models_per_page références) écartés
+    assert preamble == [1, 2]
+    assert [(s.index, s.title, s.pages, s.model_numbers) for s in sections] == [
+        (1, "Four multifonction FX-4500", [3, 4], ["FX-4500"]),
+        # Page d'accessoires citant la référence en cours, page vide ignorée, tableau comparatif rattaché
+        (2, "Four vapeur FX-5500", [5, 6, 8], ["FX-5500"]),
+        (3, "Plaque induction HX-100", [9], ["HX-100"]),
+    ]
+
+
+def test_index_page_limit_configurable():
+    sections, preamble = CatalogueSplitter(max_models_per_page=5).split(CATALOGUE[:3])
+    # Le sommaire, sous la limite, ouvre un produit qui absorbe la page suivante
+    assert preamble == [1]
+    assert sections[0].pages == [2, 3]
+    assert sections[0].model_numbers == ["FX-4500", "FX-5500", "FX-6500", "HX-100", "HX-200"]
+
+
+def test_known_reference_does_not_reopen_product():
+    pages = [
+        page("Four FX-4500", "Réf. FX-4500"),
+        page("Four FX-5500", "Réf. FX-5500"),
+        page("Rappel : Four FX-4500", "Réf. FX-4500"),
+    ]
+    sections, _ = CatalogueSplitter().split(pages)
+    assert [s.pages for s in sections] == [[1], [2, 3]]
+
+
+def test_no_reference_single_product():
+    pages = ["", "Notice d'utilisation\nLave-linge 8 kg", "Installation\nRaccorder l'arrivée d'eau", "  "]
+    sections, preamble = CatalogueSplitter().split(pages)
+    assert preamble == []
+    assert len(sections) == 1
+    assert sections[0].pages == [2, 3]
+    assert sections[0].title == "Notice d'utilisation"
+    assert sections[0].model_numbers == []
+
+
+def test_empty_document():
+    sections, preamble = CatalogueSplitter().split(["", " "])
+    assert [(s.pages, s.title) for s in sections] == [([], "")]
+    assert preamble == []
@@ -0,0 +1,92 @@
+import asyncio
+
+import pytest
+
+from app.config import settings
+from app.services import pdf_analyzer
+from app.services.checkpoints import CheckpointStore
+from app.services.pdf_analyzer import PDFAnalyzer, document_key
+
+
+def run_analysis(monkeypatch, status):
+    analyzer = PDFAnalyzer()
+    calls = []
+
+    async def cascade(text, session_id=None, output_path=None):
+        calls.append(text)
+        analyzer.segment_status = status
+        return analyzer.create_fallback_structure({"product_name": "Perceuse"})
+
+    async def available():
+        return True
+
+    monkeypatch.setattr(analyzer, "analyze_with_cascade", cascade)
+    monkeypatch.setattr(analyzer, "wait_for_ollama", available)
+    asyncio.run(analyzer.analyze_text("Perceuse sans fil 18 V", "session"))
+    return analyzer, calls
+
+
+def test_checkpoints_deleted_after_successful_merge(monkeypatch, tmp_path):
+    store = CheckpointStore(tmp_path / "checkpoints.db")
+    monkeypatch.setattr(pdf_analyzer, "checkpoint_store", store)
+    monkeypatch.setattr(settings, "NEAR_DUPLICATE_ENABLED", False)
+    saved = []
+    save = store.save
+    monkeypatch.setattr(store, "save", lambda key, index, *args: saved.append(index) or save(key, index, *args))
+
+    analyzer, calls = run_analysis(monkeypatch, "ok")
+    assert len(calls) == 1 and saved == [0]
+    key = document_key("Perceuse sans fil 18 V", 1, analyzer.model, analyzer.small_model)
+    assert store.load(key, 1) == {}
+
+    # Nouvelle soumission après succès : analysée à nouveau, pas rejouée
+    _, calls = run_analysis(monkeypatch, "ok")
+    assert len(calls) == 1
+
+
+def test_interrupted_analysis_resumes_from_checkpoints(monkeypatch, tmp_path):
+    store = CheckpointStore(tmp_path / "checkpoints.db")
+    monkeypatch.setattr(pdf_analyzer, "checkpoint_store", store)
+    monkeypatch.setattr(settings, "NEAR_DUPLICATE_ENABLED", False)
+    text = " ".join(f"Caractéristique {i} de la perceuse sans fil." for i in range(400))
+    analyzer = PDFAnalyzer()
+    segments = analyzer.split_text(text, 4000)
+    assert len(segments) > 2
+    calls = []
+    fail_at = [2]  # Le deuxième appel au modèle échoue
+
+    async def cascade(segment, session_id=None, output_path=None):
+        calls.append(segment)
+        analyzer.segment_status = "ok"
+        if len(calls) == fail_at[0]:
+            raise TimeoutError("Ollama ne répond plus")
+        return analyzer.create_fallback_structure({"product_name": "Perceuse"})
+
+    async def available():
+        return True
+
+    monkeypatch.setattr(analyzer, "analyze_with_cascade", cascade)
+    monkeypatch.setattr(analyzer, "wait_for_ollama", available)
+    with pytest.raises(TimeoutError):
+        asyncio.run(analyzer.analyze_text(text, "session"))
+    key = document_key(text, len(segments), analyzer.model, analyzer.small_model)
+    assert list(store.load(key, len(segments))) == [0]
+
+    calls.clear()
+    fail_at[0] = None
+    asyncio.run(analyzer.analyze_text(text, "session"))
+    # Premier segment repris, les autres redemandés, puis points de reprise supprimés
+    assert calls == segments[1:]
+    assert store.load(key, len(segments)) == {}
+
+
+def test_fallback_segment_not_checkpointed(monkeypatch, tmp_path):
+    store = CheckpointStore(tmp_path / "checkpoints.db")
+    monkeypatch.setattr(pdf_analyzer, "checkpoint_store", store)
+    monkeypatch.setattr(settings, "NEAR_DUPLICATE_ENABLED", False)
+    for status in ("fallback", "fallback_error"):
+        _, calls = run_analysis(monkeypatch, status)
+        # Aucune reprise : le segment est redemandé au modèle à chaque soumission
+        assert len(calls) == 1
+    analyzer, calls = run_analysis(monkeypatch, "ok")
+    assert len(calls) == 1
@@ -0,0 +1,32 @@
+import asyncio
+import json
+
+from app import cli
+from app.cli import BulkProcessor, RESULTS_FILENAME
+
+
+def test_files_in_flight_bounded_by_workers_and_concurrency(tmp_path, monkeypatch):
+    processor = BulkProcessor(tmp_path / "bulk", workers=2, concurrency=1, progress=False)
+    pdfs = []
+    for index in range(10):
+        path = tmp_path / f"notice_{index}.pdf"
+        path.write_bytes(b"%PDF-" + bytes([index]))
+        pdfs.append(path)
+    in_flight = []
+    peak = []
+
+    async def process_file(pdf_path, sha256, pool, semaphore):
+        in_flight.append(pdf_path)
+        peak.append(len(in_flight))
+        await asyncio.sleep(0.01)
+        in_flight.remove(pdf_path)
+        return {"file": str(pdf_path), "sha256": sha256, "status": "ok", "outputs": {}}
+
+    monkeypatch.setattr(processor, "process_file", process_file)
+    monkeypatch.setattr(cli.llm_scheduler, "max_wait", cli.llm_scheduler.max_wait)
+    records = asyncio.run(processor.run(pdfs))
+
+    assert len(records) == 10
+    assert max(peak) == 3
+    lines = (tmp_path / "bulk" / RESULTS_FILENAME).read_text(encoding="utf-8").splitlines()
+    assert sorted(json.loads(line)["file"] for line in lines) == sorted(str(p) for p in pdfs)
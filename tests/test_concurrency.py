@@ -0,0 +1,73 @@
+import asyncio
+
+from app.services.concurrency import AdaptiveLimiter
+
+
+def test_timeouts_lower_limit_every_time():
+    limiter = AdaptiveLimiter(initial=8, max_limit=16)
+    limits = []
+    for _ in range(20):
+        limiter.on_overload()
+        limits.append(limiter.limit)
+    assert limits[:4] == [6, 4, 3, 2]
+    assert limiter.limit == limiter.min_limit
+
+
+def test_timeout_ignored_when_not_adaptive():
+    limiter = AdaptiveLimiter(initial=8, adaptive=False)
+    limiter.on_overload()
+    assert limiter.limit == 8
+
+
+def test_growing_latency_lowers_limit_once_per_window():
+    limiter = AdaptiveLimiter(initial=8, max_limit=16)
+    for _ in range(8):
+        limiter.on_success(1.0, 100, in_flight=1)
+    assert limiter.limit == 8
+    # Latence par token multipliée par 10 : file d'attente côté serveur
+    limits = []
+    for _ in range(8):
+        limiter.on_success(10.0, 100, in_flight=1)
+        limits.append(limiter.limit)
+    # Une réduction immédiate, puis plus rien avant 6 nouveaux appels terminés
+    assert limits == [6, 6, 6, 6, 6, 6, 4, 4]
+
+
+def test_stable_latency_grows_limit_when_saturated():
+    limiter = AdaptiveLimiter(initial=2, max_limit=4)
+    for _ in range(20):
+        limiter.on_success(1.0, 100, in_flight=limiter.limit)
+    assert limiter.limit == 4
+
+
+def test_stable_latency_does_not_grow_unused_limit():
+    limiter = AdaptiveLimiter(initial=2, max_limit=4)
+    for _ in range(20):
+        limiter.on_success(1.0, 100, in_flight=1)
+    assert limiter.limit == 2
+
+
+def test_baselines_are_per_model():
+    limiter = AdaptiveLimiter(initial=4, max_limit=8)
+    for _ in range(10):
+        limiter.on_success(0.1, 100, in_flight=1, model="petit")
+        limiter.on_success(1.0, 100, in_flight=1, model="grand")
+    assert limiter.limit == 4
+
+
+def test_acquire_waits_for_free_slot():
+    async def scenario():
+        limiter = AdaptiveLimiter(initial=1, adaptive=False)
+        order = []
+
+        async def call(name):
+            async with limiter.acquire():
+                order.append(name)
+                await asyncio.sleep(0.01)
+
+        await asyncio.gather(call("a"), call("b"))
+        return order, limiter.in_flight
+
+    order, in_flight = asyncio.run(scenario())
+    assert order == ["a", "b"]
+    assert in_flight == 0
@@ -0,0 +1,78 @@
+import asyncio
+
+import pytest
+
+from app.services.lazy_render import LazyRenderer
+
+FILENAME = "fiche_produit_session.html"
+
+
+def slow_renderer(monkeypatch, result="rendu", error=None):
+    renderer = LazyRenderer()
+    calls = []
+
+    async def render(session_id, filename, output_format, product=None):
+        calls.append((session_id, filename, output_format, product))
+        await asyncio.sleep(0.05)
+        if error is not None:
+            raise error
+        return result
+
+    monkeypatch.setattr(renderer, "_render", render)
+    return renderer, calls
+
+
+def test_concurrent_requests_share_one_render(monkeypatch):
+    renderer, calls = slow_renderer(monkeypatch)
+
+    async def scenario():
+        return await asyncio.gather(*(renderer.ensure("session", FILENAME) for _ in range(5)))
+
+    assert asyncio.run(scenario()) == ["rendu"] * 5
+    assert calls == [("session", FILENAME, "html", None)]
+    assert renderer._in_flight == {}
+
+
+def test_cancelled_first_request_does_not_block_waiters(monkeypatch):
+    renderer, calls = slow_renderer(monkeypatch)
+
+    async def scenario():
+        first = asyncio.create_task(renderer.ensure("session", FILENAME))
+        await asyncio.sleep(0)
+        second = asyncio.create_task(renderer.ensure("session", FILENAME))
+        await asyncio.sleep(0)
+        first.cancel()
+        result = await asyncio.wait_for(second, timeout=1)
+        return first.cancelled(), result
+
+    assert asyncio.run(scenario()) == (True, "rendu")
+    assert len(calls) == 1
+    assert renderer._in_flight == {}
+
+
+def test_failure_propagates_to_all_waiters(monkeypatch):
+    renderer, calls = slow_renderer(monkeypatch, error=RuntimeError("rendu impossible"))
+
+    async def scenario():
+        return await asyncio.gather(*(renderer.ensure("session", FILENAME) for _ in range(3)),
+                                    return_exceptions=True)
+
+    results = asyncio.run(scenario())
+    assert [str(r) for r in results] == ["rendu impossible"] * 3
+    assert len(calls) == 1
+
+
+def test_non_sheet_file_not_rendered(monkeypatch):
+    renderer, calls = slow_renderer(monkeypatch)
+    assert asyncio.run(renderer.ensure("session", "autre.html")) is None
+    assert renderer.renderable_format("session", "fiche_produit_session_03.pdf") == ("pdf", 3)
+    assert calls == []
+
+
+def test_failed_render_retried_on_next_request(monkeypatch):
+    renderer, calls = slow_renderer(monkeypatch, error=OSError("disque plein"))
+    with pytest.raises(OSError):
+        asyncio.run(renderer.ensure("session", FILENAME))
+    with pytest.raises(OSError):
+        asyncio.run(renderer.ensure("session", FILENAME))
+    assert len(calls) == 2
@@ -0,0 +1,124 @@
+import io
+import json
+import logging
+import queue
+import threading
+
+import pytest
+
+from app.services import metrics
+from app.services.log_pipeline import ContextQueueHandler, LogPipeline, SamplingFilter, parse_sampling, set_session_id
+
+
+@pytest.fixture
+def root_logger():
+    """Handlers et niveau du logger racine rétablis après le test"""
+    root = logging.getLogger()
+    handlers, level = root.handlers[:], root.level
+    yield root
+    for handler in root.handlers[:]:
+        root.removeHandler(handler)
+    for handler in handlers:
+        root.addHandler(handler)
+    root.setLevel(level)
+
+
+def record(name, level=logging.INFO, message="page"):
+    return logging.LogRecord(name, level, __file__, 1, message, None, None)
+
+
+def test_parse_sampling():
+    assert parse_sampling("") == {}
+    assert parse_sampling(" app.pages = 0.1 ,, app.ocr=1") == {"app.pages": 0.1, "app.ocr": 1.0}
+
+
+@pytest.mark.parametrize("value", ["app.pages", "=0.5", "app.pages=0", "app.pages=1.5", "app.pages=abc"])
+def test_parse_sampling_rejects_invalid_entries(value):
+    with pytest.raises(ValueError):
+        parse_sampling(value)
+
+
+def test_sampling_keeps_first_then_one_in_n():
+    sampling = SamplingFilter({"app.pages": 0.25})
+    dropped = metrics.LOG_RECORDS_DROPPED.value(reason="sampled")
+
+    # Les enfants du logger échantillonné partagent son compteur
+    kept = [sampling.filter(record("app.pages.ocr" if i % 2 else "app.pages")) for i in range(9)]
+    assert [i for i, keep in enumerate(kept) if keep] == [0, 4, 8]
+    assert metrics.LOG_RECORDS_DROPPED.value(reason="sampled") == dropped + 6
+
+    first = record("app.pages")
+    SamplingFilter({"app.pages": 0.25}).filter(first)
+    assert first.sample_interval == 4
+
+
+def test_sampling_spares_errors_and_other_loggers():
+    sampling = SamplingFilter({"app.pages": 0.1})
+    sampling.filter(record("app.pages"))
+    assert sampling.filter(record("app.pages", logging.ERROR))
+    assert sampling.filter(record("app.pagesx"))
+    assert sampling.filter(record("app"))
+    assert not sampling.filter(record("app.pages"))
+    assert SamplingFilter({}).filter(record("app.pages"))
+
+
+def test_full_queue_drops_record_without_blocking():
+    records = queue.Queue(maxsize=1)
+    handler = ContextQueueHandler(records)
+    dropped = metrics.LOG_RECORDS_DROPPED.value(reason="queue_full")
+
+    set_session_id("session-1")
+    try:
+        handler.handle(record("app", message="premier"))
+        handler.handle(record("app", message="second"))
+    finally:
+        set_session_id(None)
+
+    assert metrics.LOG_RECORDS_DROPPED.value(reason="queue_full") == dropped + 1
+    queued = records.get_nowait()
+    assert (queued.getMessage(), queued.session_id) == ("premier", "session-1")
+    assert records.empty()
+
+
+class BlockingStream(io.StringIO):
+    """Sortie lente : la première écriture attend `release`"""
+
+    def __init__(self):
+        super().__init__()
+        self.writing = threading.Event()
+        self.release = threading.Event()
+
+    def write(self, text):
+        self.writing.set()
+        self.release.wait(5)
+        return super().write(text)
+
+
+def messages(stream):
+    return [json.loads(line)["message"] for line in stream.getvalue().splitlines()]
+
+
+def test_stop_drains_full_queue_then_writes_directly(root_logger):
+    stream = BlockingStream()
+    pipeline = LogPipeline()
+    pipeline.start(level="INFO", log_format="json", sampling="", queue_size=2, stream=stream)
+    logger = logging.getLogger("app.test")
+
+    logger.info("a")
+    assert stream.writing.wait(5)  # Thread d'écriture bloqué sur « a »
+    for message in "bcd":
+        logger.info(message)  # « d » : file pleine, abandonné
+
+    # L'arrêt attend de pouvoir déposer la sentinelle dans la file pleine
+    stopping = threading.Thread(target=pipeline.stop)
+    stopping.start()
+    stopping.join(0.1)
+    assert stopping.is_alive()
+    stream.release.set()
+    stopping.join(5)
+    assert not stopping.is_alive()
+    assert not pipeline.running
+    assert messages(stream) == ["a", "b", "c"]
+
+    logger.info("après l'arrêt")
+    assert messages(stream)[-1] == "après l'arrêt"
@@ -0,0 +1,80 @@
+import json
+import os
+import time
+
+from app.services.metrics import Counter, Gauge, Histogram, MultiprocessMetrics, Registry
+
+
+def worker_metrics():
+    """Mêmes métriques déclarées dans chaque processus, comme au chargement du module"""
+    registry = Registry()
+    return registry, {
+        "uploads": Counter("uploads", "Uploads", registry),
+        "in_progress": Gauge("in_progress", "En cours", registry),
+        "latency": Histogram("latency_seconds", "Latence", (0.1, 1.0), registry),
+    }
+
+
+def test_render_sums_counters_and_histograms_across_workers(tmp_path):
+    registry_a, a = worker_metrics()
+    registry_b, b = worker_metrics()
+    a["uploads"].inc(status="success")
+    a["uploads"].inc(status="error")
+    b["uploads"].inc(2, status="success")
+    a["latency"].observe(0.05)
+    b["latency"].observe(0.5)
+    b["latency"].observe(5)
+    a["in_progress"].set(1)
+    b["in_progress"].set(3)
+
+    MultiprocessMetrics(tmp_path, "hote:2", registry_b).write()
+    lines = MultiprocessMetrics(tmp_path, "hote:1", registry_a).render().splitlines()
+
+    assert 'uploads_total{status="success"} 3' in lines
+    assert 'uploads_total{status="error"} 1' in lines
+    assert 'latency_seconds_bucket{le="0.1"} 1' in lines
+    assert 'latency_seconds_bucket{le="1"} 2' in lines
+    assert 'latency_seconds_bucket{le="+Inf"} 3' in lines
+    assert "latency_seconds_count 3" in lines
+    assert "latency_seconds_sum 5.55" in lines
+    # Jauges : une valeur par worker
+    assert 'in_progress{worker="hote:1"} 1' in lines
+    assert 'in_progress{worker="hote:2"} 3' in lines
+
+
+def test_stopped_worker_keeps_counters_but_not_gauges(tmp_path):
+    registry_a, a = worker_metrics()
+    registry_b, b = worker_metrics()
+    b["uploads"].inc(5, status="success")
+    b["in_progress"].set(2)
+    stopped = MultiprocessMetrics(tmp_path, "hote:2", registry_b, interval=1)
+    stopped.write()
+    old = time.time() - 60
+    os.utime(stopped.path, (old, old))
+
+    lines = MultiprocessMetrics(tmp_path, "hote:1", registry_a, interval=1).render().splitlines()
+
+    assert 'uploads_total{status="success"} 5' in lines
+    assert not any(line.startswith("in_progress{") for line in lines)
+
+
+def test_single_process_render_unchanged():
+    registry, metrics = worker_metrics()
+    metrics["uploads"].inc(status="success")
+    metrics["in_progress"].inc()
+    lines = registry.render().splitlines()
+    assert 'uploads_total{status="success"} 1' in lines
+    assert "in_progress 1" in lines
+    assert "# TYPE latency_seconds histogram" in lines
+
+
+def test_snapshot_thread_writes_and_stops(tmp_path):
+    registry, metrics = worker_metrics()
+    exporter = MultiprocessMetrics(tmp_path, "hote:1", registry, interval=0.01)
+    exporter.start()
+    metrics["uploads"].inc(status="success")
+    exporter.stop()
+    # Dernier instantané écrit à l'arrêt
+    snapshot = json.loads(exporter.path.read_text(encoding="utf-8"))
+    assert snapshot["metrics"]["uploads_total"] == [[[["status", "success"]], 1.0]]
+    assert exporter.path.name == "hote_1.json"
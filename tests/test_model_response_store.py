@@ -0,0 +1,25 @@
+import json
+
+from app.services.model_response_store import ModelResponseStore
+
+
+def write_legacy(outputs, session_id, name, timestamp):
+    folder = outputs / session_id / "model_responses"
+    folder.mkdir(parents=True, exist_ok=True)
+    (folder / name).write_text(json.dumps({
+        "metadata": {"session_id": session_id, "timestamp": timestamp, "model": "llama3"},
+        "prompt": "prompt", "raw_response": "{}", "parsed_data": {"product_name": "Perceuse"},
+    }), encoding="utf-8")
+
+
+def test_legacy_import_is_idempotent(tmp_path):
+    outputs = tmp_path / "outputs"
+    write_legacy(outputs, "s1", "a.json", "2024-05-01T10:00:00")
+    write_legacy(outputs, "s1", "b.json", "2024-05-01T10:05:00")
+    store = ModelResponseStore(tmp_path / "model_responses.db")
+
+    assert store.import_legacy_files(outputs) == 2
+    assert store.import_legacy_files(outputs) == 0
+    write_legacy(outputs, "s2", "a.json", "2024-05-01T10:00:00")
+    assert store.import_legacy_files(outputs) == 1
+    assert len(store.list()) == 3
@@ -0,0 +1,153 @@
+import asyncio
+
+import pytest
+
+from app.config import settings
+from app.services import metrics, pdf_analyzer
+from app.services.near_duplicates import NearDuplicateIndex, apply_refresh, fields_to_refresh
+from app.services.pdf_analyzer import PDFAnalyzer
+
+TEXT = (
+    "Perceuse visseuse sans fil Bosch GSR 18V-55 coloris inox. Batterie lithium-ion 18 V 2,0 Ah, "
+    "couple maximal 55 Nm, mandrin automatique 13 mm. Lame de protection en inox brossé. "
+    "Poignée ergonomique Softgrip, éclairage LED intégré. Livrée avec chargeur rapide, deux batteries "
+    "et coffret L-BOXX. Garantie constructeur deux ans après enregistrement en ligne. Conforme aux "
+    "normes CE et RoHS. Entretien sans outil. Compatible avec toute la gamme Professional 18V."
+)
+
+PRODUCT = {
+    "product_name": "Perceuse visseuse GSR 18V-55",
+    "brand": "Bosch",
+    "model_number": "GSR 18V-55",
+    "category": "Perceuse visseuse",
+    "price_range": "",
+    "technical_specs": {"couleur": "inox", "couple": "55 Nm", "mandrin": "13 mm", "batterie": "18 V 2,0 Ah"},
+    "weight": "",
+    "features": ["Poignée ergonomique Softgrip", "éclairage LED intégré"],
+    "certifications": ["CE", "RoHS"],
+    "warranty": "deux ans",
+    "maintenance": "Entretien sans outil",
+    "accessories_included": "chargeur rapide, deux batteries, coffret L-BOXX",
+    "compatibility": "gamme Professional 18V",
+    "additional_info": "",
+}
+EMPTY_FIELDS = ["price_range", "weight", "additional_info"]
+
+
+def test_identical_text_needs_no_refresh():
+    assert fields_to_refresh(TEXT, TEXT, PRODUCT) == []
+
+
+def test_changed_value_refreshed_even_if_word_remains_elsewhere():
+    # « inox » figure encore dans « Lame de protection en inox »
+    variant = TEXT.replace("coloris inox", "coloris noir")
+    assert fields_to_refresh(TEXT, variant, PRODUCT) == ["technical_specs.couleur"]
+
+
+def test_removed_reference_refreshes_every_field_using_it():
+    # « 55 » disparaît aussi de la valeur du couple, redemandée par prudence
+    variant = TEXT.replace("GSR 18V-55", "GSR 18V-60")
+    assert fields_to_refresh(TEXT, variant, PRODUCT) == ["product_name", "model_number", "technical_specs.couple"]
+
+
+def test_longer_replacement_also_refreshes_empty_fields():
+    variant = TEXT.replace("coloris inox", "coloris noir mat")
+    assert fields_to_refresh(TEXT, variant, PRODUCT) == ["technical_specs.couleur"] + EMPTY_FIELDS
+
+
+def test_added_content_without_field_requires_full_analysis():
+    # Nouvelle caractéristique : aucune clé du voisin ne peut la recevoir
+    variant = TEXT.replace("13 mm.", "13 mm. Vitesse à vide 1800 tr/min.")
+    assert fields_to_refresh(TEXT, variant, PRODUCT) is None
+
+
+def test_removed_content_without_field_ignored():
+    variant = TEXT.replace(" après enregistrement en ligne", "")
+    assert fields_to_refresh(TEXT, variant, PRODUCT) == []
+
+
+def test_apply_refresh_replaces_only_requested_fields():
+    refreshed = {"technical_specs": {"couleur": "noir"}, "model_number": "GSR 18V-60"}
+    fields = ["technical_specs.couleur", "model_number", "features", "warranty"]
+    result = apply_refresh(PRODUCT, refreshed, fields)
+
+    assert result["technical_specs"] == {**PRODUCT["technical_specs"], "couleur": "noir"}
+    assert result["model_number"] == "GSR 18V-60"
+    # Champs redemandés absents de la réponse : vidés, au type d'origine
+    assert result["features"] == []
+    assert result["warranty"] == ""
+    assert result["brand"] == "Bosch"
+    assert PRODUCT["technical_specs"]["couleur"] == "inox"
+
+
+def test_apply_refresh_creates_missing_group():
+    result = apply_refresh({"brand": "Bosch"}, {"dimensions": {"hauteur": "20 cm"}}, ["dimensions.hauteur"])
+    assert result == {"brand": "Bosch", "dimensions": {"hauteur": "20 cm"}}
+
+
+@pytest.fixture
+def analyzer(tmp_path, monkeypatch):
+    index = NearDuplicateIndex(tmp_path / "near_duplicates.db")
+    monkeypatch.setattr(pdf_analyzer, "near_duplicate_index", index)
+    analyzer = PDFAnalyzer()
+    analyzer.refresh_calls = []
+
+    async def refresh_fields(text, fields, session_id=None, output_path=None, client_id="anonymous"):
+        analyzer.refresh_calls.append(fields)
+        return {"technical_specs": {"couleur": "noir"}}
+
+    monkeypatch.setattr(analyzer, "refresh_fields", refresh_fields)
+    analyzer.index = index
+    return analyzer
+
+
+def lookup(analyzer, text):
+    before = {result: metrics.NEAR_DUPLICATE_LOOKUPS.value(result=result)
+              for result in ("reused", "refreshed", "full", "miss")}
+    data = asyncio.run(analyzer.reuse_near_duplicate(text, "nouvelle"))
+    counted = [result for result, value in before.items()
+               if metrics.NEAR_DUPLICATE_LOOKUPS.value(result=result) == value + 1]
+    return data, counted
+
+
+def test_reuse_without_model_call(analyzer):
+    analyzer.index.add(TEXT, PRODUCT, "origine")
+    data, counted = lookup(analyzer, TEXT)
+    assert data == PRODUCT
+    assert counted == ["reused"]
+    assert analyzer.refresh_calls == []
+    assert analyzer.near_duplicate == {"session_id": "origine", "score": 1.0, "refreshed_fields": []}
+
+
+def test_reuse_with_refreshed_fields(analyzer):
+    analyzer.index.add(TEXT, PRODUCT, "origine")
+    data, counted = lookup(analyzer, TEXT.replace("coloris inox", "coloris noir"))
+    assert counted == ["refreshed"]
+    assert analyzer.refresh_calls == [["technical_specs.couleur"]]
+    assert data["technical_specs"]["couleur"] == "noir"
+    assert data["brand"] == "Bosch"
+
+
+def test_full_analysis_for_unmatched_added_content(analyzer):
+    analyzer.index.add(TEXT, PRODUCT, "origine")
+    data, counted = lookup(analyzer, TEXT.replace("13 mm.", "13 mm. Vitesse à vide 1800 tr/min."))
+    assert data is None
+    assert counted == ["full"]
+    assert analyzer.refresh_calls == []
+
+
+def test_full_analysis_when_too_many_fields_touched(analyzer, monkeypatch):
+    monkeypatch.setattr(settings, "NEAR_DUPLICATE_MAX_REFRESH", 0.1)
+    analyzer.index.add(TEXT, PRODUCT, "origine")
+    # Nouvelle référence : 3 champs sur 17
+    data, counted = lookup(analyzer, TEXT.replace("GSR 18V-55", "GSR 18V-60"))
+    assert data is None
+    assert counted == ["full"]
+    assert analyzer.refresh_calls == []
+
+
+def test_miss_without_similar_document(analyzer):
+    analyzer.index.add("Réfrigérateur combiné 300 litres classe énergétique A", {"brand": "Liebherr"}, "autre")
+    data, counted = lookup(analyzer, TEXT)
+    assert data is None
+    assert counted == ["miss"]
@@ -0,0 +1,127 @@
+import io
+from datetime import datetime
+
+import pytest
+from PyPDF2 import PdfReader
+
+from app.config import settings
+from app.services import ocr
+from benchmarks.corpus import make_pdf, make_scanned_pdf
+
+
+@pytest.mark.parametrize("cores, workers, expected", [(16, 1, 16), (16, 4, 4), (16, 0, 1), (4, 8, 1), (1, 1, 1)])
+def test_default_pool_shares_cores_between_uvicorn_workers(monkeypatch, cores, workers, expected):
+    monkeypatch.setattr(ocr.os, "cpu_count", lambda: cores)
+    monkeypatch.setattr(settings, "WORKERS", workers)
+    assert ocr.default_ocr_workers() == expected
+
+
+def jpeg(shade, size=(200, 50)):
+    from PIL import Image
+    output = io.BytesIO()
+    Image.new("L", size, shade).save(output, "JPEG")
+    return output.getvalue()
+
+
+def image_pdf(images):
+    """PDF d'une page 200x100 points : images (données, filtre, taille, matrice cm) sans couche texte"""
+    objects = [b"<< /Type /Catalog /Pages 2 0 R >>", b""]
+    names, content = [], []
+    for index, (data, filter_name, (width, height), matrix) in enumerate(images):
+        objects.append(b"<< /Type /XObject /Subtype /Image /Width %d /Height %d /ColorSpace /DeviceGray "
+                       b"/BitsPerComponent 8 /Filter /%s /Length %d >>\nstream\n" % (width, height, filter_name, len(data))
+                       + data + b"\nendstream")
+        names.append(b"/Im%d %d 0 R" % (index, len(objects)))
+        content.append(b"q %s cm /Im%d Do Q" % (matrix.encode(), index))
+    stream = b"\n".join(content)
+    objects.append(b"<< /Length %d >>\nstream\n" % len(stream) + stream + b"\nendstream")
+    objects.append(b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 200 100] /Resources << /XObject << %s >> >> "
+                   b"/Contents %d 0 R >>" % (b" ".join(names), len(objects)))
+    objects[1] = b"<< /Type /Pages /Kids [%d 0 R] /Count 1 >>" % len(objects)
+
+    output = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for index, body in enumerate(objects, 1):
+        offsets.append(len(output))
+        output += b"%d 0 obj\n" % index + body + b"\nendobj\n"
+    xref_offset = len(output)
+    output += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    output += b"".join(b"%010d 00000 n \n" % offset for offset in offsets)
+    output += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref_offset)
+    return bytes(output)
+
+
+# Scan en deux bandes : haut noir, bas blanc, déclarées dans l'ordre inverse
+STRIPS = [
+    (jpeg(255), b"DCTDecode", (200, 50), "200 0 0 50 0 0"),
+    (jpeg(0), b"DCTDecode", (200, 50), "200 0 0 50 0 50"),
+]
+JBIG2 = (b"\x00" * 16, b"JBIG2Decode", (200, 100), "200 0 0 100 0 0")
+
+
+def first_page(tmp_path, content):
+    path = tmp_path / "scan.pdf"
+    path.write_bytes(content)
+    return path, PdfReader(str(path)).pages[0]
+
+
+def test_page_detection(tmp_path):
+    _, text_page = first_page(tmp_path, make_pdf(["Réfrigérateur combiné"]))
+    assert not ocr.has_images(text_page)
+    assert ocr.page_images(text_page) == []
+
+    _, scanned = first_page(tmp_path, make_scanned_pdf(["Réfrigérateur combiné"], dpi=30))
+    assert ocr.has_images(scanned)
+    images = ocr.page_images(scanned)
+    assert len(images) == 1
+    # Une seule image : transmise telle quelle, sans réencodage
+    assert ocr.compose_page(images) == images[0][0]
+
+
+def test_strips_recomposed_in_page_order(tmp_path):
+    from PIL import Image
+    _, page = first_page(tmp_path, image_pdf(STRIPS))
+    composed = Image.open(io.BytesIO(ocr.compose_page(ocr.page_images(page))))
+    assert composed.size == (200, 100)
+    assert composed.getpixel((100, 10)) < 30
+    assert composed.getpixel((100, 90)) > 225
+
+
+def test_strips_recognized_once_then_cached(tmp_path, monkeypatch):
+    path, _ = first_page(tmp_path, image_pdf(STRIPS))
+    calls = []
+    monkeypatch.setattr(ocr, "run_tesseract", lambda image, *args: calls.append(image) or " Bande unique \n")
+    cache_path = str(tmp_path / "ocr.db")
+
+    first = ocr.ocr_page(str(path), 0, "fra", "tesseract", 10, cache_path)
+    second = ocr.ocr_page(str(path), 0, "fra", "tesseract", 10, cache_path)
+    ocr.close_document()
+    assert (first["status"], first["text"]) == ("ocr", "Bande unique")
+    assert (second["status"], second["text"]) == ("cached", "Bande unique")
+    assert len(calls) == 1
+
+
+def test_undecodable_image_reported_unsupported(tmp_path, monkeypatch):
+    path, _ = first_page(tmp_path, image_pdf([STRIPS[1], JBIG2]))
+    monkeypatch.setattr(ocr, "run_tesseract", lambda *args: pytest.fail("tesseract appelé"))
+    result = ocr.ocr_page(str(path), 0, "fra", "tesseract", 10, str(tmp_path / "ocr.db"))
+    ocr.close_document()
+    assert result["status"] == "unsupported"
+    assert "JBIG2" in result["error"]
+    assert ocr.OCRCache(tmp_path / "ocr.db").get(result["hash"], "fra") is None
+
+
+def test_cache_keyed_by_languages_and_expired_by_last_use(tmp_path):
+    cache = ocr.OCRCache(tmp_path / "ocr.db")
+    cache.put("abc", "fra", "Notice", 1.5)
+    cache.put("abc", "eng", "", 0.5)
+    cache.put("def", "fra", "Ancienne", 1.0)
+    assert cache.get("abc", "fra") == "Notice"
+    assert cache.get("abc", "eng") == ""
+    assert cache.get("abc", "deu") is None
+
+    cutoff = datetime.now()
+    cache.get("abc", "fra")  # Relue : conservée
+    assert cache.delete_older_than(cutoff) == 2
+    assert cache.get("abc", "fra") == "Notice"
+    assert cache.get("def", "fra") is None
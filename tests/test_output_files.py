@@ -0,0 +1,85 @@
+from pathlib import Path
+
+import pytest
+
+from app.services.output_files import OutputFile, choose_encoding, etag_matches, parse_range
+
+
+@pytest.mark.parametrize("header, expected", [
+    (None, None),
+    ("", None),
+    ("bytes=0-99", (0, 99)),
+    ("bytes=10-", (10, 999)),
+    ("bytes=-100", (900, 999)),
+    ("bytes=-5000", (0, 999)),
+    ("bytes=990-5000", (990, 999)),
+    ("bytes=999-999", (999, 999)),
+    (" bytes= 0-0 ", (0, 0)),
+    ("BYTES=0-1", (0, 1)),
+    # Syntaxiquement invalides ou non gérés : en-tête ignoré, fichier entier
+    ("bytes=abc-", None),
+    ("bytes=5-2", None),
+    ("bytes=-", None),
+    ("bytes=0-1,5-6", None),
+    ("bytes=1.5-2", None),
+    ("items=0-1", None),
+    ("0-99", None),
+])
+def test_parse_range(header, expected):
+    assert parse_range(header, 1000) == expected
+
+
+@pytest.mark.parametrize("header, size", [
+    ("bytes=1000-", 1000),
+    ("bytes=5000-6000", 1000),
+    ("bytes=-0", 1000),
+    ("bytes=0-", 0),
+    ("bytes=-10", 0),
+])
+def test_parse_range_unsatisfiable(header, size):
+    with pytest.raises(ValueError):
+        parse_range(header, size)
+
+
+@pytest.mark.parametrize("header, expected", [
+    (None, False),
+    ("", False),
+    ("*", True),
+    (' * ', True),
+    ('"abc"', True),
+    ('W/"abc"', True),
+    ('"xyz", "abc"', True),
+    ('"xyz",W/"abc"', True),
+    ('"abc-gzip"', False),
+    ('"xyz"', False),
+    ("abc", False),
+])
+def test_etag_matches(header, expected):
+    assert etag_matches(header, '"abc"') is expected
+
+
+BOTH = OutputFile(Path("fiche.html"), 1000, "abc", "text/html",
+                  variants={"br": (Path("fiche.html.br"), 200), "gzip": (Path("fiche.html.gz"), 300)})
+GZIP_ONLY = OutputFile(Path("fiche.html"), 1000, "abc", "text/html",
+                       variants={"gzip": (Path("fiche.html.gz"), 300)})
+NONE = OutputFile(Path("fiche.pdf"), 1000, "abc", "application/pdf")
+
+
+@pytest.mark.parametrize("header, entry, expected", [
+    (None, BOTH, None),
+    ("gzip, deflate, br", BOTH, "br"),
+    ("gzip, deflate", BOTH, "gzip"),
+    ("GZIP", BOTH, "gzip"),
+    ("br;q=0, gzip", BOTH, "gzip"),
+    ("br;q=0.5, gzip;q=0.1", BOTH, "br"),
+    ("br;q=abc, gzip", BOTH, "gzip"),
+    ("*", BOTH, "br"),
+    ("*;q=0", BOTH, None),
+    ("*, br;q=0", BOTH, "gzip"),
+    ("identity", BOTH, None),
+    ("br", GZIP_ONLY, None),
+    ("br, gzip", GZIP_ONLY, "gzip"),
+    ("gzip, br", NONE, None),
+])
+def test_choose_encoding(header, entry, expected):
+    assert choose_encoding(header, entry) == expected
@@ -0,0 +1,71 @@
+import io
+import tracemalloc
+
+from PyPDF2 import PdfReader, PdfWriter
+from PyPDF2.generic import ArrayObject, DictionaryObject, NameObject, RectangleObject
+
+from app.services.pdf_merge import PdfConcatenator
+from benchmarks.corpus import make_pdf
+
+
+def write_part(path, texts):
+    path.write_bytes(make_pdf(texts))
+    return path
+
+
+def write_linked_part(path):
+    """Deux pages, la première porte un lien interne vers la seconde, contenu compressé"""
+    writer = PdfWriter()
+    for _ in range(2):
+        writer.add_blank_page(width=300, height=400)
+    writer.pages[0][NameObject("/Annots")] = ArrayObject([DictionaryObject({
+        NameObject("/Type"): NameObject("/Annot"),
+        NameObject("/Subtype"): NameObject("/Link"),
+        NameObject("/Rect"): RectangleObject([0, 0, 100, 100]),
+        NameObject("/Dest"): ArrayObject([writer.pages[1].indirect_reference, NameObject("/Fit")]),
+    })])
+    for page in writer.pages:
+        page.compress_content_streams()
+    with open(path, "wb") as f:
+        writer.write(f)
+    return path
+
+
+def test_concatenates_pages_with_outline(tmp_path):
+    parts = [write_part(tmp_path / "toc.pdf", ["Sommaire"]),
+             write_part(tmp_path / "a.pdf", ["Fiche A page 1", "Fiche A page 2"]),
+             write_linked_part(tmp_path / "links.pdf")]
+    output = io.BytesIO()
+    merger = PdfConcatenator(output)
+    assert [merger.append(part) for part in parts] == [1, 2, 2]
+    merger.finish([("Sommaire", 0), ("Fiche A", 1), ("Produit accentué é", 3)], title="Catalogue été")
+
+    reader = PdfReader(io.BytesIO(output.getvalue()))
+    assert len(reader.pages) == 5
+    assert "Fiche A page 2" in reader.pages[2].extract_text()
+    assert reader.metadata.title == "Catalogue été"
+    assert [(item.title, reader.get_destination_page_number(item)) for item in reader.outline] == [
+        ("Sommaire", 0), ("Fiche A", 1), ("Produit accentué é", 3)]
+    assert reader.pages[3].mediabox.height == 400
+    link = reader.pages[3]["/Annots"][0]
+    assert link["/Dest"][0].get_object() == reader.pages[4].get_object()
+
+
+def test_memory_does_not_grow_with_parts(tmp_path):
+    part = write_part(tmp_path / "part.pdf", [f"Page {i} " + "texte " * 200 for i in range(20)])
+
+    def peak(count):
+        tracemalloc.start()
+        try:
+            merger = PdfConcatenator(open(tmp_path / f"out_{count}.pdf", "wb"))
+            for _ in range(count):
+                merger.append(part)
+            merger.finish([("Sommaire", 0)])
+            merger.stream.close()
+            return tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+
+    small, large = peak(10), peak(50)
+    assert len(PdfReader(str(tmp_path / "out_50.pdf")).pages) == 1000
+    assert large < small * 1.5
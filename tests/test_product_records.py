@@ -0,0 +1,75 @@
+import time
+from datetime import datetime
+
+import pytest
+
+from app.services.product_records import ProductRecordStore, RecordFilter
+
+
+@pytest.fixture
+def paris(monkeypatch):
+    """Heure locale du serveur fixée (UTC+2 en été)"""
+    monkeypatch.setenv("TZ", "Europe/Paris")
+    time.tzset()
+    yield
+    monkeypatch.undo()
+    time.tzset()
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = ProductRecordStore(tmp_path / "products.db")
+    rows = [
+        ("s1", {"product_name": "Perceuse", "brand": "Bosch", "category": "Outillage"}, 0, "2024-05-01T09:00:00"),
+        ("s2", {"product_name": "Visseuse", "brand": " BOSCH ", "category": "outillage"}, 0, "2024-05-01T13:00:00"),
+        ("s3", {"product_name": "Réfrigérateur", "brand": "Électrolux", "category": "Froid"}, 1, "2024-05-31T23:59:00"),
+        ("s3", {"product_name": "Congélateur", "brand": "électrolux", "category": "Froid"}, 2, "2024-06-01T00:00:00"),
+    ]
+    conn = store.connect()
+    with conn:
+        conn.executemany("INSERT INTO product_records VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                         [ProductRecordStore._row(session, data, index, created) for session, data, index, created in rows])
+    conn.close()
+    return store
+
+
+def names(store, selection):
+    return [record["data"]["product_name"] for record in store.iter_records(selection)]
+
+
+@pytest.mark.parametrize("since, until, expected", [
+    (None, None, ["Perceuse", "Visseuse", "Réfrigérateur", "Congélateur"]),
+    ("2024-05-01T12:00:00", None, ["Visseuse", "Réfrigérateur", "Congélateur"]),
+    # Jour seul : `until` inclus jusqu'à minuit
+    (None, "2024-05-31", ["Perceuse", "Visseuse", "Réfrigérateur"]),
+    (None, "2024-05-31T23:59:00", ["Perceuse", "Visseuse"]),
+    ("2024-06-01", "2024-06-01", ["Congélateur"]),
+])
+def test_date_filter(store, since, until, expected):
+    assert names(store, RecordFilter.from_query(since, until)) == expected
+
+
+def test_offset_converted_to_local_time(store, paris):
+    # 10:00 UTC = 12:00 à Paris : la visseuse (13:00 locale) est incluse, la perceuse (09:00) non
+    selection = RecordFilter.from_query(since="2024-05-01T10:00:00+00:00")
+    assert selection.since == datetime(2024, 5, 1, 12, 0)
+    assert names(store, selection) == ["Visseuse", "Réfrigérateur", "Congélateur"]
+    assert names(store, RecordFilter.from_query(until="2024-05-01T06:30:00Z")) == []
+    assert names(store, RecordFilter.from_query(until="2024-05-01T07:30:00Z")) == ["Perceuse"]
+
+
+@pytest.mark.parametrize("brand, category, expected", [
+    ("bosch", None, ["Perceuse", "Visseuse"]),
+    ("ÉLECTROLUX", None, ["Réfrigérateur", "Congélateur"]),
+    (None, "OUTILLAGE", ["Perceuse", "Visseuse"]),
+    ("Bosch", "Froid", []),
+])
+def test_brand_and_category_filters(store, brand, category, expected):
+    selection = RecordFilter.from_query(brand=brand, category=category)
+    assert names(store, selection) == expected
+    assert store.count(selection) == len(expected)
+
+
+def test_invalid_date_rejected():
+    with pytest.raises(ValueError, match="since"):
+        RecordFilter.from_query(since="01/05/2024")
@@ -0,0 +1,98 @@
+import csv
+import io
+import json
+import zipfile
+from xml.etree import ElementTree
+
+import pytest
+
+from app.services import record_export
+from app.services.product_records import ProductRecordStore, RecordFilter
+from app.services.record_export import BASE_COLUMNS, RECORD_COLUMNS, flatten_record, iter_export
+
+SHEET_NS = {"x": "http://schemas.openxmlformats.org/spreadsheetml/2006/main"}
+
+PERCEUSE = {
+    "product_name": "Perceuse « Pro »",
+    "brand": "Bosch",
+    "features": ["Mandrin 13 mm", "", None, "Éclairage LED"],
+    "technical_specs": {"voltage": "18 V", "color": "bleu", "couple": "55 Nm"},
+    "dimensions": {"length": "25 cm"},
+    "weight": 1.8,
+    "additional_info": {"note": "x"},
+}
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = ProductRecordStore(tmp_path / "products.db")
+    store.save("s1", PERCEUSE)
+    store.save("s2", {"product_name": "Ligne\nbrisée, \"guillemets\"\x01", "technical_specs": {"autonomie": "2 h"}})
+    return store
+
+
+def test_flatten_record():
+    row = flatten_record({"session_id": "s1", "product_index": 0, "created_at": "2024-05-01T09:00:00",
+                          "data": PERCEUSE})
+    assert row["product_index"] == "0"
+    assert row["features"] == "Mandrin 13 mm | Éclairage LED"
+    assert row["weight"] == "1.8"
+    assert row["additional_info"] == '{"note": "x"}'
+    assert row["description"] == ""
+    assert row["technical_specs.voltage"] == "18 V"
+    assert row["technical_specs.couple"] == "55 Nm"
+    assert row["dimensions.length"] == "25 cm"
+
+
+def test_columns_known_keys_then_extra_keys(store):
+    columns = record_export.export_columns(RecordFilter(), store)
+    assert columns[:len(RECORD_COLUMNS + BASE_COLUMNS)] == RECORD_COLUMNS + BASE_COLUMNS
+    specs = [column for column in columns if column.startswith("technical_specs.")]
+    # Clés du schéma dans leur ordre, puis clés ajoutées par ordre alphabétique
+    assert specs[-2:] == ["technical_specs.autonomie", "technical_specs.couple"]
+    assert specs.index("technical_specs.voltage") < specs.index("technical_specs.color")
+
+
+def test_csv_export(store, monkeypatch):
+    monkeypatch.setattr(record_export, "ROWS_PER_CHUNK", 1)
+    chunks = list(iter_export("csv", RecordFilter(), store))
+    assert len(chunks) > 1
+    content = b"".join(chunks).decode("utf-8")
+    assert content.startswith("\ufeff")
+    rows = list(csv.DictReader(io.StringIO(content[1:])))
+    assert [row["session_id"] for row in rows] == ["s1", "s2"]
+    assert rows[0]["features"] == "Mandrin 13 mm | Éclairage LED"
+    assert rows[0]["technical_specs.couple"] == "55 Nm"
+    assert rows[1]["product_name"] == "Ligne\nbrisée, \"guillemets\"\x01"
+    assert rows[1]["technical_specs.autonomie"] == "2 h"
+
+
+def test_ndjson_export(store, monkeypatch):
+    monkeypatch.setattr(record_export, "ROWS_PER_CHUNK", 1)
+    lines = b"".join(iter_export("ndjson", RecordFilter(), store)).decode("utf-8").splitlines()
+    records = [json.loads(line) for line in lines]
+    assert [record["session_id"] for record in records] == ["s1", "s2"]
+    # Données non aplaties
+    assert records[0]["data"] == PERCEUSE
+
+
+def test_xlsx_export(store, monkeypatch):
+    monkeypatch.setattr(record_export, "ROWS_PER_CHUNK", 1)
+    content = b"".join(iter_export("xlsx", RecordFilter(), store))
+    with zipfile.ZipFile(io.BytesIO(content)) as archive:
+        assert archive.testzip() is None
+        assert "[Content_Types].xml" in archive.namelist()
+        sheet = ElementTree.fromstring(archive.read("xl/worksheets/sheet1.xml"))
+
+    rows = sheet.findall(".//x:sheetData/x:row", SHEET_NS)
+    assert [row.get("r") for row in rows] == ["1", "2", "3"]
+    header = {cell.get("r"): cell.findtext(".//x:t", namespaces=SHEET_NS) for cell in rows[0]}
+    assert header["A1"] == "session_id"
+    assert all(cell.get("s") == "1" for cell in rows[0])
+    second = [cell.findtext(".//x:t", namespaces=SHEET_NS) for cell in rows[2]]
+    # Caractère de contrôle retiré (interdit en XML), retour à la ligne conservé
+    assert "Ligne\nbrisée, \"guillemets\"" in second
+
+
+def test_column_letters():
+    assert [record_export._column_letter(i) for i in (0, 25, 26, 27, 701, 702)] == ["A", "Z", "AA", "AB", "ZZ", "AAA"]
@@ -0,0 +1,193 @@
+import os
+import uuid
+from datetime import datetime
+
+import pytest
+
+from app.services import retention
+from app.services.model_response_store import ModelResponseStore
+from app.services.retention import RetentionManager
+
+NOW = 1_700_000_000.0
+
+
+class RecordingStore:
+    """Remplace les stockages liés aux sessions : enregistre les suppressions"""
+
+    def __init__(self):
+        self.deleted = []
+
+    def delete_session(self, session_id):
+        self.deleted.append(session_id)
+
+    def invalidate(self, session_id):
+        self.deleted.append(session_id)
+
+    def delete_older_than(self, cutoff):
+        return 0
+
+
+@pytest.fixture
+def responses(tmp_path, monkeypatch):
+    store = ModelResponseStore(tmp_path / "model_responses.db")
+    monkeypatch.setattr(retention, "model_response_store", store)
+    yield store
+    store.close()
+
+
+@pytest.fixture
+def manager(tmp_path, monkeypatch, responses):
+    recorder = RecordingStore()
+    for name in ("output_file_index", "checkpoint_store", "job_store", "product_record_store",
+                 "ocr_cache", "near_duplicate_index", "webhook_outbox"):
+        monkeypatch.setattr(retention, name, recorder)
+    manager = RetentionManager(tmp_path / "retention.db")
+    manager.upload_dir = tmp_path / "uploads"
+    manager.output_dir = tmp_path / "outputs"
+    manager.upload_dir.mkdir()
+    manager.output_dir.mkdir()
+    manager.max_age = 0
+    manager.max_bytes = 0
+    manager.recorder = recorder
+    return manager
+
+
+def make_session(manager, size=100, mtime=None):
+    """Crée l'upload et le dossier de sortie d'une session ; retourne (id, upload, sortie)"""
+    session_id = str(uuid.uuid4())
+    upload = manager.upload_dir / f"{session_id}_notice.pdf"
+    upload.write_bytes(b"u" * size)
+    output = manager.output_dir / session_id
+    output.mkdir()
+    (output / "product_data.json").write_bytes(b"o" * size)
+    if mtime is not None:
+        for path in (upload, output):
+            os.utime(path, (mtime, mtime))
+    return session_id, upload, output
+
+
+def set_last_access(manager, session_id, last_access):
+    conn = manager._connect()
+    with conn:
+        conn.execute("UPDATE sessions SET last_access = ? WHERE session_id = ?", (last_access, session_id))
+    conn.close()
+
+
+def indexed(manager):
+    conn = manager._connect()
+    rows = {row["session_id"]: dict(row) for row in conn.execute("SELECT * FROM sessions")}
+    conn.close()
+    return rows
+
+
+def test_bootstrap_indexes_existing_sessions(manager, responses):
+    session_id, upload, output = make_session(manager, size=100, mtime=NOW - 3600)
+    responses.append(session_id, "llama", "prompt", "réponse", {}, "ok", datetime.fromtimestamp(NOW - 7200))
+    responses.flush()
+
+    manager.load()
+
+    (row,) = indexed(manager).values()
+    assert row["session_id"] == session_id
+    assert row["upload_path"] == str(upload)
+    assert row["output_path"] == str(output)
+    assert row["bytes"] == 200 + responses.session_usage(session_id)[session_id]["bytes"]
+    assert row["created_at"] == pytest.approx(NOW - 7200)
+    assert row["last_access"] == pytest.approx(NOW - 3600)
+
+
+def test_bootstrap_skips_non_session_entries(manager):
+    session_id, _, _ = make_session(manager)
+    bulk = manager.output_dir / "bulk"
+    bulk.mkdir()
+    (bulk / "results.jsonl").write_text("{}")
+    (manager.upload_dir / ("x" * 40 + ".pdf")).write_bytes(b"pdf")
+
+    manager.load()
+
+    assert list(indexed(manager)) == [session_id]
+
+
+def test_bootstrap_runs_once(manager):
+    manager.load()
+    make_session(manager)
+    manager._loaded = False
+    manager.load()
+    assert indexed(manager) == {}
+
+
+def test_register_counts_queued_model_responses(manager, responses, monkeypatch):
+    session_id, upload, output = make_session(manager, size=100)
+    flushed = []
+    flush = responses.flush
+    monkeypatch.setattr(responses, "flush", lambda: flushed.append(True) or flush())
+    responses.append(session_id, "llama", "prompt", "x" * 500, {}, "ok")
+    # Pas de flush ici : register doit attendre le thread d'écriture
+    manager.register(session_id, upload, output)
+    assert flushed
+    assert indexed(manager)[session_id]["bytes"] == 200 + responses.session_usage(session_id)[session_id]["bytes"]
+    assert indexed(manager)[session_id]["bytes"] > 200
+
+
+def test_age_expiry_removes_only_old_sessions(manager):
+    manager.max_age = 3600
+    old_id, old_upload, old_output = make_session(manager)
+    new_id, new_upload, new_output = make_session(manager)
+    manager.register(old_id, old_upload, old_output)
+    manager.register(new_id, new_upload, new_output)
+    set_last_access(manager, old_id, NOW - 7200)
+    set_last_access(manager, new_id, NOW - 60)
+
+    result = manager.enforce(NOW)
+
+    assert result == {"expired": 1, "evicted": 0, "freed_bytes": 200}
+    assert not old_upload.exists() and not old_output.exists()
+    assert new_upload.exists() and new_output.exists()
+    assert list(indexed(manager)) == [new_id]
+    assert old_id in manager.recorder.deleted and new_id not in manager.recorder.deleted
+
+
+def test_quota_evicts_least_recently_used_first(manager):
+    manager.max_bytes = 450  # Trois sessions de 200 octets : la moins récemment utilisée part
+    sessions = [make_session(manager) for _ in range(3)]
+    for offset, (session_id, upload, output) in zip((300, 100, 200), sessions):
+        manager.register(session_id, upload, output)
+        set_last_access(manager, session_id, NOW - offset)
+
+    result = manager.enforce(NOW)
+
+    assert result == {"expired": 0, "evicted": 1, "freed_bytes": 200}
+    assert sorted(indexed(manager)) == sorted([sessions[1][0], sessions[2][0]])
+
+    manager.max_bytes = 250
+    manager.enforce(NOW)
+    assert list(indexed(manager)) == [sessions[1][0]]
+
+
+def test_quota_accounts_for_expired_sessions(manager):
+    manager.max_age = 3600
+    manager.max_bytes = 450
+    sessions = [make_session(manager) for _ in range(3)]
+    for offset, (session_id, upload, output) in zip((7200, 100, 200), sessions):
+        manager.register(session_id, upload, output)
+        set_last_access(manager, session_id, NOW - offset)
+
+    # L'expiration ramène le total à 400 octets : aucune éviction supplémentaire
+    assert manager.enforce(NOW) == {"expired": 1, "evicted": 0, "freed_bytes": 200}
+    assert len(indexed(manager)) == 2
+
+
+def test_custom_output_dir_outside_output_dir_left_alone(manager, tmp_path):
+    manager.max_age = 3600
+    session_id, upload, _ = make_session(manager)
+    custom = tmp_path / "client" / "fiches"
+    custom.mkdir(parents=True)
+    (custom / "fiche.html").write_text("<html></html>")
+
+    manager.register(session_id, upload, custom)
+    assert indexed(manager)[session_id]["output_path"] is None
+    set_last_access(manager, session_id, NOW - 7200)
+
+    assert manager.enforce(NOW)["expired"] == 1
+    assert not upload.exists()
+    assert (custom / "fiche.html").exists()
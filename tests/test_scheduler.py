@@ -0,0 +1,74 @@
+import asyncio
+
+import pytest
+
+from app.services.concurrency import AdaptiveLimiter
+from app.services.scheduler import LLMScheduler, QueueFullError
+
+
+def make_scheduler(max_wait=600, concurrency=1):
+    return LLMScheduler(AdaptiveLimiter(initial=concurrency, adaptive=False), max_wait=max_wait, segment_seconds=10)
+
+
+def test_running_segments_counted_once():
+    async def scenario():
+        scheduler = make_scheduler()
+        job = scheduler.admit("a", pages=1, segments=2)
+        async with scheduler.slot(job):
+            # Deux segments restants (dont celui en cours) : 20 s, pas 30
+            short = scheduler.estimated_wait(scheduler.estimate(5))
+            # Job plus court que celui en cours : seul le segment en cours le retarde
+            long = scheduler.estimated_wait(scheduler.estimate(1))
+        return short, long
+
+    assert asyncio.run(scenario()) == (20, 10)
+
+
+def test_idle_jobs_longer_than_new_one_do_not_delay_it():
+    scheduler = make_scheduler()
+    scheduler.admit("a", pages=10, segments=8)
+    assert scheduler.estimated_wait(scheduler.estimate(1)) == 0
+
+
+def test_check_rejects_before_admission():
+    scheduler = make_scheduler(max_wait=15)
+    scheduler.admit("a", pages=1, segments=1)
+    scheduler.admit("b", pages=1, segments=1)
+    with pytest.raises(QueueFullError) as error:
+        scheduler.check("c")
+    assert error.value.retry_after == 5
+    assert len(scheduler._jobs) == 2
+
+
+def test_limit_increase_dispatches_queued_jobs():
+    async def scenario():
+        limiter = AdaptiveLimiter(initial=1, max_limit=4)
+        scheduler = LLMScheduler(limiter, segment_seconds=10)
+        job = scheduler.admit("a", pages=3, segments=3)
+        release = asyncio.Event()
+        started = []
+
+        async def segment(index):
+            async with scheduler.slot(job):
+                started.append(index)
+                await release.wait()
+
+        tasks = [asyncio.create_task(segment(index)) for index in range(3)]
+        await asyncio.sleep(0)
+        assert started == [0]
+
+        # Latence stable avec la limite utilisée : la limite monte, aucun créneau n'est libéré
+        limiter.on_success(1.0, tokens=10, in_flight=1)
+        assert limiter.limit == 2
+        await asyncio.sleep(0)
+        assert sorted(started) == [0, 1]
+        while limiter.limit < 3:
+            limiter.on_success(1.0, tokens=10, in_flight=2)
+        await asyncio.sleep(0)
+        assert sorted(started) == [0, 1, 2]
+        assert scheduler.stats()["queued"] == 0
+
+        release.set()
+        await asyncio.gather(*tasks)
+
+    asyncio.run(scenario())
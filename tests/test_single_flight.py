@@ -0,0 +1,118 @@
+import asyncio
+import time
+
+import pytest
+
+from app.services.jobs import JobStore, DONE, ERROR
+from app.services.single_flight import JobFailedError, SingleFlight, upload_fingerprint
+
+
+class UploadError(Exception):
+    def __init__(self, detail, status_code):
+        super().__init__(detail)
+        self.detail = detail
+        self.status_code = status_code
+
+
+def counting_factory(result=None, error=None, delay=0.05):
+    calls = []
+
+    async def factory():
+        calls.append(True)
+        await asyncio.sleep(delay)
+        if error is not None:
+            raise error
+        return result
+
+    return factory, calls
+
+
+def test_concurrent_identical_uploads_share_one_run(tmp_path):
+    store = JobStore(tmp_path / "jobs.db")
+    flight = SingleFlight(store, ttl=60)
+    factory, calls = counting_factory({"session_id": "s1"})
+
+    async def scenario():
+        return await asyncio.gather(*(flight.run("clé", "s1", factory) for _ in range(5)))
+
+    results = asyncio.run(scenario())
+    assert len(calls) == 1
+    assert [result for result, _ in results] == [{"session_id": "s1"}] * 5
+    modes = [mode for _, mode in results]
+    assert modes.count(None) == 1 and modes.count("in_flight") == 4
+    assert store.get("clé")["status"] == DONE
+    assert flight.in_flight() == 0
+
+
+def test_failure_propagates_to_all_waiters(tmp_path):
+    store = JobStore(tmp_path / "jobs.db")
+    flight = SingleFlight(store, ttl=60)
+    factory, calls = counting_factory(error=UploadError("PDF illisible", 422))
+
+    async def scenario():
+        return await asyncio.gather(*(flight.run("clé", "s1", factory) for _ in range(3)), return_exceptions=True)
+
+    errors = asyncio.run(scenario())
+    assert len(calls) == 1
+    assert all(isinstance(error, UploadError) and error.status_code == 422 for error in errors)
+    row = store.get("clé")
+    assert (row["status"], row["error"], row["status_code"]) == (ERROR, "PDF illisible", 422)
+
+    # Nouvelle soumission après l'échec : nouveau traitement
+    factory, calls = counting_factory({"session_id": "s2"})
+    assert asyncio.run(flight.run("clé", "s2", factory)) == ({"session_id": "s2"}, None)
+
+
+def test_waiter_in_other_worker_gets_result_or_failure(tmp_path):
+    store = JobStore(tmp_path / "jobs.db")
+    leader = SingleFlight(store, ttl=60)
+    other = SingleFlight(store, ttl=60, poll_interval=0.01)  # Autre worker : coordination par la base
+
+    async def scenario(factory):
+        first = asyncio.create_task(leader.run("clé", "s1", factory))
+        await asyncio.sleep(0.01)
+        second = await other.run("clé", "s2", factory)
+        return await first, second
+
+    factory, calls = counting_factory({"session_id": "s1"})
+    first, second = asyncio.run(scenario(factory))
+    assert len(calls) == 1
+    assert first == ({"session_id": "s1"}, None)
+    assert second == ({"session_id": "s1"}, "in_flight")
+
+    factory, calls = counting_factory(error=UploadError("Ollama indisponible", 503))
+    with pytest.raises(JobFailedError) as failure:
+        asyncio.run(scenario(factory))
+    assert (failure.value.detail, failure.value.status_code) == ("Ollama indisponible", 503)
+
+
+def test_idempotency_key_replayed_until_ttl(tmp_path):
+    store = JobStore(tmp_path / "jobs.db")
+    flight = SingleFlight(store, ttl=0.2)
+    factory, calls = counting_factory({"session_id": "s1"}, delay=0)
+
+    assert asyncio.run(flight.run("idem", "s1", factory, remember=True)) == ({"session_id": "s1"}, None)
+    assert asyncio.run(flight.run("idem", "s2", factory, remember=True)) == ({"session_id": "s1"}, "replay")
+    assert len(calls) == 1
+
+    time.sleep(0.3)
+    assert asyncio.run(flight.run("idem", "s3", factory, remember=True)) == ({"session_id": "s1"}, None)
+    assert len(calls) == 2
+
+
+def test_result_not_replayed_without_idempotency_key(tmp_path):
+    store = JobStore(tmp_path / "jobs.db")
+    flight = SingleFlight(store, ttl=60)
+    factory, calls = counting_factory({"session_id": "s1"}, delay=0)
+
+    asyncio.run(flight.run("empreinte", "s1", factory))
+    assert asyncio.run(flight.run("empreinte", "s2", factory)) == ({"session_id": "s1"}, None)
+    assert len(calls) == 2
+
+
+def test_upload_fingerprint_covers_options():
+    base = upload_fingerprint(b"%PDF", "html", None)
+    assert upload_fingerprint(b"%PDF", "html", None) == base
+    assert upload_fingerprint(b"%PDF", "html", "", "single") == base
+    assert len({base, upload_fingerprint(b"%PDF2", "html", None), upload_fingerprint(b"%PDF", "pdf", None),
+                upload_fingerprint(b"%PDF", "html", "clients"), upload_fingerprint(b"%PDF", "html", None, "catalogue")}) == 5
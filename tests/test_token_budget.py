@@ -0,0 +1,67 @@
+import pytest
+
+from app.services import metrics
+from app.services.token_budget import DEFAULT_OUTPUT_TOKENS, TokenBudget
+
+
+def record_outputs(budget, counts, model="llama3", kind="structured"):
+    for count in counts:
+        budget.record(model, kind, "", {"eval_count": count})
+
+
+@pytest.mark.parametrize("chars, kind, expected", [
+    (0, "simple", 2048),
+    # 1589 tokens de prompt (+10 %) + 300 générés : 2048 tout juste
+    (4767, "simple", 2048),
+    (4770, "simple", 4096),
+    (3000, "structured", 4096),
+    (14000, "structured", 8192),
+])
+def test_num_ctx_rounded_up_to_next_size(chars, kind, expected):
+    assert TokenBudget().options("llama3", "x" * chars, kind)["num_ctx"] == expected
+
+
+def test_num_ctx_capped_by_max_ctx():
+    overflows = metrics.OLLAMA_CONTEXT_OVERFLOW.value(prompt="structured")
+    prompt = "x" * 30000  # 10 000 tokens
+    assert TokenBudget(max_ctx=8192).options("llama3", prompt)["num_ctx"] == 8192
+    assert metrics.OLLAMA_CONTEXT_OVERFLOW.value(prompt="structured") == overflows + 1
+    assert TokenBudget(max_ctx=32768).options("llama3", prompt)["num_ctx"] == 16384
+
+
+def test_num_predict_from_p95_once_enough_samples():
+    budget = TokenBudget(min_samples=20)
+    record_outputs(budget, [1000] * 19)
+    assert budget.expected_output_tokens("llama3", "structured") == DEFAULT_OUTPUT_TOKENS["structured"]
+
+    budget = TokenBudget(min_samples=20)
+    record_outputs(budget, range(10, 1010, 10))
+    # 95e centile de 10..1000 : 960, plus la marge de 25 %
+    assert budget.expected_output_tokens("llama3", "structured") == 1200
+    assert budget.options("llama3", "", "structured")["num_predict"] == 1200
+    # Mesures tenues par modèle et par type de prompt
+    assert budget.expected_output_tokens("llama3", "simple") == DEFAULT_OUTPUT_TOKENS["simple"]
+    assert budget.expected_output_tokens("mistral", "structured") == DEFAULT_OUTPUT_TOKENS["structured"]
+
+
+def test_num_predict_follows_recent_history_and_bounds():
+    budget = TokenBudget(min_samples=20, history=50)
+    record_outputs(budget, [2000] * 50 + [100] * 50)
+    assert budget.expected_output_tokens("llama3", "structured") == 125
+    # Relevé au minimum
+    assert budget.options("llama3", "", "structured")["num_predict"] == 256
+
+    record_outputs(budget, [5000] * 50)
+    assert budget.options("llama3", "", "structured")["num_predict"] == 3000
+
+
+@pytest.mark.parametrize("attempt, num_predict, num_ctx", [
+    (0, 400, 2048),
+    (1, 800, 2048),
+    (2, 1600, 2048),
+    (3, 3000, 4096),
+    (6, 3000, 4096),
+])
+def test_retry_doubles_num_predict_up_to_max(attempt, num_predict, num_ctx):
+    options = TokenBudget(max_predict=3000).options("llama3", "", "fields", attempt=attempt)
+    assert options == {"num_predict": num_predict, "num_ctx": num_ctx}
@@ -0,0 +1,75 @@
+import json
+import time
+
+import pytest
+
+from app.services.webhooks import (WebhookOutbox, validate_callback_url, AWAITING, PENDING, DELIVERED,
+                                   UPLOAD_COMPLETED, UPLOAD_FAILED)
+
+
+def test_registration_completed_in_place(tmp_path):
+    outbox = WebhookOutbox(tmp_path / "webhooks.db")
+    delivery_id = outbox.register("s1", "https://erp.example.com/hook", lease_seconds=60)
+    assert outbox.get(delivery_id)["status"] == AWAITING
+    assert outbox.claim(10) == []
+
+    assert outbox.enqueue("s1", "https://erp.example.com/hook", UPLOAD_COMPLETED, {"status": "done"},
+                          delivery_id) == delivery_id
+    (delivery,) = outbox.claim(10)
+    assert delivery["id"] == delivery_id
+    assert json.loads(delivery["payload"]) == {"id": delivery_id, "event": UPLOAD_COMPLETED, "status": "done"}
+
+
+def test_orphaned_registration_becomes_failed_event(tmp_path):
+    outbox = WebhookOutbox(tmp_path / "webhooks.db")
+    delivery_id = outbox.register("s1", "https://erp.example.com/hook", lease_seconds=-1)
+    assert outbox.expire_registrations() == 1
+
+    delivery = outbox.get(delivery_id)
+    assert delivery["status"] == PENDING
+    assert delivery["event"] == UPLOAD_FAILED
+    assert json.loads(delivery["payload"])["status_code"] == 503
+    # Fin du traitement après coup : le résultat réel est inscrit à part
+    other = outbox.enqueue("s1", "https://erp.example.com/hook", UPLOAD_COMPLETED, {}, delivery_id)
+    assert other != delivery_id
+    assert len(outbox.session_deliveries("s1")) == 2
+
+
+def test_live_registration_is_renewed_not_expired(tmp_path):
+    outbox = WebhookOutbox(tmp_path / "webhooks.db")
+    delivery_id = outbox.register("s1", "https://erp.example.com/hook", lease_seconds=-1)
+    assert outbox.renew_registrations(60) == 1
+    assert outbox.expire_registrations() == 0
+    assert outbox.get(delivery_id)["status"] == AWAITING
+
+
+def test_retention_keeps_unfinished_deliveries(tmp_path):
+    outbox = WebhookOutbox(tmp_path / "webhooks.db")
+    outbox.register("s1", "https://erp.example.com/hook", lease_seconds=60)
+    delivered = outbox.enqueue("s1", "https://erp.example.com/hook", UPLOAD_COMPLETED, {})
+    outbox.record_attempt(delivered, DELIVERED, 1)
+    assert outbox.delete_older_than(time.time() + 1) == 1
+    assert outbox.delete_session("s1") == 0
+    assert [d["status"] for d in outbox.session_deliveries("s1")] == [AWAITING]
+
+
+@pytest.mark.parametrize("url", [
+    "http://127.0.0.1:8765/hook",
+    "http://localhost/hook",
+    "http://10.0.0.5/hook",
+    "http://192.168.1.10/hook",
+    "http://169.254.169.254/latest/meta-data/",
+    "http://[::1]/hook",
+    "http://[::ffff:127.0.0.1]/hook",
+    "http://0.0.0.0/hook",
+])
+def test_private_callback_hosts_rejected(url):
+    with pytest.raises(ValueError):
+        validate_callback_url(url, hosts=set())
+
+
+def test_public_and_allowlisted_callback_hosts_accepted():
+    assert validate_callback_url("https://93.184.216.34/hook", hosts=set())
+    assert validate_callback_url("http://127.0.0.1:8765/hook", hosts={"127.0.0.1"})
+    with pytest.raises(ValueError):
+        validate_callback_url("https://93.184.216.34/hook", hosts={"erp.example.com"})
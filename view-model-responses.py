@@ -1,39 +1,49 @@
 #!/usr/bin/env python3
 """
-Script pour visualiser les réponses du modèle sauvegardées dans le dossier outputs
+Script pour visualiser les réponses du modèle sauvegardées dans le stockage indexé (data/model_responses.db)
 """
 
-import json
-import os
-import sys
+import argparse
 from pathlib import Path
-from datetime import datetime
-from typing import Dict, Any, List
+from datetime import datetime, timedelta
+from typing import Dict, Any, List, Optional
 
-def load_model_responses(outputs_dir: str = "outputs") -> List[Dict[str, Any]]:
-    """Charge toutes les réponses du modèle depuis le dossier outputs"""
-    responses = []
-    outputs_path = Path(outputs_dir)
-    
-    if not outputs_path.exists():
-        print(f"❌ Le dossier {outputs_dir} n'existe pas")
-        return responses
-    
-    # Chercher dans tous les sous-dossiers
-    for session_dir in outputs_path.iterdir():
-        if session_dir.is_dir():
-            model_responses_dir = session_dir / "model_responses"
-            if model_responses_dir.exists():
-                for json_file in model_responses_dir.glob("*.json"):
-                    try:
-                        with open(json_file, 'r', encoding='utf-8') as f:
-                            data = json.load(f)
-                            data['file_path'] = str(json_file)
-                            responses.append(data)
-                    except Exception as e:
-                        print(f"⚠️  Erreur lors du chargement de {json_file}: {e}")
-    
-    return responses
+from app.services.model_response_store import ModelResponseStore, model_response_store
+
+def load_model_responses(
+    store: ModelResponseStore = model_response_store,
+    session_id: Optional[str] = None,
+    model: Optional[str] = None,
+    parse_status: Optional[str] = None,
+    since: Optional[datetime] = None,
+    limit: Optional[int] = None
+) -> List[Dict[str, Any]]:
+    """Charge les métadonnées des réponses du modèle depuis le stockage indexé"""
+    if not store.db_path.exists():
+        print(f"❌ Le stockage {store.db_path} n'existe pas")
+        return []
+    
+    # Seules les colonnes indexées sont lues ; le contenu complet est chargé à la demande
+    summaries = store.list(
+        session_id=session_id, model=model, parse_status=parse_status, since=since, limit=limit
+    )
+    return [
+        {
+            'id': summary['id'],
+            'metadata': {
+                'session_id': summary['session_id'],
+                'timestamp': summary['timestamp'],
+                'model': summary['model'],
+                'parse_status': summary['parse_status'],
+            },
+            'analysis_info': {
+                'prompt_length': summary['prompt_length'],
+                'response_length': summary['response_length'],
+                'parsed_fields_count': summary['parsed_fields_count'],
+            },
+        }
+        for summary in summaries
+    ]
 
 def display_response_summary(response: Dict[str, Any]) -> None:
     """Affiche un résumé d'une réponse"""
@@ -43,6 +53,7 @@ def display_response_summary(response: Dict[str, Any]) -> None:
     print(f"📄 Session: {metadata.get('session_id', 'N/A')}")
     print(f"🕒 Timestamp: {metadata.get('timestamp', 'N/A')}")
     print(f"🤖 Modèle: {metadata.get('model', 'N/A')}")
+    print(f"🧩 Statut: {metadata.get('parse_status', 'N/A')}")
     print(f"📏 Longueur prompt: {analysis_info.get('prompt_length', 0)} caractères")
     print(f"📏 Longueur réponse: {analysis_info.get('response_length', 0)} caractères")
     print(f"📊 Champs extraits: {analysis_info.get('parsed_fields_count', 0)}")
@@ -64,7 +75,7 @@ def display_detailed_response(response: Dict[str, Any]) -> None:
     
     # Métadonnées
     metadata = response.get('metadata', {})
-    print(f"📄 Fichier: {response.get('file_path', 'N/A')}")
+    print(f"📄 Réponse n°: {metadata.get('id', 'N/A')}")
     print(f"🕒 Session: {metadata.get('session_id', 'N/A')}")
     print(f"🕒 Timestamp: {metadata.get('timestamp', 'N/A')}")
     print(f"🤖 Modèle: {metadata.get('model', 'N/A')}")
@@ -76,6 +87,14 @@ def display_detailed_response(response: Dict[str, Any]) -> None:
     print(f"   - Longueur réponse: {analysis_info.get('response_length', 0)} caractères")
     print(f"   - Champs extraits: {analysis_info.get('parsed_fields_count', 0)}")
     
+    usage = response.get('usage', {})
+    if usage:
+        print(f"\n🔢 TOKENS:")
+        print(f"   - num_ctx: {usage.get('num_ctx', 'N/A')} / num_predict: {usage.get('num_predict', 'N/A')}")
+        print(f"   - Tokens du prompt: {usage.get('prompt_eval_count', 'N/A')} / générés: {usage.get('eval_count', 'N/A')}")
+        if usage.get('done_reason') == 'length':
+            print(f"   - ⚠️  Génération coupée par num_predict")
+    
     # Prompt (tronqué)
     prompt = response.get('prompt', '')
     if prompt:
@@ -110,11 +129,23 @@ def display_detailed_response(response: Dict[str, Any]) -> None:
 
 def main():
     """Fonction principale"""
+    parser = argparse.ArgumentParser(description="Visualise les réponses du modèle sauvegardées")
+    parser.add_argument("--session", help="Filtrer par session")
+    parser.add_argument("--model", help="Filtrer par modèle")
+    parser.add_argument("--status", help="Filtrer par statut (ok, error, fallback, fallback_error, escalated, partial)")
+    parser.add_argument("--days", type=int, help="Seulement les N derniers jours")
+    parser.add_argument("--limit", type=int, default=50, help="Nombre maximal de réponses (défaut: 50)")
+    parser.add_argument("--db", type=Path, help="Chemin du stockage SQLite")
+    args = parser.parse_args()
+    
     print("🔍 VISUALISATEUR DES RÉPONSES DU MODÈLE")
     print("=" * 50)
     
+    store = ModelResponseStore(args.db) if args.db else model_response_store
+    since = datetime.now() - timedelta(days=args.days) if args.days else None
+    
     # Charger les réponses
-    responses = load_model_responses()
+    responses = load_model_responses(store, args.session, args.model, args.status, since, args.limit)
     
     if not responses:
         print("❌ Aucune réponse du modèle trouvée")
@@ -140,14 +171,14 @@ def main():
             
             choice_num = int(choice)
             if 1 <= choice_num <= len(responses):
-                display_detailed_response(responses[choice_num - 1])
+                display_detailed_response(store.get(responses[choice_num - 1]['id']))
             else:
                 print("❌ Numéro invalide")
         except ValueError:
             print("❌ Entrée invalide")
     else:
         # Si une seule réponse, l'afficher directement
-        display_detailed_response(responses[0])
+        display_detailed_response(store.get(responses[0]['id']))
 
 if __name__ == "__main__":
     main() 
\ No newline at end of file